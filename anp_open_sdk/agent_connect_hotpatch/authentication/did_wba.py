@@ -22,14 +22,17 @@
 import re
 import urllib.parse
 import base64
+import functools
 import logging
 logger = logging.getLogger(__name__)
-from typing import Any, Dict, Tuple, Optional, List, Callable, Union
+from typing import Any, Dict, Tuple, Optional, List, Callable, Union, NamedTuple
 import aiohttp
 import asyncio
 import json
 import secrets
 import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime, timezone
 from cryptography.hazmat.primitives.asymmetric import ec, ed25519
 from cryptography.hazmat.primitives.serialization import (
@@ -37,7 +40,7 @@ from cryptography.hazmat.primitives.serialization import (
 )
 import base58  # Need to add this dependency
 import traceback
-from agent_connect.authentication.verification_methods import create_verification_method, CURVE_MAPPING
+from agent_connect.authentication.verification_methods import create_verification_method, CURVE_MAPPING, VerificationMethod
 import jcs
 
 
@@ -308,7 +311,7 @@ def generate_auth_header_two_way(
     logger.debug(f"[签名] content_hash:{content_hash.hex()} ")
     # Calculate SHA-256 hash
     # Create verifier and encode signature
-    verifier = create_verification_method(method_dict)
+    verifier = get_cached_verifier(did, method_dict)
     signature_bytes = sign_callback(content_hash, verification_method_fragment)
     signature = verifier.encode_signature(signature_bytes)
     
@@ -328,6 +331,44 @@ def generate_auth_header_two_way(
     
     return auth_header
 
+_METHOD_INDEX_CACHE_SIZE = 256
+_method_index_cache: "OrderedDict[int, Tuple[Dict, Dict[str, Dict]]]" = OrderedDict()
+_VERIFIER_CACHE_SIZE = 1024
+_verifier_cache: "OrderedDict[Tuple[str, str, str], VerificationMethod]" = OrderedDict()
+_verification_cache_lock = threading.Lock()
+
+
+def _verification_method_index(did_document: Dict) -> Dict[str, Dict]:
+    """
+    Map verification method ids to method dicts for a DID document.
+
+    Entries from verificationMethod take precedence over embedded authentication
+    methods, and the first occurrence of an id wins. The map is cached per
+    document object; the cache holds a reference so the object id stays valid.
+    """
+    key = id(did_document)
+    with _verification_cache_lock:
+        cached = _method_index_cache.get(key)
+        if cached is not None and cached[0] is did_document:
+            _method_index_cache.move_to_end(key)
+            return cached[1]
+
+    index: Dict[str, Dict] = {}
+    for method in did_document.get('verificationMethod', []):
+        if isinstance(method, dict) and method.get('id'):
+            index.setdefault(method['id'], method)
+    for auth in did_document.get('authentication', []):
+        if isinstance(auth, dict) and auth.get('id'):
+            index.setdefault(auth['id'], auth)
+
+    with _verification_cache_lock:
+        _method_index_cache[key] = (did_document, index)
+        _method_index_cache.move_to_end(key)
+        while len(_method_index_cache) > _METHOD_INDEX_CACHE_SIZE:
+            _method_index_cache.popitem(last=False)
+    return index
+
+
 def _find_verification_method(did_document: Dict, verification_method_id: str) -> Optional[Dict]:
     """
     Find verification method in DID document by ID.
@@ -340,24 +381,46 @@ def _find_verification_method(did_document: Dict, verification_method_id: str) -
     Returns:
         Optional[Dict]: Verification method if found, None otherwise
     """
-    # Search in verificationMethod array
-    for method in did_document.get('verificationMethod', []):
-        if method['id'] == verification_method_id:
-            return method
-            
-    # Search in authentication array
-    for auth in did_document.get('authentication', []):
-        # Handle both reference string and embedded verification method
-        if isinstance(auth, str):
-            if auth == verification_method_id:
-                # If it's a reference, look up in verificationMethod
-                for method in did_document.get('verificationMethod', []):
-                    if method['id'] == verification_method_id:
-                        return method
-        elif isinstance(auth, dict) and auth.get('id') == verification_method_id:
-            return auth
-            
-    return None
+    return _verification_method_index(did_document).get(verification_method_id)
+
+
+def _key_material_hash(method_dict: Dict) -> str:
+    """Hash everything in a verification method except its id and controller."""
+    material = {k: v for k, v in method_dict.items() if k not in ('id', 'controller')}
+    return hashlib.sha256(json.dumps(material, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def get_cached_verifier(did: str, method_dict: Dict) -> VerificationMethod:
+    """
+    Return a verifier built by create_verification_method, reusing earlier instances.
+
+    The cache key is (DID, verification method id, key material hash), so a rotated
+    key gets a new verifier while unchanged keys skip JWK/multibase decoding and
+    public key construction.
+
+    Raises:
+        ValueError: If the verification method is invalid or unsupported
+    """
+    key = (did, method_dict.get('id', ''), _key_material_hash(method_dict))
+    with _verification_cache_lock:
+        verifier = _verifier_cache.get(key)
+        if verifier is not None:
+            _verifier_cache.move_to_end(key)
+            return verifier
+
+    verifier = create_verification_method(method_dict)
+    with _verification_cache_lock:
+        _verifier_cache[key] = verifier
+        while len(_verifier_cache) > _VERIFIER_CACHE_SIZE:
+            _verifier_cache.popitem(last=False)
+    return verifier
+
+
+def clear_verification_caches():
+    """Drop cached verifiers and verification method maps."""
+    with _verification_cache_lock:
+        _verifier_cache.clear()
+        _method_index_cache.clear()
 
 
 def _select_authentication_method(did_document: Dict) -> Tuple[Dict, str]:
@@ -578,7 +641,89 @@ def _extract_public_key(verification_method: Dict) -> Union[ec.EllipticCurvePubl
         f"Unsupported verification method type or missing required key format: {method_type}"
     )
 
-def extract_auth_header_parts_two_way(auth_header: str) -> Tuple[str, str, str, str, str]:
+class DIDWbaAuthHeaderParts(NamedTuple):
+    """Parsed two-way DIDWba Authorization header. Unpacks like the legacy 6-tuple."""
+    did: str
+    nonce: str
+    timestamp: str
+    resp_did: str
+    verification_method: str
+    signature: str
+
+
+_AUTH_PARAM_SEPARATORS = ' \t,'
+
+
+@functools.lru_cache(maxsize=1024)
+def _tokenize_auth_params(params: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    Split 'key1="value1", key2="value2"' into (key, value) pairs in one pass.
+
+    Identical strings are served from an LRU cache, so the repeated parses of one
+    header along the auth path cost a dictionary lookup.
+
+    Raises:
+        ValueError: On the first malformed token.
+    """
+    pairs = []
+    i, n = 0, len(params)
+    while True:
+        while i < n and params[i] in _AUTH_PARAM_SEPARATORS:
+            i += 1
+        if i >= n:
+            return tuple(pairs)
+        eq = params.find('=', i)
+        if eq < 0:
+            raise ValueError(f"Malformed auth parameter at position {i}")
+        key = params[i:eq]
+        if not key or not key.replace('_', '').isalnum():
+            raise ValueError(f"Invalid auth parameter name at position {i}")
+        if params[eq + 1:eq + 2] != '"':
+            raise ValueError(f"Auth parameter {key} must be a quoted string")
+        end = params.find('"', eq + 2)
+        if end < 0:
+            raise ValueError(f"Unterminated value for auth parameter {key}")
+        pairs.append((key, params[eq + 2:end]))
+        i = end + 1
+        if i < n and params[i] not in _AUTH_PARAM_SEPARATORS:
+            raise ValueError(f"Unexpected character after auth parameter {key}")
+
+
+def parse_auth_params(params: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    Parse the parameter list of an Authorization header (without the scheme).
+
+    Returns:
+        Tuple[Tuple[str, str], ...]: (key, value) pairs in header order
+
+    Raises:
+        ValueError: If the parameter list is malformed
+    """
+    return _tokenize_auth_params(params)
+
+
+def parse_did_wba_auth_header(auth_header: str) -> Dict[str, str]:
+    """
+    Parse a DIDWba Authorization header into a dict keyed by lower-case field name.
+
+    The first occurrence of a field wins. Empty values are dropped so that they
+    count as missing, as in the regex-based parser this replaces.
+
+    Raises:
+        ValueError: If the header does not start with 'DIDWba' or is malformed
+    """
+    stripped = auth_header.strip()
+    if not stripped.startswith('DIDWba'):
+        raise ValueError("Authorization header must start with 'DIDWba'")
+    fields = {}
+    for key, value in _tokenize_auth_params(stripped[6:]):
+        if value:
+            fields.setdefault(key.lower(), value)
+    return fields
+
+
+@functools.lru_cache(maxsize=1024)
+def extract_auth_header_parts_two_way(auth_header: str) -> DIDWbaAuthHeaderParts:
     """
     Extract authentication information from the authorization header.
     
@@ -586,7 +731,7 @@ def extract_auth_header_parts_two_way(auth_header: str) -> Tuple[str, str, str,
         auth_header: Authorization header value without "Authorization:" prefix.
         
     Returns:
-        Tuple[str, str, str, str, str]: A tuple containing:
+        DIDWbaAuthHeaderParts: Immutable tuple containing:
             - did: DID string
             - nonce: Nonce value
             - timestamp: Timestamp string
@@ -595,33 +740,13 @@ def extract_auth_header_parts_two_way(auth_header: str) -> Tuple[str, str, str,
             - signature: Signature value
             
     Raises:
-        ValueError: If any required field is missing in the auth header
+        ValueError: If the header is malformed or any required field is missing
     """
-    logger.debug(f"Extracting auth header parts from: {auth_header}")
-    
-    required_fields = {
-        'did': r'(?i)did="([^"]+)"',
-        'nonce': r'(?i)nonce="([^"]+)"',
-        'timestamp': r'(?i)timestamp="([^"]+)"',
-        'resp_did': r'(?i)resp_did="([^"]+)"',
-        'verification_method': r'(?i)verification_method="([^"]+)"',
-        'signature': r'(?i)signature="([^"]+)"'
-    }
-    
-    # Verify the header starts with DIDWba
-    if not auth_header.strip().startswith('DIDWba'):
-        raise ValueError("Authorization header must start with 'DIDWba'")
-    
-    parts = {}
-    for field, pattern in required_fields.items():
-        match = re.search(pattern, auth_header)
-        if not match:
+    fields = parse_did_wba_auth_header(auth_header)
+    for field in DIDWbaAuthHeaderParts._fields:
+        if field not in fields:
             raise ValueError(f"Missing required field in auth header: {field}")
-        parts[field] = match.group(1)
-    
-    logger.debug(f"Extracted auth header parts: {parts}")
-    return (parts['did'], parts['nonce'], parts['timestamp'], 
-            parts['resp_did'], parts['verification_method'], parts['signature'])
+    return DIDWbaAuthHeaderParts(*(fields[field] for field in DIDWbaAuthHeaderParts._fields))
 
 def verify_auth_header_signature_two_way(
     auth_header: str,
@@ -672,7 +797,7 @@ def verify_auth_header_signature_two_way(
             return False, "Verification method not found"
             
         try:
-            verifier = create_verification_method(method_dict)
+            verifier = get_cached_verifier(did_document.get('id'), method_dict)
             if verifier.verify_signature(content_hash, signature):
                 return True, "Verification successful"
             return False, "Signature verification failed"
@@ -740,7 +865,7 @@ def generate_auth_json(
     content_hash = hashlib.sha256(canonical_json).digest()
     
     # Create verifier and encode signature
-    verifier = create_verification_method(method_dict)
+    verifier = get_cached_verifier(did, method_dict)
     signature_bytes = sign_callback(content_hash, verification_method_fragment)
     signature = verifier.encode_signature(signature_bytes)
     
@@ -818,7 +943,7 @@ def verify_auth_json_signature(
             return False, "Verification method not found"
             
         try:
-            verifier = create_verification_method(method_dict)
+            verifier = get_cached_verifier(did_document.get('id'), method_dict)
             if verifier.verify_signature(content_hash, signature):
                 return True, "Verification successful"
             return False, "Signature verification failed"
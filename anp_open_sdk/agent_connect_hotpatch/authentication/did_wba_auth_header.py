@@ -168,6 +168,18 @@ class DIDWbaAuthHeader:
         
         # logger.debug(f"Using DID authentication header for domain {domain}")
         return {"Authorization": self.auth_headers[domain]}
+
+    async def get_auth_header_two_way_async(self, server_url: str, resp_did: str, force_new: bool = False) -> Dict[str, str]:
+        """
+        get_auth_header_two_way 的异步版本，签名和 JCS 规范化在密码学线程池中执行，不阻塞事件循环。
+        """
+        from anp_open_sdk.auth.crypto_executor import run_crypto
+        domain = self._get_domain(server_url)
+        if domain in self.tokens and not force_new:
+            return {"Authorization": f"Bearer {self.tokens[domain]}"}
+        if domain not in self.auth_headers or force_new:
+            self.auth_headers[domain] = await run_crypto(self._generate_auth_header_two_way, domain, resp_did)
+        return {"Authorization": self.auth_headers[domain]}
     
     def update_token(self, server_url: str, headers: Dict[str, str]) -> Optional[str]:
         """
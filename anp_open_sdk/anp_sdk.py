@@ -18,17 +18,26 @@ import os
 import time
 import asyncio
 import json
+import threading
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, Any, Optional, List
 from fastapi.middleware.cors import CORSMiddleware
 from anp_open_sdk.auth.auth_server import auth_middleware
+from anp_open_sdk.auth.rate_limiter import RateLimiter
 from anp_open_sdk.service.router import router_did, router_publisher, router_auth
 from anp_open_sdk.config import get_global_config
 from fastapi import Request, WebSocket, WebSocketDisconnect, FastAPI
 from fastapi.responses import StreamingResponse
 from anp_open_sdk.anp_sdk_agent import LocalAgent
+from anp_open_sdk.anp_sdk_lifecycle import (
+    DrainingServer, StartupTasks, flush_log_handlers, restore_runtime_state, save_runtime_state
+)
 from anp_open_sdk.service.interaction.anp_sdk_group_runner import GroupManager, GroupRunner, Message, MessageType, Agent
+from anp_open_sdk.service.interaction.anp_sdk_ws_sender import WebSocketSender
 from anp_open_sdk.sdk_mode import SdkMode
+from anp_open_sdk.utils.request_payload import get_json_payload
+from anp_open_sdk.utils.serialization import EventStreamGZipMiddleware, FastJSONResponse
 
 # 在模块顶部获取 logger，这是标准做法
 import logging
@@ -63,6 +72,11 @@ class ANPSDK:
         self.message_handlers = {}
         self.ws_connections = {}
         self.sse_clients = set()
+        self.group_heartbeat_interval = 15.0
+        # /ws/message 每个连接的发送队列上限、高水位和慢消费者超时（秒）
+        self.ws_send_queue_size = 1024
+        self.ws_high_water = 256
+        self.ws_slow_timeout = 5.0
         self.logger = logger
         self.proxy_client = None
         self.proxy_mode = False
@@ -81,7 +95,8 @@ class ANPSDK:
                 version="0.1.0",
                 reload=False,
                 docs_url="/docs",
-                redoc_url="/redoc"
+                redoc_url="/redoc",
+                default_response_class=FastJSONResponse
                     )
         else:
             self.app = FastAPI(
@@ -90,7 +105,8 @@ class ANPSDK:
                 version="0.1.0",
                 reload=True,
                 docs_url=None,
-                redoc_url=None
+                redoc_url=None,
+                default_response_class=FastJSONResponse
                     )
         self.app.state.sdk = self
 
@@ -101,11 +117,49 @@ class ANPSDK:
             allow_methods=["*"],
             allow_headers=["*"],
         )
+        # 超过阈值且客户端接受 gzip 的响应压缩返回，SSE 事件流不压缩
+        gzip_min_size = getattr(config.anp_sdk, 'gzip_min_size', 0)
+        if gzip_min_size:
+            self.app.add_middleware(EventStreamGZipMiddleware, minimum_size=gzip_min_size,
+                                    compresslevel=getattr(config.anp_sdk, 'gzip_level', 6))
 
         @self.app.middleware("http")
         async def auth_middleware_wrapper(request, call_next):
             return await auth_middleware(request, call_next)
 
+        # 后注册的中间件在外层，限流先于认证执行，被拒绝的请求不会触发验签
+        rate_config = getattr(config.anp_sdk, 'rate_limit', None)
+        self.rate_limiter = None
+        if rate_config is not None and getattr(rate_config, 'enabled', True):
+            self.rate_limiter = RateLimiter.from_config(rate_config)
+            self.app.state.rate_limiter = self.rate_limiter
+
+            @self.app.middleware("http")
+            async def rate_limit_middleware(request, call_next):
+                return await self.rate_limiter.dispatch(request, call_next)
+
+        # 停机与重启：排空时间、通知客户端的重连间隔、nonce/token 状态文件
+        lifecycle_config = getattr(config.anp_sdk, 'lifecycle', None)
+        self.drain_timeout = float(getattr(lifecycle_config, 'drain_timeout', 10))
+        self.reconnect_after = float(getattr(lifecycle_config, 'reconnect_after', 1))
+        self.state_file = getattr(lifecycle_config, 'state_file', None) or None
+        self.draining = False
+        self._watching_config = False
+        self._hosted_request_processor = None
+        self.uvicorn_server = None
+        self._server_thread = None
+        self.startup = StartupTasks()
+        self.startup.add("openapi_yaml", self.save_openapi_yaml)
+        self.startup.add("jwt_keys", self._warm_jwt_keys)
+
+        @self.app.get("/ready", tags=["status"])
+        async def ready():
+            if self.draining or not self.startup.ready:
+                status = "draining" if self.draining else "starting"
+                return FastJSONResponse(status_code=503, content={"status": status},
+                                        headers={"Retry-After": str(max(1, int(self.reconnect_after)))})
+            return {"status": "ready", "tasks": self.startup.status}
+
         from anp_open_sdk.service.router.router_agent import AgentRouter
         self.router = AgentRouter()
         if mode == SdkMode.MULTI_AGENT_ROUTER:
@@ -120,8 +174,12 @@ class ANPSDK:
         # 其他模式由LocalAgent主导
 
         @self.app.on_event("startup")
-        async def generate_openapi_yaml():
-            self.save_openapi_yaml()
+        async def run_startup_tasks():
+            # 先恢复已使用的 nonce，再开始验证请求；预热任务在后台并发执行，完成后 /ready 返回 200
+            if self.state_file:
+                restore_runtime_state(self.state_file)
+            self.draining = False
+            self.startup.start()
 
 
     def _register_ws_proxy_server(self, ws_host, ws_port):
@@ -155,63 +213,35 @@ class ANPSDK:
     def list_groups(self) -> List[str]:
         return self.group_manager.list_groups()
 
-    async def check_did_host_request(self):
+    async def check_did_host_request(self, max_concurrency: int = 8, batch_size: int = None):
         from anp_open_sdk.service.publisher.anp_sdk_publisher_mail_backend import EnhancedMailManager
-        from anp_open_sdk.service.publisher.anp_sdk_publisher import DIDManager
+        from anp_open_sdk.service.publisher.anp_sdk_publisher import DIDManager, HostedDIDRequestProcessor
         try:
             config = get_global_config()
             use_local = config.mail.use_local_backend
             logger.debug(f"管理邮箱检查前初始化，使用本地文件邮件后端参数设置:{use_local}")
-            mail_manager = EnhancedMailManager(use_local_backend=use_local)
-            did_manager = DIDManager()
-            
-            did_requests = mail_manager.get_unread_did_requests()
-            if not did_requests:
-                return "没有新的DID托管请求"
-            
-            result = "开始处理DID托管请求\n"
-            for request in did_requests:
-                did_document = request['content']
-                from_address = request['from_address']
-                message_id = request['message_id']
-                
-                parsed_json = json.loads(did_document)
-                did_document_dict = dict(parsed_json)
-
-                if did_manager.is_duplicate_did(did_document):
-                    mail_manager.send_reply_email(
-                        from_address,
-                        "DID已申请",
-                        "重复的DID申请，请联系管理员"
-                    )
-                    mail_manager.mark_message_as_read(message_id)
-                    result += f"{from_address}的DID {did_document_dict.get('id')} 已申请，退回\n"
-                    continue
-                
-                success, new_did_doc, error = did_manager.store_did_document(did_document_dict)
-                if success:
-                    mail_manager.send_reply_email(
-                        from_address,
-                        "ANP HOSTED DID RESPONSED",
-                        new_did_doc)
-                    
-                    result += f"{from_address}的DID {new_did_doc['id']} 已保存\n"
-                else:
-                    mail_manager.send_reply_email(
-                        from_address,
-                        "DID托管申请失败",
-                        f"处理DID文档时发生错误: {error}"
-                    )
-                    result += f"{from_address}的DID处理失败: {error}\n"
-                
-                mail_manager.mark_message_as_read(message_id)
-            
-            return result
+            mail_manager = EnhancedMailManager.shared(use_local_backend=use_local)
+            # 定时轮询复用同一个处理器，托管索引和处理日志的连接只打开一次
+            processor = self._hosted_request_processor
+            hosted_dir = Path(config.anp_sdk.user_hosted_path)
+            if processor is None or processor.mail_manager is not mail_manager or processor.did_manager.hosted_dir != hosted_dir:
+                processor = HostedDIDRequestProcessor(mail_manager, DIDManager(str(hosted_dir)))
+                self._hosted_request_processor = processor
+            processor.max_concurrency = max_concurrency
+            return await processor.run(limit=batch_size)
         except Exception as e:
             error_msg = f"处理DID托管请求时发生错误: {e}"
             logger.error(error_msg)
             return error_msg
 
+    def _warm_jwt_keys(self):
+        """预先解析本地智能体的 JWT 私钥，避免首个认证请求承担解析开销"""
+        from anp_open_sdk.auth.token_nonce_auth import get_jwt_signing_key
+        for agent in list(self.router.local_agents.values()):
+            key_path = getattr(agent, 'jwt_private_key_path', None)
+            if key_path and os.path.exists(key_path):
+                get_jwt_signing_key(key_path)
+
     def register_agent(self, agent: LocalAgent):
         self.router.register_agent(agent)
         self.logger.debug(f"已注册智能体到SDK: {agent.id}")
@@ -409,12 +439,7 @@ class ANPSDK:
 
         @self.app.post("/agent/api/{did}/{subpath:path}")
         async def api_entry_post(did: str, subpath: str, request: Request):
-            try:
-                data = await request.json()
-                if not data:
-                    data = {}
-            except Exception:
-                data = {}
+            data = await get_json_payload(request, {})
             req_did = request.query_params.get("req_did", "demo_caller")
             resp_did = did
             data["type"] = "api_call"
@@ -426,7 +451,7 @@ class ANPSDK:
 
         @self.app.post("/agent/message/{did}/post")
         async def message_entry_post(did: str, request: Request):
-            data = await request.json()
+            data = await get_json_payload(request, {})
             req_did = request.query_params.get("req_did", "demo_caller")
             resp_did = did
             data["type"] = "message"
@@ -440,9 +465,9 @@ class ANPSDK:
         
         @self.app.post("/agent/group/{did}/{group_id}/join")
         async def join_group(did: str, group_id: str, request: Request):
-            data = await request.json()
+            data = await get_json_payload(request, {})
             req_did = request.query_params.get("req_did", "demo_caller")
-            runner = self.group_manager.get_runner(group_id)
+            runner = await self.group_manager.acquire(group_id)
             if runner:
                 agent = Agent(
                     id=req_did,
@@ -452,7 +477,7 @@ class ANPSDK:
                 )
                 allowed = await runner.on_agent_join(agent)
                 if allowed:
-                    runner.agents[req_did] = agent
+                    runner.add_member(agent)
                     return {"status": "success", "message": "Joined group", "group_id": group_id}
                 else:
                     return {"status": "error", "message": "Join request rejected"}
@@ -467,9 +492,9 @@ class ANPSDK:
 
         @self.app.post("/agent/group/{did}/{group_id}/leave")
         async def leave_group(did: str, group_id: str, request: Request):
-            data = await request.json()
+            data = await get_json_payload(request, {})
             req_did = request.query_params.get("req_did", "demo_caller")
-            runner = self.group_manager.get_runner(group_id)
+            runner = await self.group_manager.acquire(group_id)
             if runner and req_did in runner.agents:
                 agent = runner.agents[req_did]
                 await runner.on_agent_leave(agent)
@@ -486,9 +511,9 @@ class ANPSDK:
 
         @self.app.post("/agent/group/{did}/{group_id}/message")
         async def group_message(did: str, group_id: str, request: Request):
-            data = await request.json()
+            data = await get_json_payload(request, {})
             req_did = request.query_params.get("req_did", "demo_caller")
-            runner = self.group_manager.get_runner(group_id)
+            runner = await self.group_manager.acquire(group_id)
             if runner:
                 message = Message(
                     type=MessageType.TEXT,
@@ -516,21 +541,21 @@ class ANPSDK:
         @self.app.get("/agent/group/{did}/{group_id}/connect")
         async def group_connect(did: str, group_id: str, request: Request):
             req_did = request.query_params.get("req_did", "demo_caller")
-            runner = self.group_manager.get_runner(group_id)
+            runner = await self.group_manager.acquire(group_id)
             if runner:
                 if not runner.is_member(req_did):
                     return {"status": "error", "message": "Not a member of this group"}
-                async def event_generator():
-                    queue = asyncio.Queue()
-                    runner.register_listener(req_did, queue)
-                    try:
-                        while True:
-                            message = await queue.get()
-                            yield f"data: {json.dumps(message)}\n\n"
-                    except asyncio.CancelledError:
-                        runner.unregister_listener(req_did)
-                        raise
-                return StreamingResponse(event_generator(), media_type="text/event-stream")
+                last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+                try:
+                    last_event_id = int(last_event_id) if last_event_id else None
+                except ValueError:
+                    last_event_id = None
+                compact = request.query_params.get("format") == "compact"
+                return StreamingResponse(
+                    runner.event_stream(req_did, last_event_id, self.group_heartbeat_interval, compact=compact),
+                    media_type="text/event-stream",
+                    headers={"Cache-Control": "no-cache"}
+                )
             resp_did = did
             data = {"type": "group_connect", "group_id": group_id, "req_did": req_did}
             result = await self.router.route_request(req_did, resp_did, data)
@@ -540,9 +565,9 @@ class ANPSDK:
 
         @self.app.post("/agent/group/{did}/{group_id}/members")
         async def manage_group_members(did: str, group_id: str, request: Request):
-            data = await request.json()
+            data = await get_json_payload(request, {})
             req_did = request.query_params.get("req_did", "demo_caller")
-            runner = self.group_manager.get_runner(group_id)
+            runner = await self.group_manager.acquire(group_id)
             if runner:
                 action = data.get("action", "list")
                 if action == "list":
@@ -558,7 +583,7 @@ class ANPSDK:
                     )
                     allowed = await runner.on_agent_join(agent)
                     if allowed:
-                        runner.agents[agent_id] = agent
+                        runner.add_member(agent)
                         return {"status": "success", "message": "Member added"}
                     return {"status": "error", "message": "Add member rejected"}
                 elif action == "remove":
@@ -581,7 +606,7 @@ class ANPSDK:
         @self.app.get("/agent/group/{did}/{group_id}/members")
         async def get_group_members(did: str, group_id: str, request: Request):
             req_did = request.query_params.get("req_did", "demo_caller")
-            runner = self.group_manager.get_runner(group_id)
+            runner = await self.group_manager.acquire(group_id)
             if runner:
                 members = [agent.to_dict() for agent in runner.get_members()]
                 return {"status": "success", "members": members}
@@ -599,28 +624,34 @@ class ANPSDK:
 
         @self.app.post("/api/message")
         async def receive_message(request: Request):
-            data = await request.json()
+            data = await get_json_payload(request, {})
             return await self._handle_message(data)
 
         @self.app.websocket("/ws/message")
         async def websocket_endpoint(websocket: WebSocket):
             await websocket.accept()
             client_id = id(websocket)
-            self.ws_connections[client_id] = websocket
+            sender = WebSocketSender(
+                websocket,
+                max_queue=self.ws_send_queue_size,
+                high_water=self.ws_high_water,
+                slow_timeout=self.ws_slow_timeout,
+                on_close=lambda _: self.ws_connections.pop(client_id, None)
+            ).start()
+            self.ws_connections[client_id] = sender
 
             try:
                 while True:
                     data = await websocket.receive_json()
                     response = await self._handle_message(data)
-                    await websocket.send_json(response)
+                    sender.enqueue(json.dumps(response, ensure_ascii=False, separators=(",", ":")))
             except WebSocketDisconnect:
                 self.logger.debug(f"WebSocket客户端断开连接: {client_id}")
-                if client_id in self.ws_connections:
-                    del self.ws_connections[client_id]
             except Exception as e:
-                self.logger.error(f"WebSocket处理错误: {e}")
-                if client_id in self.ws_connections:
-                    del self.ws_connections[client_id]
+                if not sender.closed:
+                    self.logger.error(f"WebSocket处理错误: {e}")
+            finally:
+                await sender.close()
 
     async def _handle_message(self, message: Dict[str, Any]):
         logger.debug(f"准备处理接收到的消息内容: {message}")
@@ -641,6 +672,7 @@ class ANPSDK:
             return {"status": "error", "message": f"未找到处理{message_type}类型消息的处理器"}
 
     def start_server(self):
+        """在后台线程中启动服务并立即返回线程；/ready 在启动任务完成后返回 200"""
         if self.server_running:
             self.logger.warning("服务器已经在运行")
             return True
@@ -651,7 +683,6 @@ class ANPSDK:
             methods = route_info['methods']
             self.app.add_api_route(f"/{route_path}", func, methods=methods)
         import uvicorn
-        import threading
         from anp_open_sdk.config import get_global_config
 
         # 2. 修正配置项的名称
@@ -660,44 +691,93 @@ class ANPSDK:
         port = config.anp_sdk.port
         host = config.anp_sdk.host
 
+        # 配置文件热加载，调整 nonce/token 过期时间、日志级别等无需重启服务
+        watch_interval = getattr(config.anp_sdk, 'config_watch_interval', 0)
+        if watch_interval and hasattr(config, 'start_watching') and not self._watching_config:
+            config.start_watching(watch_interval)
+            self._watching_config = True
+
         app_instance = self.app
 
-        if not self.debug_mode:
-            config = uvicorn.Config(app_instance, host=host, port=port)
-            server = uvicorn.Server(config)
-            self.uvicorn_server = server
+        # 调试模式也在后台线程中运行，调用方不再被阻塞，stop_server 对两种模式一致
+        server_config = uvicorn.Config(app_instance, host=host, port=port,
+                                       timeout_graceful_shutdown=self.drain_timeout)
+        server = DrainingServer(server_config, on_drain=self._drain_connections, on_stopped=self._flush_state)
+        self.uvicorn_server = server
 
-            def run_server():
-                import asyncio
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
+        def run_server():
+            import asyncio
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
                 loop.run_until_complete(server.serve())
+            finally:
+                loop.close()
+
+        server_thread = threading.Thread(target=run_server, name="anp-sdk-server")
+        server_thread.daemon = True
+        server_thread.start()
+        self._server_thread = server_thread
+        self.server_running = True
+        return server_thread
+
+    async def _drain_connections(self):
+        """停机第一步（已停止监听之后）：通知 SSE 和 WebSocket 客户端重连，进行中的 HTTP 请求继续处理"""
+        self.draining = True
+        notified = 0
+        for runner in list(self.group_manager.runners.values()):
+            notified += runner.close_streams(self.reconnect_after)
+        notice = json.dumps({"type": "server_shutdown", "reconnect_after": self.reconnect_after},
+                            separators=(",", ":"))
+        senders = list(self.ws_connections.values())
+        if senders:
+            await asyncio.gather(*(sender.shutdown(notice) for sender in senders), return_exceptions=True)
+        for websocket in list(getattr(self, 'ws_clients', {}).values()):
+            try:
+                await asyncio.wait_for(websocket.close(code=1012), timeout=1.0)
+            except Exception:
+                pass
+        self.logger.debug(f"停机通知已发送: {notified} 个 SSE 连接, {len(senders)} 个 WebSocket 连接")
 
-            server_thread = threading.Thread(target=run_server)
-            server_thread.daemon = True
-            server_thread.start()
-            self.server_running = True
-            return server_thread
-        else:
-            uvicorn.run(app_instance, host=host, port=port)
-            self.server_running = True
-        return True
-
+    def _flush_state(self):
+        """停机最后一步（请求已排空）：保存 nonce，刷新日志"""
+        if self.state_file:
+            save_runtime_state(self.state_file)
+        flush_log_handlers()
 
-    def stop_server(self):
+    def stop_server(self, timeout: Optional[float] = None):
+        """优雅停机：停止监听、通知长连接客户端、等待进行中的请求最多 drain_timeout 秒、保存状态后返回"""
         if not self.server_running:
             return True
-        for ws in self.ws_connections.values():
-            asyncio.create_task(ws.close())
+        self.draining = True
+        server = self.uvicorn_server
+        if server is not None:
+            server.should_exit = True
+            self.logger.debug("已发送服务器关闭信号")
+        thread = self._server_thread
+        if thread is not None and thread is not threading.current_thread():
+            # 留出通知客户端和保存状态的时间
+            wait = self.drain_timeout + 5 if timeout is None else timeout
+            thread.join(wait)
+            if thread.is_alive() and server is not None:
+                self.logger.warning(f"服务器未能在 {wait} 秒内停止，强制退出")
+                server.force_exit = True
+                thread.join(2)
+        self._server_thread = None
         self.ws_connections.clear()
         self.sse_clients.clear()
-        if hasattr(self, 'uvicorn_server'):
-            self.uvicorn_server.should_exit = True
-            self.logger.debug("已发送服务器关闭信号")
+        if self._watching_config:
+            # 监视按引用计数，只释放本实例的那一次，不影响其他仍在使用的服务
+            get_global_config().stop_watching()
+            self._watching_config = False
         self.server_running = False
         self.logger.debug("服务器已停止")
         return True
 
+    async def astop_server(self, timeout: Optional[float] = None):
+        """stop_server 的协程版本，在线程中等待停机，不阻塞调用方的事件循环"""
+        return await asyncio.to_thread(self.stop_server, timeout)
+
     def __del__(self):
         try:
             if self.server_running:
@@ -778,13 +858,19 @@ class ANPSDK:
             self.logger.error(f"发送消息失败: {e}")
             return False
 
-    async def broadcast_message(self, message: Dict[str, Any]):
-        for ws in self.ws_connections.values():
-            try:
-                await ws.send_json(message)
-            except Exception as e:
-                self.logger.error(f"WebSocket广播失败: {e}")
-        self.logger.debug(f"向{len(self.sse_clients)}个SSE客户端广播消息")
+    async def broadcast_message(self, message: Dict[str, Any]) -> int:
+        """向所有 WebSocket 连接广播消息
+
+        消息只编码一次，放入每个连接的发送队列后立即返回，不等待任何连接写完。
+        返回成功入队的连接数。
+        """
+        text = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+        queued = 0
+        for sender in list(self.ws_connections.values()):
+            if sender.enqueue(text):
+                queued += 1
+        self.logger.debug(f"向{queued}个WebSocket客户端广播消息")
+        return queued
 
     def __enter__(self):
         self.start_server()
@@ -798,7 +884,7 @@ class ANPSDK:
         self.stop_server()
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        self.stop_server()
+        await self.astop_server()
 
     async def _handle_api_call(self, req_did: str, resp_did: str, api_path: str, method: str, params: Dict[str, Any]):
         if resp_did != self.agent.id:
@@ -842,15 +928,19 @@ class ANPSDK:
                 self.logger.warning(f"Agent {agent_id} not found in the router")
                 return False
 
-            agent = self.router.local_agents.pop(agent_id, None)
+            agent = self.router.unregister_agent(agent_id)
 
             if agent_id in self.api_registry:
                 del self.api_registry[agent_id]
 
-            for group_id in self.list_groups():
+            # 只唤醒该智能体所在的群组
+            for group_id in self.group_manager.groups_of(agent_id):
                 runner = self.get_group_runner(group_id)
                 if runner and runner.is_member(agent_id):
-                    runner.remove_member(agent_id)
+                    try:
+                        asyncio.get_running_loop().create_task(runner.remove_member(agent_id))
+                    except RuntimeError:
+                        runner.agents.pop(agent_id, None)
 
             self.logger.debug(f"Successfully unregistered agent: {agent_id}")
 
@@ -15,14 +15,15 @@ import asyncio
 import inspect
 import json
 import os
+import re
 from datetime import datetime
-from typing import Dict, Any, Callable, List
+from typing import Dict, Any, Callable, List, Tuple
 
 import nest_asyncio
 from fastapi import FastAPI, Request
 import logging
 logger = logging.getLogger(__name__)
-from starlette.responses import JSONResponse
+from anp_open_sdk.utils.serialization import FastJSONResponse, negotiate_response
 
 
 from anp_open_sdk.config import get_global_config
@@ -30,6 +31,46 @@ from anp_open_sdk.service.publisher.anp_sdk_publisher_mail_backend import Enhanc
 from anp_open_sdk.auth.did_auth_wba import parse_wba_did_host_port
 from anp_open_sdk.contact_manager import ContactManager
 from anp_open_sdk.sdk_mode import SdkMode
+from anp_open_sdk.utils.request_payload import get_json_payload, get_raw_body
+
+_PATH_PARAM_RE = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)(?::(path|str))?\}")
+
+
+def _path_template_regex(template: str, group_prefix: str = "") -> Tuple[str, List[str]]:
+    """把 /items/{item_id} 或 /files/{rest:path} 转为正则源码，{name} 匹配单段，{name:path} 匹配剩余路径
+
+    返回正则源码和参数名列表，分组名为 group_prefix + 参数名。
+    """
+    regex = ""
+    names = []
+    pos = 0
+    for match in _PATH_PARAM_RE.finditer(template):
+        regex += re.escape(template[pos:match.start()])
+        name, kind = match.group(1), match.group(2)
+        regex += f"(?P<{group_prefix}{name}>.+)" if kind == "path" else f"(?P<{group_prefix}{name}>[^/]+)"
+        names.append(name)
+        pos = match.end()
+    regex += re.escape(template[pos:])
+    return regex, names
+
+
+def _compile_template_matcher(templates: List[tuple]):
+    """把 [(模板, handler)] 合并为一个按注册顺序尝试的多分支正则
+
+    每个模板占一个命名分支 _t{i}，其中的参数分组改名为 _t{i}_{参数名}，
+    匹配后由 lastgroup 得到命中的分支。返回 (正则, [(handler, [(分组名, 参数名)])])。
+    """
+    if not templates:
+        return None, []
+    branches = []
+    targets = []
+    for i, (template, handler) in enumerate(templates):
+        prefix = f"_t{i}_"
+        regex, names = _path_template_regex(template, prefix)
+        branches.append(f"(?P<_t{i}>{regex})")
+        targets.append((handler, [(prefix + name, name) for name in names]))
+    return re.compile("|".join(branches)), targets
+
 
 class RemoteAgent:
     def __init__(self, id: str, name: str = None, host: str = None, port: int = None, **kwargs):
@@ -92,19 +133,38 @@ class LocalAgent:
         self.requests = requests
         # 新增: API与消息handler注册表
         self.api_routes = {}  # path -> handler
+        # 含 {参数} 的路径模板，精确匹配失败时按注册顺序匹配: [(template, handler)]
+        self._api_templates: List[tuple] = []
+        # 注册时把全部模板合并成一个正则，见 _compile_template_matcher
+        self._api_template_matcher = None
+        self._api_template_targets: List[tuple] = []
         self.message_handlers = {}  # type -> handler
         # 新增: 群事件handler注册表
         # {(group_id, event_type): [handlers]}
         self._group_event_handlers = {}
         # [(event_type, handler)] 全局handler
         self._group_global_handlers = []
+        # {group_id: [event_type]} 按注册顺序记录每个群的 key，合并时不必扫描全部群
+        self._group_event_keys = {}
+        # 首次查询时合并通配项的缓存: (group_id, event_type) -> handler列表，注册时清空；
+        # 未注册过的群和事件类型分别归到 None，见 _get_group_event_handlers
+        self._group_dispatch: Dict[tuple, List[Callable]] = {}
+        self._group_event_types = set()
+        # 请求类型 -> 处理方法
+        self._request_dispatch = {
+            "group_message": self._handle_group_request,
+            "group_connect": self._handle_group_request,
+            "group_members": self._handle_group_request,
+            "api_call": self._handle_api_call,
+            "message": self._handle_message_request,
+        }
 
         # 群组相关属性
         self.group_queues = {}  # 群组消息队列: {group_id: {client_id: Queue}}
         self.group_members = {}  # 群组成员列表: {group_id: set(did)}
 
         # 新增：联系人管理器
-        self.contact_manager = ContactManager(self.user_data)
+        self.contact_manager = ContactManager.for_user_data(self.user_data)
 
     @classmethod
     def from_did(cls, did: str, name: str = "未命名", agent_type: str = "personal"):
@@ -149,7 +209,7 @@ class LocalAgent:
         methods = methods or ["GET", "POST"]
         if func is None:
             def decorator(f):
-                self.api_routes[path] = f
+                self._add_api_route(path, f)
                 api_info = {
                     "path": f"/agent/api/{self.id}{path}",
                     "methods": methods,
@@ -166,7 +226,7 @@ class LocalAgent:
                 return f
             return decorator
         else:
-            self.api_routes[path] = func
+            self._add_api_route(path, func)
             api_info = {
                 "path": f"/agent/api/{self.id}{path}",
                 "methods": methods,
@@ -182,6 +242,25 @@ class LocalAgent:
                 logger.debug(f"注册 API: {api_info}")
             return func
 
+    def _add_api_route(self, path: str, handler: Callable):
+        self.api_routes[path] = handler
+        if "{" in path:
+            self._api_templates = [(t, h) for t, h in self._api_templates if t != path]
+            self._api_templates.append((path, handler))
+            self._api_template_matcher, self._api_template_targets = _compile_template_matcher(self._api_templates)
+
+    def _resolve_api_handler(self, api_path: str):
+        """精确匹配优先，其次按路径模板匹配，返回 (handler, 路径参数)"""
+        handler = self.api_routes.get(api_path)
+        if handler is not None:
+            return handler, {}
+        if api_path and self._api_template_matcher is not None:
+            match = self._api_template_matcher.fullmatch(api_path)
+            if match:
+                template_handler, groups = self._api_template_targets[int(match.lastgroup[2:])]
+                return template_handler, {name: match.group(group) for group, name in groups}
+        return None, {}
+
     def register_message_handler(self, msg_type: str, func: Callable = None):
         if func is None:
             def decorator(f):
@@ -199,16 +278,27 @@ class LocalAgent:
             self._group_global_handlers.append((event_type, handler))
         else:
             key = (group_id, event_type)
+            if key not in self._group_event_handlers:
+                self._group_event_keys.setdefault(group_id, []).append(event_type)
             self._group_event_handlers.setdefault(key, []).append(handler)
+        if event_type is not None:
+            self._group_event_types.add(event_type)
+        self._group_dispatch.clear()
+
+    def _merge_group_event_handlers(self, group_id, event_type) -> List[Callable]:
+        """按注册顺序合并全局和该群的处理器，顺序与逐项扫描全部注册表一致"""
+        handlers = [h for et, h in self._group_global_handlers if et is None or et == event_type]
+        for et in self._group_event_keys.get(group_id, ()):
+            if et is None or et == event_type:
+                handlers.extend(self._group_event_handlers[(group_id, et)])
+        return handlers
 
     def _get_group_event_handlers(self, group_id: str, event_type: str):
-        handlers = []
-        for et, h in self._group_global_handlers:
-            if et is None or et == event_type:
-                handlers.append(h)
-        for (gid, et), hs in self._group_event_handlers.items():
-            if gid == group_id and (et is None or et == event_type):
-                handlers.extend(hs)
+        gid = group_id if group_id in self._group_event_keys else None
+        et = event_type if event_type in self._group_event_types else None
+        handlers = self._group_dispatch.get((gid, et))
+        if handlers is None:
+            handlers = self._group_dispatch[(gid, et)] = self._merge_group_event_handlers(gid, et)
         return handlers
 
     async def _dispatch_group_event(self, group_id: str, event_type: str, event_data: dict):
@@ -222,74 +312,80 @@ class LocalAgent:
                 self.logger.error(f"群事件处理器出错: {e}")
 
     async def handle_request(self, req_did: str, request_data: Dict[str, Any], request: Request):
+        handler = self._request_dispatch.get(request_data.get("type"))
+        if handler is None:
+            return {"anp_result": {"status": "error", "message": "未知的请求类型"}}
+        return await handler(request_data, request)
+
+    async def _handle_group_request(self, request_data: Dict[str, Any], request: Request):
         req_type = request_data.get("type")
-        if req_type in ("group_message", "group_connect", "group_members"):
-            handler = self.message_handlers.get(req_type)
-            if handler:
-                try:
-                    nest_asyncio.apply()
-                    if asyncio.iscoroutinefunction(handler):
-                        loop = asyncio.get_event_loop()
-                        if loop.is_running():
-                            future = asyncio.ensure_future(handler(request_data))
-                            return loop.run_until_complete(future)
-                        else:
-                            return loop.run_until_complete(handler(request_data))
-                    else:
-                        result = handler(request_data)
-                    if isinstance(result, dict) and "anp_result" in result:
-                        return result
-                    return {"anp_result": result}
-                except Exception as e:
-                    self.logger.error(f"Group message handling error: {e}")
-                    return {"anp_result": {"status": "error", "message": str(e)}}
-            else:
-                return {"anp_result": {"status": "error", "message": f"No handler for group type: {req_type}"}}
-        if req_type == "api_call":
-            api_path = request_data.get("path")
-            handler = self.api_routes.get(api_path)
-            if handler:
-                try:
-                    result = await handler(request_data, request)
-                    if isinstance(result, dict):
-                        status_code = result.pop('status_code', 200)
-                        return JSONResponse(
-                            status_code=status_code,
-                            content=result
-                        )
+        handler = self.message_handlers.get(req_type)
+        if handler:
+            try:
+                nest_asyncio.apply()
+                if asyncio.iscoroutinefunction(handler):
+                    loop = asyncio.get_event_loop()
+                    if loop.is_running():
+                        future = asyncio.ensure_future(handler(request_data))
+                        return loop.run_until_complete(future)
                     else:
-                        return result
-                except Exception as e:
+                        return loop.run_until_complete(handler(request_data))
+                else:
+                    result = handler(request_data)
+                if isinstance(result, dict) and "anp_result" in result:
+                    return result
+                return {"anp_result": result}
+            except Exception as e:
+                self.logger.error(f"Group message handling error: {e}")
+                return {"anp_result": {"status": "error", "message": str(e)}}
+        else:
+            return {"anp_result": {"status": "error", "message": f"No handler for group type: {req_type}"}}
+
+    async def _handle_api_call(self, request_data: Dict[str, Any], request: Request):
+        api_path = request_data.get("path")
+        handler, path_params = self._resolve_api_handler(api_path)
+        if handler:
+            if path_params:
+                # 路径模板参数，如 /items/{item_id} 中的 item_id
+                request_data["path_params"] = path_params
+            try:
+                result = await handler(request_data, request)
+                if isinstance(result, dict):
+                    status_code = result.pop('status_code', 200)
+                    return negotiate_response(request, result, status_code)
+                else:
+                    return result
+            except Exception as e:
+                if self.logger.isEnabledFor(logging.DEBUG):
                     self.logger.debug(
-                        f"发送到 handler的请求数据{request_data}\n"                        
+                        f"发送到 handler的请求数据{request_data}\n"
                         f"完整请求为 url: {request.url} \n"
-                        f"body: {await request.body()}")
-                    self.logger.error(f"API调用错误: {e}")
-                    return JSONResponse(
-                        status_code=500,
-                        content={"status": "error", "error_message": str(e)}
-                    )
-            else:
-                return JSONResponse(
-                    status_code=404,
-                    content={"status": "error", "message": f"未找到API: {api_path}"}
+                        f"body: {(await get_raw_body(request))[:1024]!r}")
+                self.logger.error(f"API调用错误: {e}")
+                return FastJSONResponse(
+                    status_code=500,
+                    content={"status": "error", "error_message": str(e)}
                 )
-        elif req_type == "message":
-            msg_type = request_data.get("message_type", "*")
-            handler = self.message_handlers.get(msg_type) or self.message_handlers.get("*")
-            if handler:
-                try:
-                    result = await handler(request_data)
-                    if isinstance(result, dict) and "anp_result" in result:
-                        return result
-                    return {"anp_result": result}
-                except Exception as e:
-                    self.logger.error(f"消息处理错误: {e}")
-                    return {"anp_result": {"status": "error", "message": str(e)}}
-            else:
-                return {"anp_result": {"status": "error", "message": f"未找到消息处理器: {msg_type}"}}
         else:
-            return {"anp_result": {"status": "error", "message": "未知的请求类型"}}
+            return FastJSONResponse(
+                status_code=404,
+                content={"status": "error", "message": f"未找到API: {api_path}"}
+            )
+
+    async def _handle_message_request(self, request_data: Dict[str, Any], request: Request):
+        msg_type = request_data.get("message_type", "*")
+        handler = self.message_handlers.get(msg_type) or self.message_handlers.get("*")
+        if handler:
+            try:
+                result = await handler(request_data)
+                if isinstance(result, dict) and "anp_result" in result:
+                    return result
+                return {"anp_result": result}
+            except Exception as e:
+                self.logger.error(f"消息处理错误: {e}")
+                return {"anp_result": {"status": "error", "message": str(e)}}
+        else:
+            return {"anp_result": {"status": "error", "message": f"未找到消息处理器: {msg_type}"}}
 
 
     def get_token_to_remote(self, remote_did, hosted_did=None):
@@ -327,39 +423,45 @@ class LocalAgent:
             config = get_global_config()
             use_local = config.mail.use_local_backend
             logger.debug(f"注册邮箱检查前初始化，使用本地文件邮件后端参数设置:{use_local}")
-            mail_manager = EnhancedMailManager(use_local_backend=use_local)
+            mail_manager = EnhancedMailManager.shared(use_local_backend=use_local)
             responses = mail_manager.get_unread_hosted_responses()
             if not responses:
                 return "没有找到匹配的托管 DID 激活邮件"
-            count = 0
+            from anp_open_sdk.anp_sdk_user_data import did_create_hosted_users_batch
+            pending = []
             for response in responses:
+                body = response.get('content', '')
+                message_id = response.get('message_id')
                 try:
-                    body = response.get('content', '')
-                    message_id = response.get('message_id')
-                    try:
-                        if isinstance(body, str):
-                            did_document = json.loads(body)
-                        else:
-                            did_document = body
-                    except Exception as e:
-                        logger.debug(f"无法解析 did_document: {e}")
-                        continue
-                    did_id = did_document.get('id', '')
-                    m = re.search(r'did:wba:([^:]+)%3A(\d+):', did_id)
-                    if not m:
-                        logger.debug(f"无法从id中提取host:port: {did_id}")
-                        continue
-                    host = m.group(1)
-                    port = m.group(2)
-                    success, hosted_dir_name = self._create_hosted_did_folder(host, port, did_document)
-                    if success:
-                        mail_manager.mark_message_as_read(message_id)
-                        logger.debug(f"已创建托管DID文件夹: {hosted_dir_name}")
-                        count += 1
+                    if isinstance(body, str):
+                        did_document = json.loads(body)
                     else:
-                        logger.error(f"创建托管DID文件夹失败: {host}:{port}")
+                        did_document = body
+                except Exception as e:
+                    logger.debug(f"无法解析 did_document: {e}")
+                    continue
+                did_id = did_document.get('id', '')
+                m = re.search(r'did:wba:([^:]+)%3A(\d+):', did_id)
+                if not m:
+                    logger.debug(f"无法从id中提取host:port: {did_id}")
+                    continue
+                pending.append((message_id, m.group(1), m.group(2), did_document))
+            # 托管目录并发写入，只有创建成功的邮件标记为已读
+            hosted_dir_names = await did_create_hosted_users_batch(
+                self.user_dir, self.id, [(host, port, did_document) for _, host, port, did_document in pending]
+            )
+            count = 0
+            for (message_id, host, port, _), hosted_dir_name in zip(pending, hosted_dir_names):
+                if not hosted_dir_name:
+                    logger.error(f"创建托管DID文件夹失败: {host}:{port}")
+                    continue
+                try:
+                    mail_manager.mark_message_as_read(message_id)
                 except Exception as e:
                     logger.error(f"处理邮件时出错: {e}")
+                    continue
+                logger.debug(f"已创建托管DID文件夹: {hosted_dir_name}")
+                count += 1
             if count > 0:
                 return f"成功处理{count}封托管DID邮件"
             else:
@@ -380,7 +482,7 @@ class LocalAgent:
             config = get_global_config()
             use_local = config.mail.use_local_backend
             logger.debug(f"注册邮箱检查前初始化，使用本地文件邮件后端参数设置:{use_local}")
-            mail_manager = EnhancedMailManager(use_local_backend=use_local)
+            mail_manager = EnhancedMailManager.shared(use_local_backend=use_local)
             register_email = os.environ.get('REGISTER_MAIL_USER')
             success = mail_manager.send_hosted_did_request(did_document, register_email)
             if success:
@@ -427,51 +529,9 @@ class LocalAgent:
         return None
 
     def _create_hosted_did_folder(self, host: str, port: str, did_document: dict) -> tuple[bool, str]:
-        import shutil
-        import yaml
-        from pathlib import Path
+        from anp_open_sdk.anp_sdk_user_data import did_create_hosted_user
         try:
-            did_id = did_document.get('id', '')
-            import re
-            pattern = r"did:wba:[^:]+:[^:]+:[^:]+:([a-zA-Z0-9]{16})"
-            match = re.search(pattern, did_id)
-            if match:
-                did_suffix = match.group(1)
-            else:
-                did_suffix = "无法匹配随机数"
-            original_user_dir = Path(self.user_dir)
-            parent_dir = original_user_dir.parent
-            hosted_dir_name = f"user_hosted_{host}_{port}_{did_suffix}"
-            hosted_dir = parent_dir / hosted_dir_name
-            hosted_dir.mkdir(parents=True, exist_ok=True)
-            key_files = ['key-1_private.pem', 'key-1_public.pem', 'private_key.pem', 'public_key.pem']
-            for key_file in key_files:
-                src_path = original_user_dir / key_file
-                dst_path = hosted_dir / key_file
-                if src_path.exists():
-                    shutil.copy2(src_path, dst_path)
-                    logger.debug(f"已复制密钥文件: {key_file}")
-                else:
-                    logger.warning(f"源密钥文件不存在: {src_path}")
-            did_doc_path = hosted_dir / 'did_document.json'
-            with open(did_doc_path, 'w', encoding='utf-8') as f:
-                json.dump(did_document, f, ensure_ascii=False, indent=2)
-            hosted_config = {
-                'did': did_document.get('id', ''),
-                'unique_id': did_suffix,
-                'hosted_config': {
-                    'parent_did': self.id,
-                    'host': host,
-                    'port': int(port),
-                    'created_at': datetime.now().isoformat(),
-                    'purpose': f"对外托管服务 - {host}:{port}"
-                }
-            }
-            config_path = hosted_dir / 'agent_cfg.yaml'
-            with open(config_path, 'w', encoding='utf-8') as f:
-                yaml.dump(hosted_config, f, default_flow_style=False, allow_unicode=True)
-            logger.debug(f"托管DID文件夹创建成功: {hosted_dir}")
-            return True, hosted_dir_name
+            return True, did_create_hosted_user(self.user_dir, self.id, host, port, did_document)
         except Exception as e:
             logger.error(f"创建托管DID文件夹失败: {e}")
             return False, ''
@@ -496,8 +556,8 @@ class LocalAgent:
         @self.app.post("/agent/api/{agent_id}/{path:path}")
         async def agent_api(agent_id: str, path: str, request: Request):
             if agent_id != self.id:
-                return JSONResponse(status_code=404, content={"status": "error", "message": "Agent ID not found"})
-            request_data = await request.json()
+                return FastJSONResponse(status_code=404, content={"status": "error", "message": "Agent ID not found"})
+            request_data = await get_json_payload(request, {})
             return await self.handle_request(agent_id, request_data, request)
 
         # 可扩展更多自服务API
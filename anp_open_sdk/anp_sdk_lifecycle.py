@@ -0,0 +1,196 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+服务生命周期：并发启动任务、优雅停机和运行时状态保存
+
+停机顺序：停止监听端口 -> 通知 SSE/WebSocket 客户端按提示间隔重连 -> uvicorn 等待进行中的请求
+（最长 drain_timeout 秒）-> 保存已使用的 nonce、刷新日志。
+重启时先恢复 nonce 再接受请求，防止停机前用过的 DIDWba 认证头在有效期内被重放。token 由联系人存储持久化。
+"""
+
+import os
+import time
+import json
+import asyncio
+import inspect
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import uvicorn
+
+import logging
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 2
+
+
+class DrainingServer(uvicorn.Server):
+    """停机时先停止监听并通知长连接客户端，再由 uvicorn 等待进行中的请求完成"""
+
+    def __init__(self, config: uvicorn.Config, on_drain: Optional[Callable[[], Awaitable[None]]] = None,
+                 on_stopped: Optional[Callable[[], None]] = None):
+        super().__init__(config)
+        self.on_drain = on_drain
+        self.on_stopped = on_stopped
+        self.draining = False
+
+    async def shutdown(self, sockets=None):
+        self.draining = True
+        # 先停止接受新连接，SSE 客户端收到关闭事件后的重连不会落到正在停机的进程上
+        for server in self.servers:
+            server.close()
+        if self.on_drain is not None:
+            try:
+                await self.on_drain()
+            except Exception as e:
+                logger.error(f"通知客户端停机时出错: {e}")
+        try:
+            await super().shutdown(sockets=sockets)
+            # 超过期限被取消的请求不一定会回写响应（例如经过 BaseHTTPMiddleware 时），
+            # 主动断开剩余连接，避免事件循环关闭后客户端一直等待
+            for connection in list(self.server_state.connections):
+                transport = getattr(connection, "transport", None)
+                if transport is not None and not transport.is_closing():
+                    transport.close()
+            await asyncio.sleep(0)
+        finally:
+            if self.on_stopped is not None:
+                try:
+                    self.on_stopped()
+                except Exception as e:
+                    logger.error(f"保存运行时状态时出错: {e}")
+
+
+class StartupTasks:
+    """并发执行的启动任务，全部结束后标记为就绪；同步函数在线程中执行"""
+
+    def __init__(self):
+        self._tasks: Dict[str, Callable[[], Any]] = {}
+        self.status: Dict[str, str] = {}
+        self.ready = False
+        self.elapsed: Optional[float] = None
+        self._runner: Optional[asyncio.Task] = None
+
+    def add(self, name: str, func: Callable[[], Any]):
+        self._tasks[name] = func
+        self.status[name] = "pending"
+
+    async def _run_one(self, name: str, func: Callable[[], Any]):
+        try:
+            if inspect.iscoroutinefunction(func):
+                await func()
+            else:
+                await asyncio.to_thread(func)
+            self.status[name] = "ok"
+        except Exception as e:
+            # 启动任务都是预热类工作，失败只影响首次请求的延迟，不阻止服务就绪
+            logger.error(f"启动任务 {name} 失败: {e}")
+            self.status[name] = f"error: {e}"
+
+    async def run(self):
+        self.ready = False
+        start = time.perf_counter()
+        for name in self._tasks:
+            self.status[name] = "running"
+        await asyncio.gather(*(self._run_one(name, func) for name, func in self._tasks.items()))
+        self.elapsed = time.perf_counter() - start
+        self.ready = True
+        logger.debug(f"启动任务完成，用时 {self.elapsed:.3f}s: {self.status}")
+
+    def start(self) -> asyncio.Task:
+        """在后台执行启动任务，服务可以先开始接受请求"""
+        self._runner = asyncio.create_task(self.run())
+        return self._runner
+
+
+def _nonce_expire_minutes() -> float:
+    from anp_open_sdk.config import get_global_config
+    try:
+        return get_global_config().anp_sdk.nonce_expire_minutes
+    except Exception:
+        return 5
+
+
+def _write_private_file(path: str, data: bytes):
+    """原子写入只有所有者可读写（0600）的文件"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.fchmod(fd, 0o600)
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+
+def save_runtime_state(path: str) -> Dict[str, int]:
+    """把未过期的服务端 nonce 写入 path（权限 0600），返回保存的条目数
+
+    token 已由 ContactManager 写入各用户目录下的联系人存储，这里不再保存。
+    """
+    from anp_open_sdk.auth.auth_server import VALID_SERVER_NONCES
+
+    now = datetime.now(timezone.utc)
+    window = timedelta(minutes=_nonce_expire_minutes())
+    nonces = {n: t.isoformat() for n, t in list(VALID_SERVER_NONCES.items()) if now - t <= window}
+    state = {"version": STATE_VERSION, "saved_at": now.isoformat(), "nonces": nonces}
+    _write_private_file(path, json.dumps(state, ensure_ascii=False).encode("utf-8"))
+    logger.debug(f"已保存运行时状态到 {path}: {len(nonces)} 个 nonce")
+    return {"nonces": len(nonces)}
+
+
+def restore_runtime_state(path: str) -> Dict[str, int]:
+    """从 path 恢复 nonce，跳过已过期的条目"""
+    from anp_open_sdk.auth.auth_server import VALID_SERVER_NONCES
+
+    restored = {"nonces": 0}
+    if not path or not os.path.isfile(path):
+        return restored
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取运行时状态 {path} 失败: {e}")
+        return restored
+    if not isinstance(state, dict) or state.get("version") != STATE_VERSION:
+        logger.warning(f"忽略不兼容的运行时状态文件: {path}")
+        return restored
+
+    now = datetime.now(timezone.utc)
+    window = timedelta(minutes=_nonce_expire_minutes())
+    for nonce, used_at in (state.get("nonces") or {}).items():
+        try:
+            used = datetime.fromisoformat(used_at)
+        except (TypeError, ValueError):
+            continue
+        if now - used <= window and nonce not in VALID_SERVER_NONCES:
+            VALID_SERVER_NONCES[nonce] = used
+            restored["nonces"] += 1
+    logger.debug(f"已从 {path} 恢复运行时状态: {restored}")
+    return restored
+
+
+def flush_log_handlers():
+    """刷新所有日志处理器的缓冲区"""
+    loggers = [logging.getLogger()] + [
+        item for item in logging.Logger.manager.loggerDict.values() if isinstance(item, logging.Logger)
+    ]
+    for item in loggers:
+        for handler in item.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
@@ -25,9 +25,18 @@ ANP用户工具
 """
 
 import os
+import re
 import json
+import atexit
+import shutil
+import asyncio
 import secrets
+import functools
+import threading
+import urllib.parse
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 import jwt
 import yaml
@@ -37,10 +46,11 @@ from datetime import datetime
 from Crypto.PublicKey import RSA
 import logging
 logger = logging.getLogger(__name__)
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
 
 from anp_open_sdk.config import UnifiedConfig,get_global_config
+from anp_open_sdk.utils.pagination import paginate
 from anp_open_sdk.base_user_data import BaseUserData, BaseUserDataManager
 
 def create_user(args):
@@ -59,16 +69,12 @@ def create_user(args):
     else:
         logger.error(f"用户 {name} 创建失败")
 
-def list_users():
+def _collect_users_info() -> List[Dict[str, Any]]:
     user_list, name_to_dir = get_user_cfg_list()
-    if not user_list:
-        logger.debug("未找到任何用户")
-        return
-    
     users_info = []
     config=get_global_config()
     user_dirs = config.anp_sdk.user_did_path
-    
+
     for name in user_list:
         user_dir = name_to_dir[name]
         dir_path = os.path.join(user_dirs, user_dir)
@@ -103,9 +109,28 @@ def list_users():
             'created_time': created_time,
             'created_date': datetime.fromtimestamp(created_time).strftime('%Y-%m-%d %H:%M:%S')
         })
-    users_info.sort(key=lambda x: x['created_time'], reverse=True)
-    logger.debug(f"找到 {len(users_info)} 个用户，按创建时间从新到旧排序：")
-    for i, user in enumerate(users_info, 1):
+    return users_info
+
+
+def list_users(cursor: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    按创建时间从新到旧列出用户。
+
+    Args:
+        cursor: 上一页返回的游标
+        limit: 每页条数，None 表示全部
+
+    Returns:
+        (本页用户信息, 下一页游标)
+    """
+    users_info = _collect_users_info()
+    if not users_info:
+        logger.debug("未找到任何用户")
+        return [], None
+    # 目录名唯一，作为同一创建时间下的次序
+    page, next_cursor = paginate(users_info, key=lambda x: (-x['created_time'], x['dir']), cursor=cursor, limit=limit)
+    logger.debug(f"找到 {len(users_info)} 个用户，按创建时间从新到旧排序，本页 {len(page)} 个：")
+    for i, user in enumerate(page, 1):
         logger.debug(f"[{i}] 用户名: {user['name']}")
         logger.debug(f"    DID: {user['did']}")
         logger.debug(f"    类型: {user['type']}")
@@ -113,57 +138,27 @@ def list_users():
         logger.debug(f"    创建时间: {user['created_date']}")
         logger.debug(f"    目录: {user['dir']}")
         logger.debug("---")
-
-def sort_users_by_server():
-    user_list, name_to_dir = get_user_cfg_list()
-    if not user_list:
+    return page, next_cursor
+
+def sort_users_by_server(cursor: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    按服务器、端口、用户类型排序列出用户，分页参数同 list_users。
+    """
+    users_info = _collect_users_info()
+    if not users_info:
         logger.debug("未找到任何用户")
-        return
-    
-    users_info = []
-    config=get_global_config()
-    user_dirs = config.anp_sdk.user_did_path
-    
-    for name in user_list:
-        user_dir = name_to_dir[name]
-        dir_path = os.path.join(user_dirs, user_dir)
-        did_path = os.path.join(dir_path, "did_document.json")
-        did_id = ""
-        if os.path.exists(did_path):
-            with open(did_path, 'r', encoding='utf-8') as f:
-                did_dict = json.load(f)
-                did_id = did_dict.get('id', '')
-        cfg_path = os.path.join(dir_path, "agent_cfg.yaml")
-        agent_type = ""
-        host = ""
-        port = ""
-        if os.path.exists(cfg_path):
-            with open(cfg_path, 'r', encoding='utf-8') as f:
-                cfg = yaml.safe_load(f)
-                agent_type = cfg.get('type', '')
-                if did_id and 'did:wba:' in did_id:
-                    parts = did_id.split(':')[2:]
-                    if len(parts) >= 2:
-                        host = parts[0]
-                        if ':' in parts[1]:
-                            port = parts[1].split(':')[0]
-        users_info.append({
-            'name': name,
-            'dir': user_dir,
-            'did': did_id,
-            'type': agent_type,
-            'host': host,
-            'port': port
-        })
-    users_info.sort(key=lambda x: (x['host'], x['port'], x['type']))
-    logger.debug(f"找到 {len(users_info)} 个用户，按服务器信息排序：")
-    for i, user in enumerate(users_info, 1):
+        return [], None
+    page, next_cursor = paginate(users_info, key=lambda x: (x['host'], x['port'], x['type'], x['dir']),
+                                 cursor=cursor, limit=limit)
+    logger.debug(f"找到 {len(users_info)} 个用户，按服务器信息排序，本页 {len(page)} 个：")
+    for i, user in enumerate(page, 1):
         logger.debug(f"[{i}] 服务器: {user['host']}:{user['port']}")
         logger.debug(f"    用户名: {user['name']}")
         logger.debug(f"    DID: {user['did']}")
         logger.debug(f"    类型: {user['type']}")
         logger.debug(f"    目录: {user['dir']}")
         logger.debug("---")
+    return page, next_cursor
 
 def main():
     parser = argparse.ArgumentParser(description='ANP用户工具')
@@ -171,13 +166,16 @@ def main():
                         help='创建新用户，需要提供：用户名 主机名 端口号 主机路径 用户类型')
     parser.add_argument('-l', action='store_true', help='显示所有用户信息，按从新到旧创建顺序排序')
     parser.add_argument('-s', action='store_true', help='显示所有用户信息，按用户服务器 端口 用户类型排序')
+    parser.add_argument('--limit', type=int, default=None, help='-l/-s 每页显示的用户数')
+    parser.add_argument('--cursor', default=None, help='-l/-s 上一页输出的游标')
     args = parser.parse_args()
     if args.n:
         create_user(args)
-    elif args.l:
-        list_users()
-    elif args.s:
-        sort_users_by_server()
+    elif args.l or args.s:
+        list_func = list_users if args.l else sort_users_by_server
+        _, next_cursor = list_func(cursor=args.cursor, limit=args.limit)
+        if next_cursor:
+            logger.debug(f"下一页: --cursor {next_cursor}")
     else:
         parser.print_help()
 
@@ -325,42 +323,47 @@ class LocalUserDataManager(BaseUserDataManager):
 
         for entry in os.scandir(self._user_dir):
             if entry.is_dir() and (entry.name.startswith('user_') or entry.name.startswith('user_hosted_')):
-                user_folder_path = entry.path
-                folder_name = entry.name
-                try:
-                    cfg_path = os.path.join(user_folder_path, 'agent_cfg.yaml')
-                    agent_cfg = {}
-                    if os.path.exists(cfg_path):
-                        with open(cfg_path, 'r', encoding='utf-8') as f:
-                            agent_cfg = yaml.safe_load(f)
-                    did_doc_path = os.path.join(user_folder_path, 'did_document.json')
-                    did_doc = {}
-                    if os.path.exists(did_doc_path):
-                        with open(did_doc_path, 'r', encoding='utf-8') as f:
-                            did_doc = json.load(f)
-                    config = get_global_config()
-
-                    key_id = did_doc.get('key_id') or did_doc.get('publicKey', [{}])[0].get('id') if did_doc.get('publicKey') else config.anp_sdk.user_did_key_id
-                    did_private_key_file_path = os.path.join(user_folder_path, f"{key_id}_private.pem")
-                    did_public_key_file_path = os.path.join(user_folder_path, f"{key_id}_public.pem")
-                    jwt_private_key_file_path = os.path.join(user_folder_path, 'private_key.pem')
-                    jwt_public_key_file_path = os.path.join(user_folder_path, 'public_key.pem')
-                    password_paths = {
-                        "did_private_key_file_path": did_private_key_file_path,
-                        "did_public_key_file_path": did_public_key_file_path,
-                        "jwt_private_key_file_path": jwt_private_key_file_path,
-                        "jwt_public_key_file_path": jwt_public_key_file_path
-                    }
-                    if did_doc and agent_cfg:
-                         user_data = LocalUserData(folder_name, agent_cfg, did_doc, did_doc_path, password_paths, user_folder_path)
-                         self.users[user_data.did] = user_data
-                except Exception as e:
-                    logger.error(f"加载用户数据失败 ({folder_name}): {e}")
+                self.load_user(entry.path)
             else:
                 logger.warning(f"不合格的文件或文件夹: {entry.name},{self._user_dir}")
 
         logger.debug(f"加载用户数据共 {len(self.users)} 个用户")
 
+    def load_user(self, user_folder_path: str) -> Optional[LocalUserData]:
+        """加载（或重新加载）单个用户目录，返回加载到的用户数据"""
+        folder_name = os.path.basename(os.path.normpath(user_folder_path))
+        try:
+            cfg_path = os.path.join(user_folder_path, 'agent_cfg.yaml')
+            agent_cfg = {}
+            if os.path.exists(cfg_path):
+                with open(cfg_path, 'r', encoding='utf-8') as f:
+                    agent_cfg = yaml.safe_load(f)
+            did_doc_path = os.path.join(user_folder_path, 'did_document.json')
+            did_doc = {}
+            if os.path.exists(did_doc_path):
+                with open(did_doc_path, 'r', encoding='utf-8') as f:
+                    did_doc = json.load(f)
+            config = get_global_config()
+
+            key_id = did_doc.get('key_id') or did_doc.get('publicKey', [{}])[0].get('id') if did_doc.get('publicKey') else config.anp_sdk.user_did_key_id
+            did_private_key_file_path = os.path.join(user_folder_path, f"{key_id}_private.pem")
+            did_public_key_file_path = os.path.join(user_folder_path, f"{key_id}_public.pem")
+            jwt_private_key_file_path = os.path.join(user_folder_path, 'private_key.pem')
+            jwt_public_key_file_path = os.path.join(user_folder_path, 'public_key.pem')
+            password_paths = {
+                "did_private_key_file_path": did_private_key_file_path,
+                "did_public_key_file_path": did_public_key_file_path,
+                "jwt_private_key_file_path": jwt_private_key_file_path,
+                "jwt_public_key_file_path": jwt_public_key_file_path
+            }
+            if did_doc and agent_cfg:
+                user_data = LocalUserData(folder_name, agent_cfg, did_doc, did_doc_path, password_paths, user_folder_path)
+                self.users[user_data.did] = user_data
+                return user_data
+        except Exception as e:
+            logger.error(f"加载用户数据失败 ({folder_name}): {e}")
+        return None
+
     def get_user_data(self, did: str) -> Optional[BaseUserData]:
         return self.users.get(did)
 
@@ -411,64 +414,138 @@ def get_user_dir_did_doc_by_did(did):
     logger.error(f"未找到DID为 {did} 的用户文档")
     return False, None, None
 
-def did_create_user(user_iput: dict, *, did_hex: bool = True, did_check_unique: bool = True):
-    from agent_connect.authentication.did_wba import create_did_wba_document
-    import json
-    import os
-    from datetime import datetime
-    import re
-    import urllib.parse
+class _UserNameIndex:
+    """用户名索引
 
+    首次使用时扫描一次用户目录下的 agent_cfg.yaml，之后只在目录发生变化时
+    增量读取新增的子目录，避免每次创建用户都解析全部配置文件。
+    """
 
+    def __init__(self, root: str):
+        self.root = root
+        self._names = set()
+        self._seen_dirs = set()
+        self._dir_mtime_ns = None
+        self._lock = threading.Lock()
 
+    def _refresh(self):
+        try:
+            mtime_ns = os.stat(self.root).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime_ns == self._dir_mtime_ns:
+            return
+        for d in os.listdir(self.root):
+            if d.startswith('.') or d in self._seen_dirs:
+                continue
+            cfg_path = os.path.join(self.root, d, 'agent_cfg.yaml')
+            if not os.path.isfile(cfg_path):
+                continue
+            self._seen_dirs.add(d)
+            try:
+                with open(cfg_path, 'r', encoding='utf-8') as f:
+                    cfg = yaml.safe_load(f)
+                if cfg and 'name' in cfg:
+                    self._names.add(cfg['name'])
+            except Exception as e:
+                logger.debug(f"读取配置文件 {cfg_path} 出错: {e}")
+        self._dir_mtime_ns = mtime_ns
+
+    def reserve(self, base_name: str) -> str:
+        """预留一个唯一的用户名，重名时追加日期和序号后缀"""
+        with self._lock:
+            self._refresh()
+            new_name = base_name
+            if base_name in self._names:
+                date_suffix = datetime.now().strftime('%Y%m%d')
+                new_name = f"{base_name}_{date_suffix}"
+                if new_name in self._names:
+                    pattern = re.compile(f"{re.escape(new_name)}_?(\\d+)?$")
+                    matches = [pattern.match(name) for name in self._names]
+                    numbers = [int(m.group(1)) if m.group(1) else 0 for m in matches if m]
+                    next_number = max(numbers + [0]) + 1
+                    new_name = f"{new_name}_{next_number}"
+                logger.debug(f"用户名 {base_name} 已存在，使用新名称：{new_name}")
+            self._names.add(new_name)
+            return new_name
+
+    def release(self, name: str):
+        with self._lock:
+            self._names.discard(name)
+
+    def commit(self, user_dir_name: str):
+        with self._lock:
+            self._seen_dirs.add(user_dir_name)
+
+
+_name_indexes: Dict[str, _UserNameIndex] = {}
+_name_indexes_lock = threading.Lock()
+
+_keygen_executor: Optional[ProcessPoolExecutor] = None
+_io_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_user_name_index(root: str) -> _UserNameIndex:
+    with _name_indexes_lock:
+        index = _name_indexes.get(root)
+        if index is None:
+            index = _UserNameIndex(root)
+            _name_indexes[root] = index
+        return index
+
+
+def _get_keygen_executor() -> ProcessPoolExecutor:
+    """密钥生成进程池，secp256k1 与 RSA-2048 生成属于 CPU 密集操作"""
+    global _keygen_executor
+    with _executor_lock:
+        if _keygen_executor is None:
+            _keygen_executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+        return _keygen_executor
+
+
+def _get_io_executor() -> ThreadPoolExecutor:
+    """用户文件写入线程池"""
+    global _io_executor
+    with _executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="anp_user_io")
+        return _io_executor
+
+
+def shutdown_user_executors(wait: bool = True):
+    """关闭密钥生成进程池和文件写入线程池，之后再创建用户时会重新建立；进程退出时自动调用"""
+    global _keygen_executor, _io_executor
+    with _executor_lock:
+        executors = (_keygen_executor, _io_executor)
+        _keygen_executor = _io_executor = None
+    for executor in executors:
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+atexit.register(shutdown_user_executors)
+
+
+def _plan_user(user_iput: dict, *, did_hex: bool = True, did_check_unique: bool = True) -> Optional[dict]:
+    """校验参数、分配唯一用户名并计算DID，不涉及密钥生成和文件写入"""
     required_fields = ['name', 'host', 'port', 'dir', 'type']
     if not all(field in user_iput for field in required_fields):
         logger.error("缺少必需的参数字段")
         return None
-    config=get_global_config()
+    config = get_global_config()
 
-    userdid_filepath = config.anp_sdk.user_did_path
-    userdid_filepath = UnifiedConfig.resolve_path(userdid_filepath)
-
-    def get_existing_usernames(userdid_filepath):
-        if not os.path.exists(userdid_filepath):
-            return []
-        usernames = []
-        for d in os.listdir(userdid_filepath):
-            if os.path.isdir(os.path.join(userdid_filepath, d)):
-                cfg_path = os.path.join(userdid_filepath, d, 'agent_cfg.yaml')
-                if os.path.exists(cfg_path):
-                    with open(cfg_path, 'r') as f:
-                        try:
-                            cfg = yaml.safe_load(f)
-                            if cfg and 'name' in cfg:
-                                usernames.append(cfg['name'])
-                        except:
-                            pass
-        return usernames
-
-    base_name = user_iput['name']
-    existing_names = get_existing_usernames(userdid_filepath)
-
-    if base_name in existing_names:
-        date_suffix = datetime.now().strftime('%Y%m%d')
-        new_name = f"{base_name}_{date_suffix}"
-        if new_name in existing_names:
-            pattern = f"{re.escape(new_name)}_?(\\d+)?"
-            matches = [re.match(pattern, name) for name in existing_names]
-            numbers = [int(m.group(1)) if m and m.group(1) else 0 for m in matches if m]
-            next_number = max(numbers + [0]) + 1
-            new_name = f"{new_name}_{next_number}"
-        user_iput['name'] = new_name
-        logger.debug(f"用户名 {base_name} 已存在，使用新名称：{new_name}")
+    userdid_root = str(UnifiedConfig.resolve_path(config.anp_sdk.user_did_path))
+    os.makedirs(userdid_root, exist_ok=True)
 
     userdid_hostname = user_iput['host']
     userdid_port = int(user_iput['port'])
     unique_id = secrets.token_hex(8) if did_hex else None
 
-
     if userdid_port not in (80, 443):
         userdid_host_port = f"{userdid_hostname}%3A{userdid_port}"
+    else:
+        userdid_host_port = userdid_hostname
     did_parts = ['did', 'wba', userdid_host_port]
     if user_iput['dir']:
         did_parts.append(urllib.parse.quote(user_iput['dir'], safe=''))
@@ -479,76 +556,248 @@ def did_create_user(user_iput: dict, *, did_hex: bool = True, did_check_unique:
     did_id = ':'.join(did_parts)
 
     if not did_hex and did_check_unique:
-        for d in os.listdir(userdid_filepath):
-            did_path = os.path.join(userdid_filepath, d, 'did_document.json')
+        for d in os.listdir(userdid_root):
+            did_path = os.path.join(userdid_root, d, 'did_document.json')
             if os.path.exists(did_path):
                 with open(did_path, 'r', encoding='utf-8') as f:
                     did_dict = json.load(f)
-                    if did_dict.get('id') == did_id:
-                        logger.error(f"DID已存在: {did_id}")
-        return None
+                if did_dict.get('id') == did_id:
+                    logger.error(f"DID已存在: {did_id}")
+                    return None
 
-    user_dir_name = f"user_{unique_id}" if did_hex else f"user_{user_iput['name']}"
-    userdid_filepath = os.path.join(userdid_filepath, user_dir_name)
+    index = _get_user_name_index(userdid_root)
+    name = index.reserve(user_iput['name'])
+    user_iput['name'] = name
 
     path_segments = [user_iput['dir'], user_iput['type']]
     if did_hex:
         path_segments.append(unique_id)
-    agent_description_url = f"http://{userdid_hostname}:{userdid_port}/{user_iput['dir']}/{user_iput['type']}/{unique_id if did_hex else ''}/ad.json"
+
+    return {
+        "root": userdid_root,
+        "user_dir_name": f"user_{unique_id}" if did_hex else f"user_{name}",
+        "name": name,
+        "type": user_iput['type'],
+        "unique_id": unique_id,
+        "did_id": did_id,
+        "hostname": userdid_hostname,
+        "port": userdid_port,
+        "path_segments": path_segments,
+        "agent_description_url": f"http://{userdid_hostname}:{userdid_port}/{user_iput['dir']}/{user_iput['type']}/{unique_id if did_hex else ''}/ad.json",
+    }
+
+
+def _generate_user_keys(hostname: str, port: int, path_segments: List[str], agent_description_url: str):
+    """生成DID文档、secp256k1密钥和RSA-2048 JWT密钥
+
+    纯CPU计算且不依赖全局配置，可以直接提交到进程池执行。
+    """
+    from agent_connect.authentication.did_wba import create_did_wba_document
 
     did_document, keys = create_did_wba_document(
-        hostname=userdid_hostname,
-        port=userdid_port,
+        hostname=hostname,
+        port=port,
         path_segments=path_segments,
         agent_description_url=agent_description_url
-        )
-    did_document['id'] = did_id
+    )
+    private_key = RSA.generate(2048).export_key()
+    public_key = RSA.import_key(private_key).publickey().export_key()
+    testcontent = {"user_id": 123}
+    token = create_jwt(testcontent, private_key)
+    token = verify_jwt(token, public_key)
+    if not token or testcontent["user_id"] != token["user_id"]:
+        private_key, public_key = None, None
+    return did_document, keys, private_key, public_key
+
+
+def _write_file_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.tmp-{secrets.token_hex(4)}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_user_dir(root: str, dir_name: str, files: Dict[str, bytes]) -> str:
+    """写入用户目录：新目录先写到临时目录再整体改名，已有目录逐个文件原子替换"""
+    user_path = os.path.join(root, dir_name)
+    if os.path.exists(user_path):
+        for file_name, data in files.items():
+            _write_file_atomic(os.path.join(user_path, file_name), data)
+        return user_path
+    tmp_dir = os.path.join(root, f".{dir_name}.tmp-{secrets.token_hex(4)}")
+    os.makedirs(tmp_dir)
+    try:
+        for file_name, data in files.items():
+            with open(os.path.join(tmp_dir, file_name), "wb") as f:
+                f.write(data)
+        os.rename(tmp_dir, user_path)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return user_path
+
+
+def _commit_user(plan: dict, material) -> dict:
+    """将用户文件写入临时目录后整体改名，避免产生只写了一半的用户目录"""
+    did_document, keys, private_key, public_key = material
+    did_document['id'] = plan['did_id']
     if keys:
         did_document['key_id'] = list(keys.keys())[0]
 
-    os.makedirs(userdid_filepath, exist_ok=True)
-    with open(f"{userdid_filepath}/did_document.json", "w") as f:
-        json.dump(did_document, f, indent=4)
-
-    for key_id, (private_key_pem, public_key_pem) in keys.items():
-        with open(f"{userdid_filepath}/{key_id}_private.pem", "wb") as f:
-            f.write(private_key_pem)
-        with open(f"{userdid_filepath}/{key_id}_public.pem", "wb") as f:
-            f.write(public_key_pem)
-
     time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     agent_cfg = {
-        "name": user_iput['name'],
-        "unique_id": unique_id,
+        "name": plan['name'],
+        "unique_id": plan['unique_id'],
         "did": did_document["id"],
-        "type": user_iput['type'],
+        "type": plan['type'],
         "owner": {"name": "anpsdk 创造用户", "@id": "https://localhost"},
         "description": "anpsdk的测试用户",
         "version": "0.1.0",
         "created_at": time
     }
-    with open(f"{userdid_filepath}/agent_cfg.yaml", "w", encoding='utf-8') as f:
-        yaml.dump(agent_cfg, f, default_flow_style=False, allow_unicode=True, sort_keys=False)
+    files = {"did_document.json": json.dumps(did_document, indent=4).encode('utf-8')}
+    for key_id, (private_key_pem, public_key_pem) in keys.items():
+        files[f"{key_id}_private.pem"] = private_key_pem
+        files[f"{key_id}_public.pem"] = public_key_pem
+    files["agent_cfg.yaml"] = yaml.dump(agent_cfg, default_flow_style=False, allow_unicode=True, sort_keys=False).encode('utf-8')
+    if private_key and public_key:
+        files["private_key.pem"] = private_key
+        files["public_key.pem"] = public_key
 
-    private_key = RSA.generate(2048).export_key()
-    public_key = RSA.import_key(private_key).publickey().export_key()
-    testcontent = {"user_id": 123}
-    token = create_jwt(testcontent, private_key)
-    token = verify_jwt(token, public_key)
-    if testcontent["user_id"] == token["user_id"]:
-        with open(f"{userdid_filepath}/private_key.pem", "wb") as f:
-            f.write(private_key)
-        with open(f"{userdid_filepath}/public_key.pem", "wb") as f:
-            f.write(public_key)
+    userdid_filepath = _write_user_dir(plan['root'], plan['user_dir_name'], files)
+    _get_user_name_index(plan['root']).commit(plan['user_dir_name'])
 
     logger.debug(f"DID创建成功: {did_document['id']}")
-    logger.debug(f"DID文档已保存到: {userdid_filepath}")
-    logger.debug(f"密钥已保存到: {userdid_filepath}")
     logger.debug(f"用户文件已保存到: {userdid_filepath}")
-    logger.debug(f"jwt密钥已保存到: {userdid_filepath}")
+    return did_document
 
 
-    return did_document
+def did_create_user(user_iput: dict, *, did_hex: bool = True, did_check_unique: bool = True):
+    plan = _plan_user(user_iput, did_hex=did_hex, did_check_unique=did_check_unique)
+    if plan is None:
+        return None
+    try:
+        material = _generate_user_keys(plan['hostname'], plan['port'], plan['path_segments'], plan['agent_description_url'])
+        return _commit_user(plan, material)
+    except Exception as e:
+        _get_user_name_index(plan['root']).release(plan['name'])
+        logger.error(f"用户 {plan['name']} 创建失败: {e}")
+        return None
+
+
+async def did_create_user_async(user_iput: dict, *, did_hex: bool = True, did_check_unique: bool = True):
+    """did_create_user 的异步版本
+
+    密钥生成在进程池中执行，文件写入在线程池中执行，不阻塞事件循环。
+    """
+    loop = asyncio.get_running_loop()
+    io_executor = _get_io_executor()
+    plan = await loop.run_in_executor(
+        io_executor,
+        functools.partial(_plan_user, user_iput, did_hex=did_hex, did_check_unique=did_check_unique)
+    )
+    if plan is None:
+        return None
+    keygen_args = (plan['hostname'], plan['port'], plan['path_segments'], plan['agent_description_url'])
+    try:
+        try:
+            material = await loop.run_in_executor(_get_keygen_executor(), _generate_user_keys, *keygen_args)
+        except BrokenProcessPool:
+            logger.warning("密钥生成进程池不可用，改为在线程池中生成密钥")
+            material = await loop.run_in_executor(io_executor, _generate_user_keys, *keygen_args)
+        return await loop.run_in_executor(io_executor, _commit_user, plan, material)
+    except Exception as e:
+        _get_user_name_index(plan['root']).release(plan['name'])
+        logger.error(f"用户 {plan['name']} 创建失败: {e}")
+        return None
+
+
+async def did_create_users_batch(user_inputs: List[dict], *, did_hex: bool = True,
+                                 did_check_unique: bool = True, max_concurrency: int = 32) -> List[Optional[dict]]:
+    """并发批量创建用户
+
+    Args:
+        user_inputs: 与 did_create_user 相同格式的参数列表
+        max_concurrency: 同时处理的用户数上限
+
+    Returns:
+        与输入顺序一致的 DID 文档列表，创建失败的位置为 None
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _create(user_iput):
+        async with semaphore:
+            return await did_create_user_async(user_iput, did_hex=did_hex, did_check_unique=did_check_unique)
+
+    results = await asyncio.gather(*(_create(dict(user_iput)) for user_iput in user_inputs))
+    created = sum(1 for r in results if r)
+    logger.debug(f"批量创建用户完成: {created}/{len(user_inputs)}")
+    return list(results)
+
+
+HOSTED_KEY_FILES = ('key-1_private.pem', 'key-1_public.pem', 'private_key.pem', 'public_key.pem')
+
+
+def did_create_hosted_user(parent_user_dir: str, parent_did: str, host: str, port, did_document: dict) -> str:
+    """在父用户目录旁创建托管 DID 用户目录并返回目录名
+
+    复制父用户的密钥，写入托管方返回的 DID 文档和托管配置，目录整体原子写入。
+    """
+    match = re.search(r"did:wba:[^:]+:[^:]+:[^:]+:([a-zA-Z0-9]{16})", did_document.get('id', ''))
+    did_suffix = match.group(1) if match else "无法匹配随机数"
+    hosted_dir_name = f"user_hosted_{host}_{port}_{did_suffix}"
+    files = {}
+    for key_file in HOSTED_KEY_FILES:
+        src_path = os.path.join(parent_user_dir, key_file)
+        if os.path.exists(src_path):
+            with open(src_path, 'rb') as f:
+                files[key_file] = f.read()
+        else:
+            logger.warning(f"源密钥文件不存在: {src_path}")
+    files['did_document.json'] = json.dumps(did_document, ensure_ascii=False, indent=2).encode('utf-8')
+    hosted_config = {
+        'did': did_document.get('id', ''),
+        'unique_id': did_suffix,
+        'hosted_config': {
+            'parent_did': parent_did,
+            'host': host,
+            'port': int(port),
+            'created_at': datetime.now().isoformat(),
+            'purpose': f"对外托管服务 - {host}:{port}"
+        }
+    }
+    files['agent_cfg.yaml'] = yaml.dump(hosted_config, default_flow_style=False, allow_unicode=True).encode('utf-8')
+    hosted_path = _write_user_dir(os.path.dirname(os.path.normpath(parent_user_dir)), hosted_dir_name, files)
+    logger.debug(f"托管DID文件夹创建成功: {hosted_path}")
+    return hosted_dir_name
+
+
+async def did_create_hosted_users_batch(parent_user_dir: str, parent_did: str, hosted: List[Tuple[str, Any, dict]],
+                                        *, max_concurrency: int = 32) -> List[Optional[str]]:
+    """并发创建多个托管 DID 用户目录
+
+    Args:
+        hosted: (host, port, did_document) 列表
+        max_concurrency: 同时写入的目录数上限
+
+    Returns:
+        与输入顺序一致的目录名列表，创建失败的位置为 None
+    """
+    loop = asyncio.get_running_loop()
+    io_executor = _get_io_executor()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _create(host, port, did_document):
+        async with semaphore:
+            try:
+                return await loop.run_in_executor(
+                    io_executor, did_create_hosted_user, parent_user_dir, parent_did, host, port, did_document
+                )
+            except Exception as e:
+                logger.error(f"创建托管DID文件夹失败 {host}:{port}: {e}")
+                return None
+
+    return list(await asyncio.gather(*(_create(*item) for item in hosted)))
 
 def create_jwt(content: dict, private_key: str) -> str:
     try:
@@ -594,12 +843,17 @@ def get_agent_cfg_by_user_dir(user_dir: str) -> dict:
     return cfg
 
 
+def interface_file_path(user_full_path: str, inteface_file_name: str) -> Path:
+    """接口配置文件的实际保存路径"""
+    template_ad_path = Path(user_full_path) / inteface_file_name
+    return Path(UnifiedConfig.resolve_path(template_ad_path.as_posix()))
+
+
 async def save_interface_files(user_full_path: str, interface_data: dict, inteface_file_name: str, interface_file_type: str):
 
     """保存接口配置文件"""
     # 保存智能体描述文件
-    template_ad_path = Path(user_full_path) / inteface_file_name
-    template_ad_path = Path(UnifiedConfig.resolve_path(template_ad_path.as_posix()))
+    template_ad_path = interface_file_path(user_full_path, inteface_file_name)
     template_ad_path.parent.mkdir(parents=True, exist_ok=True)
 
     with open(template_ad_path, 'w', encoding='utf-8') as f:
@@ -608,3 +862,4 @@ async def save_interface_files(user_full_path: str, interface_data: dict, intefa
         elif interface_file_type.upper() == "YAML" :
             yaml.dump(interface_data, f, allow_unicode=True)
     logger.debug(f"接口文件{inteface_file_name}已保存在: {template_ad_path}")
+    return template_ad_path
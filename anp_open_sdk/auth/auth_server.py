@@ -41,6 +41,8 @@ from datetime import datetime
 from typing import Dict
 
 from .token_nonce_auth import get_jwt_public_key
+from .crypto_executor import run_crypto
+from ..utils.request_payload import load_payload
 
 VALID_SERVER_NONCES: Dict[str, datetime] = {}
 
@@ -52,7 +54,7 @@ from ..anp_sdk_agent import LocalAgent
 EXEMPT_PATHS = [
     "/docs", "/anp-nlp/", "/ws/", "/publisher/agents", "/agent/group/*",
     "/redoc", "/openapi.json", "/wba/hostuser/*", "/wba/user/*", "/", "/favicon.ico",
-    "/agents/example/ad.json"
+    "/agents/example/ad.json", "/ready"
 ]
 
 def generate_nonce(length: int = 16) -> str:
@@ -192,7 +194,8 @@ class AgentAuthServer:
                 jwt_algorithm = self.config.anp_sdk.jwt_algorithm
 
                 # Decode and verify the token using the public key
-                payload = jwt.decode(
+                payload = await run_crypto(
+                    jwt.decode,
                     token_body,
                     public_key,
                     algorithms=[jwt_algorithm]
@@ -239,7 +242,8 @@ async def generate_auth_response(did, is_two_way_auth, resp_did):
     from anp_open_sdk.auth.token_nonce_auth import create_access_token
     config = get_global_config()
     expiration_time = config.anp_sdk.token_expire_time
-    access_token = create_access_token(
+    access_token = await run_crypto(
+        create_access_token,
         resp_did_agent.jwt_private_key_path,
         data={"req_did": did, "resp_did": resp_did, "comments": "open for req_did"},
         expires_delta=expiration_time
@@ -265,7 +269,7 @@ async def generate_auth_response(did, is_two_way_auth, resp_did):
 
                 # 获取认证头（用于返回给req_did进行验证,此时 req是现在的did）
                 target_url = "http://virtual.WBAback:9999"  # 使用当前请求的域名
-                resp_did_auth_header = resp_auth_client.get_auth_header_two_way(target_url, did)
+                resp_did_auth_header = await resp_auth_client.get_auth_header_two_way_async(target_url, did)
 
                 # 打印认证头
             # logger.debug(f"Generated resp_did_auth_header: {resp_did_auth_header}")
@@ -300,7 +304,7 @@ def is_valid_server_nonce(nonce: str) -> bool:
     """
     from datetime import datetime, timezone, timedelta
     try:
-        nonce_expire_minutes = self.config.anp_sdk.nonce_expire_minutes
+        nonce_expire_minutes = get_global_config().anp_sdk.nonce_expire_minutes
     except Exception:
         nonce_expire_minutes = 5
 
@@ -350,8 +354,15 @@ async def auth_middleware(request: Request, call_next: Callable, auth_method: st
 
         headers = dict(request.headers)
         request.state.headers = headers
+        # 认证通过后读取并解析请求体一次，路由和处理器从 request.state 复用
+        await load_payload(request)
 
         if response_auth is not None:
+            # 验签通过后按 DID 限流，认证前的限流只按（地址, 声称的 DID）计
+            limiter = getattr(request.app.state, "rate_limiter", None)
+            rejected = limiter.admit_verified(request) if limiter is not None else None
+            if rejected is not None:
+                return rejected
             response = await call_next(request)
             response.headers['authorization'] = json.dumps(response_auth) if response_auth else ""
             return response
@@ -0,0 +1,67 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Crypto execution service.
+
+ECDSA signing/verification, RS256 JWT encoding/decoding and JCS canonicalization
+are CPU bound. Running them inline on the uvicorn event loop lets a handshake
+burst stall SSE delivery and unrelated requests. They run in a BoundedExecutor
+thread pool (the cryptography library releases the GIL) behind an admission
+limit, so a flood of handshakes waits its turn instead of starving the loop.
+"""
+
+import threading
+from typing import Any, Callable, Optional
+
+from anp_open_sdk.utils.bounded_executor import BoundedExecutor
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+_crypto_executor: Optional[BoundedExecutor] = None
+_crypto_executor_lock = threading.Lock()
+
+
+def get_crypto_executor() -> BoundedExecutor:
+    """获取全局密码学线程池，线程数和排队上限取自 anp_sdk.crypto_max_workers / crypto_max_pending"""
+    global _crypto_executor
+    if _crypto_executor is None:
+        with _crypto_executor_lock:
+            if _crypto_executor is None:
+                max_workers = max_pending = None
+                try:
+                    from anp_open_sdk.config import get_global_config
+                    sdk_config = get_global_config().anp_sdk
+                    max_workers = getattr(sdk_config, 'crypto_max_workers', None)
+                    max_pending = getattr(sdk_config, 'crypto_max_pending', None)
+                except Exception:
+                    pass
+                _crypto_executor = BoundedExecutor(max_workers, max_pending, thread_name_prefix="anp-crypto")
+    return _crypto_executor
+
+
+def set_crypto_executor(executor: Optional[BoundedExecutor]):
+    """替换全局密码学线程池，传入 None 时下次使用按配置重新创建"""
+    global _crypto_executor
+    with _crypto_executor_lock:
+        previous, _crypto_executor = _crypto_executor, executor
+    if previous is not None and previous is not executor:
+        previous.shutdown(wait=False)
+
+
+async def run_crypto(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在全局密码学线程池中执行 func"""
+    return await get_crypto_executor().run(func, *args, **kwargs)
@@ -6,6 +6,8 @@ from anp_open_sdk.config import get_global_config
 from .did_auth_base import BaseDIDResolver, BaseDIDSigner, BaseAuthHeaderBuilder, BaseDIDAuthenticator, BaseAuth
 from .did_auth_wba_custom_did_resolver import resolve_local_did_document
 from .token_nonce_auth import verify_timestamp
+from .crypto_executor import run_crypto
+from ..utils.serialization import dumps_str, loads, is_msgpack_content_type, packb, unpackb
 from .schemas import DIDDocument, DIDKeyPair, DIDCredentials, AuthenticationContext
 import json
 import base64
@@ -17,7 +19,7 @@ logger = logging.getLogger(__name__)
 from agent_connect.authentication.did_wba import extract_auth_header_parts
 
 from ..agent_connect_hotpatch.authentication.did_wba import extract_auth_header_parts_two_way, \
-    verify_auth_header_signature_two_way
+    verify_auth_header_signature_two_way, parse_did_wba_auth_header
 from ..anp_sdk_user_data import LocalUserDataManager
 
 
@@ -133,6 +135,41 @@ class WBAAuthHeaderBuilder(BaseAuthHeaderBuilder):
                 logger.error(f"解析认证头失败: {e}")
             return {}
 
+def _encode_msgpack_body(headers: Dict[str, str], json_data: Any) -> Optional[bytes]:
+    """
+    请求头声明了 MessagePack 时编码请求体。
+
+    载荷无法编码为 MessagePack 时去掉该声明返回 None，由调用方按 JSON 发送。
+    """
+    key = next((k for k in headers if k.lower() == "content-type"), None)
+    if key is None or not is_msgpack_content_type(headers[key]):
+        return None
+    try:
+        return packb(json_data)
+    except (TypeError, ValueError, OverflowError, RuntimeError) as e:
+        logger.debug(f"请求体无法编码为 MessagePack，改用 JSON: {e}")
+        del headers[key]
+        return None
+
+
+async def _read_response_data(response) -> Any:
+    """按响应的 Content-Type 解码 MessagePack 或 JSON，都失败时返回文本"""
+    if is_msgpack_content_type(response.headers.get("Content-Type")):
+        raw = await response.read()
+        try:
+            return unpackb(raw)
+        except (ValueError, RuntimeError):
+            return {"text": raw.decode("utf-8", errors="replace")}
+    try:
+        return await response.json(loads=loads)
+    except Exception:
+        response_text = await response.text()
+        try:
+            return loads(response_text)
+        except Exception:
+            return {"text": response_text}
+
+
 class WBADIDAuthenticator(BaseDIDAuthenticator):
     """WBA DID认证器实现"""
 
@@ -147,8 +184,8 @@ class WBADIDAuthenticator(BaseDIDAuthenticator):
 
         """执行WBA认证请求"""
         try:
-            # 构建认证头
-            auth_headers = self.header_builder.build_auth_header(context, credentials)
+            # 构建认证头（签名在密码学线程池中执行）
+            auth_headers = await run_crypto(self.header_builder.build_auth_header, context, credentials)
             request_url = context.request_url
             method = getattr(context, 'method', 'GET')
             json_data = getattr(context, 'json_data', None)
@@ -160,31 +197,21 @@ class WBADIDAuthenticator(BaseDIDAuthenticator):
             else:
                 merged_headers = auth_headers
             # 发送带认证头的请求
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(json_serialize=dumps_str) as session:
                 if method.upper() == "GET":
                     async with session.get(request_url, headers=merged_headers) as response:
                         status = response.status
-                        try:
-                            response_data = await response.json()
-                        except Exception:
-                            response_text = await response.text()
-                            try:
-                                response_data = json.loads(response_text)
-                            except Exception:
-                                response_data = {"text": response_text}
-                                # 检查 Authorization header
+                        response_data = await _read_response_data(response)
                         return status, response.headers, response_data
                 elif method.upper() == "POST":
-                    async with session.post(request_url, headers=merged_headers, json=json_data) as response:
+                    body = _encode_msgpack_body(merged_headers, json_data)
+                    if body is not None:
+                        post = session.post(request_url, headers=merged_headers, data=body)
+                    else:
+                        post = session.post(request_url, headers=merged_headers, json=json_data)
+                    async with post as response:
                         status = response.status
-                        try:
-                            response_data = await response.json()
-                        except Exception:
-                            response_text = await response.text()
-                            try:
-                                response_data = json.loads(response_text)
-                            except Exception:
-                                response_data = {"text": response_text}
+                        response_data = await _read_response_data(response)
                         return status, response.headers, response_data
                 else:
                     logger.debug(f"Unsupported HTTP method: {method}")
@@ -258,14 +285,16 @@ class WBADIDAuthenticator(BaseDIDAuthenticator):
             # 4. 验证签名
             try:
                 if is_two_way_auth:
-                    is_valid, message = verify_auth_header_signature_two_way(
+                    is_valid, message = await run_crypto(
+                        verify_auth_header_signature_two_way,
                         auth_header=auth_header,
                         did_document=did_document,
                         service_domain=context.domain if hasattr(context, 'domain') else None
                     )
                 else:
                     from agent_connect.authentication.did_wba import verify_auth_header_signature
-                    is_valid, message = verify_auth_header_signature(
+                    is_valid, message = await run_crypto(
+                        verify_auth_header_signature,
                         auth_header=auth_header,
                         did_document=did_document,
                         service_domain=context.domain if hasattr(context, 'domain') else None
@@ -287,24 +316,13 @@ class WBAAuth(BaseAuth):
         支持两路和标准认证头的 DID 提取
         """
         try:
-            # 优先尝试两路认证
-            from anp_open_sdk.agent_connect_hotpatch.authentication.did_wba import extract_auth_header_parts_two_way
-            parts = extract_auth_header_parts_two_way(auth_header)
-            if parts and len(parts) == 6:
-                did, nonce, timestamp, resp_did, keyid, signature = parts
-                return did, resp_did
-        except Exception:
-            pass
-
-        try:
-            # 回退到标准认证
-            parts = extract_auth_header_parts(auth_header)
-            if parts and len(parts) >= 4:
-                did, nonce, timestamp, keyid, signature = parts
-                return did, None
-        except Exception:
-            pass
+            fields = parse_did_wba_auth_header(auth_header)
+        except (ValueError, AttributeError):
+            return None, None
 
+        # 标准认证头缺少 resp_did，两者共有的字段必须齐全
+        if all(field in fields for field in ('did', 'nonce', 'timestamp', 'verification_method', 'signature')):
+            return fields['did'], fields.get('resp_did')
         return None, None
 
 
@@ -408,7 +426,8 @@ async def check_response_DIDAtuhHeader(auth_value: str) -> bool:
         target_url = "virtual.WBAback" # 迁就现在的url parse代码
 
         # 调用验证函数
-        is_valid, message = verify_auth_header_signature_two_way(
+        is_valid, message = await run_crypto(
+            verify_auth_header_signature_two_way,
             auth_header=full_auth_header,
             did_document=did_document,
             service_domain=target_url
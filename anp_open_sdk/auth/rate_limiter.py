@@ -0,0 +1,203 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+准入控制与限流
+
+认证之前的令牌桶按（客户端地址, 声称的 DID）计，DID 从 Authorization 头（DIDWba 的 did 字段或
+Bearer 请求的 req_did）中直接取出，此时还没有验签，所以总是和地址一起作为键，伪造别人的 DID
+只会耗尽伪造者自己地址下的桶；没有认证头的请求只按客户端地址计。DIDWba 握手会触发 ECDSA 验签和
+DID 解析，另有更严格的握手桶，以及一个全局握手桶，防止轮换 DID 绕过单桶限制。
+认证中间件验证通过后再按 DID 扣一次桶（check_verified），同一 DID 从多个地址发起的请求合计受限。
+所有桶放在有界 LRU 中，外加一个全局并发上限。超限返回 429 和 Retry-After。
+"""
+
+import re
+import math
+import time
+import json
+import base64
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+import logging
+logger = logging.getLogger(__name__)
+
+# resp_did="..." 前面是下划线，不会被匹配
+_DIDWBA_DID_RE = re.compile(r'(?<![\w])did="([^"]*)"')
+
+
+class TokenBucket:
+    """令牌桶，按时间线性补充令牌"""
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+    def take(self, rate: float, burst: float, now: float) -> float:
+        """取一个令牌，成功返回 0，否则返回需要等待的秒数"""
+        tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if tokens >= 1:
+            self.tokens = tokens - 1
+            return 0.0
+        self.tokens = tokens
+        return (1 - tokens) / rate if rate > 0 else math.inf
+
+
+class BucketTable:
+    """按键存放令牌桶的有界 LRU，超出上限时淘汰最久未用的桶"""
+
+    def __init__(self, rate: float, burst: float, max_entries: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            # 新桶是满的，被淘汰后重新出现的调用方等同于空闲了很久
+            bucket = TokenBucket(self.burst, now)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take(self.rate, self.burst, now)
+
+
+def _bearer_caller(token: str) -> Optional[str]:
+    """不验签地读取 JWT 载荷中的 req_did"""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except Exception:
+        return None
+    if not isinstance(claims, dict):
+        return None
+    caller = claims.get("req_did") or claims.get("sub")
+    return caller if isinstance(caller, str) else None
+
+
+def claimed_did(request) -> Optional[str]:
+    """不验签地取出请求声称的调用方 DID，没有时返回 None"""
+    auth_header = request.headers.get("authorization")
+    if not auth_header:
+        return None
+    if auth_header.startswith("DIDWba"):
+        match = _DIDWBA_DID_RE.search(auth_header)
+        return match.group(1) if match and match.group(1) else None
+    if auth_header.startswith("Bearer "):
+        return request.headers.get("req_did") or _bearer_caller(auth_header[7:])
+    return None
+
+
+def extract_caller(request) -> Tuple[str, bool]:
+    """
+    从请求中取出认证前限流用的调用方标识：客户端地址，带认证头时再加上声称的 DID。
+
+    Returns:
+        (调用方标识, 是否为 DIDWba 握手)
+    """
+    client = request.client
+    address = f"ip:{client.host if client else 'unknown'}"
+    auth_header = request.headers.get("authorization")
+    did = claimed_did(request)
+    return (f"{address}|{did}" if did else address), bool(auth_header and auth_header.startswith("DIDWba"))
+
+
+class RateLimiter:
+    """按调用方限流并限制全局并发的准入控制"""
+
+    def __init__(self, caller_rate: float = 50, caller_burst: float = 100,
+                 handshake_rate: float = 1, handshake_burst: float = 5,
+                 handshake_global_rate: float = 50, handshake_global_burst: float = 100,
+                 max_concurrency: int = 256, max_callers: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.callers = BucketTable(caller_rate, caller_burst, max_callers)
+        self.verified = BucketTable(caller_rate, caller_burst, max_callers)
+        self.handshakes = BucketTable(handshake_rate, handshake_burst, max_callers)
+        self.handshake_rate = handshake_global_rate
+        self.handshake_burst = handshake_global_burst
+        self._handshake_global = TokenBucket(handshake_global_burst, clock())
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._clock = clock
+
+    @classmethod
+    def from_config(cls, rate_config) -> "RateLimiter":
+        """从 anp_sdk.rate_limit 配置创建，缺省项使用默认值"""
+        kwargs = {}
+        for name in ("caller_rate", "caller_burst", "handshake_rate", "handshake_burst",
+                     "handshake_global_rate", "handshake_global_burst", "max_concurrency", "max_callers"):
+            value = getattr(rate_config, name, None)
+            if value is not None:
+                kwargs[name] = value
+        return cls(**kwargs)
+
+    def check(self, caller: str, handshake: bool = False) -> float:
+        """检查一次请求是否放行，放行返回 0，否则返回建议的重试等待秒数"""
+        now = self._clock()
+        if handshake:
+            wait = self.handshakes.take(caller, now)
+            if wait:
+                return wait
+            wait = self._handshake_global.take(self.handshake_rate, self.handshake_burst, now)
+            if wait:
+                return wait
+        return self.callers.take(caller, now)
+
+    def check_verified(self, did: str) -> float:
+        """认证通过后按 DID 检查一次，返回值同 check"""
+        return self.verified.take(did, self._clock())
+
+    def admit_verified(self, request) -> Optional[JSONResponse]:
+        """认证中间件在验证通过后调用：DID 超限时返回 429 响应，否则返回 None"""
+        did = claimed_did(request)
+        if not did:
+            return None
+        wait = self.check_verified(did)
+        if wait:
+            logger.debug(f"限流: 已认证的 {did} 请求过于频繁，{wait:.2f}s 后重试")
+            return self._reject(wait, "Too many requests")
+        return None
+
+    @staticmethod
+    def _reject(retry_after: float, detail: str) -> JSONResponse:
+        seconds = max(1, math.ceil(retry_after)) if math.isfinite(retry_after) else 60
+        return JSONResponse(status_code=429, content={"detail": detail},
+                            headers={"Retry-After": str(seconds)})
+
+    async def dispatch(self, request, call_next) -> Any:
+        """HTTP 中间件入口"""
+        caller, handshake = extract_caller(request)
+        wait = self.check(caller, handshake)
+        if wait:
+            logger.debug(f"限流: {caller} {'握手' if handshake else '请求'}过于频繁，{wait:.2f}s 后重试")
+            return self._reject(wait, "Too many requests")
+        if self.in_flight >= self.max_concurrency:
+            logger.debug(f"限流: 并发请求数已达上限 {self.max_concurrency}")
+            return self._reject(1, "Server busy")
+        self.in_flight += 1
+        try:
+            return await call_next(request)
+        finally:
+            self.in_flight -= 1
@@ -16,8 +16,10 @@
 
 
 import os
+import functools
 from typing import Optional, Dict
 import jwt
+from cryptography.hazmat.primitives import serialization
 from fastapi import HTTPException
 
 from datetime import datetime, timezone, timedelta
@@ -47,7 +49,7 @@ def create_access_token(private_key_path, data: Dict, expires_delta: int = None)
     to_encode.update({"exp": expires})
     
     # Get private key for signing
-    private_key = get_jwt_private_key(private_key_path)
+    private_key = get_jwt_signing_key(private_key_path)
     if not private_key:
         logger.debug("Failed to load JWT private key")
         raise HTTPException(status_code=500, detail="Internal server error during token generation")
@@ -125,6 +127,30 @@ def get_jwt_private_key(key_path: str = None ) -> Optional[str]:
         return None
 
 
+@functools.lru_cache(maxsize=256)
+def _load_jwt_signing_key(key_path: str, mtime_ns: int, size: int):
+    with open(key_path, "rb") as f:
+        return serialization.load_pem_private_key(f.read(), password=None)
+
+
+def get_jwt_signing_key(key_path: str = None):
+    """
+    Get the parsed JWT private key object.
+
+    RSA 私钥的解析（含密钥校验）比签名本身慢一个数量级，按文件路径和修改时间缓存解析结果，
+    替换密钥文件后自动重新加载。
+
+    Returns:
+        The private key object, or None if the file cannot be read
+    """
+    try:
+        stat = os.stat(key_path)
+        return _load_jwt_signing_key(key_path, stat.st_mtime_ns, stat.st_size)
+    except Exception as e:
+        logger.debug(f"Error loading private key file {key_path}: {e}")
+        return None
+
+
 def get_jwt_public_key(key_path: str = None) -> Optional[str]:
     """
     Get the JWT public key from a PEM file.
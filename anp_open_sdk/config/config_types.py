@@ -8,6 +8,7 @@ from pathlib import Path
 
 class MultiAgentModeConfig(Protocol):
     agents_cfg_path: str
+    boot_manifest_path: str
 
 
 class AnpSdkAgentConfig(Protocol):
@@ -16,6 +17,30 @@ class AnpSdkAgentConfig(Protocol):
     demo_agent2: str
     demo_agent3: str
 
+class AnpSdkRateLimitConfig(Protocol):
+    """ANP SDK 限流配置协议"""
+    enabled: bool
+    caller_rate: float
+    caller_burst: float
+    handshake_rate: float
+    handshake_burst: float
+    handshake_global_rate: float
+    handshake_global_burst: float
+    max_concurrency: int
+    max_callers: int
+
+class AnpSdkLifecycleConfig(Protocol):
+    """ANP SDK 停机与重启配置协议"""
+    drain_timeout: float
+    reconnect_after: float
+    state_file: str
+
+class AnpSdkContactsConfig(Protocol):
+    """ANP SDK 联系人缓存配置协议"""
+    max_contacts: int
+    max_tokens: int
+    store_file: str
+
 class AnpSdkConfig(Protocol):
     """ANP SDK 配置协议"""
     debug_mode: bool
@@ -30,6 +55,16 @@ class AnpSdkConfig(Protocol):
     jwt_algorithm: str
     user_did_key_id: str
     helper_lang: str
+    crypto_max_workers: int
+    crypto_max_pending: int
+    handler_max_workers: int
+    handler_max_pending: int
+    config_watch_interval: float
+    gzip_min_size: int
+    gzip_level: int
+    rate_limit: AnpSdkRateLimitConfig
+    lifecycle: AnpSdkLifecycleConfig
+    contacts: AnpSdkContactsConfig
     agent: AnpSdkAgentConfig
 
 
@@ -61,7 +96,7 @@ class MailConfig(Protocol):
     hoster_mail_user: str
     sender_mail_user: str
     register_mail_user: str
-
+    inbox_scan_interval: float
 
 
 class ChatConfig(Protocol):
@@ -170,7 +205,7 @@ class BaseUnifiedConfigProtocol(Protocol):
     # 方法
     def resolve_path(self, path: str) -> Path: ...
     def get_app_root(self) -> Path: ...
-    def reload(self) -> None: ...
+    def reload(self) -> bool: ...
     def save(self) -> bool: ...
     def to_dict(self) -> Dict[str, Any]: ...
     def add_to_path(self, new_path: str) -> None: ...
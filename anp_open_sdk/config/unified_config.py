@@ -27,14 +27,16 @@ import sys
 import threading
 import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union, TYPE_CHECKING
+from typing import Any, Callable, Dict, List, Optional, Union, TYPE_CHECKING, get_args, get_origin, get_type_hints
 import yaml
 import logging
-from types import SimpleNamespace
+import functools
+from types import MappingProxyType, SimpleNamespace
 from dotenv import load_dotenv
 import os
 from typing import Optional, cast
 from .config_types import BaseUnifiedConfigProtocol
+from . import config_types
 
 
 
@@ -57,14 +59,116 @@ def get_global_config() -> 'BaseUnifiedConfigProtocol':
     """
     【解析函数】供库内其他模块调用，获取已设置的全局配置实例。
     """
-    if _global_config is None:
-        # 这是关键的保护措施！
-        raise RuntimeError(
-            "Global config has not been set. "
-            "Please call set_global_config(config) at your application's entry point."
-        )
-    # 使用 cast 来帮助类型检查器理解 _global_config 符合协议
-    return cast('UnifiedConfigProtocol', _global_config)
+    # 快速路径：请求处理中每次都会调用，已设置时直接返回
+    config = _global_config
+    if config is not None:
+        return config
+    # 这是关键的保护措施！
+    raise RuntimeError(
+        "Global config has not been set. "
+        "Please call set_global_config(config) at your application's entry point."
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def _resolve_path_cached(path_str: str, app_root: Path) -> Path:
+    path_obj = Path(path_str.replace('{APP_ROOT}', str(app_root)))
+    if not path_obj.is_absolute():
+        path_obj = app_root / path_obj
+    return path_obj.resolve()
+
+
+def _is_protocol(annotation: Any) -> bool:
+    return isinstance(annotation, type) and getattr(annotation, '_is_protocol', False)
+
+
+def _check_config_value(value: Any, annotation: Any, key_path: str, errors: List[str]):
+    origin = get_origin(annotation)
+    if origin is Union:
+        args = get_args(annotation)
+        if value is None and type(None) in args:
+            return
+        for arg in args:
+            if arg is type(None):
+                continue
+            arg_errors: List[str] = []
+            _check_config_value(value, arg, key_path, arg_errors)
+            if not arg_errors:
+                return
+        errors.append(f"{key_path}: 类型应为 {annotation}，实际为 {type(value).__name__}")
+        return
+    if _is_protocol(annotation):
+        if not isinstance(value, dict):
+            errors.append(f"{key_path}: 应为配置节，实际为 {type(value).__name__}")
+            return
+        hints = get_type_hints(annotation)
+        for key, child in value.items():
+            if key in hints:
+                _check_config_value(child, hints[key], f"{key_path}.{key}", errors)
+        return
+
+    if annotation is Any:
+        valid = True
+    elif annotation is bool:
+        valid = isinstance(value, bool)
+    elif annotation is int:
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    elif annotation is float:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif annotation is Path:
+        valid = isinstance(value, (str, Path))
+    elif origin in (list, List):
+        valid = isinstance(value, list)
+    elif origin in (dict, Dict):
+        valid = isinstance(value, dict)
+    elif isinstance(annotation, type):
+        valid = isinstance(value, annotation)
+    else:
+        valid = True
+    if not valid:
+        expected = getattr(annotation, '__name__', str(annotation))
+        errors.append(f"{key_path}: 类型应为 {expected}，实际为 {type(value).__name__}")
+
+
+def validate_config_data(data: Any) -> List[str]:
+    """
+    按 config_types 中的协议校验配置数据。
+
+    只检查文件中出现的配置项（缺省项沿用代码中的默认值），返回错误描述列表，为空表示通过。
+    """
+    if not isinstance(data, dict):
+        return [f"配置文件顶层应为映射，实际为 {type(data).__name__}"]
+    errors: List[str] = []
+    hints = get_type_hints(config_types.BaseUnifiedConfigProtocol)
+    for key, value in data.items():
+        # env/secrets 由 env_mapping 和 secrets 列表生成，不按协议校验
+        if key in ('env', 'secrets') or key not in hints:
+            continue
+        _check_config_value(value, hints[key], key, errors)
+    return errors
+
+
+class ConfigSnapshot:
+    """
+    一次加载得到的完整配置视图。
+
+    reload 时先构建新的快照，再一次性发布，读取方不加锁也不会看到新旧混杂的配置。
+    快照发布后不应再修改；需要多个配置项保持一致时，先取 config.snapshot 再读取。
+    """
+    __slots__ = ('version', 'data', 'nodes', 'env', 'secrets')
+
+    def __init__(self, version: int, data: dict, nodes: Dict[str, Any], env: 'EnvConfig', secrets: 'SecretsConfig'):
+        self.version = version
+        self.data = MappingProxyType(data)
+        self.nodes = MappingProxyType(nodes)
+        self.env = env
+        self.secrets = secrets
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self.nodes[name]
+        except KeyError:
+            raise AttributeError(f"配置项 '{name}' 不存在") from None
 
 
 class ConfigNode:
@@ -218,18 +322,20 @@ class UnifiedConfig:
             )
 
         # 2. 加载 .env 文件
-        env_path = self._app_root / ".env"
-        if env_path.exists():
-            load_dotenv(dotenv_path=env_path, override=True)
-            self.logger.info(f"已从 {env_path} 加载环境变量")
+        self._env_file = self._app_root / ".env"
+        self._load_dotenv()
 
         # 3. 解析配置文件路径
         self._config_file = self._resolve_config_file(config_file)
         self._config_data = {}
         self._config_lock = threading.RLock()
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._subscribers: List[Callable[[ConfigSnapshot, ConfigSnapshot], None]] = []
+        self._watch_thread: Optional[threading.Thread] = None
+        self._watch_stop: Optional[threading.Event] = None
+        self._watch_refs = 0
         self.load()
-        self._create_config_tree()
-        self._create_env_configs()
+        self._publish(self._build_snapshot(self._config_data))
 
 
 
@@ -239,7 +345,8 @@ class UnifiedConfig:
         config_attrs = ['anp_sdk', 'llm', 'mail', 'env', 'secrets']
         method_attrs = [
             'resolve_path', 'get_app_root', 'find_in_path', 'get_path_info', 'add_to_path',
-            'load', 'save', 'reload', 'to_dict'
+            'load', 'save', 'reload', 'to_dict', 'snapshot', 'subscribe', 'unsubscribe',
+            'start_watching', 'stop_watching'
         ]
         return config_attrs + method_attrs
 
@@ -251,21 +358,109 @@ class UnifiedConfig:
 
 
 
-    def _create_config_tree(self):
-        processed_data = self._process_paths(self._config_data)
+    def _build_snapshot(self, config_data: dict) -> ConfigSnapshot:
+        processed_data = self._process_paths(config_data)
         special_keys = {'env_mapping', 'secrets', 'env_types', 'path_config'}
+        nodes = {}
         for key, value in processed_data.items():
             if key not in special_keys and isinstance(value, dict):
-                setattr(self, key, ConfigNode(value, key))
+                nodes[key] = ConfigNode(value, key)
             elif key not in special_keys:
-                setattr(self, key, value)
+                nodes[key] = value
+        env = EnvConfig(config_data.get('env_mapping', {}), config_data.get('env_types', {}), self)
+        secrets = SecretsConfig(config_data.get('secrets', []), config_data.get('env_mapping', {}))
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        return ConfigSnapshot(version, config_data, nodes, env, secrets)
+
+    def _publish(self, snapshot: ConfigSnapshot):
+        """发布快照：顶层配置节点仍是普通实例属性，读取没有额外开销，一次 dict.update 完成替换"""
+        previous = self._snapshot
+        attrs = dict(snapshot.nodes)
+        attrs.update(env=snapshot.env, secrets=snapshot.secrets, _snapshot=snapshot)
+        self.__dict__.update(attrs)
+        if previous is not None:
+            for key in previous.nodes.keys() - snapshot.nodes.keys():
+                self.__dict__.pop(key, None)
+
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """当前发布的配置快照，读取无需加锁"""
+        return self._snapshot
+
+    def subscribe(self, callback: Callable[[ConfigSnapshot, ConfigSnapshot], None]):
+        """
+        注册配置变更回调，reload 成功后按注册顺序以 (新快照, 旧快照) 调用。
+
+        文件监视触发的回调在监视线程中执行，异步代码需自行切回事件循环（loop.call_soon_threadsafe）。
+        """
+        with self._config_lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback: Callable[[ConfigSnapshot, ConfigSnapshot], None]):
+        with self._config_lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
 
-    def _create_env_configs(self):
-        env_mapping = self._config_data.get('env_mapping', {})
-        env_types = self._config_data.get('env_types', {})
-        secrets_list = self._config_data.get('secrets', [])
-        self.env = EnvConfig(env_mapping, env_types, self)
-        self.secrets = SecretsConfig(secrets_list, env_mapping)
+    def _notify(self, snapshot: ConfigSnapshot, previous: Optional[ConfigSnapshot]):
+        for callback in list(self._subscribers):
+            try:
+                callback(snapshot, previous)
+            except Exception as e:
+                self.logger.error(f"配置变更回调 {callback} 执行出错: {e}")
+
+    def _load_dotenv(self):
+        if self._env_file.exists():
+            load_dotenv(dotenv_path=self._env_file, override=True)
+            self.logger.info(f"已从 {self._env_file} 加载环境变量")
+
+    def _watched_state(self):
+        state = []
+        for path in (self._config_file, self._env_file):
+            try:
+                stat = path.stat()
+                state.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                state.append(None)
+        return tuple(state)
+
+    def start_watching(self, interval: float = 2.0):
+        """启动后台线程，按 interval 秒检查配置文件和 .env 的变化并自动 reload
+
+        按引用计数：每次调用都要对应一次 stop_watching，最后一个使用方停止时线程才退出；
+        线程已在运行时沿用最初的检查间隔。
+        """
+        with self._config_lock:
+            self._watch_refs += 1
+            if self._watch_thread is not None and self._watch_thread.is_alive():
+                return
+            self._watch_stop = threading.Event()
+            self._watch_thread = threading.Thread(
+                target=self._watch_loop, args=(interval, self._watch_stop), name="anp-config-watch", daemon=True
+            )
+            self._watch_thread.start()
+        self.logger.info(f"开始监视配置文件 {self._config_file}，间隔 {interval} 秒")
+
+    def stop_watching(self):
+        """释放一次 start_watching，没有其他使用方时停止监视线程"""
+        with self._config_lock:
+            self._watch_refs = max(0, self._watch_refs - 1)
+            if self._watch_refs:
+                return
+            thread, stop = self._watch_thread, self._watch_stop
+            self._watch_thread = None
+        if stop is not None:
+            stop.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _watch_loop(self, interval: float, stop: threading.Event):
+        last_state = self._watched_state()
+        while not stop.wait(interval):
+            state = self._watched_state()
+            if state != last_state:
+                last_state = state
+                self.reload()
 
     def _process_paths(self, data: Any) -> Any:
         if isinstance(data, dict):
@@ -360,11 +555,40 @@ class UnifiedConfig:
                 self.logger.error(f"保存配置出错: {e}")
                 return False
 
-    def reload(self):
-        self.load()
-        self._create_config_tree()
-        self._create_env_configs()
+    def _read_config_file(self) -> Dict[str, Any]:
+        if not self._config_file.exists():
+            return self._get_default_config()
+        with open(self._config_file, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+
+    def reload(self) -> bool:
+        """
+        重新读取 .env 和配置文件，按 config_types 协议校验后替换快照并通知订阅者。
+
+        文件无法解析或校验失败时保留当前配置，返回 False。
+        """
+        try:
+            config_data = self._read_config_file()
+        except Exception as e:
+            self.logger.error(f"重新加载配置失败，保留当前配置: {e}")
+            return False
+        errors = validate_config_data(config_data)
+        if errors:
+            self.logger.error(f"配置校验失败，保留当前配置: {'; '.join(errors)}")
+            return False
+
+        with self._config_lock:
+            self._load_dotenv()
+            self._config_data = config_data
+            # 文件系统可能已变化（符号链接、目录移动），路径解析结果一并失效
+            _resolve_path_cached.cache_clear()
+            previous = self._snapshot
+            snapshot = self._build_snapshot(config_data)
+            self._publish(snapshot)
+            # 在锁内通知，并发 reload 时回调看到的版本按顺序递增
+            self._notify(snapshot, previous)
         self.logger.info("配置已重新加载")
+        return True
 
         # 这是从 path_resolver 移入的核心方法
 
@@ -382,13 +606,8 @@ class UnifiedConfig:
         if cls._app_root_cls is None:
             raise RuntimeError("UnifiedConfig 尚未初始化，无法解析路径。请先创建 UnifiedConfig 实例。")
 
-        path_str = str(path).replace('{APP_ROOT}', str(cls._app_root_cls))
-        path_obj = Path(path_str)
-
-        if not path_obj.is_absolute():
-            path_obj = cls._app_root_cls / path_obj
-
-        return path_obj.resolve()
+        # Path.resolve() 每次都要逐级查询文件系统，结果按输入字符串缓存，reload 时清空
+        return _resolve_path_cached(str(path), cls._app_root_cls)
 
     @classmethod
     def get_app_root(cls) -> Path:
@@ -1,53 +1,307 @@
+import os
+import re
+import atexit
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from anp_open_sdk.utils.serialization import dumps_str, loads
+
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONTACTS = 10000
+DEFAULT_MAX_TOKENS = 10000
+
+_DID_HOST = re.compile(r"did:wba:([^:%]+)")
+
+
+def did_host(did: str) -> Optional[str]:
+    """从 did:wba:host%3Aport:... / did:wba:host:... 取出主机名"""
+    m = _DID_HOST.match(did or "")
+    return m.group(1) if m else None
+
+
+class LRUCache(OrderedDict):
+    """容量有限的 LRU 缓存，get 和写入会把条目移到最近使用端，超出容量时淘汰最久未用的条目
+
+    只重写 get 和 __setitem__，dict(cache)、迭代等读取不改变顺序；maxsize 为 0 或 None 时不限容量。
+    """
+
+    def __init__(self, maxsize: Optional[int] = None):
+        self.maxsize = maxsize
+        self.evictions = 0
+        super().__init__()
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return OrderedDict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        OrderedDict.__setitem__(self, key, value)
+        self.move_to_end(key)
+        if self.maxsize:
+            while len(self) > self.maxsize:
+                self.popitem(last=False)
+                self.evictions += 1
+
+
+class ContactStore:
+    """联系人和 token 的持久化存储
+
+    每个智能体在用户目录下用一个 SQLite 文件保存全部联系人和 token，联系人按 DID（主键）和主机
+    （索引列）查询。内存中只保留 ContactManager 的 LRU 缓存，未命中时从这里加载。
+    path 为 ":memory:" 时只在进程内有效。
+    """
+
+    STORE_FILE = "contacts.sqlite3"
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._db:
+            if path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS contacts "
+                             "(did TEXT PRIMARY KEY, host TEXT, data TEXT NOT NULL) WITHOUT ROWID")
+            self._db.execute("CREATE INDEX IF NOT EXISTS contacts_host ON contacts (host)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS tokens "
+                             "(kind TEXT NOT NULL, did TEXT NOT NULL, data TEXT NOT NULL, "
+                             "PRIMARY KEY (kind, did)) WITHOUT ROWID")
+
+    @classmethod
+    def for_user_dir(cls, user_dir: Optional[str], file_name: Optional[str] = None) -> "ContactStore":
+        """打开用户目录下的存储文件，没有用户目录时使用内存数据库"""
+        if user_dir and os.path.isdir(user_dir):
+            return cls(os.path.join(user_dir, file_name or cls.STORE_FILE))
+        return cls()
+
+    @staticmethod
+    def _contact_row(contact: Dict[str, Any]):
+        did = contact["did"]
+        return did, contact.get("host") or did_host(did), dumps_str(contact)
+
+    def get_contact(self, did: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM contacts WHERE did = ?", (did,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def put_contact(self, contact: Dict[str, Any]):
+        row = self._contact_row(contact)
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO contacts VALUES (?, ?, ?)", row)
+
+    def put_contacts(self, contacts: Iterable[Dict[str, Any]]) -> int:
+        """在一个事务中批量写入联系人"""
+        rows = [self._contact_row(contact) for contact in contacts]
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO contacts VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    def delete_contact(self, did: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM contacts WHERE did = ?", (did,))
+
+    def contacts_by_host(self, host: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute("SELECT data FROM contacts WHERE host = ? ORDER BY did", (host,)).fetchall()
+        return [loads(row[0]) for row in rows]
+
+    def list_contacts(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute("SELECT data FROM contacts ORDER BY did LIMIT ? OFFSET ?",
+                                    (-1 if limit is None else limit, offset)).fetchall()
+        return [loads(row[0]) for row in rows]
+
+    def count_contacts(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+    def get_token(self, kind: str, did: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM tokens WHERE kind = ? AND did = ?", (kind, did)).fetchone()
+        return loads(row[0]) if row else None
+
+    def put_token(self, kind: str, did: str, info: Dict[str, Any]):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)", (kind, did, dumps_str(info)))
+
+    def put_tokens(self, kind: str, items: Iterable) -> int:
+        """在一个事务中批量写入 (did, info)"""
+        rows = [(kind, did, dumps_str(info)) for did, info in items]
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    def delete_token(self, kind: str, did: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM tokens WHERE kind = ? AND did = ?", (kind, did))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _contacts_config():
+    try:
+        from anp_open_sdk.config import get_global_config
+        return getattr(get_global_config().anp_sdk, "contacts", None)
+    except Exception:
+        return None
+
+
 class ContactManager:
-    def __init__(self, user_data):
+    """联系人和 token 管理
+
+    内存中按 LRU 保留最近使用的 max_contacts 个联系人和各 max_tokens 条 token，全部条目写入
+    ContactStore，缓存未命中时从存储加载。user_data 上的 contacts/token_*_dict 换成同一组缓存，
+    直接读写 user_data 的代码也受容量限制。
+
+    LocalAgent 按请求创建，用户数据也会被重新加载，应通过 for_user_data 取得管理器：同一用户目录
+    只打开一个存储连接、保留一组缓存，进程退出时统一关闭。
+    """
+
+    TO_REMOTE = "to_remote"
+    FROM_REMOTE = "from_remote"
+
+    _shared: Dict[str, "ContactManager"] = {}  # 用户目录 -> 管理器
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def for_user_data(cls, user_data) -> "ContactManager":
+        """返回该用户目录共用的管理器，user_data 是重新加载的新对象时把它的字典换成共用的缓存"""
+        user_dir = getattr(user_data, "user_dir", None)
+        if not user_dir or not os.path.isdir(user_dir):
+            return cls(user_data)
+        key = os.path.abspath(user_dir)
+        with cls._shared_lock:
+            manager = cls._shared.get(key)
+            if manager is None:
+                manager = cls._shared[key] = cls(user_data)
+            elif manager.user_data is not user_data:
+                manager.user_data = user_data
+                manager._load_contacts()
+        return manager
+
+    @classmethod
+    def close_shared(cls):
+        """关闭所有共用管理器的存储连接"""
+        with cls._shared_lock:
+            managers = list(cls._shared.values())
+            cls._shared.clear()
+        for manager in managers:
+            manager.close()
+
+    def close(self):
+        self.store.close()
+
+    def __init__(self, user_data, max_contacts: Optional[int] = None, max_tokens: Optional[int] = None,
+                 store: Optional[ContactStore] = None):
         self.user_data = user_data  # BaseUserData 实例
-        self._contacts = {}  # did -> contact dict
-        self._token_to_remote = {}  # did -> token dict
-        self._token_from_remote = {}  # did -> token dict
+        config = _contacts_config()
+        if max_contacts is None:
+            max_contacts = getattr(config, "max_contacts", DEFAULT_MAX_CONTACTS)
+        if max_tokens is None:
+            max_tokens = getattr(config, "max_tokens", DEFAULT_MAX_TOKENS)
+        if store is None:
+            store = ContactStore.for_user_dir(getattr(user_data, "user_dir", None),
+                                              getattr(config, "store_file", None))
+        self.store = store
+        self._contacts = LRUCache(max_contacts)  # did -> contact dict
+        self._token_to_remote = LRUCache(max_tokens)  # did -> token dict
+        self._token_from_remote = LRUCache(max_tokens)  # did -> token dict
         self._load_contacts()
 
     def _load_contacts(self):
-        # 加载联系人和 token 信息到缓存
-        for contact in self.user_data.list_contacts():
-            did = contact['did']
-            self._contacts[did] = contact
-            token_to = self.user_data.get_token_to_remote(did)
-            if token_to:
-                self._token_to_remote[did] = token_to
-            token_from = self.user_data.get_token_from_remote(did)
-            if token_from:
-                self._token_from_remote[did] = token_from
+        # user_data 中已有的条目写入存储（已是缓存的说明之前的管理器写过），之后 user_data 与管理器共用有界缓存
+        contacts = getattr(self.user_data, "contacts", None)
+        if isinstance(contacts, dict):
+            if contacts and not isinstance(contacts, LRUCache):
+                self.store.put_contacts(list(contacts.values()))
+            self._adopt("contacts", contacts, self._contacts)
+        for attr, kind, cache in (("token_to_remote_dict", self.TO_REMOTE, self._token_to_remote),
+                                  ("token_from_remote_dict", self.FROM_REMOTE, self._token_from_remote)):
+            tokens = getattr(self.user_data, attr, None)
+            if isinstance(tokens, dict):
+                if tokens and not isinstance(tokens, LRUCache):
+                    self.store.put_tokens(kind, list(tokens.items()))
+                self._adopt(attr, tokens, cache)
+
+    def _adopt(self, attr: str, existing: dict, cache: LRUCache):
+        for key, value in existing.items():
+            cache[key] = value
+        setattr(self.user_data, attr, cache)
+
+    def _lookup(self, cache: LRUCache, key: str, load: Callable[[str], Optional[Dict[str, Any]]]):
+        value = cache.get(key)
+        if value is None:
+            value = load(key)
+            if value is not None:
+                cache[key] = value
+        return value
 
     def add_contact(self, contact: dict):
         did = contact['did']
+        self.store.put_contact(contact)
         self._contacts[did] = contact
         self.user_data.add_contact(contact)
 
+    def add_contacts(self, contacts: Iterable[dict]) -> int:
+        """批量添加联系人（例如目录爬取结果），存储写入只用一个事务"""
+        contacts = list(contacts)
+        count = self.store.put_contacts(contacts)
+        for contact in contacts[-self._contacts.maxsize:] if self._contacts.maxsize else contacts:
+            self._contacts[contact['did']] = contact
+        return count
+
     def get_contact(self, did: str):
-        return self._contacts.get(did)
+        return self._lookup(self._contacts, did, self.store.get_contact)
+
+    def list_contacts(self, limit: Optional[int] = None, offset: int = 0):
+        return self.store.list_contacts(limit, offset)
 
-    def list_contacts(self):
-        return list(self._contacts.values())
+    def contacts_by_host(self, host: str):
+        """按主机查询联系人，走存储的 host 索引，不加载到缓存"""
+        return self.store.contacts_by_host(host)
+
+    def count_contacts(self) -> int:
+        return self.store.count_contacts()
 
     def store_token_to_remote(self, remote_did: str, token: str, expires_delta: int):
         self.user_data.store_token_to_remote(remote_did, token, expires_delta)
-        self._token_to_remote[remote_did] = self.user_data.get_token_to_remote(remote_did)
+        info = self.user_data.get_token_to_remote(remote_did)
+        self.store.put_token(self.TO_REMOTE, remote_did, info)
+        self._token_to_remote[remote_did] = info
 
     def get_token_to_remote(self, remote_did: str):
-        return self._token_to_remote.get(remote_did)
+        return self._lookup(self._token_to_remote, remote_did,
+                            lambda did: self.store.get_token(self.TO_REMOTE, did))
 
     def store_token_from_remote(self, remote_did: str, token: str):
         self.user_data.store_token_from_remote(remote_did, token)
-        self._token_from_remote[remote_did] = self.user_data.get_token_from_remote(remote_did)
+        info = self.user_data.get_token_from_remote(remote_did)
+        self.store.put_token(self.FROM_REMOTE, remote_did, info)
+        self._token_from_remote[remote_did] = info
 
     def get_token_from_remote(self, remote_did: str):
-        return self._token_from_remote.get(remote_did)
+        return self._lookup(self._token_from_remote, remote_did,
+                            lambda did: self.store.get_token(self.FROM_REMOTE, did))
 
     def revoke_token_to_remote(self, remote_did: str):
-        self.user_data.revoke_token_to_remote(remote_did)
+        self.store.delete_token(self.TO_REMOTE, remote_did)
         self._token_to_remote.pop(remote_did, None)
 
     def revoke_token_from_remote(self, target_did: str):
         """撤销与目标DID相关的本地token"""
-        if target_did in self._token_from_remote:
-            self._token_from_remote[target_did]["is_revoked"] = True
+        info = self.get_token_from_remote(target_did)
+        if info is not None:
+            info["is_revoked"] = True
+            self.store.put_token(self.FROM_REMOTE, target_did, info)
+
+
+atexit.register(ContactManager.close_shared)
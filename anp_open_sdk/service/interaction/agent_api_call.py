@@ -19,8 +19,9 @@ import os
 
 from anp_open_sdk.auth.auth_client import agent_auth_request, handle_response
 from anp_open_sdk.anp_sdk_agent import RemoteAgent, LocalAgent
+from anp_open_sdk.service.interaction.peer_capabilities import negotiated_auth_request
+from anp_open_sdk.utils.serialization import dumps_str
 from urllib.parse import urlencode, quote
-import json
 from typing import Optional, Dict
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
@@ -44,14 +45,14 @@ async def agent_api_call(
             }
             url_params = urlencode(url_params)
             url = f"http://{target_agent_obj.host}:{target_agent_obj.port}/agent/api/{target_agent_path}{api_path}?{url_params}"
-            status, response, info, is_auth_pass = await agent_auth_request(
-                caller_agent, target_agent, url, method="POST", json_data=req
+            status, response, info, is_auth_pass = await negotiated_auth_request(
+                caller_agent, target_agent, url, req
             )
         else:
             url_params = {
                 "req_did": caller_agent_obj.id,
                 "resp_did": target_agent_obj.id,
-                "params": json.dumps(params) if params else ""
+                "params": dumps_str(params) if params else ""
             }
             url_params = urlencode(url_params)
             url = f"http://{target_agent_obj.host}:{target_agent_obj.port}/agent/api/{target_agent_path}{api_path}?{url_params}"
@@ -0,0 +1,157 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+智能体发现客户端
+
+从 publisher 列表出发，并发获取各智能体的 DID 文档和 ad.json 描述。
+所有请求共用一个连接池化的 httpx.AsyncClient，并发数和单次请求超时可配置；
+结果按 URL 缓存（有界 LRU，超过 max_entries 时淘汰最久未用的条目），过期后携带 If-None-Match 条件刷新，服务端返回 304 时沿用缓存。
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from anp_open_sdk.anp_sdk import ANPSDK
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _CacheEntry:
+    data: Any
+    etag: Optional[str]
+    expires_at: float
+
+
+class AgentDiscoveryClient:
+    """并发、带缓存的智能体发现客户端"""
+
+    def __init__(self, client: httpx.AsyncClient = None, max_concurrency: int = 16,
+                 timeout: float = 5.0, cache_ttl: float = 300.0, max_entries: int = 4096):
+        self._own_client = client is None
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self.fetch_count = 0
+        self.not_modified_count = 0
+
+    async def aclose(self):
+        if self._own_client:
+            await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def invalidate(self, url: str = None):
+        """清除指定 URL 或全部缓存"""
+        if url is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(url, None)
+
+    def _store(self, url: str, entry: _CacheEntry):
+        self._cache[url] = entry
+        self._cache.move_to_end(url)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def fetch_json(self, url: str, revalidate: bool = False) -> Any:
+        """获取 JSON，缓存未过期时直接返回，否则带 ETag 条件请求"""
+        entry = self._cache.get(url)
+        if entry and not revalidate and entry.expires_at > time.monotonic():
+            self._cache.move_to_end(url)
+            return entry.data
+
+        headers = {"If-None-Match": entry.etag} if entry and entry.etag else {}
+        async with self._semaphore:
+            self.fetch_count += 1
+            response = await self.client.get(url, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and entry:
+            self.not_modified_count += 1
+            entry.expires_at = time.monotonic() + self.cache_ttl
+            self._store(url, entry)
+            return entry.data
+
+        response.raise_for_status()
+        data = response.json()
+        self._store(url, _CacheEntry(data, response.headers.get("ETag"), time.monotonic() + self.cache_ttl))
+        return data
+
+    @staticmethod
+    def did_document_url(did: str) -> str:
+        user_id = did.split(":")[-1]
+        host, port = ANPSDK.get_did_host_port_from_did(did)
+        user_dir = "hostuser" if ":hostuser:" in did else "user"
+        return f"http://{host}:{port}/wba/{user_dir}/{user_id}/did.json"
+
+    async def describe_agent(self, did: str) -> Optional[Dict[str, Any]]:
+        """获取单个智能体的 DID 文档和描述，失败返回 None"""
+        did_doc_url = self.did_document_url(did)
+        try:
+            did_document = await self.fetch_json(did_doc_url)
+        except (httpx.HTTPError, ValueError) as e:
+            logger.debug(f"    - ❌ Failed to get DID Document for {did}: {e}")
+            return None
+
+        ad_endpoint = None
+        for service in did_document.get("service", []):
+            if service.get("type") == "AgentDescription":
+                ad_endpoint = service.get("serviceEndpoint")
+                break
+        if not ad_endpoint:
+            logger.debug(f"    - ⚠️  No 'AgentDescription' service found in DID Document for {did}.")
+            return {"did": did, "did_document": did_document, "agent_description": None}
+
+        try:
+            agent_description = await self.fetch_json(ad_endpoint)
+        except (httpx.HTTPError, ValueError) as e:
+            logger.debug(f"    - ❌ Failed to get Agent Description from {ad_endpoint}: {e}")
+            agent_description = None
+        return {"did": did, "did_document": did_document, "agent_description": agent_description}
+
+    async def list_published_dids(self, publisher_url: str) -> List[str]:
+        """按 next_cursor 逐页获取 publisher 列表中的全部 DID，列表每次都会条件刷新"""
+        dids = []
+        url = publisher_url
+        while True:
+            data = await self.fetch_json(url, revalidate=True)
+            dids.extend(agent_info.get("did") for agent_info in data.get("agents", []) if agent_info.get("did"))
+            next_cursor = data.get("next_cursor")
+            if not next_cursor:
+                return dids
+            url = str(httpx.URL(publisher_url).copy_merge_params({"cursor": next_cursor}))
+
+    async def discover(self, publisher_url: str) -> List[Dict[str, Any]]:
+        """获取 publisher 列表中所有智能体的描述"""
+        dids = await self.list_published_dids(publisher_url)
+        logger.info(f"  - Found {len(dids)} public agents.")
+        results = await asyncio.gather(*(self.describe_agent(did) for did in dids))
+        return [result for result in results if result]
@@ -18,7 +18,8 @@
 from anp_open_sdk.anp_sdk_agent import LocalAgent, RemoteAgent
 from urllib.parse import urlencode, quote
 from anp_open_sdk.config import get_global_config
-from anp_open_sdk.auth.auth_client import agent_auth_request, handle_response
+from anp_open_sdk.auth.auth_client import handle_response
+from anp_open_sdk.service.interaction.peer_capabilities import negotiated_auth_request
 
 async def agent_msg_post(sdk, caller_agent: str, target_agent: str, content: str, message_type: str = "text"):
     """发送消息给目标智能体"""
@@ -39,7 +40,7 @@ async def agent_msg_post(sdk, caller_agent: str, target_agent: str, content: str
     msg_dir = config.anp_sdk.msg_virtual_dir
     url = f"http://{target_agent_obj.host}:{target_agent_obj.port}{msg_dir}/{target_agent_path}/post?{url_params}"
 
-    status, response, info, is_auth_pass = await agent_auth_request(
-        caller_agent, target_agent, url, method="POST", json_data=msg
+    status, response, info, is_auth_pass = await negotiated_auth_request(
+        caller_agent, target_agent, url, msg
     )
     return await handle_response(response)
@@ -1,15 +1,39 @@
 # Agent 端 SDK 用于简化 agent 与群组的交互
 import asyncio
 import json
+import random
 import time  # 添加缺失的导入
+from enum import Enum
 
 import aiohttp
-from typing import Dict, Any, Callable, List
+from typing import Dict, Any, Callable, List, Optional
 from anp_open_sdk.service.interaction.anp_sdk_group_runner import Message, MessageType
+from anp_open_sdk.service.interaction.peer_capabilities import peer_capabilities
+from anp_open_sdk.utils.serialization import MSGPACK_CONTENT_TYPE, packb
+from anp_open_sdk.utils.log_base import logging as logger
+
+
+class ListenerState(Enum):
+    """群组监听连接状态"""
+    CONNECTED = "connected"
+    RECONNECTING = "reconnecting"
+    CLOSED = "closed"
+
 
 class GroupMemberSDK:
     """Agent 端的群组 SDK"""
 
+    # SSE 重连退避参数（秒），实际等待时间在 [0, 退避上限] 内随机取值
+    RECONNECT_BASE_DELAY = 0.5
+    RECONNECT_MAX_DELAY = 30.0
+    # 超过该时间没有收到任何数据（包括服务端心跳）视为连接停滞
+    READ_TIMEOUT = 45.0
+    CONNECT_TIMEOUT = 10.0
+    # 单行 SSE 数据的上限，超出的帧记录日志后跳过，不断开连接
+    MAX_LINE_SIZE = 16 * 1024 * 1024
+    # 这些 4xx 状态码表示稍后可以重试，其余 4xx 视为永久失败
+    RETRYABLE_CLIENT_ERRORS = frozenset({408, 425, 429})
+
     def __init__(self, agent_id: str, port: int, base_url: str = "http://localhost",
                  use_local_optimization: bool = True):
         self.agent_id = agent_id
@@ -17,13 +41,53 @@ class GroupMemberSDK:
         self.base_url = base_url
         self.use_local_optimization = use_local_optimization
         self._listeners: Dict[str, asyncio.Task] = {}
+        self._local_queues: Dict[str, asyncio.Queue] = {}
         self._callbacks: Dict[str, Callable] = {}
         self._local_sdk = None
+        self._session: Optional[aiohttp.ClientSession] = None
 
     def set_local_sdk(self, sdk):
         """设置本地 SDK 实例（用于本地优化）"""
         self._local_sdk = sdk
 
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取复用的 HTTP 会话"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def _iter_sse_lines(self, content: aiohttp.StreamReader):
+        """按块读取响应并切分行，不受 aiohttp 单行缓冲上限的限制；超过 MAX_LINE_SIZE 的行产出 None"""
+        buffer = bytearray()
+        oversized = False
+        async for chunk in content.iter_any():
+            start = 0
+            while (end := chunk.find(b"\n", start)) >= 0:
+                if oversized:
+                    oversized = False
+                    yield None
+                else:
+                    buffer += chunk[start:end]
+                    yield bytes(buffer.rstrip(b"\r"))
+                buffer.clear()
+                start = end + 1
+            if not oversized:
+                buffer += chunk[start:]
+                if len(buffer) > self.MAX_LINE_SIZE:
+                    oversized = True
+                    buffer.clear()
+
+    async def close(self):
+        """停止所有监听并关闭 HTTP 会话"""
+        tasks = list(self._listeners.values())
+        for group_id in list(self._listeners):
+            self.stop_listening(group_id)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
     async def join_group(self, group_id: str, did: str = None,
                         name: str = None, metadata: Dict[str, Any] = None) -> bool:
         """加入群组"""
@@ -40,19 +104,19 @@ class GroupMemberSDK:
                 )
                 allowed = await runner.on_agent_join(agent)
                 if allowed:
-                    runner.agents[self.agent_id] = agent
+                    runner.add_member(agent)
                 return allowed
 
         # HTTP 请求路径
         url = f"{self.base_url}:{self.port}/agent/group/{did or 'default'}/{group_id}/join"
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url,
-                json={"name": name or self.agent_id, "metadata": metadata or {}},
-                params={"req_did": self.agent_id}
-            ) as resp:
-                result = await resp.json()
-                return result.get("status") == "success"
+        session = self._get_session()
+        async with session.post(
+            url,
+            json={"name": name or self.agent_id, "metadata": metadata or {}},
+            params={"req_did": self.agent_id}
+        ) as resp:
+            result = await resp.json()
+            return result.get("status") == "success"
 
     async def leave_group(self, group_id: str, did: str = None) -> bool:
         """离开群组"""
@@ -64,14 +128,14 @@ class GroupMemberSDK:
 
         # HTTP 请求路径
         url = f"{self.base_url}:{self.port}/agent/group/{did or 'default'}/{group_id}/leave"
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url,
-                json={},
-                params={"req_did": self.agent_id}
-            ) as resp:
-                result = await resp.json()
-                return result.get("status") == "success"
+        session = self._get_session()
+        async with session.post(
+            url,
+            json={},
+            params={"req_did": self.agent_id}
+        ) as resp:
+            result = await resp.json()
+            return result.get("status") == "success"
 
     async def send_message(self, group_id: str, content: Any, did: str = None,
                           message_type: MessageType = MessageType.TEXT,
@@ -94,38 +158,77 @@ class GroupMemberSDK:
 
         # HTTP 请求路径
         url = f"{self.base_url}:{self.port}/agent/group/{did or 'default'}/{group_id}/message"
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url,
-                json={"content": content, "metadata": metadata or {}},
-                params={"req_did": self.agent_id}
-            ) as resp:
-                result = await resp.json()
-                return result.get("status") == "success"
+        session = self._get_session()
+        payload = {"content": content, "metadata": metadata or {}}
+        if await peer_capabilities.supports_msgpack(did, f"{self.base_url}:{self.port}"):
+            # 群组宿主在 ad.json 中声明支持 MessagePack；无法编码或被拒绝时改用 JSON
+            try:
+                body = packb(payload)
+            except (TypeError, ValueError, OverflowError):
+                body = None
+            if body is not None:
+                async with session.post(
+                    url,
+                    data=body,
+                    params={"req_did": self.agent_id},
+                    headers={"Content-Type": MSGPACK_CONTENT_TYPE}
+                ) as resp:
+                    if resp.status != 415:
+                        result = await resp.json()
+                        return result.get("status") == "success"
+                peer_capabilities.mark_json_only(did)
+        async with session.post(
+            url,
+            json=payload,
+            params={"req_did": self.agent_id}
+        ) as resp:
+            result = await resp.json()
+            return result.get("status") == "success"
 
     async def listen_group(self, group_id: str, callback: Callable[[Message], None],
-                          did: str = None, message_types: List[MessageType] = None):
-        """监听群组消息"""
+                          did: str = None, message_types: List[MessageType] = None,
+                          on_state_change: Callable[[ListenerState], Any] = None):
+        """监听群组消息
+
+        HTTP SSE 路径在断线或连接停滞时自动重连：指数退避加随机抖动，
+        并通过 Last-Event-ID 从最后收到的消息续传。服务端停机时发送的 close 事件
+        带有 retry 间隔，按该间隔加随机抖动重连，不计入退避次数。on_state_change 在
+        连接、重连和关闭时被调用（可以是同步或异步函数）。无法解析的单帧记录日志后跳过；
+        403、404 等不可重试的 4xx 响应直接结束监听。
+        """
+        async def notify(state: ListenerState):
+            if on_state_change is None:
+                return
+            try:
+                result = on_state_change(state)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"群组 {group_id} 状态回调出错: {e}")
+
+        async def dispatch(data):
+            message = Message.from_wire(data)
+            if message_types is None or message.type in message_types:
+                await callback(message)
+
         if self.use_local_optimization and self._local_sdk:
             # 本地优化路径
             runner = self._local_sdk.get_group_runner(group_id)
             if runner:
                 queue = asyncio.Queue()
                 runner.register_listener(self.agent_id, queue)
+                self._local_queues[group_id] = queue
 
                 async def local_listener():
-                    while True:
-                        message_dict = await queue.get()
-                        message = Message(
-                            type=MessageType(message_dict["type"]),
-                            content=message_dict["content"],
-                            sender_id=message_dict["sender_id"],
-                            group_id=message_dict["group_id"],
-                            timestamp=message_dict["timestamp"],
-                            metadata=message_dict.get("metadata", {})
-                        )
-                        if message_types is None or message.type in message_types:
-                            await callback(message)
+                    await notify(ListenerState.CONNECTED)
+                    try:
+                        while True:
+                            data = await queue.get()
+                            # 服务停机时放入的关闭标记只对 SSE 连接有意义
+                            if isinstance(data, dict):
+                                await dispatch(data)
+                    finally:
+                        await notify(ListenerState.CLOSED)
 
                 task = asyncio.create_task(local_listener())
                 self._listeners[group_id] = task
@@ -133,26 +236,88 @@ class GroupMemberSDK:
 
         # HTTP SSE 路径
         url = f"{self.base_url}:{self.port}/agent/group/{did or 'default'}/{group_id}/connect"
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.CONNECT_TIMEOUT, sock_read=self.READ_TIMEOUT)
 
         async def sse_listener():
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    url,
-                    params={"req_did": self.agent_id}
-                ) as resp:
-                    async for line in resp.content:
-                        if line.startswith(b'data: '):
-                            data = json.loads(line[6:].decode())
-                            message = Message(
-                                type=MessageType(data["type"]),
-                                content=data["content"],
-                                sender_id=data["sender_id"],
-                                group_id=data["group_id"],
-                                timestamp=data["timestamp"],
-                                metadata=data.get("metadata", {})
-                            )
-                            if message_types is None or message.type in message_types:
-                                await callback(message)
+            last_event_id = None
+            attempt = 0
+            retry_after = None
+            try:
+                while True:
+                    closed_by_server = False
+                    headers = {"Last-Event-ID": str(last_event_id)} if last_event_id is not None else {}
+                    try:
+                        async with self._get_session().get(
+                            url,
+                            # 请求紧凑格式；不支持的旧服务端忽略该参数，返回完整字典
+                            params={"req_did": self.agent_id, "format": "compact"},
+                            headers=headers,
+                            timeout=timeout
+                        ) as resp:
+                            resp.raise_for_status()
+                            if not resp.content_type.startswith("text/event-stream"):
+                                # 路由返回了 JSON 错误（例如不是群组成员），重连没有意义
+                                logger.error(f"监听群组 {group_id} 失败: {await resp.text()}")
+                                return
+                            attempt = 0
+                            await notify(ListenerState.CONNECTED)
+                            event_id, event_type = None, None
+                            async for line in self._iter_sse_lines(resp.content):
+                                if not line:
+                                    if line is None:
+                                        # 超长帧：跳过，但仍按其 id 续传，避免重连后再次收到
+                                        logger.warning(f"群组 {group_id} 的消息超过 {self.MAX_LINE_SIZE} 字节，已跳过")
+                                        if event_id is not None:
+                                            last_event_id = event_id
+                                    event_id, event_type = None, None
+                                    continue
+                                try:
+                                    if line.startswith(b"id: "):
+                                        event_id = int(line[4:])
+                                    elif line.startswith(b"event: "):
+                                        event_type = line[7:].decode()
+                                    elif line.startswith(b"retry: "):
+                                        retry_after = int(line[7:]) / 1000
+                                    elif line.startswith(b"data: "):
+                                        data = json.loads(line[6:])
+                                        if event_type == "close":
+                                            logger.debug(f"群组 {group_id} 服务端停机，稍后重连: {data}")
+                                            closed_by_server = True
+                                            break
+                                        if event_type == "reset":
+                                            logger.warning(f"群组 {group_id} 的历史消息已不完整: {data}")
+                                            continue
+                                        try:
+                                            await dispatch(data)
+                                        except Exception as e:
+                                            logger.error(f"群组 {group_id} 消息回调出错: {e}")
+                                        if event_id is not None:
+                                            last_event_id = event_id
+                                except ValueError as e:
+                                    # 单帧解析失败只跳过该帧，重连只会再次收到同一帧
+                                    logger.warning(f"群组 {group_id} 收到无法解析的 SSE 行，已跳过: {e}")
+                                    if line.startswith(b"data: ") and event_id is not None:
+                                        last_event_id = event_id
+                    except aiohttp.ClientResponseError as e:
+                        if 400 <= e.status < 500 and e.status not in self.RETRYABLE_CLIENT_ERRORS:
+                            # 无权限或群组不存在，重连没有意义
+                            logger.error(f"监听群组 {group_id} 失败: HTTP {e.status} {e.message}")
+                            return
+                        logger.debug(f"群组 {group_id} 连接中断: {e}")
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        logger.debug(f"群组 {group_id} 连接中断: {e}")
+
+                    await notify(ListenerState.RECONNECTING)
+                    if closed_by_server:
+                        # 所有客户端同时收到 close 事件，抖动避免重启后的瞬时重连风暴
+                        delay = retry_after if retry_after is not None else self.RECONNECT_BASE_DELAY
+                        await asyncio.sleep(delay + random.uniform(0, delay))
+                        continue
+                    attempt += 1
+                    delay = min(self.RECONNECT_MAX_DELAY, self.RECONNECT_BASE_DELAY * 2 ** (attempt - 1))
+                    await asyncio.sleep(random.uniform(0, delay))
+            finally:
+                await notify(ListenerState.CLOSED)
 
         task = asyncio.create_task(sse_listener())
         self._listeners[group_id] = task
@@ -163,10 +328,11 @@ class GroupMemberSDK:
             self._listeners[group_id].cancel()
             del self._listeners[group_id]
 
-        if self.use_local_optimization and self._local_sdk:
+        queue = self._local_queues.pop(group_id, None)
+        if queue is not None and self._local_sdk:
             runner = self._local_sdk.get_group_runner(group_id)
             if runner:
-                runner.unregister_listener(self.agent_id)
+                runner.unregister_listener(self.agent_id, queue)
 
     async def get_members(self, group_id: str, did: str = None) -> List[Dict[str, Any]]:
         """获取群组成员列表"""
@@ -178,10 +344,10 @@ class GroupMemberSDK:
 
         # HTTP 请求路径
         url = f"{self.base_url}:{self.port}/agent/group/{did or 'default'}/{group_id}/members"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                url,
-                params={"req_did": self.agent_id}
-            ) as resp:
-                result = await resp.json()
-                return result.get("members", [])
\ No newline at end of file
+        session = self._get_session()
+        async with session.get(
+            url,
+            params={"req_did": self.agent_id}
+        ) as resp:
+            result = await resp.json()
+            return result.get("members", [])
\ No newline at end of file
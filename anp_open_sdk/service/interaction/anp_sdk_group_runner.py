@@ -7,13 +7,23 @@
 #     http://www.apache.org/licenses/LICENSE-2.0
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Deque, AsyncIterator, Set, Callable
+from collections import deque, OrderedDict
 from dataclasses import dataclass
 from enum import Enum
+import sys
 import asyncio
+import zlib
+from anp_open_sdk.utils.serialization import dumps, dumps_str, loads
 import time
 from anp_open_sdk.utils.log_base import  logging as logger
 
+# 放入监听队列后，event_stream 发送 close 事件并结束，用于停机时通知客户端重连
+_CLOSE_STREAM = object()
+# 监听队列已满时放入，event_stream 发送 close 事件让客户端用 Last-Event-ID 重连补发
+_OVERFLOW_STREAM = object()
+
+
 class MessageType(Enum):
     """消息类型枚举"""
     TEXT = "text"
@@ -22,9 +32,16 @@ class MessageType(Enum):
     SYSTEM = "system"
     COMMAND = "command"
 
-@dataclass
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+@dataclass(slots=True)
 class Message:
-    """群组消息"""
+    """群组消息
+
+    群组 ID 和发送方 DID 在大量消息之间重复，构造时驻留，所有消息共享同一个字符串对象。
+    """
     type: MessageType
     content: Any
     sender_id: str
@@ -32,6 +49,25 @@ class Message:
     timestamp: float
     metadata: Dict[str, Any] = None
 
+    def __post_init__(self):
+        self.sender_id = _intern(self.sender_id)
+        self.group_id = _intern(self.group_id)
+
+    @classmethod
+    def from_wire(cls, data) -> "Message":
+        """从 SSE 帧的 data 解析消息，兼容完整字典和紧凑数组两种格式"""
+        if isinstance(data, list):
+            return cls(MessageType(data[0]), data[1], data[2], data[3], data[4],
+                       data[5] if len(data) > 5 else {})
+        return cls(
+            type=MessageType(data["type"]),
+            content=data["content"],
+            sender_id=data["sender_id"],
+            group_id=data["group_id"],
+            timestamp=data["timestamp"],
+            metadata=data.get("metadata", {})
+        )
+
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
         return {
@@ -43,7 +79,7 @@ class Message:
             "metadata": self.metadata or {}
         }
 
-@dataclass
+@dataclass(slots=True)
 class Agent:
     """Agent 信息"""
     id: str
@@ -51,6 +87,9 @@ class Agent:
     port: int
     metadata: Dict[str, Any] = None
 
+    def __post_init__(self):
+        self.id = _intern(self.id)
+
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
         return {
@@ -60,13 +99,61 @@ class Agent:
             "metadata": self.metadata or {}
         }
 
+class GroupEvent(dict):
+    """放入监听队列和历史缓冲区的消息
+
+    仍是普通字典，所有连接共享同一个对象。SSE 帧在第一次发送时编码并缓存，
+    无论有多少连接，每条消息每种格式只序列化一次。
+
+    紧凑格式的 data 是数组 [type, content, sender_id, group_id, timestamp, metadata]，
+    metadata 为空时省略；event_id 只出现在 id 字段中。exclude 是广播时排除的 agent，
+    补发历史时同样不发给它们。
+    """
+
+    __slots__ = ("_frame", "_compact_frame", "exclude")
+
+    def __init__(self, *args, exclude: frozenset = frozenset(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self._frame = None
+        self._compact_frame = None
+        self.exclude = exclude
+
+    def compact(self) -> list:
+        row = [self["type"], self["content"], self["sender_id"], self["group_id"], self["timestamp"]]
+        if self.get("metadata"):
+            row.append(self["metadata"])
+        return row
+
+    def sse_frame(self, compact: bool = False) -> str:
+        frame = self._compact_frame if compact else self._frame
+        if frame is None:
+            data = dumps_str(self.compact() if compact else self)
+            event_id = self.get("event_id")
+            frame = f"id: {event_id}\ndata: {data}\n\n" if event_id is not None else f"data: {data}\n\n"
+            if compact:
+                self._compact_frame = frame
+            else:
+                self._frame = frame
+        return frame
+
+
 class GroupRunner(ABC):
     """GroupRunner 基类 - 开发者继承此类实现自己的群组逻辑"""
 
+    # 断线重连时可补发的最近广播消息数
+    HISTORY_SIZE = 1000
+    # 每个 SSE 连接的队列容量，消费过慢导致队列写满时断开该连接，由客户端续传补发
+    LISTENER_QUEUE_SIZE = 2000
+    # 停机时 close 事件中建议客户端的重连间隔（秒）
+    _reconnect_after = 1.0
+
     def __init__(self, group_id: str):
         self.group_id = group_id
         self.agents: Dict[str, Agent] = {}
-        self.listeners: Dict[str, asyncio.Queue] = {}  # agent_id -> queue
+        self.listeners: Dict[str, List[asyncio.Queue]] = {}  # agent_id -> queues，每个连接一个
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=self.HISTORY_SIZE)
+        self.last_event_id = 0
+        self._joined_at: Dict[str, int] = {}  # agent_id -> 加入时的 last_event_id
         self._running = False
 
     @abstractmethod
@@ -103,25 +190,50 @@ class GroupRunner(ABC):
         pass
 
     async def broadcast(self, message: Message, exclude: List[str] = None):
-        """广播消息给所有监听的 agent"""
-        exclude = exclude or []
-        message_dict = message.to_dict()
+        """广播消息给所有监听的 agent
 
-        for agent_id, queue in self.listeners.items():
-            if agent_id not in exclude:
-                try:
-                    await queue.put(message_dict)
-                except Exception as e:
-                    logger.error(f"Failed to send message to {agent_id}: {e}")
+        每条广播消息分配递增的 event_id 并写入历史缓冲区，供重连时补发，排除的 agent 随消息
+        一起记录。写入不等待：队列已满的连接被断开，客户端重连后从历史补发。
+        """
+        exclude = frozenset(exclude) if exclude else frozenset()
+        self.last_event_id += 1
+        message_dict = GroupEvent(message.to_dict(), event_id=self.last_event_id, exclude=exclude)
+        self.history.append(message_dict)
 
+        for agent_id, queues in list(self.listeners.items()):
+            if agent_id not in exclude:
+                for queue in list(queues):
+                    self._deliver(agent_id, queue, message_dict)
 
     async def send_to_agent(self, agent_id: str, message: Message):
-        """发送消息给特定 agent"""
-        if agent_id in self.listeners:
-            try:
-                await self.listeners[agent_id].put(message.to_dict())
-            except Exception as e:
-                logger.error(f"Failed to send message to {agent_id}: {e}")
+        """发送消息给特定 agent 的所有连接（不进入历史，不分配 event_id）"""
+        for queue in list(self.listeners.get(agent_id, [])):
+            self._deliver(agent_id, queue, GroupEvent(message.to_dict()))
+
+    def _deliver(self, agent_id: str, queue: asyncio.Queue, message_dict: GroupEvent):
+        try:
+            queue.put_nowait(message_dict)
+        except asyncio.QueueFull:
+            logger.warning(f"Listener queue of {agent_id} in group {self.group_id} is full, closing stream")
+            self.unregister_listener(agent_id, queue)
+            self._end_stream(queue, _OVERFLOW_STREAM)
+        except Exception as e:
+            logger.error(f"Failed to send message to {agent_id}: {e}")
+
+    @staticmethod
+    def _end_stream(queue: asyncio.Queue, marker):
+        """放入结束标记；队列已满时丢弃未发送的消息，它们在历史中，客户端续传时补发"""
+        try:
+            queue.put_nowait(marker)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(marker)
+
+    def add_member(self, agent: Agent):
+        """加入成员，记录加入时的 event_id，补发历史时不发送加入之前的消息"""
+        self.agents[agent.id] = agent
+        self._joined_at[agent.id] = self.last_event_id
 
     async def remove_member(self, agent_id: str) -> bool:
         """移除成员"""
@@ -129,6 +241,7 @@ class GroupRunner(ABC):
             agent = self.agents[agent_id]
             await self.on_agent_leave(agent)
             del self.agents[agent_id]
+            self._joined_at.pop(agent_id, None)
             # 清理监听器
             if agent_id in self.listeners:
                 del self.listeners[agent_id]
@@ -148,18 +261,115 @@ class GroupRunner(ABC):
         return agent_id in self.agents
 
 
-    def register_listener(self, agent_id: str, queue: asyncio.Queue):
-        """注册消息监听器"""
-        self.listeners[agent_id] = queue
-        logger.debug(f"Registered listener for {agent_id} in group {self.group_id}")
+    def register_listener(self, agent_id: str, queue: asyncio.Queue,
+                          last_event_id: Optional[int] = None) -> bool:
+        """注册消息监听器，同一 agent 可以有多个连接
 
-    def unregister_listener(self, agent_id: str):
-        """注销消息监听器"""
-        if agent_id in self.listeners:
-            del self.listeners[agent_id]
-            logger.debug(f"Unregistered listener for {agent_id} in group {self.group_id}")
+        Args:
+            agent_id: 监听的 agent
+            queue: 该连接的消息队列
+            last_event_id: 客户端最后收到的 event_id，提供时先把之后的历史消息放入队列，
+                跳过广播时排除该 agent 的消息和它加入群组之前的消息
 
+        Returns:
+            True 表示补发无缺口，False 表示所需消息已超出历史缓冲区或队列容量
+        """
+        complete = True
+        if last_event_id is not None:
+            oldest = self.history[0]["event_id"] if self.history else self.last_event_id + 1
+            complete = last_event_id >= oldest - 1
+            since = max(last_event_id, self._joined_at.get(agent_id, 0))
+            for message_dict in self.history:
+                if message_dict["event_id"] <= since or agent_id in message_dict.exclude:
+                    continue
+                try:
+                    queue.put_nowait(message_dict)
+                except asyncio.QueueFull:
+                    complete = False
+                    break
+        self.listeners.setdefault(agent_id, []).append(queue)
+        logger.debug(f"Registered listener for {agent_id} in group {self.group_id}")
+        return complete
+
+    def unregister_listener(self, agent_id: str, queue: Optional[asyncio.Queue] = None):
+        """注销消息监听器，未指定 queue 时注销该 agent 的全部连接"""
+        queues = self.listeners.get(agent_id)
+        if queues is None:
+            return
+        if queue is not None:
+            if queue in queues:
+                queues.remove(queue)
+            if queues:
+                return
+        del self.listeners[agent_id]
+        logger.debug(f"Unregistered listener for {agent_id} in group {self.group_id}")
+
+    async def event_stream(self, agent_id: str, last_event_id: Optional[int] = None,
+                           heartbeat_interval: float = 15.0, compact: bool = False) -> AsyncIterator[str]:
+        """生成 SSE 事件流
+
+        广播消息带 id 字段，客户端重连时通过 Last-Event-ID 续传；空闲时发送注释心跳，
+        使断开的连接在下一次写入时被发现。历史不足以无缝续传时先发送 reset 事件。
+        服务停机时发送带 retry 字段的 close 事件后结束，客户端按提示的间隔重连。
+        compact 为 True 时消息使用 GroupEvent 的紧凑格式。队列容量为 LISTENER_QUEUE_SIZE，
+        写满时发送 reason 为 overflow 的 close 事件。
+        """
+        queue = asyncio.Queue(maxsize=self.LISTENER_QUEUE_SIZE)
+        complete = self.register_listener(agent_id, queue, last_event_id)
+        try:
+            if not complete:
+                oldest = self.history[0]["event_id"] if self.history else self.last_event_id + 1
+                yield f"event: reset\ndata: {dumps_str({'oldest_event_id': oldest})}\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if message is _CLOSE_STREAM or message is _OVERFLOW_STREAM:
+                    retry_ms = int(self._reconnect_after * 1000)
+                    reason = "shutdown" if message is _CLOSE_STREAM else "overflow"
+                    data = dumps_str({"reason": reason, "reconnect_after": self._reconnect_after})
+                    yield f"retry: {retry_ms}\nevent: close\ndata: {data}\n\n"
+                    return
+                if not isinstance(message, GroupEvent):
+                    # 子类直接放入队列的普通字典
+                    message = GroupEvent(message)
+                yield message.sse_frame(compact)
+        finally:
+            self.unregister_listener(agent_id, queue)
+
+
+
+    def snapshot(self) -> Dict[str, Any]:
+        """休眠时保存的状态：成员、最近消息和 event_id。子类有其他需要保留的状态时扩展此方法和 restore"""
+        return {
+            "agents": [[a.id, a.name, a.port, a.metadata] for a in self.agents.values()],
+            "history": list(self.history),
+            "excluded": [[m["event_id"], list(m.exclude)] for m in self.history if m.exclude],
+            "joined_at": dict(self._joined_at),
+            "last_event_id": self.last_event_id,
+        }
 
+    def restore(self, state: Dict[str, Any]):
+        """从 snapshot 的结果恢复状态"""
+        for agent_id, name, port, metadata in state.get("agents", []):
+            self.agents[agent_id] = Agent(agent_id, name, port, metadata)
+        excluded = {event_id: frozenset(agent_ids) for event_id, agent_ids in state.get("excluded", [])}
+        self.history.extend(GroupEvent(message_dict, exclude=excluded.get(message_dict.get("event_id"), frozenset()))
+                            for message_dict in state.get("history", []))
+        self._joined_at.update(state.get("joined_at", {}))
+        self.last_event_id = state.get("last_event_id", 0)
+
+    def close_streams(self, reconnect_after: float = 1.0) -> int:
+        """让所有 SSE 连接发送 close 事件并结束，返回通知的连接数"""
+        self._reconnect_after = reconnect_after
+        closed = 0
+        for queues in list(self.listeners.values()):
+            for queue in list(queues):
+                self._end_stream(queue, _CLOSE_STREAM)
+                closed += 1
+        return closed
 
     async def start(self):
         """启动 GroupRunner"""
@@ -180,22 +390,96 @@ class GroupRunner(ABC):
         await self.broadcast(shutdown_msg)
         logger.debug(f"GroupRunner for {self.group_id} stopped")
 
+def _index_discard(index: Dict[str, Set[str]], agent_id: str, group_id: str):
+    groups = index.get(agent_id)
+    if groups is not None:
+        groups.discard(group_id)
+        if not groups:
+            del index[agent_id]
+
+
+class _MemberDict(dict):
+    """群组成员字典，增删成员时同步更新 GroupManager 的 agent -> 群组索引"""
+
+    __slots__ = ("_index", "_group_id")
+
+    def __init__(self, index: Dict[str, Set[str]], group_id: str, members: Dict[str, Agent] = None):
+        super().__init__()
+        self._index = index
+        self._group_id = group_id
+        for agent_id, agent in (members or {}).items():
+            self[agent_id] = agent
+
+    def _discard(self, agent_id: str):
+        _index_discard(self._index, agent_id, self._group_id)
+
+    def __setitem__(self, agent_id, agent):
+        super().__setitem__(agent_id, agent)
+        self._index.setdefault(agent_id, set()).add(self._group_id)
+
+    def __delitem__(self, agent_id):
+        super().__delitem__(agent_id)
+        self._discard(agent_id)
+
+    def pop(self, agent_id, *default):
+        existed = agent_id in self
+        value = super().pop(agent_id, *default)
+        if existed:
+            self._discard(agent_id)
+        return value
+
+    def popitem(self):
+        agent_id, agent = super().popitem()
+        self._discard(agent_id)
+        return agent_id, agent
+
+    def setdefault(self, agent_id, agent=None):
+        if agent_id not in self:
+            self[agent_id] = agent
+        return self[agent_id]
+
+    def update(self, *args, **kwargs):
+        for agent_id, agent in dict(*args, **kwargs).items():
+            self[agent_id] = agent
+
+    def clear(self):
+        for agent_id in list(self):
+            self._discard(agent_id)
+        super().clear()
+
+
 class GroupManager:
-    """群组管理器 - 管理所有 GroupRunner"""
+    """群组管理器 - 管理所有 GroupRunner
 
-    def __init__(self, sdk):
+    注册群组只记录 runner 类，第一次访问时才创建并启动 runner。超过 idle_timeout 秒未被访问、
+    且没有监听连接的 runner 进入休眠：成员和最近消息压缩成快照后释放 runner 对象，下次访问时
+    从快照恢复，event_id 连续，客户端可以照常用 Last-Event-ID 续传。agent 所在的群组有单独的索引，
+    按 agent 查找群组不需要唤醒任何 runner。
+    """
+
+    # 两次休眠检查之间的最小间隔（秒），检查在访问群组时顺带进行
+    SWEEP_INTERVAL = 1.0
+
+    def __init__(self, sdk, idle_timeout: float = 300.0, clock: Callable[[], float] = time.monotonic):
         self.sdk = sdk
-        self.runners: Dict[str, GroupRunner] = {}
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self.runners: "OrderedDict[str, GroupRunner]" = OrderedDict()  # 活跃的 runner，按最近访问排序
         self.custom_routes: Dict[str, str] = {}  # group_id -> custom_url_pattern
+        self._classes: Dict[str, type] = {}  # group_id -> runner_class，已注册的全部群组
+        self._snapshots: Dict[str, bytes] = {}  # group_id -> 休眠快照
+        self._last_active: Dict[str, float] = {}
+        self._member_index: Dict[str, Set[str]] = {}  # agent_id -> group_ids
+        self._next_sweep = 0.0
 
     def register_runner(self, group_id: str, runner_class: type[GroupRunner],
                        url_pattern: Optional[str] = None):
-        """注册 GroupRunner"""
-        if group_id in self.runners:
+        """注册 GroupRunner，runner 在第一次访问时创建"""
+        if group_id in self._classes or group_id in self.runners:
             logger.warning(f"GroupRunner for {group_id} already exists, replacing...")
+            self._drop(group_id)
 
-        runner = runner_class(group_id)
-        self.runners[group_id] = runner
+        self._classes[group_id] = runner_class
 
         # 保存自定义路由模式
         if url_pattern:
@@ -203,23 +487,134 @@ class GroupManager:
 
         logger.debug(f"Registered GroupRunner for group {group_id}")
 
-        # 启动 runner
-        asyncio.create_task(runner.start())
-
     def unregister_runner(self, group_id: str):
         """注销 GroupRunner"""
-        if group_id in self.runners:
-            runner = self.runners[group_id]
-            asyncio.create_task(runner.stop())
-            del self.runners[group_id]
-            if group_id in self.custom_routes:
-                del self.custom_routes[group_id]
+        if group_id in self._classes or group_id in self.runners:
+            self._drop(group_id)
+            self.custom_routes.pop(group_id, None)
             logger.debug(f"Unregistered GroupRunner for group {group_id}")
 
+    def _drop(self, group_id: str):
+        self._classes.pop(group_id, None)
+        self._last_active.pop(group_id, None)
+        snapshot = self._snapshots.pop(group_id, None)
+        if snapshot is not None:
+            for agent_id, *_ in self._decode(snapshot).get("agents", []):
+                _index_discard(self._member_index, agent_id, group_id)
+        runner = self.runners.pop(group_id, None)
+        if runner is not None:
+            if isinstance(runner.agents, _MemberDict):
+                runner.agents.clear()
+            try:
+                asyncio.get_running_loop().create_task(runner.stop())
+            except RuntimeError:
+                pass
+
+    # 超过该字节数的快照用 zlib 压缩，成员少、消息少的群组压缩收益不抵开销
+    COMPRESS_MIN_SIZE = 256
+
+    @classmethod
+    def _encode(cls, state: Dict[str, Any]) -> bytes:
+        data = dumps(state)
+        if len(data) >= cls.COMPRESS_MIN_SIZE:
+            return zlib.compress(data, 1)
+        return data
+
+    @staticmethod
+    def _decode(snapshot: bytes) -> Dict[str, Any]:
+        # JSON 对象以 "{" 开头，zlib 数据流的第一个字节不会是它
+        if snapshot[:1] != b"{":
+            snapshot = zlib.decompress(snapshot)
+        return loads(snapshot)
+
+    def _wake(self, group_id: str, runner_class: type) -> GroupRunner:
+        runner = runner_class(group_id)
+        runner.agents = _MemberDict(self._member_index, group_id, runner.agents)
+        snapshot = self._snapshots.pop(group_id, None)
+        if snapshot is not None:
+            runner.restore(self._decode(snapshot))
+        self.runners[group_id] = runner
+        try:
+            runner._start_task = asyncio.get_running_loop().create_task(runner.start())
+        except RuntimeError:
+            # 不在事件循环中时由 acquire 启动
+            runner._start_task = None
+        logger.debug(f"GroupRunner for {group_id} {'resumed' if snapshot is not None else 'created'}")
+        return runner
+
+    def hibernate(self, group_id: str) -> bool:
+        """把活跃的 runner 转为快照，有监听连接或未注册（无法重建）的 runner 不休眠"""
+        runner = self.runners.get(group_id)
+        if runner is None or group_id not in self._classes or runner.listeners:
+            return False
+        snapshot = runner.snapshot()
+        del self.runners[group_id]
+        self._last_active.pop(group_id, None)
+        self._snapshots[group_id] = self._encode(snapshot)
+        task = getattr(runner, "_start_task", None)
+        if task is not None and not task.done():
+            task.cancel()
+        return True
+
+    def sweep_idle(self) -> int:
+        """休眠所有超过 idle_timeout 未访问的 runner，返回休眠的数量"""
+        now = self._clock()
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        hibernated = 0
+        deadline = now - self.idle_timeout
+        # runners 按最近访问排序，只需检查头部；不能休眠的 runner 移到尾部
+        checked = 0
+        while self.runners and checked < len(self.runners):
+            group_id = next(iter(self.runners))
+            last_active = self._last_active.get(group_id)
+            if last_active is not None and last_active > deadline:
+                break
+            if self.hibernate(group_id):
+                hibernated += 1
+            else:
+                checked += 1
+                self._touch(group_id, now)
+        if hibernated:
+            logger.debug(f"{hibernated} 个空闲群组进入休眠，活跃 {len(self.runners)} 个")
+        return hibernated
+
+    def _touch(self, group_id: str, now: float):
+        self._last_active[group_id] = now
+        self.runners.move_to_end(group_id)
+
     def get_runner(self, group_id: str) -> Optional[GroupRunner]:
-        """获取群组的 runner"""
-        return self.runners.get(group_id)
+        """获取群组的 runner，休眠或尚未创建的 runner 在此时创建"""
+        now = self._clock()
+        if now >= self._next_sweep:
+            self.sweep_idle()
+        runner = self.runners.get(group_id)
+        if runner is None:
+            runner_class = self._classes.get(group_id)
+            if runner_class is None:
+                return None
+            runner = self._wake(group_id, runner_class)
+        self._touch(group_id, now)
+        return runner
+
+    async def acquire(self, group_id: str) -> Optional[GroupRunner]:
+        """获取群组的 runner 并等待其启动完成"""
+        runner = self.get_runner(group_id)
+        if runner is None:
+            return None
+        task = getattr(runner, "_start_task", None)
+        if task is None and not runner._running:
+            task = runner._start_task = asyncio.ensure_future(runner.start())
+        if task is not None:
+            await task
+        return runner
+
+    def is_hibernated(self, group_id: str) -> bool:
+        return group_id in self._snapshots
+
+    def groups_of(self, agent_id: str) -> List[str]:
+        """agent 所在的群组，不唤醒休眠的 runner"""
+        return list(self._member_index.get(agent_id, ()))
 
     def list_groups(self) -> List[str]:
         """列出所有群组"""
-        return list(self.runners.keys())
\ No newline at end of file
+        return list(dict.fromkeys([*self._classes, *self.runners]))
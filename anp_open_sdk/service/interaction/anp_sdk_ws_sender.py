@@ -0,0 +1,117 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+import asyncio
+from typing import Callable, Optional
+
+from fastapi import WebSocket
+
+from anp_open_sdk.utils.log_base import logging as logger
+
+
+class WebSocketSender:
+    """单个 WebSocket 连接的发送端
+
+    每个连接有一个有界发送队列和独立的写任务，广播只需把编码好的文本放入队列，
+    不会等待任何一个连接。队列长度超过高水位并持续 slow_timeout 秒，或者队列已满时，
+    认为客户端消费过慢并关闭连接。
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int = 1024, high_water: int = 256,
+                 slow_timeout: float = 5.0, on_close: Optional[Callable[["WebSocketSender"], None]] = None):
+        self.websocket = websocket
+        self.high_water = high_water
+        self.slow_timeout = slow_timeout
+        self.on_close = on_close
+        self.closed = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._slow_timer: Optional[asyncio.TimerHandle] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        # 同步上下文中发起的关闭任务，保留引用以免任务在完成前被回收
+        self._close_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer_task = asyncio.create_task(self._writer())
+        return self
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def enqueue(self, text: str) -> bool:
+        """放入一条已编码的消息，连接已关闭或被判定为慢消费者时返回 False"""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(text)
+        except asyncio.QueueFull:
+            logger.warning(f"WebSocket发送队列已满，关闭慢速连接: {id(self.websocket)}")
+            self._schedule_close(code=1008)
+            return False
+        if self._slow_timer is None and self._queue.qsize() > self.high_water:
+            self._slow_timer = asyncio.get_running_loop().call_later(self.slow_timeout, self._check_slow)
+        return True
+
+    def _check_slow(self):
+        self._slow_timer = None
+        if not self.closed and self._queue.qsize() > self.high_water:
+            logger.warning(f"WebSocket连接超过高水位 {self.slow_timeout} 秒，关闭慢速连接: {id(self.websocket)}")
+            self._schedule_close(code=1008)
+
+    def _schedule_close(self, code: int):
+        """在不能 await 的地方发起关闭，同一连接只创建一个关闭任务"""
+        if self._close_task is None:
+            self._close_task = asyncio.create_task(self.close(code=code))
+
+    async def _writer(self):
+        try:
+            while True:
+                text = await self._queue.get()
+                try:
+                    await self.websocket.send_text(text)
+                finally:
+                    self._queue.task_done()
+                if self._slow_timer is not None and self._queue.qsize() <= self.high_water:
+                    self._slow_timer.cancel()
+                    self._slow_timer = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"WebSocket发送失败: {e}")
+            await self.close()
+
+    async def shutdown(self, notice: str, timeout: float = 1.0):
+        """服务停机时调用：把队列中已有的消息和停机通知发完（最多 timeout 秒），再以 1012 关闭"""
+        if self.closed:
+            return
+        try:
+            self._queue.put_nowait(notice)
+        except asyncio.QueueFull:
+            pass
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.debug(f"WebSocket连接未能在停机前发完队列: {id(self.websocket)}")
+        await self.close(code=1012)
+
+    async def close(self, code: int = 1000):
+        """停止写任务并关闭连接，可重复调用"""
+        if self.closed:
+            return
+        self.closed = True
+        if self._slow_timer is not None:
+            self._slow_timer.cancel()
+            self._slow_timer = None
+        if self._writer_task is not None and self._writer_task is not asyncio.current_task():
+            self._writer_task.cancel()
+        if self.on_close:
+            self.on_close(self)
+        try:
+            # 慢速连接可能连关闭帧都写不出去，不无限等待
+            await asyncio.wait_for(self.websocket.close(code=code), timeout=1.0)
+        except Exception:
+            pass
@@ -15,6 +15,7 @@ logger = logging.getLogger(__name__)
 
 from anp_open_sdk.agent_connect_hotpatch.authentication.did_wba_auth_header import DIDWbaAuthHeader
 from anp_open_sdk.auth.auth_client import agent_auth_request
+from anp_open_sdk.utils.serialization import dumps_str, loads
 
 
 
@@ -146,7 +147,7 @@ class ANPTool:
             except Exception as e:
                 logger.debug(f"获取认证头失败: {str(e)}")
 
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(json_serialize=dumps_str) as session:
             # 准备请求参数
             request_kwargs = {
                 "url": url,
@@ -205,22 +206,22 @@ class ANPTool:
         # 获取响应内容类型
         content_type = response.headers.get("Content-Type", "").lower()
 
-        # 获取响应文本
-        text = await response.text()
-
         # 根据内容类型处理响应
         if "application/json" in content_type:
-            # 处理 JSON 响应
+            # 处理 JSON 响应，直接解析字节，不先解码为文本
+            raw = await response.read()
             try:
-                result = json.loads(text)
+                result = loads(raw)
                 logger.debug("成功解析 JSON 响应")
-            except json.JSONDecodeError:
+            except ValueError:
+                text = raw.decode(response.get_encoding(), errors="replace")
                 logger.warning(
                     "Content-Type 声明为 JSON 但解析失败，返回原始文本"
                 )
                 result = {"text": text, "format": "text", "content_type": content_type}
         elif "application/yaml" in content_type or "application/x-yaml" in content_type:
             # 处理 YAML 响应
+            text = await response.text()
             try:
                 result = yaml.safe_load(text)
                 logger.debug("成功解析 YAML 响应")
@@ -236,6 +237,7 @@ class ANPTool:
                 result = {"text": text, "format": "text", "content_type": content_type}
         else:
             # 默认返回文本
+            text = await response.text()
             result = {"text": text, "format": "text", "content_type": content_type}
 
         # 添加状态码到结果
@@ -352,9 +354,9 @@ class ANPTool:
         elif isinstance(response, str):
             # 尝试解析为 JSON
             try:
-                result = json.loads(response)
+                result = loads(response)
                 logger.debug("成功解析 JSON 响应")
-            except json.JSONDecodeError:
+            except ValueError:
                 # 如果不是 JSON，作为文本处理
                 result = {
                     "text": response,
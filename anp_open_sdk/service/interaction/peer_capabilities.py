@@ -0,0 +1,153 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+对端载荷类型协商
+
+智能体在 ad.json 的 "ad:supportedContentTypes" 中声明自己可以收发的载荷类型。
+调用方第一次访问某个 DID 时读取一次 ad.json 并按 DID 缓存结果，对端声明支持
+MessagePack 且本端安装了 msgpack 时才用 MessagePack 发送请求；ad.json 缺少该字段
+（旧版本智能体）、读取失败或对端返回 415 时一律使用 JSON。
+"""
+
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple
+from urllib.parse import quote
+
+import aiohttp
+
+from anp_open_sdk.auth.auth_client import agent_auth_request
+from anp_open_sdk.auth.did_auth_wba import parse_wba_did_host_port
+from anp_open_sdk.utils.serialization import (
+    JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, loads, msgpack_available
+)
+
+import logging
+logger = logging.getLogger(__name__)
+
+AD_CONTENT_TYPES_KEY = "ad:supportedContentTypes"
+
+_JSON_ONLY: FrozenSet[str] = frozenset({JSON_CONTENT_TYPE})
+
+
+def msgpack_request_headers() -> Dict[str, str]:
+    """用 MessagePack 发送请求时附加的请求头，响应仍接受 JSON"""
+    return {
+        "Content-Type": MSGPACK_CONTENT_TYPE,
+        "Accept": f"{MSGPACK_CONTENT_TYPE}, {JSON_CONTENT_TYPE};q=0.9",
+    }
+
+
+class PeerCapabilities:
+    """按 DID 缓存对端在 ad.json 中声明的载荷类型，有界 LRU，带过期时间"""
+
+    def __init__(self, ttl: float = 300.0, failure_ttl: float = 60.0, max_entries: int = 1024,
+                 timeout: float = 3.0, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[FrozenSet[str], float]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def ad_url(did: str, base_url: Optional[str] = None) -> str:
+        """对端 ad.json 地址，base_url 缺省时从 DID 中解析主机和端口"""
+        if base_url is None:
+            host, port = parse_wba_did_host_port(did)
+            base_url = f"http://{host}:{port}"
+        return f"{base_url.rstrip('/')}/wba/user/{quote(did)}/ad.json"
+
+    def _store(self, did: str, types: FrozenSet[str], ttl: float):
+        self._entries[did] = (types, self._clock() + ttl)
+        self._entries.move_to_end(did)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def mark_json_only(self, did: str):
+        """对端声明支持但拒绝了 MessagePack 请求（如 415），在缓存期内改用 JSON"""
+        self._store(did, _JSON_ONLY, self.ttl)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def _fetch(self, did: str, base_url: Optional[str]) -> FrozenSet[str]:
+        url = self.ad_url(did, base_url)
+        types, ttl = _JSON_ONLY, self.failure_ttl
+        try:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        document = loads(await response.read())
+                        ttl = self.ttl
+                        declared = document.get(AD_CONTENT_TYPES_KEY) if isinstance(document, dict) else None
+                        if isinstance(declared, list):
+                            types = _JSON_ONLY | frozenset(
+                                t.split(";", 1)[0].strip().lower() for t in declared if isinstance(t, str)
+                            )
+                    else:
+                        logger.debug(f"获取 {url} 失败: HTTP {response.status}，使用 JSON")
+        except Exception as e:
+            logger.debug(f"获取 {url} 失败: {e}，使用 JSON")
+        self._store(did, types, ttl)
+        return types
+
+    async def content_types(self, did: str, base_url: Optional[str] = None) -> FrozenSet[str]:
+        """对端声明的载荷类型，总是包含 JSON；同一 DID 的并发查询只请求一次 ad.json"""
+        entry = self._entries.get(did)
+        if entry is not None and entry[1] > self._clock():
+            self._entries.move_to_end(did)
+            return entry[0]
+        task = self._pending.get(did)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(did, base_url))
+            self._pending[did] = task
+            task.add_done_callback(lambda _: self._pending.pop(did, None))
+        return await task
+
+    async def supports_msgpack(self, did: Optional[str], base_url: Optional[str] = None) -> bool:
+        if not did or not msgpack_available():
+            return False
+        return MSGPACK_CONTENT_TYPE in await self.content_types(did, base_url)
+
+
+peer_capabilities = PeerCapabilities()
+
+
+async def negotiated_auth_request(caller_agent: str, target_agent: str, request_url: str,
+                                  json_data: Any) -> Tuple[int, Any, str, bool]:
+    """
+    带认证的 POST 请求，对端支持时使用 MessagePack。
+
+    对端返回 415 时记为仅 JSON 并用 JSON 重发一次，返回值与 agent_auth_request 相同。
+    """
+    if await peer_capabilities.supports_msgpack(target_agent):
+        result = await agent_auth_request(
+            caller_agent, target_agent, request_url, method="POST", json_data=json_data,
+            custom_headers=msgpack_request_headers()
+        )
+        if result[0] != 415:
+            return result
+        logger.debug(f"{target_agent} 拒绝了 MessagePack 请求，改用 JSON")
+        peer_capabilities.mark_json_only(target_agent)
+    return await agent_auth_request(
+        caller_agent, target_agent, request_url, method="POST", json_data=json_data
+    )
@@ -0,0 +1,116 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+已发布智能体目录
+
+按 DID 排序的内存索引，随智能体注册/注销增量维护，供 /publisher/agents 分页查询，
+不再每次请求都遍历并构造全部智能体。
+"""
+
+import bisect
+import threading
+import urllib.parse
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from anp_open_sdk.utils.pagination import encode_cursor, decode_cursor
+
+AGENT_FIELDS = ("did", "name", "hosted", "server", "agent_type")
+
+
+def did_server(did: str) -> str:
+    """did:wba:localhost%3A9527:wba:user:xxx -> localhost:9527"""
+    parts = did.split(":")
+    if len(parts) < 3:
+        return ""
+    return urllib.parse.unquote(parts[2])
+
+
+class AgentDirectory:
+    """按 DID 排序的智能体目录"""
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._order: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def add(self, agent) -> Dict[str, Any]:
+        did = str(getattr(agent, "id", "unknown"))
+        entry = {
+            "did": did,
+            "name": getattr(agent, "name", "unknown"),
+            "hosted": bool(getattr(agent, "is_hosted_did", False)),
+            "server": did_server(did),
+            "agent_type": getattr(agent, "agent_type", None),
+        }
+        with self._lock:
+            if did not in self._entries:
+                bisect.insort(self._order, did)
+            self._entries[did] = entry
+        return entry
+
+    def remove(self, did: str) -> bool:
+        with self._lock:
+            if self._entries.pop(did, None) is None:
+                return False
+            index = bisect.bisect_left(self._order, did)
+            del self._order[index]
+            return True
+
+    def page(self, cursor: Optional[str] = None, limit: Optional[int] = 100, hosted: Optional[bool] = None,
+             name_prefix: Optional[str] = None, server: Optional[str] = None,
+             fields: Optional[Sequence[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按 DID 顺序取一页符合条件的智能体，limit 为 None 时返回全部。
+
+        Returns:
+            (本页记录, 下一页游标)，没有更多记录时游标为 None
+
+        Raises:
+            ValueError: 游标或字段名无效
+        """
+        if fields:
+            unknown = [f for f in fields if f not in AGENT_FIELDS]
+            if unknown:
+                raise ValueError(f"未知字段: {', '.join(unknown)}")
+        after = decode_cursor(cursor)[0] if cursor else None
+        if after is not None and not isinstance(after, str):
+            raise ValueError(f"无效的分页游标: {cursor}")
+
+        results = []
+        has_more = False
+        with self._lock:
+            start = bisect.bisect_right(self._order, after) if after is not None else 0
+            for did in self._order[start:]:
+                entry = self._entries[did]
+                if hosted is not None and entry["hosted"] != hosted:
+                    continue
+                if name_prefix and not str(entry["name"]).startswith(name_prefix):
+                    continue
+                if server and entry["server"] != server:
+                    continue
+                if len(results) == limit:
+                    has_more = True
+                    break
+                results.append(entry)
+
+        next_cursor = encode_cursor([results[-1]["did"]]) if has_more else None
+        if fields:
+            results = [{f: entry[f] for f in fields} for entry in results]
+        else:
+            results = [dict(entry) for entry in results]
+        return results, next_cursor
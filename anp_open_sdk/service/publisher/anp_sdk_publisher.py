@@ -1,10 +1,131 @@
 import os
 import json
+import asyncio
+import hashlib
 import secrets
+import sqlite3
+import threading
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from anp_open_sdk.utils.log_base import  logging as logger
 import socket
 
+
+_host_ip_cache: Dict[str, str] = {}
+
+
+async def resolve_host_ip(hostname: str) -> str:
+    """异步解析主机IP并缓存，避免 gethostbyname 阻塞事件循环"""
+    ip = _host_ip_cache.get(hostname)
+    if ip is None:
+        loop = asyncio.get_running_loop()
+        ip = await loop.run_in_executor(None, socket.gethostbyname, hostname)
+        _host_ip_cache[hostname] = ip
+    return ip
+
+
+def did_key_fingerprints(did_document: dict) -> List[str]:
+    """计算DID文档中每个验证方法公钥材料的指纹"""
+    fingerprints = []
+    for method in did_document.get('verificationMethod') or []:
+        if not isinstance(method, dict):
+            continue
+        material = {k: v for k, v in method.items()
+                    if k in ('publicKeyJwk', 'publicKeyMultibase', 'publicKeyBase58', 'publicKeyPem', 'publicKeyHex')}
+        if material:
+            canonical = json.dumps(material, sort_keys=True, separators=(',', ':'))
+            fingerprints.append(hashlib.sha256(canonical.encode('utf-8')).hexdigest())
+    return fingerprints
+
+
+class _IndexConflict(Exception):
+    pass
+
+
+class HostedDIDIndex:
+    """托管DID索引
+
+    在托管目录下用 SQLite 记录 DID ID 和公钥指纹到 sid 的映射，
+    查重只需一次索引查询。SQLite 负责跨进程写锁，进程内再加一把线程锁。
+    """
+
+    INDEX_FILE = "hosted_did_index.sqlite3"
+
+    def __init__(self, hosted_dir: Path):
+        self.hosted_dir = Path(hosted_dir)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.hosted_dir / self.INDEX_FILE), check_same_thread=False, timeout=30)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS dids (did_id TEXT PRIMARY KEY, sid TEXT NOT NULL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS fingerprints (fingerprint TEXT PRIMARY KEY, sid TEXT NOT NULL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            built = self._db.execute("SELECT value FROM meta WHERE key = 'built'").fetchone()
+        if not built:
+            self.rebuild()
+
+    def rebuild(self) -> int:
+        """从托管目录中的 did_document_request.json 重建索引"""
+        entries = []
+        for user_req in self.hosted_dir.glob('user_*/did_document_request.json'):
+            try:
+                with open(user_req, 'r', encoding='utf-8') as f:
+                    req_doc = json.load(f)
+            except Exception as e:
+                logger.error(f"读取DID文档失败: {e}")
+                continue
+            if req_doc.get('id'):
+                entries.append((req_doc['id'], user_req.parent.name[len('user_'):], did_key_fingerprints(req_doc)))
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM dids")
+            self._db.execute("DELETE FROM fingerprints")
+            for did_id, sid, fingerprints in entries:
+                self._db.execute("INSERT OR IGNORE INTO dids VALUES (?, ?)", (did_id, sid))
+                self._db.executemany("INSERT OR IGNORE INTO fingerprints VALUES (?, ?)",
+                                     [(fp, sid) for fp in fingerprints])
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('built', '1')")
+        logger.debug(f"托管DID索引已重建，共 {len(entries)} 个DID")
+        return len(entries)
+
+    def contains(self, did_id: str, fingerprints: List[str] = ()) -> bool:
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM dids WHERE did_id = ?", (did_id,)).fetchone():
+                return True
+            for fp in fingerprints:
+                if self._db.execute("SELECT 1 FROM fingerprints WHERE fingerprint = ?", (fp,)).fetchone():
+                    return True
+        return False
+
+    def reserve(self, did_id: str, fingerprints: List[str], sid: str) -> bool:
+        """登记DID，DID或公钥已属于其他sid时返回False"""
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute("BEGIN IMMEDIATE")
+                    owner = self._db.execute("SELECT sid FROM dids WHERE did_id = ?", (did_id,)).fetchone()
+                    if owner and owner[0] != sid:
+                        raise _IndexConflict()
+                    for fp in fingerprints:
+                        owner = self._db.execute("SELECT sid FROM fingerprints WHERE fingerprint = ?", (fp,)).fetchone()
+                        if owner and owner[0] != sid:
+                            raise _IndexConflict()
+                    self._db.execute("INSERT OR IGNORE INTO dids VALUES (?, ?)", (did_id, sid))
+                    self._db.executemany("INSERT OR IGNORE INTO fingerprints VALUES (?, ?)",
+                                         [(fp, sid) for fp in fingerprints])
+                return True
+            except _IndexConflict:
+                return False
+
+    def release(self, sid: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM dids WHERE sid = ?", (sid,))
+            self._db.execute("DELETE FROM fingerprints WHERE sid = ?", (sid,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM dids").fetchone()[0]
+
+
 class DIDManager:
     """DID管理器，用于处理DID文档的存储和管理"""
     
@@ -15,17 +136,35 @@ class DIDManager:
         Args:
             hosted_dir: DID托管目录路径，如果为None则使用默认路径
         """
-        from anp_open_sdk.config import get_global_config
-        config = get_global_config()
         if hosted_dir is None:
+            from anp_open_sdk.config import get_global_config
+            config = get_global_config()
             self.hosted_dir = Path(config.anp_sdk.user_hosted_path)
+        else:
+            self.hosted_dir = Path(hosted_dir)
         self.hosted_dir.mkdir(parents=True, exist_ok=True)
         
-        # 获取主机配置
+        self.index = HostedDIDIndex(self.hosted_dir)
+
+        # 获取主机配置，IP 在首次使用时解析并缓存
         self.hostname = socket.gethostname()
-        self.hostip = socket.gethostbyname(self.hostname)
         self.hostport = os.environ.get('HOST_DID_PORT', '9527')
         self.hostdomain = os.environ.get('HOST_DID_DOMAIN', 'localhost')
+
+    @property
+    def hostip(self) -> str:
+        ip = _host_ip_cache.get(self.hostname)
+        if ip is None:
+            ip = socket.gethostbyname(self.hostname)
+            _host_ip_cache[self.hostname] = ip
+        return ip
+
+    async def get_host_ip(self) -> str:
+        return await resolve_host_ip(self.hostname)
+
+    def rebuild_index(self) -> int:
+        """从磁盘重建托管DID索引"""
+        return self.index.rebuild()
     
     def is_duplicate_did(self, did_document: dict) -> bool:
         """
@@ -37,44 +176,32 @@ class DIDManager:
         Returns:
             bool: 是否存在重复的DID
         """
-        def _get_did_id(did_document):
-            if isinstance(did_document, str):  # 可能是 JSON 字符串
-                try:
-                    did_document = json.loads(did_document)  # 解析 JSON
-                except json.JSONDecodeError:
-                    return None  # 解析失败，返回 None
-            if isinstance(did_document, dict):  # 确保是字典
-                return did_document.get('id')  # 取值
-            return None
-
-
-        did_id = _get_did_id(did_document)
-        if not did_id:
-            return False
-            
-        for user_req in self.hosted_dir.glob('user_*/did_document_request.json'):
+        if isinstance(did_document, str):  # 可能是 JSON 字符串
             try:
-                with open(user_req, 'r', encoding='utf-8') as f:
-                    req_doc = json.load(f)
-                if req_doc.get('id') == did_id:
-                    return True
-            except Exception as e:
-                logger.error(f"读取DID文档失败: {e}")
-        return False
+                did_document = json.loads(did_document)  # 解析 JSON
+            except json.JSONDecodeError:
+                return False  # 解析失败
+        if not isinstance(did_document, dict) or not did_document.get('id'):
+            return False
+
+        return self.index.contains(did_document['id'], did_key_fingerprints(did_document))
     
-    def store_did_document(self, did_document: dict) -> tuple[bool, str, str]:
+    def store_did_document(self, did_document: dict, sid: str = None) -> tuple[bool, str, str]:
         """
         存储DID文档
         
         Args:
             did_document: DID文档
+            sid: 托管目录的会话ID，为None时随机生成；重试时传入相同的sid会覆盖同一目录
             
         Returns:
             tuple: (是否成功, 新的DID ID, 错误信息)
         """
         try:
             # 生成新的sid
-            sid = secrets.token_hex(8)
+            sid = sid or secrets.token_hex(8)
+            if not self.index.reserve(did_document.get('id'), did_key_fingerprints(did_document), sid):
+                return False, "", f"DID已存在: {did_document.get('id')}"
             user_dir = self.hosted_dir / f"user_{sid}"
             user_dir.mkdir(parents=True, exist_ok=True)
             
@@ -94,6 +221,7 @@ class DIDManager:
             return True, modified_doc, ""
             
         except Exception as e:
+            self.index.release(sid)
             error_msg = f"存储DID文档失败: {e}"
             logger.error(error_msg)
             return False, "", error_msg
@@ -141,4 +269,176 @@ class DIDManager:
             did_document = replace_all_old_id(did_document, old_id, new_id)
     
                         
-        return did_document 
\ No newline at end of file
+        return did_document
+
+
+class HostedRequestJournal:
+    """托管DID请求处理日志
+
+    以邮件 message_id 为键记录每个请求的处理阶段，保证中途崩溃后重新处理时
+    不会重复创建托管DID目录：
+    - claimed: 已通过重复检查并分配了sid，待存储和回复
+    - failed: 存储DID文档失败，邮件保持未读，下次处理时用同一sid重试
+    - rejected: 重复的DID申请，待回复
+    - replied: 已回复，只剩标记已读
+    """
+
+    def __init__(self, journal_path: Path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(journal_path), check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS hosted_requests ("
+                " message_id TEXT PRIMARY KEY,"
+                " did_id TEXT,"
+                " status TEXT NOT NULL,"
+                " sid TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(hosted_requests)")}
+            if "attempts" not in columns:
+                self._db.execute("ALTER TABLE hosted_requests ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_hosted_requests_did ON hosted_requests (did_id)")
+
+    def get(self, message_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT status, sid FROM hosted_requests WHERE message_id = ?", (message_id,)
+            ).fetchone()
+
+    def claim(self, message_id: str, did_id: str, is_duplicate) -> Tuple[str, Optional[str]]:
+        """为请求登记处理决定，已登记的请求直接返回原决定"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, sid FROM hosted_requests WHERE message_id = ?", (message_id,)
+            ).fetchone()
+            if row:
+                return row
+            claimed = self._db.execute(
+                "SELECT 1 FROM hosted_requests WHERE did_id = ? AND status != 'rejected' LIMIT 1", (did_id,)
+            ).fetchone()
+            if claimed or is_duplicate():
+                status, sid = "rejected", None
+            else:
+                status, sid = "claimed", secrets.token_hex(8)
+            with self._db:
+                self._db.execute(
+                    "INSERT INTO hosted_requests (message_id, did_id, status, sid) VALUES (?, ?, ?, ?)",
+                    (message_id, did_id, status, sid)
+                )
+            return status, sid
+
+    def mark_failed(self, message_id: str) -> int:
+        """记录一次存储失败，返回累计失败次数"""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE hosted_requests SET status = 'failed', attempts = attempts + 1 WHERE message_id = ?",
+                (message_id,)
+            )
+            row = self._db.execute("SELECT attempts FROM hosted_requests WHERE message_id = ?", (message_id,)).fetchone()
+        return row[0] if row else 0
+
+    def mark_replied(self, message_id: str):
+        with self._lock, self._db:
+            self._db.execute("UPDATE hosted_requests SET status = 'replied' WHERE message_id = ?", (message_id,))
+
+
+class HostedDIDRequestProcessor:
+    """托管DID请求处理流水线
+
+    拉取未读请求后在线程池中并发校验和创建托管目录（并发数受限），
+    然后批量发送回复并逐条标记已读。每条请求的处理阶段记录在
+    HostedRequestJournal 中，重复执行是幂等的。存储失败的请求不回复也不标记已读，
+    留到下一批重试，连续失败 MAX_STORE_ATTEMPTS 次后才回复失败。
+    """
+
+    JOURNAL_FILE = "hosted_requests.sqlite3"
+    MAX_STORE_ATTEMPTS = 3
+
+    def __init__(self, mail_manager, did_manager: DIDManager, max_concurrency: int = 8):
+        self.mail_manager = mail_manager
+        self.did_manager = did_manager
+        self.max_concurrency = max_concurrency
+        self.journal = HostedRequestJournal(did_manager.hosted_dir / self.JOURNAL_FILE)
+
+    @staticmethod
+    def _parse_request(request: dict) -> Optional[dict]:
+        did_document = request.get('content', request.get('did_document'))
+        if isinstance(did_document, str):
+            try:
+                did_document = json.loads(did_document)
+            except json.JSONDecodeError:
+                return None
+        if not isinstance(did_document, dict) or not did_document.get('id'):
+            return None
+        return did_document
+
+    def _process_one(self, request: dict) -> Tuple[Optional[tuple], str]:
+        """处理单个请求，返回 (待发送的回复, 结果描述)"""
+        from_address = request['from_address']
+        message_id = str(request['message_id'])
+        did_document = self._parse_request(request)
+        if did_document is None:
+            return (from_address, "DID托管申请失败", "无法解析DID文档"), f"{from_address}的DID文档无法解析\n"
+
+        did_id = did_document['id']
+        row = self.journal.get(message_id)
+        if row and row[0] == "replied":
+            return None, f"{from_address}的DID {did_id} 已回复，补标已读\n"
+
+        status, sid = self.journal.claim(message_id, did_id, lambda: self.did_manager.is_duplicate_did(did_document))
+        if status == "rejected":
+            return (from_address, "DID已申请", "重复的DID申请，请联系管理员"), \
+                f"{from_address}的DID {did_id} 已申请，退回\n"
+
+        success, new_did_doc, error = self.did_manager.store_did_document(did_document, sid=sid)
+        if success:
+            return (from_address, "ANP HOSTED DID RESPONSED", new_did_doc), \
+                f"{from_address}的DID {new_did_doc['id']} 已保存\n"
+        attempts = self.journal.mark_failed(message_id)
+        if attempts < self.MAX_STORE_ATTEMPTS:
+            raise RuntimeError(f"{error}，第{attempts}次失败，稍后重试")
+        return (from_address, "DID托管申请失败", f"处理DID文档时发生错误: {error}"), \
+            f"{from_address}的DID处理失败: {error}\n"
+
+    def _reply_and_ack(self, message_id: str, reply: Optional[tuple]):
+        if reply is not None:
+            if not self.mail_manager.send_reply_email(*reply):
+                raise RuntimeError(f"回复邮件发送失败: {reply[0]}")
+            self.journal.mark_replied(message_id)
+        self.mail_manager.mark_message_as_read(message_id)
+
+    async def run(self, limit: int = None) -> str:
+        """处理一批未读的托管DID请求，返回处理结果描述"""
+        did_requests = await asyncio.to_thread(self.mail_manager.get_unread_did_requests, limit)
+        if not did_requests:
+            return "没有新的DID托管请求"
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _bounded(func, *args):
+            async with semaphore:
+                return await asyncio.to_thread(func, *args)
+
+        processed = await asyncio.gather(
+            *(_bounded(self._process_one, request) for request in did_requests),
+            return_exceptions=True
+        )
+
+        result = "开始处理DID托管请求\n"
+        acks = []
+        for request, outcome in zip(did_requests, processed):
+            if isinstance(outcome, BaseException):
+                logger.error(f"处理DID托管请求 {request.get('message_id')} 失败: {outcome}")
+                result += f"{request.get('from_address')}的DID处理失败: {outcome}\n"
+                continue
+            reply, summary = outcome
+            result += summary
+            acks.append(_bounded(self._reply_and_ack, str(request['message_id']), reply))
+
+        for error in await asyncio.gather(*acks, return_exceptions=True):
+            if isinstance(error, BaseException):
+                logger.error(f"回复DID托管请求失败: {error}")
+        return result
+
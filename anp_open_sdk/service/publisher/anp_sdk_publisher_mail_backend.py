@@ -13,9 +13,13 @@
 # limitations under the License.
 
 from anp_open_sdk.config import get_global_config
+import os
 import json
 import time
+import atexit
+import sqlite3
 import imaplib
+import threading
 import smtplib
 import email
 from email.mime.text import MIMEText
@@ -35,7 +39,7 @@ class MailBackend(ABC):
         pass
     
     @abstractmethod
-    def get_unread_emails(self, subject_filter: str = None) -> List[Dict]:
+    def get_unread_emails(self, subject_filter: str = None, limit: int = None) -> List[Dict]:
         """获取未读邮件"""
         pass
     
@@ -46,21 +50,153 @@ class MailBackend(ABC):
 
 
 class LocalFileMailBackend(MailBackend):
-    """本地文件邮件后端，用于测试"""
-    
+    """本地文件邮件后端，用于测试
+
+    每封邮件仍以 JSON 文件保存在 inbox/read/sent 目录，同时在 SQLite 中维护
+    message_id -> 文件、已读标记和时间戳的索引。查询未读邮件和标记已读
+    都只访问索引和目标文件，不再扫描整个收件箱。其他进程直接放入 inbox 的文件
+    在查询未读邮件时补进索引：本后端自己写入或移走文件后记下目录的新 mtime，
+    只有观察到的 mtime 与记录不同时才扫描收件箱，且两次扫描至少间隔
+    EXTERNAL_SCAN_INTERVAL 秒；另每隔 FULL_SCAN_INTERVAL 秒无条件扫描一次，
+    兜住 mtime 精度不足或与自身写入同时发生的外部写入。
+    """
+
+    INDEX_FILE = "mail_index.sqlite3"
+    EXTERNAL_SCAN_INTERVAL = 1.0
+    FULL_SCAN_INTERVAL = 60.0
+
+    _last_timestamp = 0
+    _timestamp_lock = threading.Lock()
+
+    @classmethod
+    def _next_timestamp(cls) -> int:
+        """毫秒时间戳，同一毫秒内多次发送时顺延，保证 message_id 和文件名不重复"""
+        with cls._timestamp_lock:
+            timestamp = max(int(time.time() * 1000), cls._last_timestamp + 1)
+            cls._last_timestamp = timestamp
+            return timestamp
+
     def __init__(self, mail_dir: str = None):
         self.mail_dir = Path(mail_dir or "./local_mail_storage")
-        self.mail_dir.mkdir(exist_ok=True)
-        
+        self.mail_dir.mkdir(parents=True, exist_ok=True)
+
         # 创建子目录
         (self.mail_dir / "inbox").mkdir(exist_ok=True)
         (self.mail_dir / "sent").mkdir(exist_ok=True)
         (self.mail_dir / "read").mkdir(exist_ok=True)
-    
+
+        self._index_lock = threading.Lock()
+        self._index = sqlite3.connect(str(self.mail_dir / self.INDEX_FILE), check_same_thread=False)
+        self._inbox_mtime = None
+        self._last_scan = float("-inf")
+        self._init_index()
+
+    def close(self):
+        with self._index_lock:
+            self._index.close()
+
+    def _init_index(self):
+        with self._index_lock, self._index:
+            self._index.execute("PRAGMA journal_mode=WAL")
+            self._index.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " file_name TEXT PRIMARY KEY,"
+                " folder TEXT NOT NULL,"
+                " message_id TEXT NOT NULL,"
+                " subject TEXT,"
+                " timestamp INTEGER,"
+                " read INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._index.execute("CREATE INDEX IF NOT EXISTS idx_messages_id ON messages (message_id)")
+            self._index.execute("CREATE INDEX IF NOT EXISTS idx_messages_unread ON messages (read, timestamp)")
+            self._index.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            migrated = self._index.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone()
+        if not migrated:
+            self.rebuild_index()
+
+    @staticmethod
+    def _read_index_row(email_file: Path, folder: str):
+        """读取邮件文件生成索引行，文件无法读取时返回 None"""
+        try:
+            with open(email_file, 'r', encoding='utf-8') as f:
+                email_data = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取邮件文件失败 {email_file}: {e}")
+            return None
+        return (
+            email_file.name,
+            folder,
+            str(email_data.get("message_id", "")),
+            email_data.get("subject", ""),
+            email_data.get("timestamp", 0),
+            1 if folder == "read" or email_data.get("read", False) else 0
+        )
+
+    def rebuild_index(self) -> int:
+        """从 inbox 和 read 目录中的邮件文件重建索引，用于迁移已有数据"""
+        rows = []
+        for folder in ("inbox", "read"):
+            for email_file in (self.mail_dir / folder).glob("*.json"):
+                row = self._read_index_row(email_file, folder)
+                if row is not None:
+                    rows.append(row)
+        with self._index_lock, self._index:
+            self._index.execute("DELETE FROM messages")
+            self._index.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._index.execute("INSERT OR REPLACE INTO meta VALUES ('migrated', ?)", (str(int(time.time())),))
+        logger.debug(f"本地邮件索引已重建，共 {len(rows)} 封邮件")
+        return len(rows)
+
+    def _stat_inbox(self):
+        try:
+            return os.stat(self.mail_dir / "inbox").st_mtime_ns
+        except OSError:
+            return None
+
+    def _note_own_change(self, mtime_before):
+        """本后端修改收件箱后记下新的 mtime；修改前已有未扫描的变化时保持原记录，留给下次扫描"""
+        if mtime_before is not None and mtime_before == self._inbox_mtime:
+            self._inbox_mtime = self._stat_inbox()
+
+    def _sync_inbox(self) -> int:
+        """收件箱出现外部变化时把不在索引中的邮件文件补进索引，返回新增数量"""
+        now = time.monotonic()
+        if now - self._last_scan < self.EXTERNAL_SCAN_INTERVAL:
+            return 0
+        mtime = self._stat_inbox()
+        if mtime is None:
+            return 0
+        if mtime == self._inbox_mtime and now - self._last_scan < self.FULL_SCAN_INTERVAL:
+            return 0
+        self._last_scan = now
+        return self._scan_inbox(mtime)
+
+    def _scan_inbox(self, mtime) -> int:
+        inbox_dir = self.mail_dir / "inbox"
+        with self._index_lock:
+            indexed = {row[0] for row in self._index.execute("SELECT file_name FROM messages WHERE folder = 'inbox'")}
+        rows = []
+        complete = True
+        for entry in os.scandir(inbox_dir):
+            if not entry.name.endswith(".json") or entry.name in indexed:
+                continue
+            row = self._read_index_row(Path(entry.path), "inbox")
+            if row is None:
+                # 可能是其他进程还没写完的文件，下次扫描时重新检查
+                complete = False
+                continue
+            rows.append(row)
+        if rows:
+            with self._index_lock, self._index:
+                self._index.executemany("INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?, ?)", rows)
+            logger.debug(f"收件箱新增 {len(rows)} 封未索引的邮件")
+        self._inbox_mtime = mtime if complete else None
+        return len(rows)
+
     def send_email(self, to_address: str, subject: str, content: str, from_address: str = None) -> bool:
         """发送邮件到本地文件"""
         try:
-            timestamp = int(time.time() * 1000)
+            timestamp = self._next_timestamp()
             filename = f"{timestamp}_{to_address.replace('@', '_at_')}.json"
             
             email_data = {
@@ -80,8 +216,16 @@ class LocalFileMailBackend(MailBackend):
             
             # 同时保存到收件箱
             inbox_path = self.mail_dir / "inbox" / filename
+            mtime_before = self._stat_inbox()
             with open(inbox_path, 'w', encoding='utf-8') as f:
                 json.dump(email_data, f, ensure_ascii=False, indent=2)
+            self._note_own_change(mtime_before)
+
+            with self._index_lock, self._index:
+                self._index.execute(
+                    "INSERT OR REPLACE INTO messages VALUES (?, 'inbox', ?, ?, ?, 0)",
+                    (filename, email_data["message_id"], subject, timestamp)
+                )
             
             logger.debug(f"本地邮件已发送: {subject} -> {to_address}")
             return True
@@ -90,25 +234,37 @@ class LocalFileMailBackend(MailBackend):
             logger.error(f"发送本地邮件失败: {e}")
             return False
     
-    def get_unread_emails(self, subject_filter: str = None) -> List[Dict]:
+    def get_unread_emails(self, subject_filter: str = None, limit: int = None) -> List[Dict]:
         """获取未读邮件"""
         try:
+            self._sync_inbox()
+            sql = "SELECT file_name FROM messages WHERE read = 0 AND folder = 'inbox'"
+            args = []
+            if subject_filter is not None:
+                sql += " AND instr(subject, ?) > 0"
+                args.append(subject_filter)
+            sql += " ORDER BY timestamp"
+            if limit is not None:
+                sql += " LIMIT ?"
+                args.append(limit)
+            with self._index_lock:
+                file_names = [row[0] for row in self._index.execute(sql, args)]
+
             unread_emails = []
             inbox_dir = self.mail_dir / "inbox"
-            
-            for email_file in inbox_dir.glob("*.json"):
+            for file_name in file_names:
+                email_file = inbox_dir / file_name
                 try:
                     with open(email_file, 'r', encoding='utf-8') as f:
-                        email_data = json.load(f)
-                    
-                    if not email_data.get("read", False):
-                        if subject_filter is None or subject_filter in email_data.get("subject", ""):
-                            unread_emails.append(email_data)
-                            
+                        unread_emails.append(json.load(f))
+                except FileNotFoundError:
+                    # 文件已被外部移除，同步清理索引
+                    with self._index_lock, self._index:
+                        self._index.execute("DELETE FROM messages WHERE file_name = ?", (file_name,))
                 except Exception as e:
                     logger.warning(f"读取邮件文件失败 {email_file}: {e}")
-            
-            return sorted(unread_emails, key=lambda x: x.get("timestamp", 0))
+
+            return unread_emails
             
         except Exception as e:
             logger.error(f"获取未读邮件失败: {e}")
@@ -117,32 +273,38 @@ class LocalFileMailBackend(MailBackend):
     def mark_as_read(self, message_id: str) -> bool:
         """标记邮件为已读"""
         try:
-            inbox_dir = self.mail_dir / "inbox"
-            read_dir = self.mail_dir / "read"
-            
-            for email_file in inbox_dir.glob("*.json"):
-                try:
-                    with open(email_file, 'r', encoding='utf-8') as f:
-                        email_data = json.load(f)
-                    
-                    if email_data.get("message_id") == message_id:
-                        email_data["read"] = True
-                        
-                        # 移动到已读目录
-                        read_path = read_dir / email_file.name
-                        with open(read_path, 'w', encoding='utf-8') as f:
-                            json.dump(email_data, f, ensure_ascii=False, indent=2)
-                        
-                        # 删除原文件
-                        email_file.unlink()
-                        
-                        logger.debug(f"邮件已标记为已读: {message_id}")
-                        return True
-                        
-                except Exception as e:
-                    logger.warning(f"处理邮件文件失败 {email_file}: {e}")
-            
-            return False
+            with self._index_lock:
+                row = self._index.execute(
+                    "SELECT file_name FROM messages WHERE message_id = ? AND read = 0 AND folder = 'inbox' "
+                    "ORDER BY timestamp LIMIT 1",
+                    (str(message_id),)
+                ).fetchone()
+            if not row:
+                return False
+
+            file_name = row[0]
+            email_file = self.mail_dir / "inbox" / file_name
+            with open(email_file, 'r', encoding='utf-8') as f:
+                email_data = json.load(f)
+            email_data["read"] = True
+
+            # 移动到已读目录
+            read_path = self.mail_dir / "read" / file_name
+            with open(read_path, 'w', encoding='utf-8') as f:
+                json.dump(email_data, f, ensure_ascii=False, indent=2)
+
+            # 删除原文件
+            mtime_before = self._stat_inbox()
+            email_file.unlink()
+            self._note_own_change(mtime_before)
+
+            with self._index_lock, self._index:
+                self._index.execute(
+                    "UPDATE messages SET read = 1, folder = 'read' WHERE file_name = ?", (file_name,)
+                )
+
+            logger.debug(f"邮件已标记为已读: {message_id}")
+            return True
             
         except Exception as e:
             logger.error(f"标记邮件为已读失败: {e}")
@@ -217,7 +379,7 @@ class GmailBackend(MailBackend):
             logger.error(f"发送邮件失败: {e}")
             return False
     
-    def get_unread_emails(self, subject_filter: str = None) -> List[Dict]:
+    def get_unread_emails(self, subject_filter: str = None, limit: int = None) -> List[Dict]:
         """获取未读邮件"""
         try:
             imap = self.connect_imap()
@@ -235,6 +397,8 @@ class GmailBackend(MailBackend):
                 return []
             
             msg_ids = messages[0].split()
+            if limit is not None:
+                msg_ids = msg_ids[:limit]
             unread_emails = []
             
             for num in msg_ids:
@@ -288,8 +452,63 @@ class GmailBackend(MailBackend):
 
 
 class EnhancedMailManager:
-    """增强的邮件管理器"""
-    
+    """增强的邮件管理器
+
+    定时检查邮箱的调用方应通过 shared 取得管理器：同一个后端只创建一次，
+    本地后端的索引连接在进程退出时统一关闭；mail.inbox_scan_interval 配置热加载后
+    同步到共用本地后端的外部写入扫描间隔。
+    """
+
+    _shared: Dict[tuple, "EnhancedMailManager"] = {}  # (后端类型, 邮件目录) -> 管理器
+    _shared_lock = threading.Lock()
+    _config_subscribed = False
+
+    @classmethod
+    def shared(cls, use_local_backend: bool = False, local_mail_dir: str = None) -> "EnhancedMailManager":
+        """返回该后端共用的管理器"""
+        if use_local_backend:
+            if local_mail_dir is None:
+                local_mail_dir = get_global_config().mail.local_backend_path
+            key = ("local", os.path.abspath(local_mail_dir))
+        else:
+            key = ("gmail", None)
+        with cls._shared_lock:
+            manager = cls._shared.get(key)
+            if manager is None:
+                manager = cls._shared[key] = cls(use_local_backend=use_local_backend, local_mail_dir=local_mail_dir)
+                created = True
+            else:
+                created = False
+        if created and use_local_backend:
+            cls._watch_config()
+        return manager
+
+    @classmethod
+    def _watch_config(cls):
+        """按当前配置设置扫描间隔，并订阅配置热加载"""
+        try:
+            config = get_global_config()
+        except RuntimeError:
+            return
+        _apply_inbox_scan_interval(getattr(config, 'snapshot', config))
+        if not cls._config_subscribed and hasattr(config, 'subscribe'):
+            cls._config_subscribed = True
+            config.subscribe(_apply_inbox_scan_interval)
+
+    @classmethod
+    def close_shared(cls):
+        """关闭所有共用管理器的后端"""
+        with cls._shared_lock:
+            managers = list(cls._shared.values())
+            cls._shared.clear()
+        for manager in managers:
+            manager.close()
+
+    def close(self):
+        close = getattr(self.backend, "close", None)
+        if close is not None:
+            close()
+
     def __init__(self, use_local_backend: bool = False, local_mail_dir: str = None):
         """
         初始化邮件管理器
@@ -319,13 +538,13 @@ class EnhancedMailManager:
         """发送回复邮件（兼容旧接口）"""
         return self.send_email(to_address, subject, content)
     
-    def get_unread_did_requests(self) -> List[Dict]:
+    def get_unread_did_requests(self, limit: int = None) -> List[Dict]:
         """获取未读的DID请求邮件"""
-        return self.backend.get_unread_emails("ANP-DID host request")
+        return self.backend.get_unread_emails("ANP-DID host request", limit=limit)
     
-    def get_unread_hosted_responses(self) -> List[Dict]:
+    def get_unread_hosted_responses(self, limit: int = None) -> List[Dict]:
         """获取未读的托管DID响应邮件"""
-        return self.backend.get_unread_emails("ANP HOSTED DID RESPONSED")
+        return self.backend.get_unread_emails("ANP HOSTED DID RESPONSED", limit=limit)
     
     def mark_message_as_read(self, message_id: str) -> bool:
         """标记邮件为已读"""
@@ -362,6 +581,21 @@ class EnhancedMailManager:
             return False
 
 
+def _apply_inbox_scan_interval(snapshot, previous=None):
+    """配置变更回调：按 mail.inbox_scan_interval 调整共用本地后端的外部写入扫描间隔"""
+    interval = getattr(getattr(snapshot, 'mail', None), 'inbox_scan_interval', None)
+    if interval is None:
+        interval = LocalFileMailBackend.EXTERNAL_SCAN_INTERVAL
+    with EnhancedMailManager._shared_lock:
+        managers = list(EnhancedMailManager._shared.values())
+    for manager in managers:
+        if isinstance(manager.backend, LocalFileMailBackend):
+            manager.backend.EXTERNAL_SCAN_INTERVAL = float(interval)
+
+
+atexit.register(EnhancedMailManager.close_shared)
+
+
 # 兼容性函数，保持向后兼容
 class MailManager(EnhancedMailManager):
     """原MailManager类的兼容性包装"""
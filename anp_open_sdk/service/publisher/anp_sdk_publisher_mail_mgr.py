@@ -45,7 +45,7 @@ class MailManager:
             logger.error(f"发送回复邮件失败: {e}")
             return False
     
-    def get_unread_did_requests(self):
+    def get_unread_did_requests(self, limit: int = None):
         """获取未读的DID托管请求邮件"""
         imap = self.connect_imap()
         imap.select('INBOX')
@@ -57,6 +57,8 @@ class MailManager:
             return []
             
         msg_ids = messages[0].split()
+        if limit is not None:
+            msg_ids = msg_ids[:limit]
         requests = []
         
         for num in msg_ids:
@@ -84,8 +86,9 @@ class MailManager:
             try:
                 did_document = json.loads(body)
                 requests.append({
-                    'message_id': num,
+                    'message_id': num.decode(),
                     'from_address': msg['From'],
+                    'content': body,
                     'did_document': did_document
                 })
             except Exception as e:
@@ -0,0 +1,175 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+业务处理函数参数绑定
+
+按函数签名和类型注解为每个业务函数编译一次参数绑定器：参数名、是否需要 request、
+是否为同步函数都在包装时确定，调用时用一个 pydantic 模型一次性完成校验和类型转换。
+校验沿用旧版直接传参时能接受的宽松输入：数字可以传给 str 参数，单个值可以传给列表类参数。
+"""
+
+import json
+import types
+import inspect
+import typing
+import weakref
+import threading
+from typing import Annotated, Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BeforeValidator, ConfigDict, Field, ValidationError, create_model
+
+from anp_open_sdk.utils.bounded_executor import BoundedExecutor
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class BindingError(ValueError):
+    """请求参数无法绑定到业务函数"""
+
+    def __init__(self, message: str, errors: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+    def to_response(self) -> Dict[str, Any]:
+        return {"status": "error", "message": str(self), "errors": self.errors, "status_code": 400}
+
+
+_SEQUENCE_TYPES = (list, tuple, set, frozenset)
+
+
+def _is_sequence_hint(hint) -> bool:
+    """注解是列表、元组或集合（含 Optional[...]）"""
+    origin = typing.get_origin(hint) or hint
+    if origin in (typing.Union, types.UnionType):
+        args = [arg for arg in typing.get_args(hint) if arg is not type(None)]
+        return bool(args) and all(_is_sequence_hint(arg) for arg in args)
+    return origin in _SEQUENCE_TYPES
+
+
+def _scalar_to_list(value):
+    if value is None or isinstance(value, (*_SEQUENCE_TYPES, dict)):
+        return value
+    return [value]
+
+
+def _lenient(hint):
+    """列表类注解接受单个值，校验前包装成只有一个元素的列表"""
+    if _is_sequence_hint(hint):
+        return Annotated[hint, BeforeValidator(_scalar_to_list)]
+    return hint
+
+
+class ArgumentBinder:
+    """从 request_data 及其 params 中取出业务函数参数，校验并转换类型"""
+
+    def __init__(self, func: Callable):
+        self.func = func
+        self.name = getattr(func, "__name__", repr(func))
+        sig = inspect.signature(func)
+        try:
+            hints = typing.get_type_hints(func)
+        except Exception:
+            hints = {}
+
+        self.wants_request = "request" in sig.parameters
+        self.is_async = inspect.iscoroutinefunction(func)
+        names = []
+        fields = {}
+        for index, (name, param) in enumerate(sig.parameters.items()):
+            if name == "request" or param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            default = ... if param.default is param.empty else param.default
+            # 用位置编号作字段名、参数名作别名，避免与 BaseModel 自身属性（json、schema 等）冲突
+            fields[f"p{index}"] = (_lenient(hints.get(name, Any)), Field(default, alias=name))
+            names.append((name, f"p{index}"))
+        self.names: Tuple[Tuple[str, str], ...] = tuple(names)
+        self._name_set = frozenset(name for name, _ in names)
+        self.model = create_model(
+            f"{self.name}_params",
+            __config__=ConfigDict(arbitrary_types_allowed=True, populate_by_name=False, coerce_numbers_to_str=True),
+            **fields
+        )
+
+    def collect(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """按 request_data < path_params < params 的优先级收集参数原始值"""
+        names = self._name_set
+        values = {k: request_data[k] for k in names.intersection(request_data)}
+        path_params = request_data.get("path_params")
+        if path_params:
+            values.update((k, path_params[k]) for k in names.intersection(path_params))
+        params = request_data.get("params")
+        if isinstance(params, (str, bytes)):
+            try:
+                params = json.loads(params)
+            except ValueError as e:
+                raise BindingError(f"params 不是合法的 JSON: {e}") from e
+        if params:
+            if not isinstance(params, dict):
+                raise BindingError("params 必须是 JSON 对象")
+            values.update((k, params[k]) for k in names.intersection(params))
+        return values
+
+    def bind(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """返回校验和类型转换后的关键字参数，参数缺失或类型不符时抛出 BindingError"""
+        try:
+            validated = self.model.model_validate(self.collect(request_data))
+        except ValidationError as e:
+            errors = [
+                {"param": ".".join(str(p) for p in err["loc"]), "type": err["type"], "message": err["msg"]}
+                for err in e.errors(include_url=False, include_context=False, include_input=False)
+            ]
+            raise BindingError(f"{self.name} 参数校验失败", errors) from None
+        return {name: getattr(validated, field) for name, field in self.names}
+
+
+_binders: "weakref.WeakKeyDictionary[Callable, ArgumentBinder]" = weakref.WeakKeyDictionary()
+_binders_lock = threading.Lock()
+
+
+def get_binder(func: Callable) -> ArgumentBinder:
+    """获取函数的参数绑定器，同一函数只编译一次"""
+    with _binders_lock:
+        try:
+            binder = _binders.get(func)
+        except TypeError:
+            # 不支持弱引用的可调用对象不缓存
+            return ArgumentBinder(func)
+        if binder is None:
+            binder = ArgumentBinder(func)
+            _binders[func] = binder
+        return binder
+
+
+_handler_executor: Optional[BoundedExecutor] = None
+_handler_executor_lock = threading.Lock()
+
+
+def get_handler_executor() -> BoundedExecutor:
+    """同步业务函数的有界线程池，线程数和排队上限取自 anp_sdk.handler_max_workers / handler_max_pending"""
+    global _handler_executor
+    if _handler_executor is None:
+        with _handler_executor_lock:
+            if _handler_executor is None:
+                max_workers = max_pending = None
+                try:
+                    from anp_open_sdk.config import get_global_config
+                    sdk_config = get_global_config().anp_sdk
+                    max_workers = getattr(sdk_config, 'handler_max_workers', None)
+                    max_pending = getattr(sdk_config, 'handler_max_pending', None)
+                except Exception:
+                    pass
+                _handler_executor = BoundedExecutor(max_workers, max_pending, thread_name_prefix="anp-handler")
+    return _handler_executor
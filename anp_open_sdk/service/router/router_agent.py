@@ -14,6 +14,11 @@
 import inspect
 
 from anp_open_sdk.service.router.router_did import url_did_format
+from anp_open_sdk.service.publisher.agent_directory import AgentDirectory
+from anp_open_sdk.utils.request_payload import payload_size
+from anp_open_sdk.utils.serialization import accepts_msgpack, negotiate_response
+from anp_open_sdk.service.router.handler_binder import BindingError, get_binder, get_handler_executor
+from anp_open_sdk.contact_manager import DEFAULT_MAX_CONTACTS, ContactStore, LRUCache
 import logging
 logger = logging.getLogger(__name__)
 
@@ -51,16 +56,53 @@ class AgentSearchRecord:
 
 
 class AgentContactBook:
-    """智能体通讯录"""
+    """智能体通讯录
+
+    与 ContactManager 相同的结构：内存中按 LRU 保留最近交互的 max_contacts 个联系人，全部联系人
+    保存在 ContactStore 中，按 DID 和主机索引，未命中时从存储加载。未指定存储时使用所有者用户目录
+    （user_dir，缺省按 owner_did 查找）下的 contact_book.sqlite3，找不到用户目录时才使用内存数据库。
+    """
+
+    STORE_FILE = "contact_book.sqlite3"
     
-    def __init__(self, owner_did: str):
+    def __init__(self, owner_did: str, max_contacts: int = DEFAULT_MAX_CONTACTS, store: ContactStore = None,
+                 user_dir: str = None):
         self.owner_did = owner_did
-        self.contacts = {}  # did -> 联系人信息
+        if store is None:
+            user_dir = user_dir or self._owner_user_dir(owner_did)
+            if not user_dir:
+                logger.warning(f"未找到 {owner_did} 的用户目录，通讯录只保存在内存中")
+            store = ContactStore.for_user_dir(user_dir, self.STORE_FILE)
+        self.store = store
+        self.contacts = LRUCache(max_contacts)  # did -> 联系人信息（最近交互的部分）
+
+    @staticmethod
+    def _owner_user_dir(owner_did: str):
+        try:
+            from anp_open_sdk.anp_sdk_user_data import LocalUserDataManager
+            user_data = LocalUserDataManager().get_user_data(owner_did)
+        except Exception as e:
+            logger.debug(f"查找 {owner_did} 的用户目录失败: {e}")
+            return None
+        return getattr(user_data, "user_dir", None)
+    
+    def _save(self, contact: Dict[str, Any]):
+        self.store.put_contact(contact)
+        self.contacts[contact["did"]] = contact
+    
+    def get_contact(self, did: str):
+        """按 DID 获取联系人，缓存未命中时从存储加载"""
+        contact = self.contacts.get(did)
+        if contact is None:
+            contact = self.store.get_contact(did)
+            if contact is not None:
+                self.contacts[did] = contact
+        return contact
     
     def add_contact(self, did: str, name: str = None, description: str = "", tags: List[str] = None):
         """添加联系人"""
-        if did not in self.contacts:
-            self.contacts[did] = {
+        if self.get_contact(did) is None:
+            self._save({
                 "did": did,
                 "name": name or did.split(":")[-1],
                 "description": description,
@@ -68,21 +110,28 @@ class AgentContactBook:
                 "first_contact": datetime.now().isoformat(),
                 "last_contact": datetime.now().isoformat(),
                 "interaction_count": 1
-            }
+            })
         else:
             self.update_interaction(did)
     
     def update_interaction(self, did: str):
         """更新交互记录"""
-        if did in self.contacts:
-            self.contacts[did]["last_contact"] = datetime.now().isoformat()
-            self.contacts[did]["interaction_count"] += 1
+        contact = self.get_contact(did)
+        if contact is not None:
+            contact["last_contact"] = datetime.now().isoformat()
+            contact["interaction_count"] += 1
+            self._save(contact)
     
     def get_contacts(self, tag: str = None):
-        """获取联系人列表"""
+        """获取联系人列表（从存储读取全部联系人）"""
+        contacts = {info["did"]: info for info in self.store.list_contacts()}
         if tag:
-            return {did: info for did, info in self.contacts.items() if tag in info["tags"]}
-        return self.contacts
+            return {did: info for did, info in contacts.items() if tag in info["tags"]}
+        return contacts
+    
+    def get_contacts_by_host(self, host: str):
+        """按主机获取联系人"""
+        return {info["did"]: info for info in self.store.contacts_by_host(host)}
 
 
 class SessionRecord:
@@ -155,13 +204,20 @@ class AgentRouter:
     
     def __init__(self):
         self.local_agents = {}  # did -> LocalAgent实例
+        self.directory = AgentDirectory()  # 按 DID 排序的发布目录，随注册/注销增量维护
         self.logger = logger
     
     def register_agent(self, agent):
         """注册一个本地智能体"""
         self.local_agents[str(agent.id)] = agent
+        self.directory.add(agent)
         self.logger.debug(f"已注册智能体到多智能体路由: {agent.id}")
         return agent
+
+    def unregister_agent(self, did: str):
+        """注销一个本地智能体，返回被移除的实例"""
+        self.directory.remove(str(did))
+        return self.local_agents.pop(str(did), None)
         
     def get_agent(self, did: str):
         """获取指定DID的本地智能体"""
@@ -177,11 +233,14 @@ class AgentRouter:
                 resp_agent = self.local_agents[resp_did]
                 # 将agent实例 挂载到request.state 方便在处理中引用
                 request.state.agent = resp_agent
-                logger.info(
-                        f"成功路由到{resp_agent.id}的处理函数, 请求数据为{request_data}\n"
-                        f"完整请求为 url: {request.url} \n"
-                        f"body: {await request.body()}")
-                return await self.local_agents[resp_did].handle_request(req_did, request_data , request)
+                # 请求体已由认证中间件缓存，这里只记录大小，不再重新读取和格式化整个请求体
+                logger.info(f"成功路由到{resp_agent.id}的处理函数, 类型: {request_data.get('type')}, "
+                            f"url: {request.url}, body: {payload_size(request)} 字节")
+                result = await self.local_agents[resp_did].handle_request(req_did, request_data , request)
+                if isinstance(result, (dict, list)) and accepts_msgpack(request.headers.get("accept")):
+                    # 调用方声明接受 MessagePack；其余情况保持原样，由 FastAPI 按 JSON 返回
+                    return negotiate_response(request, result)
+                return result
             else:
                 self.logger.error(f"{resp_did} 的 `handle_request` 不是一个可调用对象")
                 raise TypeError(f"{resp_did} 的 `handle_request` 不是一个可调用对象")
@@ -199,27 +258,25 @@ class AgentRouter:
 import functools
 
 def wrap_business_handler(business_func):
-    sig = inspect.signature(business_func)
-    param_names = list(sig.parameters.keys())
+    """
+    把普通业务函数包装为 (request_data, request) 形式的 API 处理器。
+
+    参数绑定器在包装时按签名和类型注解编译一次；参数缺失或类型不符时返回 400，
+    同步函数在有界线程池中执行，不阻塞事件循环。
+    """
+    binder = get_binder(business_func)
+
     @functools.wraps(business_func)
     async def api_handler(request_data, request):
-        import json
         try:
-            kwargs = {k: request_data.get(k) for k in param_names if k in request_data}
-            if "params" in request_data:
-                params = request_data["params"]
-                if isinstance(params, str):
-                    params = json.loads(params)
-                for k in param_names:
-                    if k in params:
-                        kwargs[k] = params[k]
-            kwargs_str = json.dumps(kwargs, ensure_ascii=False)
-            logger.info(f"api封装器发送参数 {kwargs_str}到{business_func.__name__}")
-            if 'request' in sig.parameters:
-                return await business_func(request, **kwargs)
-            else:
-                return await business_func(**kwargs)
-        except Exception as e :
-            logger.error(f"wrap error {e}")
-            return f"wrap error {e}"
+            kwargs = binder.bind(request_data)
+        except BindingError as e:
+            logger.warning(f"{binder.name} 参数绑定失败: {e.errors or e}")
+            return e.to_response()
+        logger.debug("api封装器发送参数 %s 到 %s", kwargs.keys(), binder.name)
+        if binder.wants_request:
+            kwargs["request"] = request
+        if binder.is_async:
+            return await business_func(**kwargs)
+        return await get_handler_executor().run(business_func, **kwargs)
     return api_handler
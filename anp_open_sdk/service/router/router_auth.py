@@ -25,6 +25,8 @@ logger = logging.getLogger(__name__)
 from typing import Dict
 from fastapi import APIRouter, Request, HTTPException
 
+from anp_open_sdk.agent_connect_hotpatch.authentication.did_wba import parse_auth_params
+
 router = APIRouter(tags=["authentication"])
 
 
@@ -83,15 +85,8 @@ def parse_auth_str_to_dict(auth_str: str) -> dict:
     """
     将类似于 'key1="value1", key2="value2"' 的字符串解析为字典
     """
-    result = {}
     try:
-        # 先按逗号分割，再按等号分割
-        for kv in auth_str.split(", "):
-            if "=" in kv:
-                k, v = kv.split("=", 1)
-                result[k.strip()] = v.strip('"')
-    except Exception as e:
+        return dict(parse_auth_params(auth_str))
+    except ValueError as e:
         logger.warning(f"解析认证字符串为字典时出错: {e}")
-    return result
-    
-    
+        return {}
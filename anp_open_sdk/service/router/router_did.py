@@ -33,6 +33,7 @@ from typing import Dict
 from pathlib import Path
 from fastapi import APIRouter, Request, Response, HTTPException
 from anp_open_sdk.config import get_global_config,UnifiedConfig
+from anp_open_sdk.utils.serialization import supported_content_types
 
 from anp_open_sdk.utils.log_base import  logging as logger
 
@@ -211,6 +212,9 @@ async def get_agent_description(user_id: str, request: Request) -> Dict:
         del result["interfaces"]
 
 
+    # 声明可以收发的载荷类型，调用方据此协商是否使用 MessagePack
+    result["ad:supportedContentTypes"] = supported_content_types()
+
     # 确保必要的字段存在
     result["@context"] = result.get("@context", {
             "@vocab": "https://schema.org/",
@@ -19,14 +19,16 @@ import json
 import yaml
 import logging
 logger = logging.getLogger(__name__)
-from typing import Dict
+from typing import Dict, Optional
 from pathlib import Path
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Query
 from anp_open_sdk.config import get_global_config, UnifiedConfig
 from anp_open_sdk.utils.log_base import  logging as logger
 
 router = APIRouter(tags=["publisher"])
 
+DEFAULT_PAGE_SIZE = 100
+
 
 @router.get("/wba/hostuser/{user_id}/did.json", summary="Get Hosted DID document")
 async def get_hosted_did_document(user_id: str) -> Dict:
@@ -50,31 +52,43 @@ async def get_hosted_did_document(user_id: str) -> Dict:
 
 
 @router.get("/publisher/agents", summary="Get published agent list")
-async def get_agent_publishers(request: Request) -> Dict:
+async def get_agent_publishers(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页条数，带 cursor 时默认 100"),
+    hosted: Optional[bool] = Query(None, description="只返回托管/非托管的智能体"),
+    name_prefix: Optional[str] = Query(None, description="名称前缀"),
+    server: Optional[str] = Query(None, description="DID 所在服务器，如 localhost:9527"),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，可选 did,name,hosted,server,agent_type")
+) -> Dict:
     """
-    获取已发布的代理列表，直接从运行中的 SDK 实例获取。
+    获取已发布的代理列表，直接从运行中的 SDK 实例的目录索引分页获取。
     发布设置:
     - open: 公开给所有人
+
+    按 DID 排序，响应中的 next_cursor 用于获取下一页，为 null 时表示已到末尾。
+    cursor 和 limit 都未提供时不分页，返回全部符合条件的智能体（与分页前的接口一致）。
     """
     try:
         # 通过 request.app.state 获取在 ANPSDK 初始化时存储的 sdk 实例
         sdk = request.app.state.sdk
-
-        # 从 SDK 实例中获取所有已注册的 agent
-        all_agents = sdk.get_agents() # 使用 get_agents() 公共方法
-
-        public_agents = []
-        for agent in all_agents:
-                public_agents.append({
-                    "did": getattr(agent, "id", "unknown"),
-                    "name": getattr(agent, "name", "unknown")
-                })
-
-        return {
-            "agents": public_agents,
-            "count": len(public_agents)
-        }
+        directory = sdk.router.directory
+        field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        if limit is None and cursor is not None:
+            limit = DEFAULT_PAGE_SIZE
+        public_agents, next_cursor = directory.page(
+            cursor=cursor, limit=limit, hosted=hosted, name_prefix=name_prefix,
+            server=server, fields=field_list or ["did", "name"]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting agent list from SDK instance: {e}")
         raise HTTPException(status_code=500, detail="Error getting agent list from SDK instance")
 
+    return {
+        "agents": public_agents,
+        "count": len(public_agents),
+        "total": len(directory),
+        "next_cursor": next_cursor
+    }
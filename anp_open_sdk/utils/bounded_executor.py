@@ -0,0 +1,63 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+有界线程池
+
+CPU 密集或阻塞的调用（密码学运算、同步业务函数）放到线程池执行，不占用事件循环。
+线程池前面加一个准入上限，洪峰时多余的调用在事件循环上等待，而不是无限堆积在线程池队列里。
+"""
+
+import os
+import asyncio
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class BoundedExecutor:
+    """有界线程池：限制线程数，并限制同时提交的任务数，超出的调用在事件循环上排队"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 thread_name_prefix: str = "anp-worker"):
+        """
+        Args:
+            max_workers: 线程数，默认 min(8, CPU 数)
+            max_pending: 同时提交到线程池的任务上限，超出的调用在事件循环上排队等待，默认 max_workers * 4
+            thread_name_prefix: 线程名前缀
+        """
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.max_workers * 4
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=thread_name_prefix)
+        # asyncio.Semaphore 绑定到首次使用它的事件循环，每个循环各用一个
+        self._admission: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+
+    def _get_admission(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._admission.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_pending)
+            self._admission[loop] = semaphore
+        return semaphore
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """在线程池中执行 func(*args, **kwargs) 并等待结果"""
+        async with self._get_admission():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -122,3 +122,18 @@ def setup_logging():
     _is_logging_configured = True
     root_logger.info(f"日志系统配置完成，级别: {log_level_str}。")
 
+    # 配置热加载后更新日志级别
+    if hasattr(config, 'subscribe'):
+        config.subscribe(_apply_log_level)
+
+
+def _apply_log_level(snapshot, previous=None):
+    """配置变更回调：按新配置中的 log_settings.log_level 调整根日志记录器级别"""
+    log_config = getattr(snapshot, 'log_settings', None)
+    log_level_str = str(getattr(log_config, 'log_level', None) or 'INFO').upper()
+    log_level = getattr(logging, log_level_str, logging.INFO)
+    root_logger = logging.getLogger()
+    if root_logger.level != log_level:
+        root_logger.setLevel(log_level)
+        root_logger.info(f"日志级别已更新为: {log_level_str}")
+
@@ -0,0 +1,71 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+游标分页工具
+
+游标是上一页最后一条记录排序键的不透明编码（base64url JSON）。下一页从排序键严格大于游标的位置开始，
+翻页期间有记录增删时，不会重复返回记录，也不会漏掉翻页全程都存在的记录。
+"""
+
+import json
+import base64
+import bisect
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple
+
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    raw = json.dumps(list(key), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, ...]:
+    """解码游标，格式无效时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+    if not isinstance(key, list):
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return tuple(key)
+
+
+def paginate(items: Iterable[Any], key: Callable[[Any], Tuple], cursor: Optional[str] = None,
+             limit: Optional[int] = None) -> Tuple[List[Any], Optional[str]]:
+    """
+    对一组记录按 key 排序后取一页。
+
+    Args:
+        items: 记录
+        key: 排序键，必须能唯一确定一条记录
+        cursor: 上一页返回的游标，None 表示第一页
+        limit: 每页条数，None 表示不分页
+
+    Returns:
+        (本页记录, 下一页游标)，没有更多记录时游标为 None
+    """
+    keyed = sorted(((tuple(key(item)), item) for item in items), key=lambda pair: pair[0])
+    start = 0
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        try:
+            start = bisect.bisect_right([k for k, _ in keyed], after)
+        except TypeError as e:
+            raise ValueError(f"无效的分页游标: {cursor}") from e
+    if limit is None:
+        return [item for _, item in keyed[start:]], None
+    page = keyed[start:start + limit]
+    next_cursor = encode_cursor(page[-1][0]) if page and start + limit < len(keyed) else None
+    return [item for _, item in page], next_cursor
@@ -0,0 +1,108 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+请求级载荷缓存
+
+认证中间件读取并解析请求体一次，把原始字节和解析后的 JSON 存在 request.state 上。
+request.state 保存在 ASGI scope 中，中间件和路由处理函数看到的是同一份，
+后续的路由、处理器和日志直接使用缓存，不再重复 await request.body() 和 json.loads。
+带 Content-Encoding: gzip/deflate 的请求体在读取时解压，
+Content-Type 为 application/msgpack 的请求体按 MessagePack 解码。
+"""
+
+import re
+from typing import Any
+
+from fastapi import HTTPException
+
+from anp_open_sdk.utils import serialization
+from anp_open_sdk.utils.serialization import PayloadTooLarge, decode_content, is_msgpack_content_type
+
+# 不看 Content-Type，以 { 或 [ 开头的请求体按 JSON 解析，与 request.json() 的行为一致
+_JSON_START = re.compile(rb"\s*[\[{]")
+
+
+async def load_payload(request) -> bytes:
+    """读取请求体并缓存原始字节和 JSON 解析结果，已缓存时直接返回"""
+    state = request.state
+    raw = getattr(state, "raw_body", None)
+    if raw is not None:
+        return raw
+    raw = await request.body()
+    encoding = request.headers.get("content-encoding")
+    if encoding:
+        # 压缩的请求体在这里解压一次，raw_body 保存解压后的内容
+        try:
+            raw = decode_content(raw, encoding)
+        except PayloadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    payload = None
+    if raw and is_msgpack_content_type(request.headers.get("content-type")):
+        # 声明了 MessagePack 的请求体不做猜测：不支持时返回 415，数据损坏时返回 400
+        if not serialization.msgpack_available():
+            raise HTTPException(status_code=415, detail="MessagePack is not supported")
+        try:
+            payload = serialization.unpackb(raw)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"无法解码 MessagePack 请求体: {e}")
+    elif raw and _JSON_START.match(raw):
+        # 看起来是 JSON 却解析失败时返回 400，不当作空载荷交给路由
+        try:
+            payload = serialization.loads(raw)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"无法解析 JSON 请求体: {e}")
+    state.raw_body = raw
+    state.payload = payload
+    return raw
+
+
+async def get_raw_body(request) -> bytes:
+    """返回缓存的原始请求体，未经过中间件时读取一次并缓存"""
+    state = getattr(request, "state", None)
+    if state is None:
+        return b""
+    raw = getattr(state, "raw_body", None)
+    if raw is None:
+        raw = await load_payload(request)
+    return raw
+
+
+async def get_json_payload(request, default: Any = None) -> Any:
+    """
+    返回缓存的 JSON 载荷，请求体为空或不是 JSON 时返回 default，JSON 格式错误时抛出 400。
+
+    同一请求多次调用只解析一次。路由会直接改写返回的 dict（如 data["type"] = ...），
+    所以每次返回顶层 dict/list 的浅拷贝，各调用方互不影响；嵌套对象仍是共享的。
+    """
+    state = getattr(request, "state", None)
+    if state is None:
+        return default
+    if getattr(state, "raw_body", None) is None:
+        await load_payload(request)
+    payload = state.payload
+    if payload is None:
+        return default
+    if isinstance(payload, (dict, list)):
+        return payload.copy()
+    return payload
+
+
+def payload_size(request) -> int:
+    """已缓存请求体的字节数，未缓存时为 0，用于日志"""
+    state = getattr(request, "state", None)
+    raw = getattr(state, "raw_body", None) if state is not None else None
+    return len(raw) if raw is not None else 0
@@ -0,0 +1,370 @@
+# Copyright 2024 ANP Open SDK Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+JSON 与 MessagePack 编解码
+
+安装了 orjson 时使用 orjson，否则回退到标准库 json。两种实现输出的 JSON 语义相同
+（orjson 不转义非 ASCII 字符、不输出多余空格，NaN/Infinity 都输出为 null），orjson 无法处理的对象
+（超出 64 位的整数、自定义类型等）自动回退到标准库。另提供对应的 FastAPI 响应类、gzip 请求体解压和跳过 SSE 的响应压缩。
+
+安装了 msgpack 时，智能体之间的 /agent/api 和 /agent/message 请求可以按
+Content-Type/Accept 协商使用 MessagePack，未安装或任一方不支持时一律使用 JSON。
+"""
+
+import re
+import json
+import math
+import zlib
+from typing import Any, Optional, Union
+
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _json_default(obj: Any) -> Any:
+    """标准库 json 和 orjson 都无法直接序列化的常见类型"""
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _finite(obj: Any) -> Any:
+    """把 NaN/Infinity 替换为 None，与 orjson 的输出一致（两者都不是合法 JSON）"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    return obj
+
+
+def _std_dumps_str(obj: Any) -> str:
+    try:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_json_default, allow_nan=False)
+    except ValueError:
+        # 含 NaN/Infinity 时才整体替换一遍，普通载荷不多走一次遍历
+        return json.dumps(_finite(obj), ensure_ascii=False, separators=(",", ":"),
+                          default=lambda o: _finite(_json_default(o)), allow_nan=False)
+
+
+class JsonCodec:
+    """标准库 json 实现"""
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return _std_dumps_str(obj).encode("utf-8")
+
+    def dumps_str(self, obj: Any) -> str:
+        return _std_dumps_str(obj)
+
+    def loads(self, data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+
+# orjson 把超出 64 位的整数解析成浮点数而不报错。这样的整数至少有 19 位数字，
+# 先用 bytes.translate 把数字映射为 0、其他字节映射为空格，再查找 19 个连续的 0，
+# 只有命中时才遍历解析结果查找由整数得到的浮点数
+_DIGIT_TABLE = bytes(0x30 if 0x30 <= i <= 0x39 else 0x20 for i in range(256))
+_LONG_DIGITS = b"0" * 19
+_INT_AS_FLOAT_MAX = float(2 ** 64)
+_INT_AS_FLOAT_MIN = float(-2 ** 63)
+
+
+def _may_have_big_int(data: Union[bytes, bytearray]) -> bool:
+    return _LONG_DIGITS in data.translate(_DIGIT_TABLE)
+
+
+def _has_int_as_float(obj: Any) -> bool:
+    """解析结果中是否有超出 64 位整数范围的浮点数（可能来自整数字面量）"""
+    if type(obj) is float:
+        return obj >= _INT_AS_FLOAT_MAX or obj <= _INT_AS_FLOAT_MIN
+    if type(obj) is not dict and type(obj) is not list:
+        return False
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        for value in (item.values() if type(item) is dict else item):
+            kind = type(value)
+            if kind is dict or kind is list:
+                stack.append(value)
+            elif kind is float and (value >= _INT_AS_FLOAT_MAX or value <= _INT_AS_FLOAT_MIN):
+                return True
+    return False
+
+
+class OrjsonCodec(JsonCodec):
+    """orjson 实现，遇到 orjson 不支持的输入时回退到标准库"""
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError("orjson 未安装")
+        self._option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, default=_json_default, option=self._option)
+        except TypeError:
+            # 超出 64 位的整数等
+            return _std_dumps_str(obj).encode("utf-8")
+
+    def dumps_str(self, obj: Any) -> str:
+        return self.dumps(obj).decode("utf-8")
+
+    def loads(self, data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        try:
+            result = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # 标准库接受 NaN/Infinity，保持兼容；仍然失败时抛出 json.JSONDecodeError（ValueError 子类）
+            return json.loads(data)
+        raw = data.encode("utf-8", "surrogatepass") if isinstance(data, str) else data
+        if _may_have_big_int(raw) and _has_int_as_float(result):
+            # 超大整数被 orjson 转成了浮点数，交给标准库保证整数精度
+            return json.loads(data)
+        return result
+
+
+def get_codec(name: Optional[str] = None) -> JsonCodec:
+    """按名称获取编解码器，None 表示可用的最快实现"""
+    if name is None:
+        name = "orjson" if orjson is not None else "json"
+    if name == "orjson":
+        return OrjsonCodec()
+    if name == "json":
+        return JsonCodec()
+    raise ValueError(f"未知的 JSON 编解码器: {name}")
+
+
+codec: JsonCodec = get_codec()
+
+
+def set_codec(name: Optional[str] = None) -> JsonCodec:
+    """切换全局编解码器，返回新的编解码器"""
+    global codec
+    codec = get_codec(name)
+    return codec
+
+
+def dumps(obj: Any) -> bytes:
+    return codec.dumps(obj)
+
+
+def dumps_str(obj: Any) -> str:
+    return codec.dumps_str(obj)
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    return codec.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """使用全局编解码器渲染的 JSON 响应，用作 FastAPI 的 default_response_class"""
+
+    def render(self, content: Any) -> bytes:
+        return codec.dumps(content)
+
+
+class PayloadTooLarge(ValueError):
+    """解压后的请求体超过上限"""
+
+
+def decode_content(raw: bytes, encoding: Optional[str], max_size: int = 64 * 1024 * 1024) -> bytes:
+    """
+    按 Content-Encoding 解压请求体，支持 gzip 和 deflate，其他编码原样返回。
+
+    Raises:
+        PayloadTooLarge: 解压后超过 max_size 字节
+        ValueError: 压缩数据损坏
+    """
+    encoding = (encoding or "").strip().lower()
+    if not raw or encoding in ("", "identity"):
+        return raw
+    if encoding in ("gzip", "x-gzip"):
+        wbits = 16 + zlib.MAX_WBITS
+    elif encoding == "deflate":
+        wbits = zlib.MAX_WBITS
+    else:
+        return raw
+    decompressor = zlib.decompressobj(wbits)
+    try:
+        data = decompressor.decompress(raw, max_size + 1)
+    except zlib.error as e:
+        raise ValueError(f"无法解压 {encoding} 请求体: {e}") from e
+    if len(data) > max_size or decompressor.unconsumed_tail:
+        raise PayloadTooLarge(f"解压后的请求体超过 {max_size} 字节")
+    return data
+
+
+# 返回 SSE 事件流的路由
+EVENT_STREAM_PATHS = re.compile(r"^/agent/group/[^/]+/[^/]+/connect$")
+
+
+class EventStreamGZipMiddleware:
+    """
+    跳过 SSE 事件流的 GZipMiddleware。
+
+    starlette 0.27 的 GZipMiddleware 会压缩 text/event-stream 响应且不逐条刷新，事件积压在压缩缓冲区里，
+    客户端迟迟收不到消息。请求路径匹配 stream_paths 或 Accept 中包含 text/event-stream 时直接交给内层应用，
+    其余请求照常压缩。
+    """
+
+    def __init__(self, app, minimum_size: int = 500, compresslevel: int = 9,
+                 stream_paths: "re.Pattern" = EVENT_STREAM_PATHS):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.stream_paths = stream_paths
+
+    def _is_event_stream(self, scope) -> bool:
+        if self.stream_paths.match(scope.get("path", "")):
+            return True
+        for name, value in scope.get("headers", ()):
+            if name == b"accept" and b"text/event-stream" in value:
+                return True
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self._is_event_stream(scope):
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+_MSGPACK_MEDIA_TYPES = frozenset({MSGPACK_CONTENT_TYPE, "application/x-msgpack", "application/vnd.msgpack"})
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def supported_content_types() -> list:
+    """本端可以收发的载荷类型，写入 ad.json 供对端协商"""
+    if msgpack is None:
+        return [JSON_CONTENT_TYPE]
+    return [JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE]
+
+
+def _msgpack_default(obj: Any) -> Any:
+    """msgpack 无法直接序列化的常见类型；bytes 原样作为二进制类型编码"""
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not MessagePack serializable")
+
+
+def packb(obj: Any) -> bytes:
+    """
+    编码为 MessagePack。
+
+    Raises:
+        RuntimeError: 未安装 msgpack
+        TypeError / OverflowError: 无法编码的对象或超出 64 位的整数，调用方应回退到 JSON
+    """
+    if msgpack is None:
+        raise RuntimeError("msgpack 未安装")
+    return msgpack.packb(obj, default=_msgpack_default, use_bin_type=True)
+
+
+def unpackb(data: Union[bytes, bytearray, memoryview]) -> Any:
+    """
+    解码 MessagePack，允许非字符串的键。
+
+    Raises:
+        RuntimeError: 未安装 msgpack
+        ValueError: 数据损坏或不完整
+    """
+    if msgpack is None:
+        raise RuntimeError("msgpack 未安装")
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def _media_type(value: Optional[str]) -> str:
+    return (value or "").split(";", 1)[0].strip().lower()
+
+
+def is_msgpack_content_type(content_type: Optional[str]) -> bool:
+    return _media_type(content_type) in _MSGPACK_MEDIA_TYPES
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    """Accept 头中列出了 MessagePack（且 q 不为 0），并且本端安装了 msgpack"""
+    if msgpack is None or not accept:
+        return False
+    for item in accept.split(","):
+        media_type, _, params = item.partition(";")
+        if media_type.strip().lower() not in _MSGPACK_MEDIA_TYPES:
+            continue
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    if float(value) <= 0:
+                        return False
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+class MsgpackResponse(Response):
+    """MessagePack 响应"""
+    media_type = MSGPACK_CONTENT_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return packb(content)
+
+
+def negotiate_response(request, content: Any, status_code: int = 200) -> Response:
+    """
+    按请求的 Accept 头选择 MessagePack 或 JSON 响应。
+
+    内容无法编码为 MessagePack 时（超出 64 位的整数等）回退到 JSON。
+    """
+    request_headers = getattr(request, "headers", None)
+    headers = {"Vary": "Accept"}
+    if request_headers is not None and accepts_msgpack(request_headers.get("accept")):
+        try:
+            return MsgpackResponse(content=content, status_code=status_code, headers=headers)
+        except (TypeError, ValueError, OverflowError) as e:
+            logger.debug(f"响应无法编码为 MessagePack，回退到 JSON: {e}")
+    return FastJSONResponse(content=content, status_code=status_code, headers=headers)
@@ -107,6 +107,8 @@ class ANPDemoApplication:
             # 加载agents
             self.step_helper.pause("加载智能体")
             self.agents = self.agent_loader.load_demo_agents(self.sdk)
+            if len(self.agents) < 3:
+                self._provision_missing_agents()
 
             if len(self.agents) < 3:
                 logger.error("智能体不足3个，无法完成全部演示")
@@ -140,6 +142,21 @@ class ANPDemoApplication:
             traceback.print_exc()
             raise
 
+    def _provision_missing_agents(self):
+        """批量创建配置中缺少用户数据的演示智能体"""
+        agent_cfg = app_config.anp_sdk.agent
+        names = [agent_cfg.demo_agent1, agent_cfg.demo_agent2, agent_cfg.demo_agent3]
+        loaded = {agent.name for agent in self.agents}
+        missing = [name for name in names if name and name not in loaded]
+        if not missing:
+            return
+        logger.debug(f"批量创建缺少的演示智能体: {missing}")
+        user_inputs = [{'name': name, 'host': app_config.anp_sdk.host, 'port': app_config.anp_sdk.port,
+                        'dir': 'wba', 'type': 'user'} for name in missing]
+        self.agents.extend(asyncio.run(self.agent_registry.provision_agents(self.sdk, user_inputs)))
+        # 保持与配置一致的顺序，后续演示按位置区分智能体角色
+        self.agents.sort(key=lambda agent: names.index(agent.name) if agent.name in names else len(names))
+
     def _run_development_mode(self):
         """开发模式"""
         logger.debug("启动开发模式演示")
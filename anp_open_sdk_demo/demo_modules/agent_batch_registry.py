@@ -9,10 +9,27 @@ import aiofiles
 
 
 from anp_open_sdk.anp_sdk import LocalAgent
+from anp_open_sdk.anp_sdk_user_data import did_create_users_batch
 
 
 class DemoAgentRegistry:
     """演示用Agent注册器"""
+
+    @staticmethod
+    async def provision_agents(sdk, user_inputs: List[Dict[str, Any]]) -> List[LocalAgent]:
+        """批量创建用户并返回对应的智能体，密钥生成和文件写入并发进行"""
+        did_documents = await did_create_users_batch(user_inputs)
+        user_data_manager = sdk.user_data_manager
+        user_data_manager.load_users()
+        agents = []
+        for user_iput, did_document in zip(user_inputs, did_documents):
+            if not did_document:
+                logger.error(f"创建演示用户失败: {user_iput.get('name')}")
+                continue
+            user_data = user_data_manager.get_user_data(did_document['id'])
+            if user_data:
+                agents.append(LocalAgent(user_data, user_data.name))
+        return agents
     
     @staticmethod
     def register_api_handlers(agents: List[LocalAgent]) -> None:
@@ -117,6 +117,16 @@ class ModeratedChatRunnerWithLogging(FileLoggingGroupRunner):
         self.banned_words = ["spam", "abuse", "bad"]
         self.moderators = []
 
+    def snapshot(self) -> Dict[str, Any]:
+        # 休眠后恢复时保留管理员列表
+        state = super().snapshot()
+        state["moderators"] = list(self.moderators)
+        return state
+
+    def restore(self, state: Dict[str, Any]):
+        super().restore(state)
+        self.moderators = list(state.get("moderators", []))
+
     async def on_agent_join(self, agent: Agent) -> bool:
         logger.debug(f"🛡️ {agent.name} is joining moderated chat {self.group_id}...")
 
@@ -7,8 +7,9 @@ from typing import Dict, List, Optional, Tuple, Any
 
 from anp_open_sdk.anp_sdk_agent import LocalAgent
 from anp_open_sdk.anp_sdk import ANPSDK
-from anp_open_sdk.anp_sdk_user_data import LocalUserDataManager, save_interface_files
+from anp_open_sdk.anp_sdk_user_data import LocalUserDataManager, interface_file_path, save_interface_files
 from anp_open_sdk.service.router.router_agent import wrap_business_handler
+from anp_open_sdk_framework.boot_manifest import BootManifest, interface_hash
 
 logger = logging.getLogger(__name__)
 
@@ -16,8 +17,27 @@ class LocalAgentManager:
     """本地 Agent 管理器，负责加载、注册和生成接口文档"""
 
     @staticmethod
-    def load_agent_from_module(yaml_path: str) -> Tuple[Optional[LocalAgent], Optional[Any]]:
-        """从模块路径加载 Agent 实例"""
+    def _agent_from_did(did: str, manifest: Optional[BootManifest] = None) -> LocalAgent:
+        """按 DID 创建 LocalAgent；有启动清单时只重新加载该 agent 变化过的用户目录，不重新扫描全部用户"""
+        if manifest is None:
+            return LocalAgent.from_did(did)
+        user_data_manager = LocalUserDataManager()
+        user_data = user_data_manager.get_user_data(did)
+        user_dir = user_data.user_dir if user_data else manifest.user_dir(did)
+        if user_dir and not manifest.user_unchanged(did, user_dir):
+            reloaded = user_data_manager.load_user(user_dir)
+            user_data = reloaded if reloaded and reloaded.did == did else None
+        if user_data is None:
+            user_data_manager.load_users()
+            user_data = user_data_manager.get_user_data(did)
+            if not user_data:
+                raise ValueError(f"未找到 DID 为 {did} 的用户数据")
+        manifest.record_user(did, user_data.user_dir)
+        return LocalAgent(user_data, user_data.name)
+
+    @staticmethod
+    def load_agent_from_module(yaml_path: str, manifest: Optional[BootManifest] = None) -> Tuple[Optional[LocalAgent], Optional[Any]]:
+        """从模块路径加载 Agent 实例，传入启动清单时复用未变化的映射文件和用户数据"""
         logger.debug(f"\n🔎 Loading agent module from path: {yaml_path}")
         plugin_dir = os.path.dirname(yaml_path)
         handler_script_path = os.path.join(plugin_dir, "agent_handlers.py")
@@ -28,21 +48,25 @@ class LocalAgentManager:
             return None, None
 
         import sys
-        if plugin_dir not in sys.path:
-            sys.path.append(os.path.dirname(plugin_dir))
+        agents_dir = os.path.dirname(plugin_dir)
+        if agents_dir not in sys.path:
+            sys.path.append(agents_dir)
 
         # 使用目录名作为模块名
         base_module_name = os.path.basename(plugin_dir)
 
         handlers_module = importlib.import_module(f"{base_module_name}.agent_handlers")
 
-        with open(yaml_path, "r", encoding="utf-8") as f:
-            cfg = yaml.safe_load(f)
+        if manifest is not None:
+            cfg = manifest.load_mapping(yaml_path)
+        else:
+            with open(yaml_path, "r", encoding="utf-8") as f:
+                cfg = yaml.safe_load(f)
 
         # 1. agent_002: 存在 agent_register.py，优先自定义注册
         if os.path.exists(register_script_path):
             register_module = importlib.import_module(f"{base_module_name}.agent_register")
-            agent = LocalAgent.from_did(cfg["did"])
+            agent = LocalAgentManager._agent_from_did(cfg["did"], manifest)
             agent.name = cfg["name"]
             agent.api_config = cfg.get("api", [])
             logger.info(f"  -> self register agent : {agent.name}")
@@ -52,14 +76,14 @@ class LocalAgentManager:
         # 2. agent_llm: 存在 initialize_agent
         if hasattr(handlers_module, "initialize_agent"):
             logger.debug(f"  - Calling 'initialize_agent' in module: {base_module_name}.agent_handlers")
-            agent = LocalAgent.from_did(cfg["did"])
+            agent = LocalAgentManager._agent_from_did(cfg["did"], manifest)
             agent.name = cfg["name"]
             agent.api_config = cfg.get("api", [])
             logger.info(f"  - pre-init agent: {agent.name}")
             return agent, handlers_module
 
         # 3. 普通配置型 agent_001 / agent_caculator
-        agent = LocalAgent.from_did(cfg["did"])
+        agent = LocalAgentManager._agent_from_did(cfg["did"], manifest)
         agent.name = cfg["name"]
         agent.api_config = cfg.get("api", [])
         logger.debug(f"  -> Self-created agent instance: {agent.name}")
@@ -122,7 +146,22 @@ class LocalAgentManager:
         return openapi
 
     @staticmethod
-    async def generate_and_save_agent_interfaces(agent: LocalAgent,sdk):
+    async def _save_interface(agent: LocalAgent, user_full_path: str, interface_data: dict, file_name: str,
+                              file_type: str, manifest: Optional[BootManifest] = None):
+        """保存接口文件；启动清单中记录的内容摘要相同且文件未被改动时跳过写入"""
+        if manifest is not None:
+            file_path = str(interface_file_path(user_full_path, file_name))
+            digest = interface_hash(interface_data)
+            if manifest.interface_unchanged(agent.id, file_name, file_path, digest):
+                logger.debug(f"接口文件 {file_name} 未变化，跳过生成: {file_path}")
+                return
+        await save_interface_files(user_full_path=user_full_path, interface_data=interface_data,
+                                   inteface_file_name=file_name, interface_file_type=file_type)
+        if manifest is not None:
+            manifest.record_interface(agent.id, file_name, file_path, digest)
+
+    @staticmethod
+    async def generate_and_save_agent_interfaces(agent: LocalAgent, sdk, manifest: Optional[BootManifest] = None):
         """为指定的 agent 生成并保存 OpenAPI (YAML) 和 JSON-RPC 接口文件"""
         logger.debug(f"开始为 agent '{agent.name}' ({agent.id}) 生成接口文件...")
         user_data_manager = LocalUserDataManager()
@@ -135,12 +174,8 @@ class LocalAgentManager:
         # 2. 生成并保存 OpenAPI YAML 文件
         try:
             openapi_data = LocalAgentManager.generate_custom_openapi_from_router(agent,sdk)
-            await save_interface_files(
-                user_full_path=user_full_path,
-                interface_data=openapi_data,
-                inteface_file_name=f"api_interface.yaml",
-                interface_file_type="YAML"
-            )
+            await LocalAgentManager._save_interface(agent, user_full_path, openapi_data,
+                                                    "api_interface.yaml", "YAML", manifest)
         except Exception as e:
             logger.error(f"为 agent '{agent.name}' 生成 OpenAPI YAML 文件失败: {e}")
 
@@ -178,11 +213,7 @@ class LocalAgentManager:
                 }
                 jsonrpc_data["methods"].append(method_obj)
 
-            await save_interface_files(
-                user_full_path=user_full_path,
-                interface_data=jsonrpc_data,
-                inteface_file_name="api_interface.json",
-                interface_file_type="JSON"
-            )
+            await LocalAgentManager._save_interface(agent, user_full_path, jsonrpc_data,
+                                                    "api_interface.json", "JSON", manifest)
         except Exception as e:
             logger.error(f"为 agent '{agent.name}' 生成 JSON-RPC 文件失败: {e}")
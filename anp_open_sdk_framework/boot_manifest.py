@@ -0,0 +1,137 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+import yaml
+
+from anp_open_sdk.anp_sdk_user_data import _write_file_atomic
+
+logger = logging.getLogger(__name__)
+
+USER_FILES = ("agent_cfg.yaml", "did_document.json")
+
+
+def _stat(path: str) -> Optional[list]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def interface_hash(data: Any) -> str:
+    """接口描述的内容摘要，键顺序不影响结果"""
+    encoded = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class BootManifest:
+    """多智能体启动清单缓存
+
+    记录上次启动解析出的 agent_mappings.yaml 内容（按文件 mtime 和大小校验）、每个 agent 的 DID、
+    用户目录及其中 agent_cfg.yaml/did_document.json 的 mtime，以及生成的 api_interface.yaml/.json
+    的内容摘要和文件 mtime。下次启动只重新解析修改过的映射文件、只重新加载变化的用户目录、
+    只重写内容变化或被改动过的接口文件。
+
+    文件格式带版本号，版本不符或无法解析时按冷启动处理；本次启动没有用到的条目在保存时丢弃。
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.mappings: Dict[str, Dict[str, Any]] = {}
+        self.agents: Dict[str, Dict[str, Any]] = {}
+        self._used_mappings = set()
+        self._used_agents = set()
+        self.stats = {"mapping_hits": 0, "mapping_misses": 0, "user_hits": 0, "user_misses": 0,
+                      "interface_hits": 0, "interface_misses": 0}
+
+    @classmethod
+    def load(cls, path: Optional[str]) -> "BootManifest":
+        manifest = cls(path)
+        if not path or not os.path.isfile(path):
+            return manifest
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取启动清单 {path} 失败，按冷启动处理: {e}")
+            return manifest
+        if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+            logger.info(f"启动清单版本不符，按冷启动处理: {path}")
+            return manifest
+        manifest.mappings = data.get("mappings") or {}
+        manifest.agents = data.get("agents") or {}
+        return manifest
+
+    def save(self) -> bool:
+        """保存本次启动用到的条目"""
+        if not self.path:
+            return False
+        data = {
+            "version": self.VERSION,
+            "mappings": {k: v for k, v in self.mappings.items() if k in self._used_mappings},
+            "agents": {k: v for k, v in self.agents.items() if k in self._used_agents},
+        }
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            _write_file_atomic(self.path, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"保存启动清单 {self.path} 失败: {e}")
+            return False
+        logger.debug(f"启动清单已保存: {self.path}, {self.stats}")
+        return True
+
+    def load_mapping(self, yaml_path: str) -> Dict[str, Any]:
+        """返回 agent_mappings.yaml 的内容，文件未变化时直接使用缓存"""
+        key = os.path.abspath(yaml_path)
+        self._used_mappings.add(key)
+        stat = _stat(key)
+        entry = self.mappings.get(key)
+        if entry and stat is not None and entry.get("stat") == stat:
+            self.stats["mapping_hits"] += 1
+            return entry["mapping"]
+        self.stats["mapping_misses"] += 1
+        with open(key, "r", encoding="utf-8") as f:
+            mapping = yaml.safe_load(f)
+        self.mappings[key] = {"stat": stat, "mapping": mapping}
+        return mapping
+
+    def user_dir(self, did: str) -> Optional[str]:
+        """上次启动时 DID 对应的用户目录"""
+        entry = self.agents.get(did)
+        return entry.get("user_dir") if entry else None
+
+    def user_unchanged(self, did: str, user_dir: str) -> bool:
+        """用户目录与上次启动相同且其中的配置文件未修改"""
+        entry = self.agents.get(did)
+        fresh = bool(entry) and entry.get("user_dir") == user_dir and entry.get("files") == self._user_files(user_dir)
+        self.stats["user_hits" if fresh else "user_misses"] += 1
+        return fresh
+
+    def record_user(self, did: str, user_dir: str):
+        entry = self.agents.setdefault(did, {})
+        if entry.get("user_dir") != user_dir:
+            entry["interfaces"] = {}
+        entry["user_dir"] = user_dir
+        entry["files"] = self._user_files(user_dir)
+        self._used_agents.add(did)
+
+    @staticmethod
+    def _user_files(user_dir: str) -> Dict[str, Optional[list]]:
+        return {name: _stat(os.path.join(user_dir, name)) for name in USER_FILES}
+
+    def interface_unchanged(self, did: str, file_name: str, file_path: str, digest: str) -> bool:
+        """接口内容与上次生成的相同，且文件在那之后没有被改动或删除"""
+        entry = self.agents.get(did, {}).get("interfaces", {}).get(file_name)
+        fresh = bool(entry) and entry.get("hash") == digest and entry.get("stat") == _stat(file_path)
+        self.stats["interface_hits" if fresh else "interface_misses"] += 1
+        return fresh
+
+    def record_interface(self, did: str, file_name: str, file_path: str, digest: str):
+        entry = self.agents.setdefault(did, {})
+        entry.setdefault("interfaces", {})[file_name] = {"hash": digest, "stat": _stat(file_path)}
+        self._used_agents.add(did)
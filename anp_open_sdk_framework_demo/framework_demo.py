@@ -17,6 +17,7 @@ from anp_open_sdk.anp_sdk import ANPSDK
 import logging
 
 from anp_open_sdk_framework.agent_manager import LocalAgentManager
+from anp_open_sdk_framework.boot_manifest import BootManifest
 
 from anp_open_sdk_framework.local_methods.local_methods_caller import LocalMethodsCaller
 from anp_open_sdk_framework.local_methods.local_methods_doc import LocalMethodsDocGenerator
@@ -54,7 +55,11 @@ async def main():
         logger.info("No agent configurations found. Exiting.")
         return
 
-    prepared_agents_info = [LocalAgentManager.load_agent_from_module(f) for f in agent_files]
+    # 启动清单：未变化的映射文件、用户目录和接口文件直接复用上次启动的结果
+    manifest_path = getattr(config.multi_agent_mode, "boot_manifest_path", None)
+    manifest = BootManifest.load(str(manifest_path)) if manifest_path else None
+
+    prepared_agents_info = [LocalAgentManager.load_agent_from_module(f, manifest) for f in agent_files]
 
 
     # 过滤掉加载失败的
@@ -80,7 +85,11 @@ async def main():
             await module.initialize_agent(agent, sdk)  # 传入 agent 和 sdk 实例
 
     for agent in all_agents:
-        await LocalAgentManager.generate_and_save_agent_interfaces(agent, sdk)
+        await LocalAgentManager.generate_and_save_agent_interfaces(agent, sdk, manifest)
+
+    if manifest is not None:
+        manifest.save()
+        logger.info(f"启动清单命中情况: {manifest.stats}")
 
 
     # 用线程启动 server
@@ -5,12 +5,12 @@ import httpx  # 需要安装 httpx: pip install httpx
 import json
 
 from anp_open_sdk.service.interaction.agent_api_call import agent_api_call_get
+from anp_open_sdk.service.interaction.agent_discovery import AgentDiscoveryClient
 from anp_open_sdk.service.interaction.anp_tool import ANPToolCrawler
 import logging
 logger = logging.getLogger(__name__)
 from anp_open_sdk.anp_sdk import ANPSDK
 from anp_open_sdk.anp_sdk_agent import LocalAgent
-from anp_open_sdk.auth.auth_client import agent_auth_request
 from anp_open_sdk_framework.local_methods.local_methods_caller import LocalMethodsCaller
 from anp_open_sdk_framework.local_methods.local_methods_doc import LocalMethodsDocGenerator
 
@@ -18,14 +18,19 @@ from anp_open_sdk_framework.local_methods.local_methods_doc import LocalMethodsD
 caller = None
 # --- 模块级变量 ---
 my_agent_instance = None
+discovery_client = None
 
 async def initialize_agent(agent, sdk_instance):
     """
     初始化钩子，创建和配置Agent实例，并附加特殊能力。
     """
-    global my_agent_instance,caller
+    global my_agent_instance,caller,discovery_client
     logger.debug(f" -> Self-initializing Orchestrator Agent from its own module...")
     my_agent_instance = agent
+    # 发现客户端的连接池绑定当前事件循环，每次初始化重新创建
+    if discovery_client is not None:
+        await discovery_client.aclose()
+    discovery_client = AgentDiscoveryClient()
     caller = LocalMethodsCaller(sdk_instance)
 
     # 关键步骤：将函数作为方法动态地附加到创建的 Agent 实例上
@@ -44,84 +49,25 @@ async def discover_and_describe_agents(publisher_url):
     """
     发现并获取所有已发布Agent的详细描述。
     这个函数将被附加到 Agent 实例上作为方法。
+    DID 文档和 ad.json 通过初始化时创建的 AgentDiscoveryClient 并发获取并缓存。
     """
+    global discovery_client
     logger.debug("\n🕵️  Starting agent discovery process (from agent method)...")
+    if discovery_client is None:
+        discovery_client = AgentDiscoveryClient()
 
-
-
-    async with httpx.AsyncClient() as client:
-        try:
-            # 1. 访问  获取公开的 agent 列表
-            logger.debug("  - Step 1: Fetching public agent list...")
-            response = await client.get(publisher_url)
-            response.raise_for_status()
-            data = response.json()
-            agents = data.get("agents", [])
-            logger.info(f"  - Found {len(agents)} public agents.")
-            logger.info(f"\n  - {data}")
-            for agent_info in agents:
-                did = agent_info.get("did")
-                if not did:
-                    continue
-
-                logger.debug(f"\n  🔎 Processing Agent DID: {did}")
-
-                # 2. 获取每个 agent 的 DID Document
-                user_id = did.split(":")[-1]
-                host , port = ANPSDK.get_did_host_port_from_did(user_id)
-                did_doc_url = f"http://{host}:{port}/wba/user/{user_id}/did.json"
-
-                logger.debug(f"    - Step 2: Fetching DID Document from {did_doc_url}")
-                status, did_doc_data, msg, success = await agent_auth_request(
-                    caller_agent=my_agent_instance.id,  # 使用 self.id 作为调用者
-                    target_agent=did,
-                    request_url=did_doc_url
-                )
-
-                if not success:
-                    logger.debug(f"    - ❌ Failed to get DID Document for {did}. Message: {msg}")
-                    continue
-
-                if isinstance(did_doc_data, str):
-                    did_document = json.loads(did_doc_data)
-                else:
-                    did_document = did_doc_data
-
-                # 3. 从 DID Document 中提取 ad.json 的地址并获取内容
-                ad_endpoint = None
-                for service in did_document.get("service", []):
-                    if service.get("type") == "AgentDescription":
-                        ad_endpoint = service.get("serviceEndpoint")
-                        logger.info(f"\n   - ✅ get endpoint from did-doc{did}:{ad_endpoint}")
-                        break
-
-                if not ad_endpoint:
-                    logger.debug(f"    - ⚠️  No 'AgentDescription' service found in DID Document for {did}.")
-                    continue
-
-                logger.debug(f"    - Step 3: Fetching Agent Description from {ad_endpoint}")
-                status, ad_data, msg, success = await agent_auth_request(
-                    caller_agent=my_agent_instance.id,
-                    target_agent=did,
-                    request_url=ad_endpoint
-                )
-
-                if success:
-                    if isinstance(ad_data, str):
-                        agent_description = json.loads(ad_data)
-                    else:
-                        agent_description = ad_data
-                    logger.info(f"Agent Description:{ad_data}")
-                    logger.debug("    - ✅ Successfully fetched Agent Description:")
-                    logger.debug(json.dumps(agent_description, indent=2, ensure_ascii=False))
-                else:
-                    logger.debug(
-                        f"    - ❌ Failed to get Agent Description from {ad_endpoint}. Status: {status}")
-
-        except httpx.RequestError as e:
-            logger.debug(f"  - ❌ Discovery process failed due to a network error: {e}")
-        except Exception as e:
-            logger.debug(f"  - ❌ An unexpected error occurred during discovery: {e}")
+    try:
+        descriptions = await discovery_client.discover(publisher_url)
+        for item in descriptions:
+            if item["agent_description"] is not None:
+                logger.debug(f"    - ✅ Agent Description for {item['did']}:")
+                logger.debug(json.dumps(item["agent_description"], indent=2, ensure_ascii=False))
+        return descriptions
+    except httpx.HTTPError as e:
+        logger.debug(f"  - ❌ Discovery process failed due to a network error: {e}")
+    except Exception as e:
+        logger.debug(f"  - ❌ An unexpected error occurred during discovery: {e}")
+    return []
 
 
 
@@ -271,7 +217,10 @@ async def cleanup_agent():
     """
     清理钩子。
     """
-    global my_agent_instance
+    global my_agent_instance, discovery_client
+    if discovery_client:
+        await discovery_client.aclose()
+        discovery_client = None
     if my_agent_instance:
         logger.debug(f" -> Self-cleaning Orchestrator Agent: {my_agent_instance.name}")
         my_agent_instance = None
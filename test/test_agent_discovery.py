@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+智能体发现测试
+
+使用本地 ASGI 应用模拟 100 个智能体的 publisher 列表、DID 文档和 ad.json，
+验证 AgentDiscoveryClient 的并发获取、请求次数、ETag 条件刷新和缓存容量上限。
+"""
+
+import sys
+import time
+import asyncio
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI, Request, Response
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.service.interaction.agent_discovery import AgentDiscoveryClient
+
+logger = logging.getLogger(__name__)
+
+AGENT_COUNT = 100
+LATENCY = 0.05
+PUBLISHER_URL = "http://localhost:9527/publisher/agents"
+
+
+def _did(i: int) -> str:
+    return f"did:wba:localhost%3A9527:wba:user:{i:016x}"
+
+
+def _create_app(stats: dict) -> FastAPI:
+    app = FastAPI()
+
+    def _json_response(request: Request, data) -> Response:
+        body = json.dumps(data).encode("utf-8")
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+    @app.middleware("http")
+    async def slow(request: Request, call_next):
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            await asyncio.sleep(LATENCY)
+            return await call_next(request)
+        finally:
+            stats["in_flight"] -= 1
+
+    @app.get("/publisher/agents")
+    async def agents(request: Request):
+        return _json_response(request, {"agents": [{"did": _did(i), "name": f"agent{i}"} for i in range(AGENT_COUNT)]})
+
+    @app.get("/wba/user/{user_id}/did.json")
+    async def did_document(user_id: str, request: Request):
+        did = f"did:wba:localhost%3A9527:wba:user:{user_id}"
+        return _json_response(request, {
+            "id": did,
+            "service": [{"type": "AgentDescription",
+                         "serviceEndpoint": f"http://localhost:9527/wba/user/{user_id}/ad.json"}]
+        })
+
+    @app.get("/wba/user/{user_id}/ad.json")
+    async def agent_description(user_id: str, request: Request):
+        return _json_response(request, {"name": f"agent {user_id}", "interfaces": []})
+
+    return app
+
+
+def _new_stats():
+    return {"requests": 0, "in_flight": 0, "max_in_flight": 0}
+
+
+def test_concurrent_discovery():
+    """测试 100 个智能体并发发现的请求次数和总耗时"""
+    stats = _new_stats()
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=_create_app(stats)))
+        async with AgentDiscoveryClient(client=client, max_concurrency=20) as discovery:
+            start_time = time.time()
+            results = await discovery.discover(PUBLISHER_URL)
+            elapsed = time.time() - start_time
+        await client.aclose()
+        return results, elapsed, discovery
+
+    results, elapsed, discovery = asyncio.run(run())
+    assert len(results) == AGENT_COUNT
+    assert all(r["agent_description"]["name"].startswith("agent ") for r in results)
+    assert discovery.fetch_count == 1 + 2 * AGENT_COUNT
+    assert stats["requests"] == 1 + 2 * AGENT_COUNT
+    assert stats["max_in_flight"] <= 20
+    # 串行获取约需 (1 + 200) * LATENCY 秒
+    assert elapsed < (1 + 2 * AGENT_COUNT) * LATENCY / 4
+    logger.info(f"发现 {AGENT_COUNT} 个智能体耗时 {elapsed:.2f}秒")
+
+
+def test_cache_and_conditional_refresh():
+    """测试缓存有效期内只刷新列表，过期后通过 ETag 条件刷新"""
+    stats = _new_stats()
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=_create_app(stats)))
+        discovery = AgentDiscoveryClient(client=client, cache_ttl=300)
+        first = await discovery.discover(PUBLISHER_URL)
+        fetches = discovery.fetch_count
+
+        second = await discovery.discover(PUBLISHER_URL)
+        assert second == first
+        assert discovery.fetch_count == fetches + 1
+        assert discovery.not_modified_count == 1
+
+        discovery.cache_ttl = 0
+        for entry in discovery._cache.values():
+            entry.expires_at = 0
+        third = await discovery.discover(PUBLISHER_URL)
+        assert third == first
+        assert discovery.not_modified_count == 2 + 2 * AGENT_COUNT
+        await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_cache_is_bounded_lru():
+    """测试缓存超过容量时淘汰最久未用的条目，命中的条目保留"""
+    stats = _new_stats()
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=_create_app(stats)))
+        discovery = AgentDiscoveryClient(client=client, max_entries=50)
+        await discovery.discover(PUBLISHER_URL)
+        assert len(discovery._cache) == 50
+        recent = list(discovery._cache)[-1]
+        oldest, second = list(discovery._cache)[:2]
+        await discovery.fetch_json(oldest)
+        await discovery.fetch_json(f"http://localhost:9527/wba/user/{0:016x}/did.json")
+        assert oldest in discovery._cache and recent in discovery._cache
+        assert second not in discovery._cache
+        assert len(discovery._cache) == 50
+        await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_failed_agent_is_skipped():
+    """测试单个智能体获取失败时不影响其他智能体"""
+    app = FastAPI()
+
+    @app.get("/publisher/agents")
+    async def agents():
+        return {"agents": [{"did": _did(1)}, {"did": _did(2)}, {"name": "no did"}]}
+
+    @app.get("/wba/user/{user_id}/did.json")
+    async def did_document(user_id: str):
+        if user_id == f"{2:016x}":
+            return Response(status_code=404)
+        return {"id": _did(1), "service": []}
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+        async with AgentDiscoveryClient(client=client) as discovery:
+            results = await discovery.discover(PUBLISHER_URL)
+        await client.aclose()
+        return results
+
+    results = asyncio.run(run())
+    assert [r["did"] for r in results] == [_did(1)]
+    assert results[0]["agent_description"] is None
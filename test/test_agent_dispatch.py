@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+LocalAgent 请求分发测试
+
+测试按请求类型查表分发、API 精确匹配优先于路径模板、消息通配处理器回退，
+群事件处理器缓存与原线性合并顺序一致且注册后失效，注册开销与群数量无关，并给出分发路径的性能基准。
+"""
+
+import sys
+import time
+import asyncio
+import logging
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.anp_sdk_agent import LocalAgent
+from anp_open_sdk.config.unified_config import UnifiedConfig, get_global_config, set_global_config
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = Path(__file__).parent.parent
+
+
+def _agent(tmp_path) -> LocalAgent:
+    try:
+        get_global_config()
+    except RuntimeError:
+        set_global_config(UnifiedConfig(
+            config_file=str(APP_ROOT / 'anp_open_sdk_framework_demo_agent_unified_config.yaml'),
+            app_root=str(APP_ROOT)
+        ))
+    user_dir = tmp_path / "user_dispatch"
+    user_data = SimpleNamespace(
+        user_dir=str(user_dir), did="did:wba:localhost%3A9527:wba:user:dispatch", name="dispatch",
+        did_doc_path=str(user_dir / "did_document.json"),
+        did_private_key_file_path=str(user_dir / "key-1_private.pem"),
+        jwt_private_key_file_path=str(user_dir / "private_key.pem"),
+        jwt_public_key_file_path=str(user_dir / "public_key.pem"),
+        list_contacts=lambda: [],
+    )
+    return LocalAgent(user_data, name="dispatch")
+
+
+def _linear_group_handlers(agent: LocalAgent, group_id: str, event_type: str):
+    """原先每次事件都执行的线性合并"""
+    handlers = []
+    for et, h in agent._group_global_handlers:
+        if et is None or et == event_type:
+            handlers.append(h)
+    for (gid, et), hs in agent._group_event_handlers.items():
+        if gid == group_id and (et is None or et == event_type):
+            handlers.extend(hs)
+    return handlers
+
+
+def test_api_exact_and_template_routes(tmp_path):
+    """测试精确路径优先，模板路径提取参数，未注册路径返回 404"""
+    agent = _agent(tmp_path)
+
+    async def exact(request_data, request):
+        return {"route": "exact"}
+
+    async def item(request_data, request):
+        return {"route": "item", "params": request_data.get("path_params")}
+
+    async def files(request_data, request):
+        return {"route": "files", "params": request_data.get("path_params")}
+
+    agent.expose_api("/items/latest", exact)
+    agent.expose_api("/items/{item_id}", item)
+    agent.expose_api("/files/{rest:path}", files)
+
+    assert agent._resolve_api_handler("/items/latest") == (exact, {})
+    assert agent._resolve_api_handler("/items/42") == (item, {"item_id": "42"})
+    assert agent._resolve_api_handler("/items/42/extra") == (None, {})
+    assert agent._resolve_api_handler("/files/a/b.txt") == (files, {"rest": "a/b.txt"})
+    assert agent._resolve_api_handler(None) == (None, {})
+
+    async def main():
+        response = await agent.handle_request("caller", {"type": "api_call", "path": "/items/7"}, None)
+        assert response.status_code == 200
+        assert b'"item_id":"7"' in response.body
+        response = await agent.handle_request("caller", {"type": "api_call", "path": "/missing"}, None)
+        assert response.status_code == 404
+
+    asyncio.run(main())
+
+    # 重新注册同一模板时替换原处理器，不重复匹配
+    agent.expose_api("/items/{item_id}", exact)
+    assert agent._resolve_api_handler("/items/42") == (exact, {"item_id": "42"})
+    assert len(agent._api_templates) == 2
+
+    # 不同模板使用同名参数，先注册的模板优先
+    agent.expose_api("/users/{item_id}/items/{rest:path}", item)
+    agent.expose_api("/users/{user_id}/{item_id}", files)
+    assert agent._resolve_api_handler("/users/u1/items/a/b") == (item, {"item_id": "u1", "rest": "a/b"})
+    assert agent._resolve_api_handler("/users/u1/i2") == (files, {"user_id": "u1", "item_id": "i2"})
+    assert agent._resolve_api_handler("/users/u1/items/x") == (item, {"item_id": "u1", "rest": "x"})
+
+
+def test_message_and_unknown_types(tmp_path):
+    """测试消息类型查表、通配处理器回退和未知请求类型"""
+    agent = _agent(tmp_path)
+
+    async def text_handler(data):
+        return "text"
+
+    async def fallback(data):
+        return {"anp_result": "fallback"}
+
+    async def main():
+        assert "未找到消息处理器" in (await agent.handle_request(
+            "caller", {"type": "message", "message_type": "text"}, None))["anp_result"]["message"]
+        agent.register_message_handler("text", text_handler)
+        agent.register_message_handler("*", fallback)
+        assert await agent.handle_request("caller", {"type": "message", "message_type": "text"}, None) == {"anp_result": "text"}
+        assert await agent.handle_request("caller", {"type": "message", "message_type": "other"}, None) == {"anp_result": "fallback"}
+        assert await agent.handle_request("caller", {"type": "bogus"}, None) == \
+            {"anp_result": {"status": "error", "message": "未知的请求类型"}}
+        assert await agent.handle_request("caller", {}, None) == \
+            {"anp_result": {"status": "error", "message": "未知的请求类型"}}
+
+    asyncio.run(main())
+
+
+def test_group_handlers_match_linear_order(tmp_path):
+    """测试注册时合并的群事件处理器与线性合并结果顺序一致，新注册后重新生成"""
+    agent = _agent(tmp_path)
+    handlers = [lambda *a, i=i: i for i in range(8)]
+    agent.register_group_event_handler(handlers[0])
+    agent.register_group_event_handler(handlers[1], group_id="g1", event_type="join")
+    agent.register_group_event_handler(handlers[2], event_type="join")
+    agent.register_group_event_handler(handlers[3], group_id="g1")
+    agent.register_group_event_handler(handlers[4], group_id="g2", event_type="leave")
+
+    cases = [(g, e) for g in ("g1", "g2", "g3") for e in ("join", "leave", "message")]
+    for group_id, event_type in cases:
+        expected = _linear_group_handlers(agent, group_id, event_type)
+        assert agent._get_group_event_handlers(group_id, event_type) == expected
+    # 未注册过的群和事件类型共用注册时生成的列表，分发表不随查询增长
+    assert agent._get_group_event_handlers("g3", "message") is agent._get_group_event_handlers("g4", "other")
+    size = len(agent._group_dispatch)
+    for i in range(100):
+        agent._get_group_event_handlers(f"new_group_{i}", f"new_event_{i}")
+    assert len(agent._group_dispatch) == size
+
+    # 注册只清空缓存，下次查询时重新合并
+    agent.register_group_event_handler(handlers[5], group_id="g1", event_type="join")
+    agent.register_group_event_handler(handlers[6], event_type="message")
+    for group_id, event_type in cases:
+        assert agent._get_group_event_handlers(group_id, event_type) == \
+            _linear_group_handlers(agent, group_id, event_type)
+    assert handlers[5] in agent._get_group_event_handlers("g1", "join")
+
+    calls = []
+
+    async def recorder(group_id, event_type, event_data):
+        calls.append((group_id, event_type))
+
+    agent.register_group_event_handler(recorder, group_id="g9")
+    asyncio.run(agent._dispatch_group_event("g9", "join", {}))
+    asyncio.run(agent._dispatch_group_event("g8", "join", {}))
+    assert calls == [("g9", "join")]
+
+
+def test_dispatch_benchmark(tmp_path):
+    """基准：大量 API 和群事件处理器注册后的分发开销"""
+    agent = _agent(tmp_path)
+
+    async def handler(request_data, request):
+        return None
+
+    for i in range(500):
+        agent.expose_api(f"/api/{i}", handler)
+    for i in range(50):
+        agent.expose_api(f"/resource_{i}/{{rid}}", handler)
+    for i in range(500):
+        agent.register_group_event_handler(handler, group_id=f"group_{i}", event_type="message")
+
+    rounds = 2000
+    start = time.perf_counter()
+    for i in range(rounds):
+        _linear_group_handlers(agent, f"group_{i % 500}", "message")
+    linear = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        agent._get_group_event_handlers(f"group_{i % 500}", "message")
+    cached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        agent._resolve_api_handler(f"/api/{i % 500}")
+    exact = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        agent._resolve_api_handler(f"/resource_{i % 50}/{i}")
+    template = time.perf_counter() - start
+
+    logger.info(f"群事件处理器: 线性合并 {linear / rounds * 1e6:.2f}us/次, 缓存 {cached / rounds * 1e6:.2f}us/次; "
+                f"API 精确匹配 {exact / rounds * 1e6:.2f}us/次, 模板匹配 {template / rounds * 1e6:.2f}us/次")
+    assert cached < linear
+
+    # 注册开销不随群数量和事件类型组合增长
+    timings = {}
+    for groups in (100, 400):
+        agent = _agent(tmp_path)
+        start = time.perf_counter()
+        for g in range(groups):
+            for e in range(3):
+                agent.register_group_event_handler(handler, group_id=f"group_{g}", event_type=f"event_{e}")
+                agent._get_group_event_handlers(f"group_{g}", f"event_{e}")
+        timings[groups] = time.perf_counter() - start
+    logger.info(f"群事件注册: 100 群 {timings[100] * 1000:.1f}ms, 400 群 {timings[400] * 1000:.1f}ms (每群 3 种事件)")
+    assert timings[400] < 1.0
+    assert timings[400] < timings[100] * 16
+
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO)
+    with tempfile.TemporaryDirectory() as d:
+        test_dispatch_benchmark(Path(d))
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+DIDWba 认证头解析测试
+
+将单次扫描的解析器与原先基于正则的解析器做随机等价测试，覆盖畸形输入的提前拒绝，
+并提供解析性能的微基准。
+"""
+
+import re
+import sys
+import time
+import random
+import string
+import logging
+from pathlib import Path
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.agent_connect_hotpatch.authentication.did_wba import (
+    extract_auth_header_parts_two_way, parse_did_wba_auth_header, DIDWbaAuthHeaderParts, _tokenize_auth_params
+)
+from anp_open_sdk.auth.did_auth_wba import WBAAuth
+from anp_open_sdk.service.router.router_auth import parse_auth_str_to_dict
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ['did', 'nonce', 'timestamp', 'resp_did', 'verification_method', 'signature']
+VALUE_CHARS = string.ascii_letters + string.digits + ':%#-_.+/=@ '
+
+
+def _legacy_extract(auth_header: str):
+    """原先的六次正则解析实现，作为等价测试的参照"""
+    required_fields = {field: rf'(?i){field}="([^"]+)"' for field in FIELDS}
+    if not auth_header.strip().startswith('DIDWba'):
+        raise ValueError("Authorization header must start with 'DIDWba'")
+    parts = {}
+    for field, pattern in required_fields.items():
+        match = re.search(pattern, auth_header)
+        if not match:
+            raise ValueError(f"Missing required field in auth header: {field}")
+        parts[field] = match.group(1)
+    return tuple(parts[field] for field in FIELDS)
+
+
+def _random_header(rng: random.Random, drop: bool = False, extra: bool = False) -> str:
+    fields = list(FIELDS)
+    if drop:
+        # 不删除 did：旧实现会把 resp_did 的值误当作 did
+        fields.remove(rng.choice(FIELDS[1:]))
+    pairs = []
+    for field in fields:
+        key = ''.join(c.upper() if rng.random() < 0.2 else c for c in field)
+        value = ''.join(rng.choice(VALUE_CHARS) for _ in range(rng.randint(1, 40))).strip() or "v"
+        pairs.append(f'{key}="{value}"')
+    if extra:
+        pairs.append(f'extra="{rng.randint(0, 999)}"')
+    separator = rng.choice([", ", ",", " ,  ", "\t, "])
+    return f"{' ' * rng.randint(0, 2)}DIDWba {separator.join(pairs)}{' ' * rng.randint(0, 2)}"
+
+
+def _outcome(func, header):
+    try:
+        return tuple(func(header))
+    except ValueError:
+        return ValueError
+
+
+def test_fuzz_equivalence_with_legacy_parser():
+    """随机生成的合法/缺字段认证头，新旧解析结果一致"""
+    rng = random.Random(2024)
+    for _ in range(5000):
+        header = _random_header(rng, drop=rng.random() < 0.3, extra=rng.random() < 0.3)
+        assert _outcome(extract_auth_header_parts_two_way, header) == _outcome(_legacy_extract, header), header
+
+
+def test_fuzz_corrupted_headers():
+    """随机破坏的认证头：新解析器要么拒绝，要么与旧解析器结果相同"""
+    rng = random.Random(7)
+    for _ in range(5000):
+        header = list(_random_header(rng))
+        for _ in range(rng.randint(1, 3)):
+            position = rng.randrange(len(header))
+            action = rng.random()
+            if action < 0.4:
+                del header[position]
+            elif action < 0.8:
+                header.insert(position, rng.choice('"=, x'))
+            else:
+                header[position] = rng.choice('"=')
+        header = ''.join(header)
+        new = _outcome(extract_auth_header_parts_two_way, header)
+        if new is not ValueError:
+            assert new == _outcome(_legacy_extract, header), header
+
+
+def test_typed_result_and_early_rejection():
+    """测试返回不可变的命名元组，以及畸形输入的拒绝"""
+    header = ('DIDWba did="did:wba:a", nonce="n", timestamp="t", resp_did="did:wba:b", '
+              'verification_method="key-1", signature="sig"')
+    parts = extract_auth_header_parts_two_way(header)
+    assert isinstance(parts, DIDWbaAuthHeaderParts)
+    assert parts.resp_did == "did:wba:b"
+    did, nonce, timestamp, resp_did, keyid, signature = parts
+    assert (did, keyid) == ("did:wba:a", "key-1")
+    with pytest.raises(AttributeError):
+        parts.did = "other"
+
+    # 字段顺序无关，且 resp_did 不会被误当作 did
+    reordered = 'DIDWba resp_did="did:wba:b", did="did:wba:a", nonce="n", timestamp="t", verification_method="k", signature="s"'
+    assert extract_auth_header_parts_two_way(reordered).did == "did:wba:a"
+
+    for malformed in ['Bearer abc', 'DIDWba did="unterminated', 'DIDWba did=unquoted', 'DIDWba junk did="a"',
+                      'DIDWba did="a"nonce="b"', 'DIDWba ="a"']:
+        with pytest.raises(ValueError):
+            extract_auth_header_parts_two_way(malformed)
+
+
+def test_did_extraction_and_str_to_dict():
+    """测试 WBAAuth.extract_did_from_auth_header 与 parse_auth_str_to_dict"""
+    auth = WBAAuth()
+    two_way = 'DIDWba did="a", nonce="n", timestamp="t", resp_did="b", verification_method="k", signature="s"'
+    one_way = 'DIDWba did="a", nonce="n", timestamp="t", verification_method="k", signature="s"'
+    assert auth.extract_did_from_auth_header(two_way) == ("a", "b")
+    assert auth.extract_did_from_auth_header(one_way) == ("a", None)
+    assert auth.extract_did_from_auth_header('DIDWba did="a"') == (None, None)
+    assert auth.extract_did_from_auth_header("Bearer token") == (None, None)
+
+    assert parse_auth_str_to_dict('req_did="a", resp_did="b"') == {"req_did": "a", "resp_did": "b"}
+    assert parse_auth_str_to_dict('req_did="a", broken') == {}
+    assert parse_did_wba_auth_header(two_way)["resp_did"] == "b"
+
+
+def run_parser_benchmark(count: int = 20000):
+    """比较旧解析器与新解析器（未命中/命中缓存）的单次耗时"""
+    rng = random.Random(1)
+    headers = [_random_header(rng) for _ in range(count)]
+
+    start_time = time.perf_counter()
+    for header in headers:
+        _legacy_extract(header)
+    legacy = (time.perf_counter() - start_time) / count
+
+    _tokenize_auth_params.cache_clear()
+    extract_auth_header_parts_two_way.cache_clear()
+    start_time = time.perf_counter()
+    for header in headers:
+        extract_auth_header_parts_two_way(header)
+    uncached = (time.perf_counter() - start_time) / count
+
+    start_time = time.perf_counter()
+    for header in headers[-1000:]:
+        for _ in range(3):
+            extract_auth_header_parts_two_way(header)
+    cached = (time.perf_counter() - start_time) / 3000
+
+    logger.info(f"认证头解析: 正则 {legacy * 1e6:.2f}微秒, 单次扫描 {uncached * 1e6:.2f}微秒, "
+                f"缓存命中 {cached * 1e6:.2f}微秒")
+    return legacy, uncached, cached
+
+
+def test_parser_benchmark():
+    """解析微基准，缓存命中应明显快于正则解析"""
+    legacy, uncached, cached = run_parser_benchmark(5000)
+    assert cached < legacy
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_parser_benchmark()
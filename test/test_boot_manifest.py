@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+多智能体启动清单测试
+
+在临时目录中生成一批 agent（agent_mappings.yaml + agent_handlers.py）和对应的用户目录，
+按 framework_demo 的流程加载 agent 并生成接口文件：有启动清单时未变化的映射文件不再解析、
+用户目录不再重新扫描、接口文件不再重写；修改过的映射文件、用户配置和被删除的接口文件只重建对应部分；
+版本不符的清单按冷启动处理。并给出不用清单、冷缓存和热缓存三种启动耗时的基准。
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import textwrap
+from pathlib import Path
+from types import SimpleNamespace
+
+import yaml
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.anp_sdk_user_data import LocalUserDataManager
+from anp_open_sdk.config.unified_config import UnifiedConfig, get_global_config, set_global_config
+from anp_open_sdk_framework.agent_manager import LocalAgentManager
+from anp_open_sdk_framework.boot_manifest import BootManifest
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = Path(__file__).parent.parent
+AGENT_COUNT = 40
+API_COUNT = 8
+
+
+def _ensure_config():
+    try:
+        get_global_config()
+    except RuntimeError:
+        set_global_config(UnifiedConfig(
+            config_file=str(APP_ROOT / 'anp_open_sdk_framework_demo_agent_unified_config.yaml'),
+            app_root=str(APP_ROOT)
+        ))
+
+
+def _private_key_pem() -> bytes:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    key = ec.generate_private_key(ec.SECP256K1())
+    return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                             serialization.NoEncryption())
+
+
+def _build_tree(root: Path, agent_count: int, api_count: int) -> dict:
+    """生成 agent 配置目录和用户目录，返回路径信息"""
+    agents_dir, users_dir = root / "agents_config", root / "anp_users"
+    prefix = f"bootbench_{os.getpid()}_{root.name[-8:]}".replace("-", "_")
+    key_pem = _private_key_pem()
+    for i in range(agent_count):
+        did = f"did:wba:localhost%3A9527:wba:user:{i:016x}"
+        user_dir = users_dir / f"user_{i:016x}"
+        user_dir.mkdir(parents=True)
+        (user_dir / "agent_cfg.yaml").write_text(yaml.dump({"name": f"agent-{i}", "unique_id": f"{i:016x}", "did": did}),
+                                                 encoding="utf-8")
+        (user_dir / "did_document.json").write_text(json.dumps({"id": did, "key_id": "key-1"}), encoding="utf-8")
+        (user_dir / "key-1_private.pem").write_bytes(key_pem)
+
+        plugin_dir = agents_dir / f"{prefix}_{i}"
+        plugin_dir.mkdir(parents=True)
+        apis = [{"path": f"/api_{n}", "method": "POST", "handler": f"handler_{n}", "summary": f"接口 {n}",
+                 "params": {"a": {"type": "float", "value": 1.0}, "b": {"type": "float", "value": 2.0}},
+                 "result": {"result": {"type": "float", "value": 3.0}}} for n in range(api_count)]
+        (plugin_dir / "agent_mappings.yaml").write_text(
+            yaml.dump({"name": f"agent-{i}", "did": did, "api": apis}, allow_unicode=True), encoding="utf-8")
+        (plugin_dir / "agent_handlers.py").write_text("".join(textwrap.dedent(f"""
+            async def handler_{n}(a: float, b: float):
+                return {{"result": a + b}}
+            """) for n in range(api_count)), encoding="utf-8")
+    return {"agents_dir": agents_dir, "users_dir": users_dir, "prefix": prefix}
+
+
+def _boot(tree: dict, manifest_path=None):
+    """模拟一次进程启动：新的用户数据管理器、重新导入 handler 模块、加载 agent、生成接口文件"""
+    for name in [m for m in sys.modules if m.startswith(tree["prefix"])]:
+        del sys.modules[name]
+    original = LocalUserDataManager._instance
+    LocalUserDataManager._instance = None
+    try:
+        start = time.perf_counter()
+        LocalUserDataManager(str(tree["users_dir"]))
+        manifest = BootManifest.load(manifest_path) if manifest_path else None
+        agent_files = sorted(str(p) for p in tree["agents_dir"].glob("*/agent_mappings.yaml"))
+        agents = [LocalAgentManager.load_agent_from_module(f, manifest)[0] for f in agent_files]
+        sdk = SimpleNamespace(api_registry={})
+
+        async def generate():
+            for agent in agents:
+                await LocalAgentManager.generate_and_save_agent_interfaces(agent, sdk, manifest)
+
+        asyncio.run(generate())
+        if manifest is not None:
+            manifest.save()
+        elapsed = time.perf_counter() - start
+    finally:
+        LocalUserDataManager._instance = original
+    return agents, manifest, elapsed
+
+
+def _interface_mtimes(tree: dict) -> dict:
+    return {str(p): p.stat().st_mtime_ns for p in tree["users_dir"].glob("*/api_interface.*")}
+
+
+@pytest.fixture
+def agent_tree(tmp_path):
+    _ensure_config()
+    tree = _build_tree(tmp_path, agent_count=4, api_count=2)
+    yield tree
+    sys.path[:] = [p for p in sys.path if p != str(tree["agents_dir"])]
+
+
+def test_warm_boot_reuses_unchanged_entries(agent_tree, tmp_path):
+    """测试热启动不解析映射文件、不重载用户目录、不重写接口文件，结果与冷启动一致"""
+    manifest_path = str(tmp_path / "boot_manifest.json")
+    cold_agents, cold, _ = _boot(agent_tree, manifest_path)
+    assert cold.stats["mapping_misses"] == 4 and cold.stats["interface_misses"] == 8
+    assert len(_interface_mtimes(agent_tree)) == 8
+    written = _interface_mtimes(agent_tree)
+
+    warm_agents, warm, _ = _boot(agent_tree, manifest_path)
+    assert warm.stats == {"mapping_hits": 4, "mapping_misses": 0, "user_hits": 4, "user_misses": 0,
+                          "interface_hits": 8, "interface_misses": 0}
+    assert _interface_mtimes(agent_tree) == written
+    assert [(a.id, a.name, sorted(a.api_routes)) for a in warm_agents] == \
+           [(a.id, a.name, sorted(a.api_routes)) for a in cold_agents]
+    assert all(a.api_config for a in warm_agents)
+
+
+def test_changed_entries_are_rebuilt(agent_tree, tmp_path):
+    """测试修改的映射文件、用户配置和被删除的接口文件只重建对应部分，旧版本清单按冷启动处理"""
+    manifest_path = str(tmp_path / "boot_manifest.json")
+    _boot(agent_tree, manifest_path)
+
+    mapping_file = sorted(agent_tree["agents_dir"].glob("*/agent_mappings.yaml"))[1]
+    mapping = yaml.safe_load(mapping_file.read_text(encoding="utf-8"))
+    mapping["name"] = "renamed"
+    mapping["api"][0]["summary"] = "新的说明"
+    mapping_file.write_text(yaml.dump(mapping, allow_unicode=True), encoding="utf-8")
+    user_dirs = sorted(agent_tree["users_dir"].iterdir())
+    cfg_file = user_dirs[2] / "agent_cfg.yaml"
+    cfg_file.write_text(cfg_file.read_text(encoding="utf-8") + "type: service\n", encoding="utf-8")
+    (user_dirs[3] / "api_interface.json").unlink()
+
+    agents, manifest, _ = _boot(agent_tree, manifest_path)
+    assert manifest.stats["mapping_misses"] == 1 and manifest.stats["mapping_hits"] == 3
+    assert manifest.stats["user_misses"] == 1 and manifest.stats["user_hits"] == 3
+    # 改名的 agent 两个接口文件内容都变了，另外补上被删除的 json
+    assert manifest.stats["interface_misses"] == 3
+    assert agents[1].name == "renamed"
+    rpc = json.loads((user_dirs[1] / "api_interface.json").read_text(encoding="utf-8"))
+    assert rpc["methods"][0]["summary"] == "新的说明"
+    assert (user_dirs[3] / "api_interface.json").exists()
+
+    data = json.loads(Path(manifest_path).read_text(encoding="utf-8"))
+    data["version"] = BootManifest.VERSION + 1
+    Path(manifest_path).write_text(json.dumps(data), encoding="utf-8")
+    _, manifest, _ = _boot(agent_tree, manifest_path)
+    assert manifest.stats["mapping_misses"] == 4 and manifest.stats["interface_misses"] == 8
+
+
+def run_boot_benchmark(root: Path, agent_count: int = AGENT_COUNT, api_count: int = API_COUNT, rounds: int = 3):
+    """基准：agent_count 个 agent 不用清单、冷缓存（清单不存在）和热缓存时的启动耗时（取最小值）"""
+    _ensure_config()
+    tree = _build_tree(Path(root), agent_count, api_count)
+    manifest_path = str(Path(root) / "boot_manifest.json")
+    try:
+        _boot(tree)  # 预热：生成字节码缓存
+        legacy = min(_boot(tree)[2] for _ in range(rounds))
+        cold_times = []
+        for _ in range(rounds):
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            cold_times.append(_boot(tree, manifest_path)[2])
+        cold = min(cold_times)
+        warm = min(_boot(tree, manifest_path)[2] for _ in range(rounds))
+    finally:
+        sys.path[:] = [p for p in sys.path if p != str(tree["agents_dir"])]
+    logger.info(f"{agent_count} 个 agent（每个 {api_count} 个接口）启动: 不用清单 {legacy * 1000:.0f}ms, "
+                f"冷缓存 {cold * 1000:.0f}ms, 热缓存 {warm * 1000:.0f}ms")
+    return legacy, cold, warm
+
+
+def test_boot_benchmark(tmp_path):
+    """基准：热缓存启动明显快于冷缓存和不用清单的启动"""
+    legacy, cold, warm = run_boot_benchmark(tmp_path)
+    assert warm < cold / 1.5
+    assert warm < legacy / 3
+
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("anp_open_sdk").setLevel(logging.ERROR)
+    logging.getLogger("anp_open_sdk_framework").setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as root:
+        run_boot_benchmark(Path(root))
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+配置热加载测试
+
+测试无效配置被拒绝并保留当前快照、订阅回调的调用顺序、文件监视自动 reload
+（含 .env 变化）、日志级别和邮箱扫描间隔随配置更新，以及 reload 期间并发读取方看到的配置始终完整一致。
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.config.unified_config import UnifiedConfig, validate_config_data
+from anp_open_sdk.utils.log_base import _apply_log_level
+from anp_open_sdk.service.publisher.anp_sdk_publisher_mail_backend import (
+    EnhancedMailManager, _apply_inbox_scan_interval
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _write_config(path: Path, n: int, extra: str = ""):
+    path.write_text(
+        f"anp_sdk:\n"
+        f"  port: {n}\n"
+        f"  host: host-{n}\n"
+        f"  nonce_expire_minutes: {n}\n"
+        f"log_settings:\n"
+        f"  log_level: INFO\n"
+        f"{extra}",
+        encoding="utf-8"
+    )
+
+
+def _config(tmp_path) -> UnifiedConfig:
+    config_file = tmp_path / "unified_config.yaml"
+    _write_config(config_file, 1)
+    return UnifiedConfig(config_file=str(config_file))
+
+
+def test_validate_config_data():
+    """测试按 config_types 协议校验"""
+    assert validate_config_data({"anp_sdk": {"port": 9527, "host": "localhost"}}) == []
+    assert validate_config_data({"anp_sdk": {"config_watch_interval": 2}}) == []
+    assert validate_config_data({"log_settings": {"log_level": None, "detail": {"file": None}}}) == []
+    assert validate_config_data(["not", "a", "mapping"])
+    errors = validate_config_data({"anp_sdk": {"port": "9527", "debug_mode": 1, "agent": "x"}})
+    assert len(errors) == 3
+    assert any(e.startswith("anp_sdk.port") for e in errors)
+    # 协议中没有的配置项不校验
+    assert validate_config_data({"custom": {"anything": [1, 2]}, "anp_sdk": {"extra": object()}}) == []
+
+
+def test_invalid_config_rejected(tmp_path):
+    """测试无法解析或类型错误的配置被拒绝，不发布快照也不通知订阅者"""
+    config = _config(tmp_path)
+    config_file = tmp_path / "unified_config.yaml"
+    calls = []
+    config.subscribe(lambda new, old: calls.append(new.version))
+    snapshot = config.snapshot
+
+    config_file.write_text("anp_sdk: [unclosed\n", encoding="utf-8")
+    assert config.reload() is False
+    config_file.write_text("anp_sdk:\n  port: not-a-port\n", encoding="utf-8")
+    assert config.reload() is False
+
+    assert config.snapshot is snapshot
+    assert config.anp_sdk.port == 1
+    assert calls == []
+
+    _write_config(config_file, 2)
+    assert config.reload() is True
+    assert config.anp_sdk.port == 2
+    assert calls == [snapshot.version + 1]
+
+
+def test_callback_order(tmp_path):
+    """测试回调按注册顺序调用，收到新旧快照，出错的回调不影响后续回调"""
+    config = _config(tmp_path)
+    calls = []
+
+    def first(new, old):
+        calls.append(("first", old.anp_sdk.port, new.anp_sdk.port))
+
+    def broken(new, old):
+        calls.append(("broken",))
+        raise RuntimeError("boom")
+
+    def last(new, old):
+        calls.append(("last", new.version))
+
+    for callback in (first, broken, last):
+        config.subscribe(callback)
+    _write_config(tmp_path / "unified_config.yaml", 5)
+    assert config.reload()
+    assert calls == [("first", 1, 5), ("broken",), ("last", config.snapshot.version)]
+
+    config.unsubscribe(broken)
+    calls.clear()
+    assert config.reload()
+    assert [c[0] for c in calls] == ["first", "last"]
+
+
+def test_concurrent_reloads_notify_in_version_order(tmp_path):
+    """测试多个线程同时 reload 时，回调看到的版本严格递增"""
+    config = _config(tmp_path)
+    versions = []
+    config.subscribe(lambda new, old: versions.append((old.version, new.version)))
+
+    threads = [threading.Thread(target=config.reload) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(versions) == 8
+    for old_version, new_version in versions:
+        assert new_version == old_version + 1
+    assert [v for _, v in versions] == sorted(v for _, v in versions)
+
+
+def test_readers_during_swap(tmp_path):
+    """测试有效和无效配置交替写入并 reload 时，读取方看到的配置始终完整"""
+    config = _config(tmp_path)
+    config_file = tmp_path / "unified_config.yaml"
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            node = config.anp_sdk
+            if node.host != f"host-{node.port}" or node.nonce_expire_minutes != node.port:
+                errors.append((node.port, node.host, node.nonce_expire_minutes))
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    try:
+        for n in range(2, 40):
+            _write_config(config_file, n)
+            assert config.reload()
+            config_file.write_text(f"anp_sdk:\n  port: {n}\n  host: {n}\n  debug_mode: maybe\n", encoding="utf-8")
+            assert not config.reload()
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    assert errors == []
+    assert config.anp_sdk.port == 39
+
+
+def test_file_watching(tmp_path):
+    """测试监视线程在配置文件或 .env 变化后自动 reload"""
+    config = _config(tmp_path)
+    config._env_file = tmp_path / ".env"
+    config_file = tmp_path / "unified_config.yaml"
+    changes = []
+    config.subscribe(lambda new, old: changes.append(new.anp_sdk.port))
+
+    def wait_for(predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if predicate():
+                return True
+            time.sleep(0.02)
+        return False
+
+    config.start_watching(interval=0.05)
+    try:
+        time.sleep(0.1)
+        _write_config(config_file, 7, extra="# changed\n")
+        assert wait_for(lambda: config.anp_sdk.port == 7)
+
+        config._env_file.write_text("ANP_TEST_RELOAD_VALUE=42\n", encoding="utf-8")
+        assert wait_for(lambda: os.environ.get("ANP_TEST_RELOAD_VALUE") == "42")
+        assert wait_for(lambda: len(changes) >= 2)
+    finally:
+        config.stop_watching()
+        os.environ.pop("ANP_TEST_RELOAD_VALUE", None)
+    assert config._watch_thread is None
+
+
+def test_watching_is_reference_counted(tmp_path):
+    """测试多个使用方共用一个监视线程，最后一个 stop_watching 时才停止"""
+    config = _config(tmp_path)
+    config.start_watching(interval=0.05)
+    thread = config._watch_thread
+    config.start_watching(interval=0.05)
+    assert config._watch_thread is thread
+    config.stop_watching()
+    assert config._watch_thread is thread and thread.is_alive()
+    config.stop_watching()
+    assert config._watch_thread is None and not thread.is_alive()
+    config.stop_watching()
+    assert config._watch_refs == 0
+
+
+def test_log_level_follows_config(tmp_path):
+    """测试日志级别回调按新配置调整根日志记录器"""
+    config = _config(tmp_path)
+    root_logger = logging.getLogger()
+    original = root_logger.level
+    config.subscribe(_apply_log_level)
+    try:
+        (tmp_path / "unified_config.yaml").write_text("log_settings:\n  log_level: error\n", encoding="utf-8")
+        assert config.reload()
+        assert root_logger.level == logging.ERROR
+    finally:
+        root_logger.setLevel(original)
+
+
+def test_inbox_scan_interval_follows_config(tmp_path):
+    """测试邮箱扫描间隔回调按新配置调整共用本地后端"""
+    config = _config(tmp_path)
+    manager = EnhancedMailManager.shared(use_local_backend=True, local_mail_dir=str(tmp_path / "mail"))
+    config.subscribe(_apply_inbox_scan_interval)
+    try:
+        (tmp_path / "unified_config.yaml").write_text("mail:\n  inbox_scan_interval: 7.5\n", encoding="utf-8")
+        assert config.reload()
+        assert manager.backend.EXTERNAL_SCAN_INTERVAL == 7.5
+        (tmp_path / "unified_config.yaml").write_text("mail:\n  use_local_backend: true\n", encoding="utf-8")
+        assert config.reload()
+        assert manager.backend.EXTERNAL_SCAN_INTERVAL == type(manager.backend).EXTERNAL_SCAN_INTERVAL
+    finally:
+        EnhancedMailManager.close_shared()
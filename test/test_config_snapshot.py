@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+配置快照与路径解析缓存测试
+
+测试 reload 时整体发布新快照、并发读取方不会读到新旧混杂的配置，
+resolve_path 按输入缓存且 reload 后失效，并给出热路径读取的性能基准。
+"""
+
+import sys
+import time
+import threading
+import logging
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.config import unified_config
+from anp_open_sdk.config.unified_config import UnifiedConfig
+
+logger = logging.getLogger(__name__)
+
+
+def _write_config(path: Path, n: int):
+    path.write_text(
+        f"anp_sdk:\n"
+        f"  port: {n}\n"
+        f"  host: host-{n}\n"
+        f"  user_did_path: \"{{APP_ROOT}}/users-{n}\"\n"
+        f"llm:\n"
+        f"  max_tokens: {n}\n",
+        encoding="utf-8"
+    )
+
+
+def _config(tmp_path, n=1) -> UnifiedConfig:
+    config_file = tmp_path / "unified_config.yaml"
+    _write_config(config_file, n)
+    return UnifiedConfig(config_file=str(config_file))
+
+
+def test_reload_publishes_new_snapshot(tmp_path):
+    """测试 reload 发布新版本快照，旧快照保持不变，删除的顶层配置不再可见"""
+    config = _config(tmp_path)
+    old = config.snapshot
+    assert config.anp_sdk is old.anp_sdk
+    assert old.anp_sdk.port == 1
+
+    config_file = tmp_path / "unified_config.yaml"
+    config_file.write_text("anp_sdk:\n  port: 2\n  host: host-2\n", encoding="utf-8")
+    config.reload()
+
+    assert config.snapshot.version == old.version + 1
+    assert config.anp_sdk.port == 2
+    assert old.anp_sdk.port == 1
+    assert not hasattr(config, "llm")
+    assert "llm" not in config.snapshot.nodes
+
+
+def test_concurrent_readers_during_reload(tmp_path):
+    """测试反复 reload 期间，读取方看到的每个快照内部都一致"""
+    config = _config(tmp_path)
+    config_file = tmp_path / "unified_config.yaml"
+    stop = threading.Event()
+    errors = []
+    reads = [0]
+
+    def reader():
+        while not stop.is_set():
+            snapshot = config.snapshot
+            node = config.anp_sdk
+            if node.host != f"host-{node.port}":
+                errors.append(("node", node.port, node.host))
+            if snapshot.anp_sdk.port != snapshot.llm.max_tokens:
+                errors.append(("snapshot", snapshot.anp_sdk.port, snapshot.llm.max_tokens))
+            reads[0] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    try:
+        for n in range(2, 60):
+            _write_config(config_file, n)
+            config.reload()
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+    assert errors == []
+    assert reads[0] > 0
+    assert config.anp_sdk.port == 59
+
+
+def test_resolve_path_memoized_and_invalidated(tmp_path):
+    """测试 resolve_path 按输入缓存，reload 后重新解析"""
+    config = _config(tmp_path)
+    app_root = UnifiedConfig.get_app_root()
+    unified_config._resolve_path_cached.cache_clear()
+
+    first = UnifiedConfig.resolve_path("{APP_ROOT}/a/../b")
+    hits = unified_config._resolve_path_cached.cache_info().hits
+    assert UnifiedConfig.resolve_path("{APP_ROOT}/a/../b") == first
+    assert unified_config._resolve_path_cached.cache_info().hits == hits + 1
+    assert first == (app_root / "b").resolve()
+    assert UnifiedConfig.resolve_path("relative/x") == (app_root / "relative/x").resolve()
+
+    config.reload()
+    assert unified_config._resolve_path_cached.cache_info().currsize <= 1
+
+
+def test_hot_path_benchmark(tmp_path):
+    """基准：缓存后的 resolve_path、配置读取和 get_global_config"""
+    previous = unified_config._global_config
+    config = _config(tmp_path)
+    unified_config._global_config = config
+    paths = [f"{{APP_ROOT}}/anp_users/user_{i}/did_document.json" for i in range(100)]
+    rounds = 100
+    try:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for p in paths:
+                Path(p.replace('{APP_ROOT}', str(UnifiedConfig.get_app_root()))).resolve()
+        uncached = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for p in paths:
+                UnifiedConfig.resolve_path(p)
+        cached = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(rounds * len(paths)):
+            unified_config.get_global_config().anp_sdk.port
+        read = time.perf_counter() - start
+    finally:
+        unified_config._global_config = previous
+
+    calls = rounds * len(paths)
+    logger.info(f"resolve_path: 未缓存 {uncached / calls * 1e6:.2f}us/次, 缓存 {cached / calls * 1e6:.2f}us/次; "
+                f"get_global_config().anp_sdk.port {read / calls * 1e6:.3f}us/次")
+    assert cached < uncached
+
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO)
+    with tempfile.TemporaryDirectory() as d:
+        test_hot_path_benchmark(Path(d))
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+ContactManager 有界缓存测试
+
+测试联系人和 token 缓存按 LRU 顺序淘汰、被淘汰的条目在下次访问时从存储加载、重新创建管理器后
+数据仍在（持久化）、按主机索引查询、user_data 上的字典换成同一组有界缓存，AgentContactBook 使用
+相同结构，并给出 100 万个对端的内存基准（直接运行本文件；pytest 中用 10 万个对端）。
+"""
+
+import gc
+import sys
+import time
+import logging
+import tracemalloc
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.anp_sdk_user_data import LocalUserData
+from anp_open_sdk.contact_manager import ContactManager, ContactStore, LRUCache, did_host
+from anp_open_sdk.service.router.router_agent import AgentContactBook
+
+logger = logging.getLogger(__name__)
+
+PEER_COUNT = 1_000_000
+CACHE_SIZE = 10_000
+BATCH_SIZE = 10_000
+
+
+def _did(i: int, host: str = "localhost") -> str:
+    return f"did:wba:{host}%3A9527:wba:user:{i:016x}"
+
+
+def _contact(i: int, host: str = "localhost") -> dict:
+    return {"did": _did(i, host), "name": f"peer-{i}", "description": "", "tags": ["crawled"]}
+
+
+def _user_data(user_dir) -> LocalUserData:
+    return LocalUserData("owner", {"name": "owner"}, {"id": "did:wba:localhost%3A9527:wba:user:owner"},
+                         None, {}, str(user_dir))
+
+
+def test_lru_eviction_order():
+    """测试写入和 get 更新使用顺序，超出容量时淘汰最久未用的条目，迭代不改变顺序"""
+    cache = LRUCache(3)
+    for key in "abc":
+        cache[key] = key.upper()
+    assert cache.get("a") == "A"
+    cache["d"] = "D"
+    assert list(cache) == ["c", "a", "d"] and cache.evictions == 1
+    cache["c"] = "C2"
+    cache["e"] = "E"
+    assert list(cache) == ["d", "c", "e"]
+    assert dict(cache) == {"d": "D", "c": "C2", "e": "E"}
+    assert list(cache) == ["d", "c", "e"]
+    assert cache.get("a") is None
+
+    unbounded = LRUCache(0)
+    for i in range(100):
+        unbounded[i] = i
+    assert len(unbounded) == 100 and unbounded.evictions == 0
+
+
+def test_contacts_and_tokens_evicted_and_loaded_lazily(tmp_path):
+    """测试联系人和 token 按 LRU 淘汰，淘汰后从存储加载并重新成为最近使用的条目"""
+    user_data = _user_data(tmp_path)
+    manager = ContactManager(user_data, max_contacts=3, max_tokens=2)
+    for i in range(3):
+        manager.add_contact(_contact(i))
+    manager.get_contact(_did(0))
+    manager.add_contact(_contact(3))
+    assert list(manager._contacts) == [_did(2), _did(0), _did(3)]
+    assert user_data.contacts is manager._contacts
+
+    # 未命中从存储加载，并淘汰当前最久未用的条目
+    assert manager.get_contact(_did(1)) == _contact(1)
+    assert list(manager._contacts) == [_did(0), _did(3), _did(1)]
+    assert manager.count_contacts() == 4 and len(manager.list_contacts()) == 4
+    assert manager.get_contact("did:wba:localhost%3A9527:wba:user:missing") is None
+
+    for i in range(3):
+        manager.store_token_to_remote(_did(i), f"token-{i}", 3600)
+    assert list(user_data.token_to_remote_dict) == [_did(1), _did(2)]
+    assert manager.get_token_to_remote(_did(0))["token"] == "token-0"
+    assert list(manager._token_to_remote) == [_did(2), _did(0)]
+    manager.revoke_token_to_remote(_did(0))
+    assert manager.get_token_to_remote(_did(0)) is None
+
+    manager.store_token_from_remote(_did(1), "from-1")
+    manager.store_token_from_remote(_did(2), "from-2")
+    manager.store_token_from_remote(_did(3), "from-3")
+    manager.revoke_token_from_remote(_did(1))
+    assert manager.get_token_from_remote(_did(1))["is_revoked"] is True
+    assert list(manager._token_from_remote) == [_did(3), _did(1)]
+
+
+def test_store_persists_and_indexes_by_host(tmp_path):
+    """测试重新创建管理器后联系人和 token 仍可读取，按主机查询走索引"""
+    user_data = _user_data(tmp_path)
+    user_data.contacts = {_did(100): _contact(100)}
+    manager = ContactManager(user_data, max_contacts=2, max_tokens=2)
+    manager.add_contacts([_contact(i, "a.example.com") for i in range(5)])
+    manager.add_contact(_contact(5, "b.example.com"))
+    manager.store_token_to_remote(_did(1, "a.example.com"), "persisted", 3600)
+    assert len(manager._contacts) == 2
+    assert (tmp_path / ContactStore.STORE_FILE).exists()
+
+    restarted = ContactManager(_user_data(tmp_path), max_contacts=2, max_tokens=2)
+    assert not restarted._contacts
+    assert restarted.get_contact(_did(100)) == _contact(100)
+    assert restarted.get_token_to_remote(_did(1, "a.example.com"))["token"] == "persisted"
+    assert [c["did"] for c in restarted.contacts_by_host("a.example.com")] == [_did(i, "a.example.com") for i in range(5)]
+    assert restarted.contacts_by_host("b.example.com") == [_contact(5, "b.example.com")]
+    assert restarted.count_contacts() == 7
+    assert did_host(_did(1, "a.example.com")) == "a.example.com"
+    assert did_host("did:wba:example.com:user:alice") == "example.com"
+
+
+def test_shared_manager_per_user_dir(tmp_path):
+    """测试同一用户目录重新加载的 user_data 共用一个管理器和存储连接，缓存和已写入的数据保留"""
+    first = _user_data(tmp_path)
+    manager = ContactManager.for_user_data(first)
+    try:
+        manager.add_contact(_contact(1))
+        manager.store_token_to_remote(_did(1), "shared", 3600)
+
+        reloaded = _user_data(tmp_path)
+        reloaded.contacts[_did(2)] = _contact(2)
+        again = ContactManager.for_user_data(reloaded)
+        assert again is manager and again.store is manager.store and again.user_data is reloaded
+        assert reloaded.contacts is manager._contacts and reloaded.token_to_remote_dict is manager._token_to_remote
+        assert set(reloaded.contacts) == {_did(1), _did(2)}
+        assert again.get_token_to_remote(_did(1))["token"] == "shared"
+        assert again.count_contacts() == 2
+        assert ContactManager.for_user_data(reloaded) is manager
+
+        other = tmp_path / "other"
+        other.mkdir()
+        assert ContactManager.for_user_data(_user_data(other)) is not manager
+    finally:
+        for key in [key for key in ContactManager._shared if key.startswith(str(tmp_path))]:
+            ContactManager._shared.pop(key).close()
+
+
+def test_agent_contact_book_uses_bounded_store(tmp_path):
+    """测试 AgentContactBook 只在内存中保留最近的联系人，交互记录写入用户目录下的存储"""
+    book = AgentContactBook("did:wba:localhost%3A9527:wba:user:owner", max_contacts=2, user_dir=str(tmp_path))
+    assert book.store.path == str(tmp_path / AgentContactBook.STORE_FILE)
+    book.add_contact(_did(0), tags=["weather"])
+    book.add_contact(_did(1, "b.example.com"), name="bob")
+    book.add_contact(_did(2))
+    assert list(book.contacts) == [_did(1, "b.example.com"), _did(2)]
+
+    book.add_contact(_did(0))
+    assert book.get_contact(_did(0))["interaction_count"] == 2
+    assert list(book.contacts) == [_did(2), _did(0)]
+    assert set(book.get_contacts()) == {_did(0), _did(1, "b.example.com"), _did(2)}
+    assert list(book.get_contacts("weather")) == [_did(0)]
+    assert book.get_contacts_by_host("b.example.com")[_did(1, "b.example.com")]["name"] == "bob"
+    book.store.close()
+
+    reopened = AgentContactBook("did:wba:localhost%3A9527:wba:user:owner", user_dir=str(tmp_path))
+    assert reopened.get_contact(_did(0))["interaction_count"] == 2
+    reopened.store.close()
+
+
+def run_memory_benchmark(peer_count: int = PEER_COUNT, cache_size: int = CACHE_SIZE, store_dir: str = None):
+    """基准：peer_count 个对端的联系人和 token 放在普通字典与有界 ContactManager 中的 Python 堆内存
+
+    SQLite 的页缓存不经过 tracemalloc，默认上限约 2MB，另外记录存储文件大小。
+    """
+    import tempfile
+
+    def peers(start: int, stop: int):
+        contacts = [_contact(i, f"host-{i % 1000}.example.com") for i in range(start, stop)]
+        tokens = [(c["did"], {"token": f"token-{i:08x}", "created_at": "2024-01-01T00:00:00+00:00",
+                              "expires_at": "2099-01-01T00:00:00+00:00", "is_revoked": False,
+                              "req_did": c["did"]}) for i, c in zip(range(start, stop), contacts)]
+        return contacts, tokens
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        legacy_contacts, legacy_tokens = {}, {}
+        for start in range(0, peer_count, BATCH_SIZE):
+            contacts, tokens = peers(start, min(start + BATCH_SIZE, peer_count))
+            for contact in contacts:
+                legacy_contacts[contact["did"]] = contact
+            legacy_tokens.update(tokens)
+        gc.collect()
+        legacy = tracemalloc.get_traced_memory()[0] - base
+        del legacy_contacts, legacy_tokens, contacts, tokens
+        gc.collect()
+
+        with tempfile.TemporaryDirectory(dir=store_dir) as user_dir:
+            base = tracemalloc.get_traced_memory()[0]
+            manager = ContactManager(_user_data(user_dir), max_contacts=cache_size, max_tokens=cache_size)
+            start_time = time.perf_counter()
+            for start in range(0, peer_count, BATCH_SIZE):
+                contacts, tokens = peers(start, min(start + BATCH_SIZE, peer_count))
+                manager.add_contacts(contacts)
+                manager.store.put_tokens(ContactManager.TO_REMOTE, tokens)
+            del contacts, tokens
+            insert_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            lookups = min(peer_count, cache_size * 2)
+            for i in range(0, peer_count, max(1, peer_count // lookups)):
+                assert manager.get_contact(_did(i, f"host-{i % 1000}.example.com")) is not None
+                assert manager.get_token_to_remote(_did(i, f"host-{i % 1000}.example.com")) is not None
+            lookup_time = time.perf_counter() - start_time
+            assert len(manager._contacts) == cache_size and len(manager._token_to_remote) == cache_size
+            assert len(manager.contacts_by_host("host-7.example.com")) == peer_count // 1000
+            gc.collect()
+            bounded = tracemalloc.get_traced_memory()[0] - base
+            store_size = sum(f.stat().st_size for f in Path(user_dir).glob(f"{ContactStore.STORE_FILE}*"))
+            manager.store.close()
+    finally:
+        tracemalloc.stop()
+
+    logger.info(f"{peer_count} 个对端: 普通字典 {legacy / 1e6:.1f}MB, 有界缓存（{cache_size} 条）"
+                f"{bounded / 1e6:.1f}MB, 存储文件 {store_size / 1e6:.1f}MB; "
+                f"写入 {insert_time:.1f}s, {lookups} 次查询 {lookup_time:.2f}s")
+    return legacy, bounded
+
+
+def test_memory_benchmark(tmp_path):
+    """基准：有界缓存的内存不随对端数增长；测试中用 10 万个对端（100 万个写入约两分钟，见 __main__）"""
+    legacy, bounded = run_memory_benchmark(PEER_COUNT // 10, store_dir=str(tmp_path))
+    assert bounded < legacy / 4
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_memory_benchmark()
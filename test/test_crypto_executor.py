@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+密码学线程池测试
+
+测试 BoundedExecutor 的准入上限和结果/异常传递、JWT 私钥解析缓存，并基准测试握手洪峰下普通请求的 p99 延迟：
+握手（验签 + RS256 签发 + 校验令牌）在事件循环上执行时，普通请求排在所有握手之后；
+交给线程池后，普通请求不受影响。
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import jwt
+import httpx
+import pytest
+from fastapi import FastAPI
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+
+from anp_open_sdk.utils.bounded_executor import BoundedExecutor
+from anp_open_sdk.auth.token_nonce_auth import get_jwt_signing_key
+from anp_open_sdk.agent_connect_hotpatch.authentication.did_wba import (
+    generate_auth_header_two_way, verify_auth_header_signature_two_way, _public_key_to_jwk
+)
+
+logger = logging.getLogger(__name__)
+
+HANDSHAKES = int(os.environ.get("ANP_BENCH_HANDSHAKES", "200"))
+DID = "did:wba:localhost%3A9527:wba:user:0123456789abcdef"
+SERVICE = "localhost"
+
+
+def test_admission_limit():
+    """测试同时提交到线程池的任务不超过 max_pending"""
+    executor = BoundedExecutor(max_workers=4, max_pending=2)
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def work(i):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.01)
+        with lock:
+            state["running"] -= 1
+        return i * 2
+
+    async def main():
+        return await asyncio.gather(*(executor.run(work, i) for i in range(12)))
+
+    try:
+        assert asyncio.run(main()) == [i * 2 for i in range(12)]
+        assert state["peak"] == 2
+    finally:
+        executor.shutdown()
+
+
+def test_exception_propagates():
+    """测试线程池中的异常原样抛给调用方，关键字参数正常传递"""
+    executor = BoundedExecutor(max_workers=1)
+
+    secret = "s" * 32
+
+    async def main():
+        with pytest.raises(jwt.InvalidTokenError):
+            await executor.run(jwt.decode, "not-a-token", secret, algorithms=["HS256"])
+        token = await executor.run(jwt.encode, {"a": 1}, secret, algorithm="HS256")
+        return await executor.run(jwt.decode, token, secret, algorithms=["HS256"])
+
+    try:
+        assert asyncio.run(main()) == {"a": 1}
+    finally:
+        executor.shutdown()
+
+
+def test_jwt_signing_key_cached_until_file_changes(tmp_path):
+    """测试解析后的 JWT 私钥按文件缓存，替换密钥文件后重新加载"""
+    key_path = tmp_path / "private_key.pem"
+
+    def write_key():
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        key_path.write_bytes(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+        return key
+
+    first = write_key()
+    loaded = get_jwt_signing_key(str(key_path))
+    assert loaded.private_numbers() == first.private_numbers()
+    assert get_jwt_signing_key(str(key_path)) is loaded
+
+    second = write_key()
+    os.utime(key_path, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+    reloaded = get_jwt_signing_key(str(key_path))
+    assert reloaded.private_numbers() == second.private_numbers()
+    assert get_jwt_signing_key(str(tmp_path / "missing.pem")) is None
+
+
+def _sign(private_key):
+    def sign(content, fragment):
+        # encode_signature 按最短字节长度拼接 R|S，避开 r/s 不足 32 字节的签名以免验签偶发失败
+        while True:
+            signature = private_key.sign(content, ec.ECDSA(hashes.SHA256()))
+            r, s = decode_dss_signature(signature)
+            if r.bit_length() > 248 and s.bit_length() > 248:
+                return signature
+    return sign
+
+
+def _handshake_app(offload: bool, executor: BoundedExecutor) -> FastAPI:
+    did_key = ec.generate_private_key(ec.SECP256K1())
+    did_document = {
+        "id": DID,
+        "verificationMethod": [{
+            "id": f"{DID}#key-1",
+            "type": "EcdsaSecp256k1VerificationKey2019",
+            "controller": DID,
+            "publicKeyJwk": _public_key_to_jwk(did_key.public_key())
+        }],
+        "authentication": [f"{DID}#key-1"]
+    }
+    auth_header = generate_auth_header_two_way(did_document, "did:wba:resp", SERVICE, _sign(did_key))
+    jwt_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def handshake():
+        is_valid, message = verify_auth_header_signature_two_way(auth_header, did_document, SERVICE)
+        assert is_valid, message
+        token = jwt.encode({"req_did": DID, "exp": int(time.time()) + 60}, jwt_key, algorithm="RS256")
+        return jwt.decode(token, jwt_key.public_key(), algorithms=["RS256"])
+
+    app = FastAPI()
+
+    @app.get("/handshake")
+    async def handshake_route():
+        payload = await executor.run(handshake) if offload else handshake()
+        return {"req_did": payload["req_did"]}
+
+    @app.get("/plain")
+    async def plain_route():
+        return {"ok": True}
+
+    return app
+
+
+async def _plain_latencies_under_flood(offload: bool, executor: BoundedExecutor, interval: float = 0.005):
+    app = _handshake_app(offload, executor)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.get("/plain")
+        latencies = []
+
+        async def probe(scheduled):
+            response = await client.get("/plain")
+            assert response.status_code == 200
+            latencies.append(time.perf_counter() - scheduled)
+
+        # 普通请求按固定节拍到达，各自独立处理；延迟从到达时间算起，
+        # 事件循环被握手阻塞期间到达的请求，其等待时间也计入
+        flood = asyncio.gather(*(client.get("/handshake") for _ in range(HANDSHAKES)))
+        probes = []
+        start = time.perf_counter()
+        while not flood.done():
+            scheduled = start + len(probes) * interval
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            probes.append(asyncio.create_task(probe(scheduled)))
+        responses = await flood
+        await asyncio.gather(*probes)
+    assert all(r.status_code == 200 for r in responses)
+    latencies.sort()
+    return latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], len(latencies)
+
+
+def test_plain_request_p99_under_handshake_flood():
+    """握手洪峰期间普通请求的 p99 延迟：线程池执行明显低于事件循环内联执行"""
+    executor = BoundedExecutor(max_workers=4, max_pending=16)
+    try:
+        inline_p99, inline_samples = asyncio.run(_plain_latencies_under_flood(False, executor))
+        offload_p99, offload_samples = asyncio.run(_plain_latencies_under_flood(True, executor))
+    finally:
+        executor.shutdown()
+
+    logger.info(f"{HANDSHAKES} 个并发握手期间普通请求 p99: 内联 {inline_p99 * 1000:.1f}ms "
+                f"({inline_samples} 个样本), 线程池 {offload_p99 * 1000:.1f}ms ({offload_samples} 个样本)")
+    assert offload_p99 < inline_p99
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    HANDSHAKES = 1000
+    test_admission_limit()
+    test_exception_propagates()
+    test_plain_request_p99_under_handshake_flood()
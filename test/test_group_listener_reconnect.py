@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+群组监听自动重连测试
+
+本地 aiohttp 服务使用 GroupRunner.event_stream 输出 SSE，并随机断开连接或停止发送数据，
+验证 GroupMemberSDK.listen_group 能通过 Last-Event-ID 续传且每条消息只收到一次，
+无法解析的单帧被跳过而不触发重连，不可重试的 4xx 响应直接结束监听。
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+from pathlib import Path
+
+from aiohttp import web
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.service.interaction.anp_sdk_group_runner import GroupRunner, Message, MessageType, Agent
+from anp_open_sdk.service.interaction.anp_sdk_group_member import GroupMemberSDK, ListenerState
+
+logger = logging.getLogger(__name__)
+
+
+class EchoRunner(GroupRunner):
+    async def on_agent_join(self, agent: Agent) -> bool:
+        return True
+
+    async def on_agent_leave(self, agent: Agent):
+        pass
+
+    async def on_message(self, message: Message):
+        await self.broadcast(message)
+        return None
+
+
+async def _start_server(runner: GroupRunner, drop_probability: float = 0.0, stall_first: bool = False):
+    """启动群组 SSE 服务，按概率在写入后断开连接；stall_first 时第一个连接只发响应头"""
+    stats = {"connections": 0, "last_event_ids": []}
+    rng = random.Random(42)
+
+    async def connect(request: web.Request):
+        stats["connections"] += 1
+        last_event_id = request.headers.get("Last-Event-ID")
+        stats["last_event_ids"].append(last_event_id)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        if stall_first and stats["connections"] == 1:
+            await asyncio.sleep(3600)
+        stream = runner.event_stream(request.query["req_did"],
+                                     int(last_event_id) if last_event_id else None, heartbeat_interval=10)
+        try:
+            async for chunk in stream:
+                await response.write(chunk.encode())
+                if rng.random() < drop_probability:
+                    request.transport.close()
+                    break
+        finally:
+            await stream.aclose()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/agent/group/{did}/{group_id}/connect", connect)
+    app_runner = web.AppRunner(app, handler_cancellation=True, shutdown_timeout=0.1)
+    await app_runner.setup()
+    site = web.TCPSite(app_runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return app_runner, port, stats
+
+
+def _member(port: int) -> GroupMemberSDK:
+    member = GroupMemberSDK("alice", port, base_url="http://127.0.0.1", use_local_optimization=False)
+    member.RECONNECT_BASE_DELAY = 0.01
+    member.RECONNECT_MAX_DELAY = 0.05
+    return member
+
+
+def test_reconnect_with_random_drops():
+    """测试服务端随机断开连接时消息按序且不重复地全部送达"""
+    message_count = 200
+
+    async def run():
+        runner = EchoRunner("g1")
+        app_runner, port, stats = await _start_server(runner, drop_probability=0.1)
+        member = _member(port)
+        received, states = [], []
+
+        async def on_message(message: Message):
+            received.append(message.content)
+
+        await member.listen_group("g1", on_message, on_state_change=states.append)
+        for i in range(message_count):
+            while not runner.listeners.get("alice"):
+                await asyncio.sleep(0.005)
+            await runner.broadcast(Message(MessageType.TEXT, i, "bob", "g1", time.time()))
+            await asyncio.sleep(0.001)
+
+        deadline = time.time() + 10
+        while len(received) < message_count and time.time() < deadline:
+            await asyncio.sleep(0.01)
+        await member.close()
+        await app_runner.cleanup()
+        return received, states, stats
+
+    received, states, stats = asyncio.run(run())
+    assert received == list(range(message_count))
+    assert stats["connections"] > 1
+    assert any(event_id is not None for event_id in stats["last_event_ids"])
+    assert states[0] == ListenerState.CONNECTED
+    assert ListenerState.RECONNECTING in states
+    assert states[-1] == ListenerState.CLOSED
+
+
+def test_stalled_stream_is_detected():
+    """测试连接建立后长时间无数据时触发重连"""
+    async def run():
+        runner = EchoRunner("g1")
+        app_runner, port, stats = await _start_server(runner, stall_first=True)
+        member = _member(port)
+        member.READ_TIMEOUT = 0.2
+        received, states = [], []
+
+        async def on_message(message: Message):
+            received.append(message.content)
+
+        await member.listen_group("g1", on_message, on_state_change=states.append)
+        while not runner.listeners.get("alice"):
+            await asyncio.sleep(0.01)
+        await runner.broadcast(Message(MessageType.TEXT, "after stall", "bob", "g1", time.time()))
+        while not received:
+            await asyncio.sleep(0.01)
+        await member.close()
+        await app_runner.cleanup()
+        return received, states, stats
+
+    received, states, stats = asyncio.run(asyncio.wait_for(run(), timeout=10))
+    assert received == ["after stall"]
+    assert stats["connections"] == 2
+    assert states[:3] == [ListenerState.CONNECTED, ListenerState.RECONNECTING, ListenerState.CONNECTED]
+
+
+def test_backoff_grows_when_server_is_down():
+    """测试服务不可用时按指数退避重试"""
+    async def run():
+        member = GroupMemberSDK("alice", 1, base_url="http://127.0.0.1", use_local_optimization=False)
+        member.RECONNECT_BASE_DELAY = 0.02
+        member.RECONNECT_MAX_DELAY = 0.08
+        states = []
+        await member.listen_group("g1", lambda m: None, on_state_change=states.append)
+        await asyncio.sleep(0.5)
+        await member.close()
+        return states
+
+    states = asyncio.run(run())
+    reconnects = states.count(ListenerState.RECONNECTING)
+    # 等待上限 0.08 秒、平均 0.04 秒，0.5 秒内重试次数应明显少于无退避时
+    assert 3 <= reconnects < 60
+    assert ListenerState.CONNECTED not in states
+    assert states[-1] == ListenerState.CLOSED
+
+
+def test_reconnect_after_server_close_event():
+    """测试服务端停机发送 close 事件后按 retry 间隔重连并续传，不走指数退避"""
+    async def run():
+        runner = EchoRunner("g1")
+        app_runner, port, stats = await _start_server(runner)
+        member = _member(port)
+        member.RECONNECT_BASE_DELAY = 5
+        received, states = [], []
+
+        async def on_message(message: Message):
+            received.append(message.content)
+
+        await member.listen_group("g1", on_message, on_state_change=states.append)
+        while not runner.listeners.get("alice"):
+            await asyncio.sleep(0.005)
+        await runner.broadcast(Message(MessageType.TEXT, "before", "bob", "g1", time.time()))
+        while not received:
+            await asyncio.sleep(0.005)
+
+        start = time.time()
+        assert runner.close_streams(reconnect_after=0.1) == 1
+        while stats["connections"] < 2:
+            await asyncio.sleep(0.005)
+        elapsed = time.time() - start
+        while not runner.listeners.get("alice"):
+            await asyncio.sleep(0.005)
+        await runner.broadcast(Message(MessageType.TEXT, "after", "bob", "g1", time.time()))
+        while len(received) < 2:
+            await asyncio.sleep(0.005)
+        await member.close()
+        await app_runner.cleanup()
+        return received, states, stats, elapsed
+
+    received, states, stats, elapsed = asyncio.run(asyncio.wait_for(run(), timeout=10))
+    assert received == ["before", "after"]
+    assert stats["last_event_ids"] == [None, "1"]
+    # 重连间隔为 0.1 秒加最多 0.1 秒抖动，远小于退避基数 5 秒
+    assert 0.1 <= elapsed < 1
+    assert states[:3] == [ListenerState.CONNECTED, ListenerState.RECONNECTING, ListenerState.CONNECTED]
+
+
+async def _start_raw_server(frames: bytes = b"", status: int = 200):
+    """启动只输出固定内容的 SSE 服务，之后保持连接不再发送数据"""
+    stats = {"connections": 0, "last_event_ids": []}
+
+    async def connect(request: web.Request):
+        stats["connections"] += 1
+        stats["last_event_ids"].append(request.headers.get("Last-Event-ID"))
+        if status != 200:
+            return web.json_response({"status": "error"}, status=status)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(frames)
+        await asyncio.sleep(3600)
+        return response
+
+    app = web.Application()
+    app.router.add_get("/agent/group/{did}/{group_id}/connect", connect)
+    app_runner = web.AppRunner(app, handler_cancellation=True, shutdown_timeout=0.1)
+    await app_runner.setup()
+    site = web.TCPSite(app_runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return app_runner, port, stats
+
+
+def _frame(event_id, content) -> bytes:
+    data = json.dumps(Message(MessageType.TEXT, content, "bob", "g1", 1.0).to_dict())
+    return f"id: {event_id}\ndata: {data}\n\n".encode()
+
+
+def test_bad_frames_are_skipped():
+    """测试无法解析的 data、id、retry 和超长帧只跳过该帧，不断开重连"""
+    frames = b"".join([
+        _frame(1, "first"),
+        b"id: 2\ndata: {not json\n\n",
+        b"id: x\nretry: soon\n\n",
+        b"id: 3\ndata: " + b"[" * 300_000 + b"\n\n",
+        _frame(4, "second"),
+    ])
+
+    async def run():
+        app_runner, port, stats = await _start_raw_server(frames)
+        member = _member(port)
+        member.MAX_LINE_SIZE = 100_000
+        received, states = [], []
+
+        async def on_message(message: Message):
+            received.append(message.content)
+
+        await member.listen_group("g1", on_message, on_state_change=states.append)
+        while len(received) < 2:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        await member.close()
+        await app_runner.cleanup()
+        return received, states, stats
+
+    received, states, stats = asyncio.run(asyncio.wait_for(run(), timeout=10))
+    assert received == ["first", "second"]
+    assert stats["connections"] == 1
+    assert states == [ListenerState.CONNECTED, ListenerState.CLOSED]
+
+
+def test_client_error_status_is_terminal():
+    """测试 403、404 响应直接结束监听，429 仍按退避重试"""
+    async def run(status):
+        app_runner, port, stats = await _start_raw_server(status=status)
+        member = _member(port)
+        states = []
+        await member.listen_group("g1", lambda m: None, on_state_change=states.append)
+        await asyncio.sleep(0.3)
+        await member.close()
+        await app_runner.cleanup()
+        return states, stats
+
+    for status in (403, 404):
+        states, stats = asyncio.run(run(status))
+        assert states == [ListenerState.CLOSED]
+        assert stats["connections"] == 1
+    states, stats = asyncio.run(run(429))
+    assert stats["connections"] > 1
+    assert ListenerState.RECONNECTING in states
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+GroupManager 懒启动与休眠测试
+
+测试注册群组不创建任务、第一次访问时创建并启动 runner、空闲 runner 休眠后从快照恢复成员和
+最近消息（event_id 连续，可按 Last-Event-ID 续传）、有监听连接的 runner 不休眠、按 agent 查找群组
+走索引不唤醒 runner，并给出 5 万个群组的内存基准。
+"""
+
+import gc
+import sys
+import time
+import asyncio
+import logging
+import tracemalloc
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.service.interaction.anp_sdk_group_runner import (
+    Agent, GroupManager, GroupRunner, Message, MessageType
+)
+
+logger = logging.getLogger(__name__)
+
+GROUP_COUNT = 50_000
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingRunner(GroupRunner):
+    created = 0
+    started = 0
+
+    def __init__(self, group_id: str):
+        super().__init__(group_id)
+        CountingRunner.created += 1
+
+    async def start(self):
+        CountingRunner.started += 1
+        await super().start()
+
+    async def on_agent_join(self, agent: Agent) -> bool:
+        return True
+
+    async def on_agent_leave(self, agent: Agent):
+        pass
+
+    async def on_message(self, message: Message):
+        await self.broadcast(message)
+        return None
+
+
+def _message(group_id: str, content) -> Message:
+    return Message(MessageType.TEXT, content, "alice", group_id, time.time())
+
+
+def test_lazy_start_and_hibernation():
+    """测试懒创建、空闲休眠、快照恢复后成员和消息历史完整"""
+    CountingRunner.created = CountingRunner.started = 0
+    clock = FakeClock()
+
+    async def main():
+        manager = GroupManager(None, idle_timeout=60, clock=clock)
+        before = len(asyncio.all_tasks())
+        for i in range(100):
+            manager.register_runner(f"g{i}", CountingRunner)
+        assert len(asyncio.all_tasks()) == before
+        assert CountingRunner.created == 0
+        assert len(manager.list_groups()) == 100
+
+        runner = await manager.acquire("g1")
+        assert CountingRunner.created == 1 and CountingRunner.started == 1 and runner._running
+        runner.agents["alice"] = Agent("alice", "Alice", 9527, {"role": "owner"})
+        runner.agents["bob"] = Agent("bob", "Bob", 9528)
+        for i in range(5):
+            await runner.broadcast(_message("g1", i))
+        assert manager.get_runner("g1") is runner
+
+        clock.now += 61
+        assert manager.sweep_idle() == 1
+        assert manager.is_hibernated("g1") and "g1" not in manager.runners
+
+        resumed = await manager.acquire("g1")
+        assert resumed is not runner
+        assert CountingRunner.created == 2 and CountingRunner.started == 2
+        assert resumed.get_member("alice") == Agent("alice", "Alice", 9527, {"role": "owner"})
+        assert set(resumed.agents) == {"alice", "bob"}
+        assert [m["content"] for m in resumed.history] == [0, 1, 2, 3, 4]
+        await resumed.broadcast(_message("g1", 5))
+        assert resumed.last_event_id == 6
+
+        # 重连客户端从休眠前收到的 event_id 续传
+        queue = asyncio.Queue()
+        assert resumed.register_listener("bob", queue, last_event_id=3)
+        assert [queue.get_nowait()["content"] for _ in range(queue.qsize())] == [3, 4, 5]
+
+        # 有监听连接的 runner 不休眠
+        clock.now += 61
+        assert manager.sweep_idle() == 0
+        assert manager.runners["g1"] is resumed
+        resumed.unregister_listener("bob", queue)
+        clock.now += 61
+        assert manager.sweep_idle() == 1
+
+        manager.unregister_runner("g1")
+        assert manager.get_runner("g1") is None and not manager.is_hibernated("g1")
+        assert manager.groups_of("alice") == []
+
+    asyncio.run(main())
+
+
+def test_sweep_happens_on_access_and_keeps_recent_groups():
+    """测试访问群组时顺带休眠空闲 runner，最近访问的不受影响，未注册的 runner 不被休眠"""
+    clock = FakeClock()
+
+    async def main():
+        manager = GroupManager(None, idle_timeout=60, clock=clock)
+        for i in range(10):
+            manager.register_runner(f"g{i}", CountingRunner)
+            manager.get_runner(f"g{i}")
+        manual = CountingRunner("manual")
+        manager.runners["manual"] = manual
+
+        clock.now += 30
+        for i in range(5):
+            manager.get_runner(f"g{i}")
+        clock.now += 40
+        manager.get_runner("g0")
+        assert sorted(manager.runners) == ["g0", "g1", "g2", "g3", "g4", "manual"]
+        assert all(manager.is_hibernated(f"g{i}") for i in range(5, 10))
+        assert manager.runners["manual"] is manual
+
+    asyncio.run(main())
+
+
+def test_agent_index():
+    """测试按 agent 查找群组走索引，成员增删与休眠不影响索引"""
+    clock = FakeClock()
+
+    async def main():
+        manager = GroupManager(None, idle_timeout=60, clock=clock)
+        for i in range(20):
+            manager.register_runner(f"g{i}", CountingRunner)
+        for i in range(0, 20, 2):
+            runner = await manager.acquire(f"g{i}")
+            runner.agents["alice"] = Agent("alice", "Alice", 0)
+            runner.agents.setdefault("bob", Agent("bob", "Bob", 0))
+        assert sorted(manager.groups_of("alice")) == sorted(f"g{i}" for i in range(0, 20, 2))
+
+        clock.now += 61
+        assert manager.sweep_idle() == 10
+        assert len(manager.groups_of("bob")) == 10
+        assert not manager.runners
+
+        runner = manager.get_runner("g4")
+        assert await runner.remove_member("alice")
+        runner.agents.pop("bob")
+        assert "g4" not in manager.groups_of("alice") and "g4" not in manager.groups_of("bob")
+        # 只有被访问的群组被唤醒
+        assert list(manager.runners) == ["g4"]
+
+        manager.unregister_runner("g6")
+        assert "g6" not in manager.groups_of("alice")
+        runner.agents.update({"carol": Agent("carol", "Carol", 0)})
+        runner.agents.clear()
+        assert manager.groups_of("carol") == []
+
+    asyncio.run(main())
+
+
+def run_memory_benchmark(group_count: int = GROUP_COUNT, members: int = 3, messages: int = 5):
+    """基准：group_count 个群组全部活跃与全部休眠时的内存占用"""
+    clock = FakeClock()
+
+    async def main():
+        gc.collect()
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            manager = GroupManager(None, idle_timeout=60, clock=clock)
+            for i in range(group_count):
+                manager.register_runner(f"group-{i}", CountingRunner)
+            registered = tracemalloc.get_traced_memory()[0] - base
+            assert len(asyncio.all_tasks()) == 1
+
+            start = time.perf_counter()
+            for i in range(group_count):
+                runner = manager.get_runner(f"group-{i}")
+                for m in range(members):
+                    agent_id = f"did:wba:localhost%3A9527:wba:user:{m:016x}"
+                    runner.agents[agent_id] = Agent(agent_id, f"agent-{m}", 9527, {"role": "member"})
+                for n in range(messages):
+                    await runner.broadcast(_message(runner.group_id, f"message {n}"))
+            await asyncio.sleep(0)
+            wake_time = time.perf_counter() - start
+            gc.collect()
+            active = tracemalloc.get_traced_memory()[0] - base
+
+            clock.now += 61
+            start = time.perf_counter()
+            assert manager.sweep_idle() == group_count
+            hibernate_time = time.perf_counter() - start
+            gc.collect()
+            hibernated = tracemalloc.get_traced_memory()[0] - base
+            assert len(asyncio.all_tasks()) == 1
+            assert len(manager.groups_of("did:wba:localhost%3A9527:wba:user:0000000000000000")) == group_count
+        finally:
+            tracemalloc.stop()
+        return registered, active, hibernated, wake_time, hibernate_time
+
+    registered, active, hibernated, wake_time, hibernate_time = asyncio.run(main())
+    logger.info(f"{group_count} 个群组: 仅注册 {registered / 1e6:.1f}MB, 全部活跃 {active / 1e6:.1f}MB, "
+                f"全部休眠 {hibernated / 1e6:.1f}MB（每组 {hibernated / group_count:.0f} 字节）; "
+                f"唤醒 {wake_time:.2f}s, 休眠 {hibernate_time:.2f}s")
+    return registered, active, hibernated
+
+
+def test_memory_benchmark():
+    """基准：5 万个群组休眠后的内存明显低于全部活跃"""
+    registered, active, hibernated = run_memory_benchmark()
+    assert registered < active / 10
+    assert hibernated < active / 3
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_memory_benchmark()
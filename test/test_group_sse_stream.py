@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+群组 SSE 事件流测试
+
+测试 GroupRunner 的多连接订阅、基于 event_id 的无缝续传和心跳，
+并通过 ANPSDK 的 /agent/group/{did}/{group_id}/connect 路由做端到端验证。
+"""
+
+import gc
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import threading
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict
+
+import httpx
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.service.interaction import anp_sdk_group_runner
+from anp_open_sdk.service.interaction.anp_sdk_group_runner import GroupEvent, GroupRunner, Message, MessageType, Agent
+from anp_open_sdk.utils.serialization import dumps_str
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = Path(__file__).parent.parent
+
+
+class EchoRunner(GroupRunner):
+    async def on_agent_join(self, agent: Agent) -> bool:
+        return True
+
+    async def on_agent_leave(self, agent: Agent):
+        pass
+
+    async def on_message(self, message: Message):
+        await self.broadcast(message)
+        return None
+
+
+def _message(group_id: str, content: str) -> Message:
+    return Message(type=MessageType.TEXT, content=content, sender_id="sender",
+                   group_id=group_id, timestamp=time.time())
+
+
+def _parse_events(chunks):
+    """把 SSE 文本块解析为 (id, data) 列表，心跳注释单独计数"""
+    events, heartbeats = [], 0
+    for chunk in chunks:
+        if chunk.startswith(":"):
+            heartbeats += 1
+            continue
+        fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+        events.append((fields.get("id"), json.loads(fields["data"]) if "data" in fields else None))
+    return events, heartbeats
+
+
+def test_multi_device_fan_out():
+    """测试同一 agent 的多个连接都能收到广播，断开一个不影响其他连接"""
+    async def run():
+        runner = EchoRunner("g1")
+        phone = runner.event_stream("alice", heartbeat_interval=10)
+        laptop = runner.event_stream("alice", heartbeat_interval=10)
+        first_phone = asyncio.ensure_future(phone.__anext__())
+        first_laptop = asyncio.ensure_future(laptop.__anext__())
+        await asyncio.sleep(0)
+        assert len(runner.listeners["alice"]) == 2
+
+        await runner.broadcast(_message("g1", "hello"))
+        for pending in (first_phone, first_laptop):
+            events, _ = _parse_events([await pending])
+            assert events == [("1", runner.history[0])]
+
+        await phone.aclose()
+        assert len(runner.listeners["alice"]) == 1
+        await runner.broadcast(_message("g1", "second"))
+        events, _ = _parse_events([await laptop.__anext__()])
+        assert events[0][1]["content"] == "second"
+        await laptop.aclose()
+        assert "alice" not in runner.listeners
+
+    asyncio.run(run())
+
+
+def test_gapless_resume():
+    """测试按 Last-Event-ID 重连后补发断线期间的全部消息"""
+    async def run():
+        runner = EchoRunner("g1")
+        stream = runner.event_stream("alice", heartbeat_interval=10)
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        for i in range(3):
+            await runner.broadcast(_message("g1", f"m{i}"))
+        last_id = int(_parse_events([await pending])[0][0][0])
+        await stream.aclose()
+
+        # 断线期间的消息
+        for i in range(3, 10):
+            await runner.broadcast(_message("g1", f"m{i}"))
+
+        resumed = runner.event_stream("alice", last_event_id=last_id, heartbeat_interval=10)
+        chunks = [await resumed.__anext__() for _ in range(9)]
+        await runner.broadcast(_message("g1", "m10"))
+        chunks.append(await resumed.__anext__())
+        await resumed.aclose()
+
+        events, _ = _parse_events(chunks)
+        assert [int(event_id) for event_id, _ in events] == list(range(2, 12))
+        assert [data["content"] for _, data in events] == [f"m{i}" for i in range(1, 11)]
+
+    asyncio.run(run())
+
+
+def test_resume_beyond_history_sends_reset():
+    """测试续传位置早于历史缓冲区时先发送 reset 事件"""
+    async def run():
+        runner = EchoRunner("g1")
+        runner.history = type(runner.history)(maxlen=5)
+        for i in range(20):
+            await runner.broadcast(_message("g1", f"m{i}"))
+        stream = runner.event_stream("alice", last_event_id=3, heartbeat_interval=10)
+        first = await stream.__anext__()
+        await stream.aclose()
+        assert first.startswith("event: reset")
+        assert json.loads(first.split("data: ", 1)[1]) == {"oldest_event_id": 16}
+
+    asyncio.run(run())
+
+
+def test_resume_skips_excluded_and_pre_join_messages():
+    """测试续传不补发广播时排除该 agent 的消息和它加入之前的消息，休眠快照后仍然如此"""
+    async def run():
+        runner = EchoRunner("g1")
+        await runner.broadcast(_message("g1", "before-join"))
+        runner.add_member(Agent("alice", "alice", 0))
+        await runner.broadcast(_message("g1", "own"), exclude=["alice"])
+        await runner.broadcast(_message("g1", "for-alice"))
+
+        restored = EchoRunner("g1")
+        restored.restore(runner.snapshot())
+        for target in (runner, restored):
+            stream = target.event_stream("alice", last_event_id=0, heartbeat_interval=10)
+            first = await stream.__anext__()
+            await stream.aclose()
+            assert _parse_events([first])[0] == [("3", dict(runner.history[2]))]
+            assert target.history[1].exclude == {"alice"}
+
+    asyncio.run(run())
+
+
+def test_slow_listener_is_closed_and_resumes():
+    """测试队列写满的连接收到 overflow close 事件并被注销，用 Last-Event-ID 重连后补发全部消息"""
+    async def run():
+        runner = EchoRunner("g1")
+        runner.LISTENER_QUEUE_SIZE = 3
+        stream = runner.event_stream("alice", heartbeat_interval=10)
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        await runner.broadcast(_message("g1", "m0"))
+        last_id = _parse_events([await pending])[0][0][0]
+        for i in range(1, 6):
+            await runner.broadcast(_message("g1", f"m{i}"))
+        assert "alice" not in runner.listeners
+
+        closing = await stream.__anext__()
+        assert "event: close" in closing and '"overflow"' in closing
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+
+        runner.LISTENER_QUEUE_SIZE = 10
+        resumed = runner.event_stream("alice", last_event_id=int(last_id), heartbeat_interval=10)
+        events, _ = _parse_events([await resumed.__anext__() for _ in range(5)])
+        await resumed.aclose()
+        assert [data["content"] for _, data in events] == [f"m{i}" for i in range(1, 6)]
+
+    asyncio.run(run())
+
+
+def test_heartbeat_timing():
+    """测试空闲时按间隔发送心跳注释"""
+    async def run():
+        runner = EchoRunner("g1")
+        stream = runner.event_stream("alice", heartbeat_interval=0.05)
+        start_time = time.time()
+        chunks = [await stream.__anext__() for _ in range(4)]
+        elapsed = time.time() - start_time
+        await stream.aclose()
+        return chunks, elapsed
+
+    chunks, elapsed = asyncio.run(run())
+    assert chunks == [": heartbeat\n\n"] * 4
+    assert 0.18 <= elapsed < 1.0
+
+
+def test_frames_encoded_once_and_compact_format(monkeypatch):
+    """测试一条广播无论多少连接只编码一次，紧凑格式可还原为同一条消息"""
+    calls = []
+
+    def counting_dumps_str(obj):
+        calls.append(obj)
+        return dumps_str(obj)
+
+    monkeypatch.setattr(anp_sdk_group_runner, "dumps_str", counting_dumps_str)
+
+    async def run():
+        runner = EchoRunner("g1")
+        streams = [runner.event_stream(f"agent-{i}", heartbeat_interval=10, compact=i % 2 == 1) for i in range(50)]
+        pending = [asyncio.ensure_future(stream.__anext__()) for stream in streams]
+        await asyncio.sleep(0)
+        message = Message(MessageType.TEXT, {"text": "你好"}, "sender", "g1", 1.5, {"lang": "zh"})
+        await runner.broadcast(message)
+        frames = [await p for p in pending]
+        for stream in streams:
+            await stream.aclose()
+        return message, frames
+
+    message, frames = asyncio.run(run())
+    assert len(calls) == 2
+    full, compact = frames[0], frames[1]
+    assert all(frame is full for frame in frames[::2]) and all(frame is compact for frame in frames[1::2])
+    (_, full_data), (event_id, compact_data) = _parse_events([full, compact])[0]
+    assert event_id == "1" and compact_data == ["text", {"text": "你好"}, "sender", "g1", 1.5, {"lang": "zh"}]
+    assert len(compact) < len(full)
+    assert Message.from_wire(full_data) == message == Message.from_wire(compact_data)
+
+    without_metadata = GroupEvent(Message(MessageType.SYSTEM, "x", "s", "g1", 2.0).to_dict())
+    assert json.loads(without_metadata.sse_frame(compact=True)[6:]) == ["system", "x", "s", "g1", 2.0]
+    assert Message.from_wire(["system", "x", "s", "g1", 2.0]).metadata == {}
+
+
+def test_slotted_models_intern_ids():
+    """测试消息和成员没有实例字典，重复的群组 ID 和 DID 共享同一个字符串对象"""
+    prefix = "did:wba:localhost%3A9527:wba:user:"
+    first = Message(MessageType.TEXT, "a", prefix + "0001", "".join(["group", "-1"]), 1.0)
+    second = Message(MessageType.TEXT, "b", prefix + "0001", "".join(["group", "-1"]), 2.0)
+    assert first.sender_id is second.sender_id and first.group_id is second.group_id
+    assert Agent(prefix + "0001", "a", 0).id is first.sender_id
+    assert not hasattr(first, "__dict__") and not hasattr(Agent("a", "a", 0), "__dict__")
+    assert not hasattr(GroupEvent(), "__dict__")
+
+
+@dataclass
+class LegacyMessage:
+    """改动前的消息模型：普通 dataclass，不驻留字符串"""
+    type: MessageType
+    content: Any
+    sender_id: str
+    group_id: str
+    timestamp: float
+    metadata: Dict[str, Any] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.type.value, "content": self.content, "sender_id": self.sender_id,
+                "group_id": self.group_id, "timestamp": self.timestamp, "metadata": self.metadata or {}}
+
+
+def run_queued_message_benchmark(members: int = 1000, messages: int = 100):
+    """基准：members 个监听连接各排队 messages 条广播（共 members * messages 条），
+    比较改动前（每个连接各自序列化）与改动后（每条消息只编码一次）的 CPU 时间，
+    以及同样数量的消息对象在两种模型下的内存"""
+    prefix = "did:wba:localhost%3A9527:wba:user:"
+
+    async def fan_out(legacy: bool) -> float:
+        runner = EchoRunner("bench")
+        queues = [asyncio.Queue() for _ in range(members)]
+        for i, queue in enumerate(queues):
+            runner.register_listener(f"{prefix}{i:016x}", queue)
+        for n in range(messages):
+            if legacy:
+                message_dict = LegacyMessage(MessageType.TEXT, f"message {n}", f"{prefix}{n % members:016x}",
+                                             "bench", time.time()).to_dict()
+                message_dict["event_id"] = n + 1
+                for queue in queues:
+                    queue.put_nowait(message_dict)
+            else:
+                await runner.broadcast(Message(MessageType.TEXT, f"message {n}", f"{prefix}{n % members:016x}",
+                                               "bench", time.time()))
+        # 模拟各连接的 event_stream 取出并编码 SSE 帧
+        start = time.process_time()
+        total = 0
+        for queue in queues:
+            while not queue.empty():
+                message = queue.get_nowait()
+                if legacy:
+                    frame = f"id: {message['event_id']}\ndata: {dumps_str(message)}\n\n"
+                else:
+                    frame = message.sse_frame()
+                total += len(frame)
+        return time.process_time() - start
+
+    def object_memory(model) -> int:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            # 每条消息的 DID 都来自反序列化，是新的字符串对象
+            objects = [model(MessageType.TEXT, "hi", "".join([prefix, f"{n % members:016x}"]),
+                             "".join(["bench", "-group"]), float(n)) for n in range(members * messages)]
+            used = tracemalloc.get_traced_memory()[0] - base
+        finally:
+            tracemalloc.stop()
+        del objects
+        return used
+
+    legacy_cpu = asyncio.run(fan_out(legacy=True))
+    cpu = asyncio.run(fan_out(legacy=False))
+    legacy_memory = object_memory(LegacyMessage)
+    memory = object_memory(Message)
+    total = members * messages
+    logger.info(f"{total} 条排队消息（{members} 个连接）编码 CPU: 改动前 {legacy_cpu * 1000:.0f}ms, "
+                f"改动后 {cpu * 1000:.0f}ms; {total} 个消息对象内存: 改动前 {legacy_memory / 1e6:.1f}MB"
+                f"（{legacy_memory / total:.0f} 字节/条）, 改动后 {memory / 1e6:.1f}MB（{memory / total:.0f} 字节/条）")
+    return legacy_cpu, cpu, legacy_memory, memory
+
+
+def test_queued_message_benchmark():
+    """基准：10 万条排队消息在 1000 个连接上的编码 CPU 和消息对象内存"""
+    legacy_cpu, cpu, legacy_memory, memory = run_queued_message_benchmark()
+    assert cpu < legacy_cpu / 2
+    assert memory < legacy_memory / 2
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def group_server():
+    """在后台线程中运行 ANPSDK 服务，并注册一个回显群组"""
+    import uvicorn
+    from anp_open_sdk.config import UnifiedConfig, set_global_config, get_global_config
+    from anp_open_sdk.anp_sdk import ANPSDK
+
+    try:
+        get_global_config()
+    except RuntimeError:
+        set_global_config(UnifiedConfig(
+            config_file=str(APP_ROOT / 'anp_open_sdk_framework_demo_agent_unified_config.yaml'),
+            app_root=str(APP_ROOT)
+        ))
+    sdk = ANPSDK()
+    sdk.group_heartbeat_interval = 0.2
+    runner = EchoRunner("sse_group")
+    sdk.group_manager.runners["sse_group"] = runner
+    runner.agents["alice"] = Agent(id="alice", name="alice", port=0)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(sdk.app, host="127.0.0.1", port=port, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}", sdk, runner
+    server.should_exit = True
+    thread.join(timeout=5)
+    sdk.group_manager.runners.pop("sse_group", None)
+
+
+def test_connect_route_end_to_end(group_server):
+    """测试 connect 路由的多连接、id 字段、Last-Event-ID 续传和心跳"""
+    base_url, sdk, runner = group_server
+    url = f"{base_url}/agent/group/default/sse_group/connect"
+    message_url = f"{base_url}/agent/group/default/sse_group/message"
+
+    async def read_chunks(response, count):
+        chunks, buffer = [], ""
+        async for text in response.aiter_text():
+            buffer += text
+            while "\n\n" in buffer and len(chunks) < count:
+                chunk, buffer = buffer.split("\n\n", 1)
+                chunks.append(chunk + "\n\n")
+            if len(chunks) >= count:
+                return chunks
+        return chunks
+
+    async def run():
+        async with httpx.AsyncClient(timeout=5) as client:
+            async with client.stream("GET", url, params={"req_did": "alice"}) as first, \
+                    client.stream("GET", url, params={"req_did": "alice"}) as second:
+                while len(runner.listeners.get("alice", [])) < 2:
+                    await asyncio.sleep(0.01)
+                for i in range(3):
+                    await client.post(message_url, params={"req_did": "alice"}, json={"content": f"m{i}"})
+                first_events, _ = _parse_events(await read_chunks(first, 3))
+                second_events, _ = _parse_events(await read_chunks(second, 3))
+            assert [e[0] for e in first_events] == ["1", "2", "3"]
+            assert first_events == second_events
+
+            await client.post(message_url, params={"req_did": "alice"}, json={"content": "missed"})
+            async with client.stream("GET", url, params={"req_did": "alice"},
+                                     headers={"Last-Event-ID": "3"}) as resumed:
+                chunks = await read_chunks(resumed, 2)
+            events, heartbeats = _parse_events(chunks)
+            assert events[0][0] == "4"
+            assert events[0][1]["content"] == "missed"
+            assert heartbeats == 1
+
+            async with client.stream("GET", url, params={"req_did": "alice", "format": "compact"},
+                                     headers={"Last-Event-ID": "3"}) as compact:
+                events, _ = _parse_events(await read_chunks(compact, 1))
+            assert events[0][0] == "4"
+            assert events[0][1][:4] == ["text", "missed", "alice", "sse_group"]
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_queued_message_benchmark()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+业务处理函数参数绑定测试
+
+测试 wrap_business_handler 编译的参数绑定器：类型转换矩阵、参数来源优先级、
+request 参数注入、同步函数在线程池中执行、非法输入返回 400，并给出分发性能基准。
+"""
+
+import sys
+import json
+import time
+import asyncio
+import inspect
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from anp_open_sdk.service.router.handler_binder import BindingError, get_binder
+from anp_open_sdk.service.router.router_agent import wrap_business_handler
+
+logger = logging.getLogger(__name__)
+
+
+async def typed(a: int, b: float, flag: bool = False, name: str = "x",
+                tags: Optional[List[str]] = None, meta: Optional[Dict[str, int]] = None, raw=None):
+    return {"a": a, "b": b, "flag": flag, "name": name, "tags": tags, "meta": meta, "raw": raw}
+
+
+@pytest.mark.parametrize("params,expected", [
+    ({"a": 1, "b": 2}, {"a": 1, "b": 2.0}),
+    ({"a": "7", "b": "2.5"}, {"a": 7, "b": 2.5}),
+    ({"a": 3.0, "b": 1}, {"a": 3, "b": 1.0}),
+    ({"a": 1, "b": 1, "flag": "true"}, {"flag": True}),
+    ({"a": 1, "b": 1, "flag": 0}, {"flag": False}),
+    ({"a": 1, "b": 1, "tags": ["p", "q"]}, {"tags": ["p", "q"]}),
+    ({"a": 1, "b": 1, "meta": {"k": "5"}}, {"meta": {"k": 5}}),
+    ({"a": 1, "b": 1, "raw": {"nested": [1, None]}}, {"raw": {"nested": [1, None]}}),
+    ({"a": 1, "b": 1, "tags": None}, {"tags": None}),
+    ({"a": 1, "b": 1, "name": 123}, {"name": "123"}),
+    ({"a": 1, "b": 1, "name": 1.5}, {"name": "1.5"}),
+    ({"a": 1, "b": 1, "tags": "p"}, {"tags": ["p"]}),
+    ({"a": 1, "b": 1, "tags": 7}, {"tags": ["7"]}),
+])
+def test_coercion_matrix(params, expected):
+    """测试合法输入按类型注解转换"""
+    kwargs = get_binder(typed).bind({"params": params})
+    for key, value in expected.items():
+        assert kwargs[key] == value
+        assert type(kwargs[key]) is type(value)
+
+
+@pytest.mark.parametrize("params,bad_param", [
+    ({"b": 1}, "a"),
+    ({"a": "seven", "b": 1}, "a"),
+    ({"a": 1.5, "b": 1}, "a"),
+    ({"a": 1, "b": "abc"}, "b"),
+    ({"a": 1, "b": 1, "flag": "maybe"}, "flag"),
+    ({"a": 1, "b": 1, "tags": {"k": "v"}}, "tags"),
+    ({"a": 1, "b": 1, "meta": {"k": "v"}}, "meta.k"),
+    ({"a": 1, "b": 1, "name": None}, "name"),
+])
+def test_invalid_input(params, bad_param):
+    """测试缺失或类型不符的参数在调用前给出结构化错误"""
+    with pytest.raises(BindingError) as exc_info:
+        get_binder(typed).bind({"params": params})
+    assert [e["param"] for e in exc_info.value.errors] == [bad_param]
+
+
+def test_lenient_untyped_containers():
+    """测试未参数化的 list/tuple 注解接受单个值，str 注解接受数字"""
+    async def search(prompt: str, ids: list, pair: tuple = ()):
+        return prompt, ids, pair
+
+    assert get_binder(search).bind({"params": {"prompt": 123, "ids": 5, "pair": "x"}}) == \
+        {"prompt": "123", "ids": [5], "pair": ("x",)}
+
+
+def test_param_sources_and_request_injection():
+    """测试 request_data < path_params < params 的优先级、JSON 字符串 params 和 request 注入"""
+    received = {}
+
+    async def handler(request, item_id: int, mode: str = "fast"):
+        received.update(request=request, item_id=item_id, mode=mode)
+        return {"ok": True}
+
+    api_handler = wrap_business_handler(handler)
+    request = object()
+
+    async def main():
+        await api_handler({"item_id": "1", "mode": "slow"}, request)
+        assert received == {"request": request, "item_id": 1, "mode": "slow"}
+        await api_handler({"item_id": "1", "path_params": {"item_id": "2"}}, request)
+        assert received["item_id"] == 2
+        await api_handler({"item_id": 1, "path_params": {"item_id": 2}, "params": json.dumps({"item_id": 3})}, request)
+        assert received["item_id"] == 3 and received["mode"] == "fast"
+
+        response = await api_handler({"params": "{not json"}, request)
+        assert response["status_code"] == 400 and "JSON" in response["message"]
+        response = await api_handler({"params": [1, 2]}, request)
+        assert response["status_code"] == 400
+        response = await api_handler({"params": {}}, request)
+        assert response["status_code"] == 400
+        assert response["errors"][0]["param"] == "item_id"
+
+    asyncio.run(main())
+    assert inspect.signature(api_handler) == inspect.signature(handler)
+
+
+def test_reserved_names_and_binder_cache():
+    """测试与 BaseModel 属性同名的参数，以及同一函数只编译一次"""
+    async def handler(json: dict, schema: str = "s", model_config: int = 0):
+        return json, schema, model_config
+
+    assert get_binder(handler) is get_binder(handler)
+    kwargs = get_binder(handler).bind({"json": {"a": 1}, "model_config": "3"})
+    assert kwargs == {"json": {"a": 1}, "schema": "s", "model_config": 3}
+
+
+def test_sync_function_runs_in_executor():
+    """测试同步业务函数在线程池中执行，不阻塞事件循环"""
+    threads = []
+
+    def blocking(seconds: float):
+        threads.append(threading.current_thread().name)
+        time.sleep(seconds)
+        return {"slept": seconds}
+
+    api_handler = wrap_business_handler(blocking)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await api_handler({"seconds": "0.2"}, None)
+        task.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(main())
+    assert result == {"slept": 0.2}
+    assert threads[0].startswith("anp-handler")
+    assert ticks >= 5
+
+
+def test_business_errors_propagate():
+    """测试业务函数自身的异常交给 LocalAgent 返回 500，不再被包装成字符串"""
+    async def failing(x: int):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(wrap_business_handler(failing)({"x": 1}, None))
+
+
+def _legacy_wrap(business_func):
+    """原先每次调用都重复扫描参数并 json.dumps 记录日志的包装器"""
+    sig = inspect.signature(business_func)
+    param_names = list(sig.parameters.keys())
+
+    async def api_handler(request_data, request):
+        kwargs = {k: request_data.get(k) for k in param_names if k in request_data}
+        if "params" in request_data:
+            params = request_data["params"]
+            if isinstance(params, str):
+                params = json.loads(params)
+            for k in param_names:
+                if k in params:
+                    kwargs[k] = params[k]
+        kwargs_str = json.dumps(kwargs, ensure_ascii=False)
+        logger.info(f"api封装器发送参数 {kwargs_str}到{business_func.__name__}")
+        if 'request' in sig.parameters:
+            return await business_func(request, **kwargs)
+        return await business_func(**kwargs)
+    return api_handler
+
+
+def test_dispatch_benchmark():
+    """基准：旧包装器与编译后的绑定器每次调用的开销"""
+    async def add(a: float, b: float, note: str = ""):
+        return a + b
+
+    request_data = {"type": "api_call", "path": "/add", "params": json.dumps({"a": 2.5, "b": 3, "note": "n" * 32})}
+    legacy = _legacy_wrap(add)
+    compiled = wrap_business_handler(add)
+    rounds = 5000
+
+    async def run(handler):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await handler(request_data, None)
+        return time.perf_counter() - start
+
+    legacy_time = asyncio.run(run(legacy))
+    compiled_time = asyncio.run(run(compiled))
+    logger.info(f"业务函数分发: 旧包装器 {legacy_time / rounds * 1e6:.1f}us/次, "
+                f"编译绑定器 {compiled_time / rounds * 1e6:.1f}us/次（含类型校验）")
+    assert asyncio.run(compiled(request_data, None)) == 5.5
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    test_dispatch_benchmark()
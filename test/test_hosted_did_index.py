@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+托管DID索引测试
+
+测试 DIDManager 基于 SQLite 索引的查重（按 DID ID 和公钥指纹）、从磁盘重建、
+并发写入，并提供 20k 个托管DID的性能基准。
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.service.publisher.anp_sdk_publisher import DIDManager, HostedDIDIndex
+
+logger = logging.getLogger(__name__)
+
+
+def _did_document(i: int, key: str = None) -> dict:
+    did = f"did:wba:localhost%3A9527:wba:user:{i:016x}"
+    return {
+        "id": did,
+        "verificationMethod": [{
+            "id": f"{did}#key-1",
+            "controller": did,
+            "publicKeyJwk": {"kty": "EC", "crv": "secp256k1", "x": key or f"x{i}", "y": f"y{i}"}
+        }],
+        "authentication": [f"{did}#key-1"]
+    }
+
+
+def test_duplicate_by_id_and_key(tmp_path):
+    """测试按 DID ID 和公钥指纹查重"""
+    manager = DIDManager(hosted_dir=str(tmp_path))
+    assert not manager.is_duplicate_did(_did_document(1))
+    success, _, _ = manager.store_did_document(_did_document(1))
+    assert success
+
+    assert manager.is_duplicate_did(_did_document(1))
+    assert manager.is_duplicate_did(json.dumps(_did_document(1)))
+    # 不同的 DID 复用同一公钥
+    reused = _did_document(2)
+    reused["verificationMethod"][0]["publicKeyJwk"] = _did_document(1)["verificationMethod"][0]["publicKeyJwk"]
+    assert manager.is_duplicate_did(reused)
+    assert not manager.is_duplicate_did(_did_document(3))
+    assert not manager.is_duplicate_did("not json")
+
+
+def test_store_rejects_duplicate_but_allows_retry(tmp_path):
+    """测试重复DID存储失败，而同一 sid 的重试可以覆盖"""
+    manager = DIDManager(hosted_dir=str(tmp_path))
+    success, _, _ = manager.store_did_document(_did_document(1), sid="a" * 16)
+    assert success
+    success, _, _ = manager.store_did_document(_did_document(1), sid="a" * 16)
+    assert success
+    success, _, error = manager.store_did_document(_did_document(1))
+    assert not success
+    assert error
+    assert len(list(tmp_path.glob("user_*"))) == 1
+
+
+def test_rebuild_from_disk(tmp_path):
+    """测试没有索引时从已有托管目录重建"""
+    manager = DIDManager(hosted_dir=str(tmp_path))
+    for i in range(5):
+        manager.store_did_document(_did_document(i))
+    (tmp_path / HostedDIDIndex.INDEX_FILE).unlink()
+
+    reopened = DIDManager(hosted_dir=str(tmp_path))
+    assert len(reopened.index) == 5
+    assert reopened.is_duplicate_did(_did_document(4))
+    assert reopened.rebuild_index() == 5
+
+
+def test_concurrent_writers(tmp_path):
+    """测试多个管理器实例并发存储同一批DID时每个只托管一次"""
+    managers = [DIDManager(hosted_dir=str(tmp_path)) for _ in range(4)]
+    jobs = [(managers[n % 4], i) for n in range(4) for i in range(50)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda job: job[0].store_did_document(_did_document(job[1]))[0], jobs))
+    assert sum(results) == 50
+    assert len(list(tmp_path.glob("user_*"))) == 50
+
+
+def test_host_ip_resolution(tmp_path):
+    """测试主机IP异步解析并缓存"""
+    manager = DIDManager(hosted_dir=str(tmp_path))
+    ip = asyncio.run(manager.get_host_ip())
+    assert ip == manager.hostip
+
+
+def run_hosted_index_benchmark(hosted_dir: Path, count: int):
+    """在 count 个托管DID上测试重建和查重耗时"""
+    manager = DIDManager(hosted_dir=str(hosted_dir))
+    start_time = time.time()
+    for i in range(count):
+        manager.store_did_document(_did_document(i))
+    store_time = time.time() - start_time
+
+    start_time = time.time()
+    manager.rebuild_index()
+    rebuild_time = time.time() - start_time
+
+    start_time = time.time()
+    for i in range(count - 100, count + 100):
+        manager.is_duplicate_did(_did_document(i))
+    check_time = (time.time() - start_time) / 200
+
+    logger.info(f"托管DID规模 {count}: 存储 {store_time:.2f}秒, 重建 {rebuild_time:.2f}秒, "
+                f"查重 {check_time * 1000:.3f}毫秒/次")
+    return check_time
+
+
+def test_hosted_index_benchmark(tmp_path):
+    """托管DID查重性能基准测试，ANP_BENCH_HOSTED 可调整数量"""
+    check_time = run_hosted_index_benchmark(tmp_path, int(os.environ.get("ANP_BENCH_HOSTED", "500")))
+    assert check_time < 0.05
+
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        run_hosted_index_benchmark(Path(tmp), 20000)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+托管DID请求处理流水线测试
+
+使用 LocalFileMailBackend 排队数百个托管请求，验证并发处理、重复申请退回，
+中途失败后重新处理时每个请求只创建一次托管目录，以及存储失败的请求留待重试。
+"""
+
+import sys
+import json
+import asyncio
+import logging
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.service.publisher.anp_sdk_publisher_mail_backend import EnhancedMailManager
+from anp_open_sdk.service.publisher.anp_sdk_publisher import DIDManager, HostedDIDRequestProcessor
+
+logger = logging.getLogger(__name__)
+
+REQUEST_COUNT = 300
+
+
+def _did_document(i: int) -> dict:
+    did = f"did:wba:localhost%3A9527:wba:user:{i:016x}"
+    return {
+        "id": did,
+        "verificationMethod": [{"id": f"{did}#key-1", "controller": did}],
+        "authentication": [f"{did}#key-1"]
+    }
+
+
+def _queue_requests(mail_manager, dids):
+    for i in dids:
+        mail_manager.send_email(
+            to_address="hoster@local.com",
+            subject="ANP-DID host request",
+            content=json.dumps(_did_document(i)),
+            from_address=f"agent{i}@local.com"
+        )
+
+
+def _hosted_requests(hosted_dir: Path):
+    ids = []
+    for req_path in hosted_dir.glob("user_*/did_document_request.json"):
+        with open(req_path, 'r', encoding='utf-8') as f:
+            ids.append(json.load(f)["id"])
+    return ids
+
+
+def _setup(tmp_path):
+    mail_manager = EnhancedMailManager(use_local_backend=True, local_mail_dir=str(tmp_path / "mail"))
+    did_manager = DIDManager(hosted_dir=str(tmp_path / "hosted"))
+    return mail_manager, did_manager
+
+
+def test_concurrent_processing(tmp_path):
+    """测试数百个请求并发处理后每个DID只托管一次"""
+    mail_manager, did_manager = _setup(tmp_path)
+    # 最后 20 个请求与前面的DID重复
+    _queue_requests(mail_manager, list(range(REQUEST_COUNT)) + list(range(20)))
+
+    processor = HostedDIDRequestProcessor(mail_manager, did_manager, max_concurrency=16)
+    result = asyncio.run(processor.run())
+
+    hosted = _hosted_requests(did_manager.hosted_dir)
+    assert len(hosted) == REQUEST_COUNT
+    assert len(set(hosted)) == REQUEST_COUNT
+    assert result.count("已申请，退回") == 20
+    assert mail_manager.get_unread_did_requests() == []
+
+    replies = mail_manager.backend.get_unread_emails("ANP HOSTED DID RESPONSED")
+    assert len(replies) == REQUEST_COUNT
+
+    # 再次运行没有新请求
+    assert asyncio.run(processor.run()) == "没有新的DID托管请求"
+
+
+def test_exactly_once_after_failure(tmp_path):
+    """测试回复阶段失败后重新处理不会重复创建托管目录"""
+    mail_manager, did_manager = _setup(tmp_path)
+    _queue_requests(mail_manager, range(REQUEST_COUNT))
+
+    original_send = mail_manager.send_reply_email
+    sent = {"count": 0}
+
+    def flaky_send(to_address, subject, content):
+        sent["count"] += 1
+        if sent["count"] % 3 == 0:
+            return False
+        return original_send(to_address, subject, content)
+
+    mail_manager.send_reply_email = flaky_send
+    asyncio.run(HostedDIDRequestProcessor(mail_manager, did_manager).run())
+    remaining = mail_manager.get_unread_did_requests()
+    assert 0 < len(remaining) < REQUEST_COUNT
+
+    # 模拟进程重启：新的处理器和管理器实例
+    mail_manager.send_reply_email = original_send
+    did_manager = DIDManager(hosted_dir=str(did_manager.hosted_dir))
+    result = asyncio.run(HostedDIDRequestProcessor(mail_manager, did_manager).run())
+    assert "已申请，退回" not in result
+
+    hosted = _hosted_requests(did_manager.hosted_dir)
+    assert len(hosted) == REQUEST_COUNT
+    assert len(set(hosted)) == REQUEST_COUNT
+    assert mail_manager.get_unread_did_requests() == []
+
+
+def test_store_failure_is_retried(tmp_path):
+    """测试存储失败的请求不回复、保持未读，下一批用同一sid重试；连续失败到上限后才回复失败"""
+    mail_manager, did_manager = _setup(tmp_path)
+    _queue_requests(mail_manager, range(10))
+
+    original_store = did_manager.store_did_document
+    failing = {_did_document(i)["id"] for i in (2, 5)}
+    sids = {}
+
+    def flaky_store(did_document, sid=None):
+        sids.setdefault(did_document["id"], set()).add(sid)
+        if did_document["id"] in failing:
+            return False, "", "磁盘已满"
+        return original_store(did_document, sid=sid)
+
+    did_manager.store_did_document = flaky_store
+    processor = HostedDIDRequestProcessor(mail_manager, did_manager)
+    asyncio.run(processor.run())
+    remaining = mail_manager.get_unread_did_requests()
+    assert sorted(json.loads(m["content"])["id"] for m in remaining) == sorted(failing)
+    assert mail_manager.backend.get_unread_emails("DID托管申请失败") == []
+    statuses = {processor.journal.get(str(m["message_id"]))[0] for m in remaining}
+    assert statuses == {"failed"}
+
+    # 恢复后重试成功，每个DID只托管一次且沿用原来的sid
+    failing.discard(_did_document(2)["id"])
+    asyncio.run(processor.run())
+    assert len(mail_manager.get_unread_did_requests()) == 1
+    assert len(sids[_did_document(2)["id"]]) == 1
+    hosted = _hosted_requests(did_manager.hosted_dir)
+    assert len(hosted) == 9 and len(set(hosted)) == 9
+
+    # 一直失败的请求在达到上限后回复失败并标记已读
+    asyncio.run(processor.run())
+    assert mail_manager.get_unread_did_requests() == []
+    assert len(mail_manager.backend.get_unread_emails("DID托管申请失败")) == 1
+
+
+def test_journal_without_attempts_column(tmp_path):
+    """测试旧版处理日志打开时补上失败次数列"""
+    import sqlite3
+    from anp_open_sdk.service.publisher.anp_sdk_publisher import HostedRequestJournal
+    journal_path = tmp_path / "hosted_requests.sqlite3"
+    with sqlite3.connect(str(journal_path)) as db:
+        db.execute("CREATE TABLE hosted_requests (message_id TEXT PRIMARY KEY, did_id TEXT, status TEXT NOT NULL, sid TEXT)")
+        db.execute("INSERT INTO hosted_requests VALUES ('1', 'did:x', 'claimed', 'abc')")
+    journal = HostedRequestJournal(journal_path)
+    assert journal.mark_failed("1") == 1
+    assert journal.get("1") == ("failed", "abc")
+
+
+def test_invalid_request(tmp_path):
+    """测试无法解析的请求被回复并标记已读"""
+    mail_manager, did_manager = _setup(tmp_path)
+    mail_manager.send_email("hoster@local.com", "ANP-DID host request", "not json", "bad@local.com")
+    result = asyncio.run(HostedDIDRequestProcessor(mail_manager, did_manager).run())
+    assert "无法解析" in result
+    assert mail_manager.get_unread_did_requests() == []
+    assert _hosted_requests(did_manager.hosted_dir) == []
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+本地邮件后端索引测试
+
+测试 LocalFileMailBackend 的 SQLite 索引：未读查询、标记已读、已有邮件迁移、
+其他进程放入收件箱的邮件补入索引，共用的邮件管理器，并提供 50k 封邮件的性能基准。
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.service.publisher.anp_sdk_publisher_mail_backend import EnhancedMailManager, LocalFileMailBackend
+
+logger = logging.getLogger(__name__)
+
+
+def _write_legacy_inbox(mail_dir: Path, count: int, subject: str = "ANP-DID host request"):
+    """按旧版格式直接写入收件箱文件（没有索引）"""
+    inbox = mail_dir / "inbox"
+    inbox.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        timestamp = 1750000000000 + i
+        email_data = {
+            "message_id": str(timestamp),
+            "from_address": f"agent{i}@local.com",
+            "to_address": "hoster@local.com",
+            "subject": subject if i % 2 == 0 else "其他邮件",
+            "content": json.dumps({"id": f"did:wba:localhost%3A9527:wba:user:{i:016x}"}),
+            "timestamp": timestamp,
+            "read": False
+        }
+        with open(inbox / f"{timestamp}_hoster_at_local.com.json", 'w', encoding='utf-8') as f:
+            json.dump(email_data, f)
+
+
+def test_send_and_read(tmp_path):
+    """测试发送后能查询到未读邮件，标记已读后不再返回"""
+    backend = LocalFileMailBackend(str(tmp_path))
+    assert backend.send_email("a@local.com", "ANP-DID host request", "{}")
+    time.sleep(0.002)
+    assert backend.send_email("b@local.com", "其他邮件", "hello")
+
+    unread = backend.get_unread_emails("ANP-DID host request")
+    assert len(unread) == 1
+    message_id = unread[0]["message_id"]
+
+    assert backend.mark_as_read(message_id)
+    assert backend.get_unread_emails("ANP-DID host request") == []
+    assert not backend.mark_as_read(message_id)
+
+    read_files = list((tmp_path / "read").glob("*.json"))
+    assert len(read_files) == 1
+    with open(read_files[0], 'r', encoding='utf-8') as f:
+        assert json.load(f)["read"] is True
+
+
+def test_limit_and_order(tmp_path):
+    """测试按时间排序和数量限制"""
+    _write_legacy_inbox(tmp_path, 10)
+    backend = LocalFileMailBackend(str(tmp_path))
+    unread = backend.get_unread_emails("ANP-DID host request", limit=3)
+    assert [m["timestamp"] for m in unread] == [1750000000000, 1750000000002, 1750000000004]
+    assert len(backend.get_unread_emails()) == 10
+
+
+def test_migration_of_existing_inbox(tmp_path):
+    """测试已有收件箱文件在首次打开时被索引，且只迁移一次"""
+    _write_legacy_inbox(tmp_path, 6)
+    backend = LocalFileMailBackend(str(tmp_path))
+    assert len(backend.get_unread_emails("ANP-DID host request")) == 3
+    assert backend.mark_as_read("1750000000000")
+
+    reopened = LocalFileMailBackend(str(tmp_path))
+    unread = reopened.get_unread_emails("ANP-DID host request")
+    assert [m["message_id"] for m in unread] == ["1750000000002", "1750000000004"]
+
+
+def test_externally_removed_file(tmp_path):
+    """测试索引中的文件被外部删除时查询不会失败"""
+    _write_legacy_inbox(tmp_path, 2)
+    backend = LocalFileMailBackend(str(tmp_path))
+    for email_file in (tmp_path / "inbox").glob("*.json"):
+        email_file.unlink()
+    assert backend.get_unread_emails() == []
+
+
+def test_externally_dropped_file(tmp_path):
+    """测试索引建立后其他进程直接写入收件箱的邮件也能查到并标记已读"""
+    backend = LocalFileMailBackend(str(tmp_path))
+    backend.EXTERNAL_SCAN_INTERVAL = 0
+    assert backend.get_unread_emails() == []
+    _write_legacy_inbox(tmp_path, 4)
+    unread = backend.get_unread_emails("ANP-DID host request")
+    assert [m["message_id"] for m in unread] == ["1750000000000", "1750000000002"]
+
+    # 写了一半的文件先跳过，写完后在下次查询时补上
+    (tmp_path / "inbox" / "1760000000000_partial.json").write_text('{"message_id": ', encoding="utf-8")
+    assert len(backend.get_unread_emails()) == 4
+    (tmp_path / "inbox" / "1760000000000_partial.json").write_text(json.dumps(
+        {"message_id": "1760000000000", "subject": "ANP-DID host request", "timestamp": 1760000000000}),
+        encoding="utf-8")
+    assert len(backend.get_unread_emails()) == 5
+    assert backend.mark_as_read("1760000000000")
+    assert len(backend.get_unread_emails()) == 4
+    backend.close()
+
+
+def test_own_writes_do_not_rescan(tmp_path):
+    """测试本后端自己的发送和标记已读不触发收件箱扫描，外部写入的扫描受间隔限制"""
+    backend = LocalFileMailBackend(str(tmp_path))
+    backend.EXTERNAL_SCAN_INTERVAL = 0
+    scans = []
+    original_scan = backend._scan_inbox
+    backend._scan_inbox = lambda mtime: scans.append(mtime) or original_scan(mtime)
+
+    backend.get_unread_emails()
+    assert len(scans) == 1
+    for i in range(20):
+        assert backend.send_email(f"a{i}@local.com", "ANP-DID host request", "{}")
+        assert len(backend.get_unread_emails(limit=1)) == 1
+    for message in backend.get_unread_emails():
+        assert backend.mark_as_read(message["message_id"])
+        backend.get_unread_emails(limit=1)
+    assert len(scans) == 1
+
+    # 外部写入后在间隔内不扫描，间隔过后补进索引
+    backend.EXTERNAL_SCAN_INTERVAL = 3600
+    _write_legacy_inbox(tmp_path, 2)
+    assert backend.get_unread_emails() == []
+    backend._last_scan -= 3600
+    assert len(backend.get_unread_emails()) == 2
+    assert len(scans) == 2
+    backend.close()
+
+
+def test_shared_mail_manager(tmp_path):
+    """测试同一后端只创建一个管理器，关闭后重新创建"""
+    first = EnhancedMailManager.shared(use_local_backend=True, local_mail_dir=str(tmp_path))
+    assert EnhancedMailManager.shared(use_local_backend=True, local_mail_dir=str(tmp_path) + "/") is first
+    other = EnhancedMailManager.shared(use_local_backend=True, local_mail_dir=str(tmp_path / "other"))
+    assert other is not first
+    for key in [k for k in EnhancedMailManager._shared if k[1] and k[1].startswith(str(tmp_path))]:
+        EnhancedMailManager._shared.pop(key).close()
+    assert EnhancedMailManager.shared(use_local_backend=True, local_mail_dir=str(tmp_path)) is not first
+    EnhancedMailManager._shared.pop(("local", str(tmp_path))).close()
+
+
+def run_mailbox_benchmark(mail_dir: Path, count: int):
+    """在 count 封邮件的收件箱上测试迁移、查询和标记已读耗时"""
+    _write_legacy_inbox(mail_dir, count)
+
+    start_time = time.time()
+    backend = LocalFileMailBackend(str(mail_dir))
+    migrate_time = time.time() - start_time
+
+    start_time = time.time()
+    for _ in range(100):
+        unread = backend.get_unread_emails("ANP-DID host request", limit=10)
+    query_time = (time.time() - start_time) / 100
+
+    start_time = time.time()
+    for message in unread:
+        assert backend.mark_as_read(message["message_id"])
+    mark_time = (time.time() - start_time) / len(unread)
+
+    logger.info(f"邮箱规模 {count}: 迁移 {migrate_time:.2f}秒, "
+                f"查询 {query_time * 1000:.2f}毫秒/次, 标记已读 {mark_time * 1000:.2f}毫秒/次")
+    return query_time, mark_time
+
+
+def test_mailbox_benchmark(tmp_path):
+    """邮箱索引性能基准测试，ANP_BENCH_MAILS 可调整邮件数量"""
+    query_time, mark_time = run_mailbox_benchmark(tmp_path, int(os.environ.get("ANP_BENCH_MAILS", "2000")))
+    assert query_time < 0.1
+    assert mark_time < 0.1
+
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        run_mailbox_benchmark(Path(tmp), 50000)
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+MessagePack 传输协商测试
+
+测试 MessagePack 编解码与 Accept 解析、ANPSDK 路由按 Content-Type/Accept 协商、
+未安装 msgpack 的服务端回退到 JSON，以及支持 msgpack 的 ANPSDK 智能体与只支持 JSON 的
+旧版智能体之间通过 agent_api_call_post、agent_msg_post 和 GroupMemberSDK.send_message 互通。
+"""
+
+import sys
+import asyncio
+import logging
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+import pytest
+import uvicorn
+from aiohttp import web
+
+from anp_open_sdk.anp_sdk_agent import LocalAgent
+from anp_open_sdk.auth import auth_server
+from anp_open_sdk.auth.did_auth_wba import WBADIDAuthenticator
+from anp_open_sdk.auth.schemas import AuthenticationContext
+from anp_open_sdk.config.unified_config import UnifiedConfig, get_global_config, set_global_config
+from anp_open_sdk.service.interaction import peer_capabilities as capabilities_module
+from anp_open_sdk.service.interaction.agent_api_call import agent_api_call_post
+from anp_open_sdk.service.interaction.agent_message_p2p import agent_msg_post
+from anp_open_sdk.service.interaction.anp_sdk_group_member import GroupMemberSDK
+from anp_open_sdk.service.interaction.anp_sdk_group_runner import GroupRunner, Message, Agent
+from anp_open_sdk.service.interaction.peer_capabilities import PeerCapabilities
+from anp_open_sdk.service.router import router_did
+from anp_open_sdk.utils import serialization
+from anp_open_sdk.utils.serialization import (
+    JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, accepts_msgpack, packb, unpackb
+)
+
+pytestmark = pytest.mark.skipif(serialization.msgpack is None, reason="msgpack 未安装")
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = Path(__file__).parent.parent
+CALLER_DID = "did:wba:localhost%3A9527:wba:user:caller"
+GROUP_ID = "msgpack_group"
+
+
+def _get_sdk():
+    from anp_open_sdk.anp_sdk import ANPSDK
+    try:
+        get_global_config()
+    except RuntimeError:
+        set_global_config(UnifiedConfig(
+            config_file=str(APP_ROOT / 'anp_open_sdk_framework_demo_agent_unified_config.yaml'),
+            app_root=str(APP_ROOT)
+        ))
+    return ANPSDK()
+
+
+def _agent(tmp_path, did: str) -> LocalAgent:
+    user_dir = tmp_path / "user_msgpack"
+    user_data = SimpleNamespace(
+        user_dir=str(user_dir), did=did, name="msgpack",
+        did_doc_path=str(user_dir / "did_document.json"),
+        did_private_key_file_path=str(user_dir / "key-1_private.pem"),
+        jwt_private_key_file_path=str(user_dir / "private_key.pem"),
+        jwt_public_key_file_path=str(user_dir / "public_key.pem"),
+        list_contacts=lambda: [],
+    )
+    return LocalAgent(user_data, name="msgpack")
+
+
+def _payload() -> dict:
+    """带二进制数据和大量数字的结构化载荷"""
+    return {
+        "blob": bytes(range(256)) * 16,
+        "samples": [i * 0.25 for i in range(2000)],
+        "ids": list(range(-1000, 1000)),
+        "meta": {"name": "传感器", "ok": True, "none": None},
+    }
+
+
+def test_codec_and_accept_parsing():
+    """测试 MessagePack 往返、体积、无法编码时的异常，以及 Accept 头解析"""
+    payload = _payload()
+    encoded = packb(payload)
+    assert unpackb(encoded) == payload
+    assert unpackb(packb({1: "int key", "set": {3}})) == {1: "int key", "set": [3]}
+    as_json = serialization.dumps(payload)
+    logger.info(f"载荷 MessagePack {len(encoded)} 字节, JSON {len(as_json)} 字节")
+    assert len(encoded) < len(as_json)
+    with pytest.raises((TypeError, OverflowError)):
+        packb({"huge": 2 ** 70})
+    with pytest.raises(ValueError):
+        unpackb(b"\xc1")
+
+    assert accepts_msgpack(MSGPACK_CONTENT_TYPE)
+    assert accepts_msgpack(f"{JSON_CONTENT_TYPE}, {MSGPACK_CONTENT_TYPE};q=0.5")
+    assert accepts_msgpack("application/x-msgpack")
+    assert not accepts_msgpack(f"{MSGPACK_CONTENT_TYPE};q=0")
+    assert not accepts_msgpack("*/*")
+    assert not accepts_msgpack(None)
+
+
+def test_server_negotiation(tmp_path, monkeypatch):
+    """测试 ANPSDK 路由按 Content-Type 解码、按 Accept 编码，未安装 msgpack 时回退到 JSON"""
+    sdk = _get_sdk()
+    did = "did:wba:localhost%3A9527:wba:user:msgpack"
+    agent = _agent(tmp_path, did)
+    seen = []
+
+    async def echo(request_data, request):
+        seen.append(request.headers.get("content-type"))
+        return {"params": request_data["params"]}
+
+    async def on_text(request_data):
+        return {"echo": request_data["content"]}
+
+    agent.expose_api("/echo", echo)
+    agent.register_message_handler("text", on_text)
+    sdk.register_agent(agent)
+
+    async def no_auth(request, auth):
+        return None
+
+    monkeypatch.setattr(auth_server, "authenticate_request", no_auth)
+    quoted = did.replace("%", "%25")
+    payload = _payload()
+    msgpack_headers = {"content-type": MSGPACK_CONTENT_TYPE, "accept": MSGPACK_CONTENT_TYPE}
+
+    async def main():
+        transport = httpx.ASGITransport(app=sdk.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost:9527") as client:
+            response = await client.post(f"/agent/api/{quoted}/echo", content=packb({"params": payload}),
+                                         headers=msgpack_headers)
+            assert response.status_code == 200
+            assert response.headers["content-type"] == MSGPACK_CONTENT_TYPE
+            assert unpackb(response.content) == {"params": payload}
+
+            # 只发送 MessagePack、响应仍为 JSON
+            response = await client.post(f"/agent/api/{quoted}/echo", content=packb({"params": {"a": 1}}),
+                                         headers={"content-type": MSGPACK_CONTENT_TYPE})
+            assert response.headers["content-type"] == JSON_CONTENT_TYPE
+            assert response.json() == {"params": {"a": 1}}
+
+            # 超出 64 位的整数无法编码为 MessagePack，回退到 JSON
+            response = await client.post(f"/agent/api/{quoted}/echo", json={"params": {"big": 2 ** 70}},
+                                         headers={"accept": MSGPACK_CONTENT_TYPE})
+            assert response.headers["content-type"] == JSON_CONTENT_TYPE
+            assert response.json() == {"params": {"big": 2 ** 70}}
+
+            response = await client.post(f"/agent/message/{quoted}/post",
+                                         content=packb({"message_type": "text", "content": "你好"}),
+                                         headers=msgpack_headers)
+            assert unpackb(response.content) == {"anp_result": {"echo": "你好"}}
+
+            response = await client.post(f"/agent/api/{quoted}/echo", content=b"\xc1\x00",
+                                         headers=msgpack_headers)
+            assert response.status_code == 400
+
+            # 只支持 JSON 的服务端：MessagePack 请求体返回 415，Accept 被忽略
+            body = packb({"params": {}})
+            monkeypatch.setattr(serialization, "msgpack", None)
+            response = await client.post(f"/agent/api/{quoted}/echo", content=body, headers=msgpack_headers)
+            assert response.status_code == 415
+            response = await client.post(f"/agent/api/{quoted}/echo", json={"params": {"a": 1}},
+                                         headers={"accept": MSGPACK_CONTENT_TYPE})
+            assert response.headers["content-type"] == JSON_CONTENT_TYPE
+            assert response.json() == {"params": {"a": 1}}
+
+    try:
+        asyncio.run(main())
+    finally:
+        sdk.unregister_agent(did)
+    assert seen[:2] == [MSGPACK_CONTENT_TYPE, MSGPACK_CONTENT_TYPE]
+
+
+class RecordingRunner(GroupRunner):
+    received = []
+
+    async def on_agent_join(self, agent: Agent) -> bool:
+        return True
+
+    async def on_agent_leave(self, agent: Agent):
+        pass
+
+    async def on_message(self, message: Message):
+        RecordingRunner.received.append(message.content)
+        return None
+
+
+async def _start_legacy_agent():
+    """只支持 JSON 的旧版智能体：ad.json 没有 ad:supportedContentTypes，请求体按 JSON 解析"""
+    seen = []
+
+    async def ad(request: web.Request):
+        return web.json_response({"@type": "ad:AgentDescription", "name": "legacy"})
+
+    async def api(request: web.Request):
+        seen.append(request.content_type)
+        data = await request.json()
+        return web.json_response({"params": data["params"]})
+
+    async def message(request: web.Request):
+        seen.append(request.content_type)
+        data = await request.json()
+        return web.json_response({"anp_result": {"echo": data["content"]}})
+
+    async def group_message(request: web.Request):
+        seen.append(request.content_type)
+        await request.json()
+        return web.json_response({"status": "success"})
+
+    app = web.Application()
+    app.router.add_get("/wba/user/{did}/ad.json", ad)
+    app.router.add_post("/agent/api/{did}/echo", api)
+    app.router.add_post("/agent/message/{did}/post", message)
+    app.router.add_post("/agent/group/{did}/{group_id}/message", group_message)
+    app_runner = web.AppRunner(app)
+    await app_runner.setup()
+    site = web.TCPSite(app_runner, "127.0.0.1", 0)
+    await site.start()
+    return app_runner, site._server.sockets[0].getsockname()[1], seen
+
+
+def test_interop_between_msgpack_and_json_agents(tmp_path, monkeypatch):
+    """测试调用方对支持 msgpack 的智能体使用 MessagePack，对旧版智能体使用 JSON，结果一致"""
+    sdk = _get_sdk()
+    RecordingRunner.received = []
+    capable_seen = []
+    payload = {"samples": [i * 0.5 for i in range(100)], "name": "测试"}
+
+    async def echo(request_data, request):
+        capable_seen.append(request.headers.get("content-type"))
+        return {"params": request_data["params"]}
+
+    async def on_text(request_data):
+        capable_seen.append(request_data.get("message_type"))
+        return {"echo": request_data["content"]}
+
+    async def no_auth(request, auth):
+        return None
+
+    class StubHeaderBuilder:
+        def build_auth_header(self, context, credentials):
+            return {"Authorization": "Bearer test"}
+
+    authenticator = WBADIDAuthenticator(None, None, StubHeaderBuilder(), None)
+
+    async def auth_request(caller_agent, target_agent, request_url, method="GET", json_data=None,
+                           custom_headers=None, **kwargs):
+        # 跳过 DID 签名，请求仍经过 WBADIDAuthenticator 的编码和解码
+        context = AuthenticationContext(caller_did=caller_agent, target_did=target_agent, request_url=request_url,
+                                        method=method, json_data=json_data, custom_headers=custom_headers or {})
+        status, _, data = await authenticator.authenticate_request(context, None)
+        return status, data, "", status == 200
+
+    monkeypatch.setattr(auth_server, "authenticate_request", no_auth)
+    monkeypatch.setattr(capabilities_module, "agent_auth_request", auth_request)
+    monkeypatch.setattr(capabilities_module, "peer_capabilities", PeerCapabilities())
+    monkeypatch.setattr(LocalAgent, "from_did", classmethod(lambda cls, did, *args: SimpleNamespace(id=did)))
+    monkeypatch.setattr(router_did, "get_user_dir_did_doc_by_did", lambda did: (True, {}, "user_msgpack"))
+    monkeypatch.setattr(router_did, "get_agent_cfg_by_user_dir", lambda user_dir: {})
+
+    async def main():
+        sdk.register_group_runner(GROUP_ID, RecordingRunner)
+        server = uvicorn.Server(uvicorn.Config(sdk.app, host="127.0.0.1", port=0, log_level="warning"))
+        serve = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        legacy_runner, legacy_port, legacy_seen = await _start_legacy_agent()
+        capable_did = f"did:wba:127.0.0.1%3A{port}:wba:user:capable"
+        legacy_did = f"did:wba:127.0.0.1%3A{legacy_port}:wba:user:legacy"
+        agent = _agent(tmp_path, capable_did)
+        agent.expose_api("/echo", echo)
+        agent.register_message_handler("text", on_text)
+        sdk.register_agent(agent)
+        members = [GroupMemberSDK(CALLER_DID, p, base_url="http://127.0.0.1", use_local_optimization=False)
+                   for p in (port, legacy_port)]
+        try:
+            capabilities = capabilities_module.peer_capabilities
+            assert await capabilities.supports_msgpack(capable_did)
+            assert not await capabilities.supports_msgpack(legacy_did)
+
+            for target in (capable_did, legacy_did):
+                result = await agent_api_call_post(CALLER_DID, target, "/echo", payload)
+                assert result == {"params": payload}
+                result = await agent_msg_post(sdk, CALLER_DID, target, "你好")
+                assert result == {"anp_result": {"echo": "你好"}}
+            assert capable_seen == [MSGPACK_CONTENT_TYPE, "text"]
+            assert legacy_seen == [JSON_CONTENT_TYPE, JSON_CONTENT_TYPE]
+
+            assert await members[0].join_group(GROUP_ID, did=capable_did)
+            assert await members[0].send_message(GROUP_ID, b"\x00binary", did=capable_did)
+            assert RecordingRunner.received == [b"\x00binary"]
+            assert await members[1].send_message(GROUP_ID, "text", did=legacy_did)
+            assert legacy_seen[-1] == JSON_CONTENT_TYPE
+
+            # ad.json 声明支持但服务端拒绝（如降级部署）时，收到 415 后改用 JSON 重发
+            monkeypatch.setattr(serialization, "msgpack_available", lambda: False)
+            result = await agent_api_call_post(CALLER_DID, capable_did, "/echo", {"a": 1})
+            assert result == {"params": {"a": 1}}
+            assert capable_seen[-1] == JSON_CONTENT_TYPE
+            assert not await capabilities.supports_msgpack(capable_did)
+        finally:
+            for member in members:
+                await member.close()
+            sdk.unregister_agent(capable_did)
+            await legacy_runner.cleanup()
+            server.should_exit = True
+            await serve
+            sdk.unregister_group_runner(GROUP_ID)
+
+    asyncio.run(main())
+
+
+def test_peer_capabilities_cache():
+    """测试 ad.json 只请求一次、并发查询合并、读取失败按 JSON 处理并在短时间后重试"""
+    clock = SimpleNamespace(now=0.0)
+    requests = []
+
+    async def main():
+        async def ad(request: web.Request):
+            requests.append(request.match_info["did"])
+            await asyncio.sleep(0.05)
+            if "broken" in request.match_info["did"]:
+                return web.Response(status=500)
+            return web.json_response({"ad:supportedContentTypes": [JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE]})
+
+        app = web.Application()
+        app.router.add_get("/wba/user/{did}/ad.json", ad)
+        app_runner = web.AppRunner(app)
+        await app_runner.setup()
+        site = web.TCPSite(app_runner, "127.0.0.1", 0)
+        await site.start()
+        base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        cache = PeerCapabilities(ttl=300, failure_ttl=10, max_entries=2, clock=lambda: clock.now)
+        try:
+            results = await asyncio.gather(*[cache.supports_msgpack("did:wba:a", base_url) for _ in range(10)])
+            assert all(results) and requests == ["did:wba:a"]
+            assert not await cache.supports_msgpack("did:wba:broken", base_url)
+            assert not await cache.supports_msgpack("did:wba:broken", base_url)
+            assert len(requests) == 2
+            clock.now += 11
+            assert not await cache.supports_msgpack("did:wba:broken", base_url)
+            assert len(requests) == 3
+            assert await cache.supports_msgpack("did:wba:a", base_url)
+            assert len(requests) == 3
+            await cache.supports_msgpack("did:wba:c", base_url)
+            assert len(cache) == 2
+        finally:
+            await app_runner.cleanup()
+
+    asyncio.run(main())
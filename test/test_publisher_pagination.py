@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+发布者智能体列表分页测试
+
+测试 AgentDirectory 的游标分页、过滤和字段选择，/publisher/agents 接口，
+以及翻页期间并发注册/注销时不重复、不遗漏全程存在的智能体。
+"""
+
+import sys
+import random
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from anp_open_sdk.service.publisher.agent_directory import AgentDirectory
+from anp_open_sdk.service.router import router_publisher
+from anp_open_sdk.utils.pagination import paginate
+
+logger = logging.getLogger(__name__)
+
+AGENT_COUNT = 250
+
+
+def _agent(i: int, port: int = 9527, hosted: bool = False):
+    return SimpleNamespace(
+        id=f"did:wba:localhost%3A{port}:wba:{'hostuser' if hosted else 'user'}:{i:016x}",
+        name=f"agent{i % 10}-{i}", is_hosted_did=hosted, agent_type="personal"
+    )
+
+
+def _directory(count: int = AGENT_COUNT) -> AgentDirectory:
+    directory = AgentDirectory()
+    for i in range(count):
+        directory.add(_agent(i, port=9527 if i % 2 else 9528, hosted=i % 5 == 0))
+    return directory
+
+
+def _walk(directory: AgentDirectory, limit: int, **filters):
+    seen, cursor = [], None
+    while True:
+        page, cursor = directory.page(cursor=cursor, limit=limit, **filters)
+        assert len(page) <= limit
+        seen.extend(page)
+        if cursor is None:
+            return seen
+
+
+def test_page_through_directory():
+    """测试逐页遍历得到全部智能体，按 DID 有序且不重复"""
+    directory = _directory()
+    seen = _walk(directory, limit=40)
+    dids = [entry["did"] for entry in seen]
+    assert len(dids) == AGENT_COUNT
+    assert dids == sorted(set(dids))
+
+    first, cursor = directory.page(limit=AGENT_COUNT)
+    assert len(first) == AGENT_COUNT and cursor is None
+
+
+def test_filters_and_fields():
+    """测试托管、名称前缀、服务器过滤与字段选择"""
+    directory = _directory()
+    hosted = _walk(directory, limit=7, hosted=True)
+    assert len(hosted) == AGENT_COUNT // 5
+    assert all(entry["hosted"] for entry in hosted)
+
+    prefixed = _walk(directory, limit=3, name_prefix="agent3-")
+    assert len(prefixed) == AGENT_COUNT // 10
+    assert all(entry["name"].startswith("agent3-") for entry in prefixed)
+
+    on_server = _walk(directory, limit=50, server="localhost:9528", hosted=False)
+    assert all(e["server"] == "localhost:9528" and not e["hosted"] for e in on_server)
+    assert len(on_server) == len([i for i in range(AGENT_COUNT) if i % 2 == 0 and i % 5 != 0])
+
+    page, _ = directory.page(limit=2, fields=["did"])
+    assert all(set(entry) == {"did"} for entry in page)
+    with pytest.raises(ValueError):
+        directory.page(fields=["password"])
+    with pytest.raises(ValueError):
+        directory.page(cursor="not a cursor!")
+
+
+def test_incremental_maintenance():
+    """测试注销和重复注册后索引保持一致"""
+    directory = _directory(10)
+    agent = _agent(3)
+    assert directory.remove(agent.id)
+    assert not directory.remove(agent.id)
+    assert len(directory) == 9
+    directory.add(_agent(4, port=9528))
+    assert len(directory) == 9
+    directory.add(agent)
+    dids = [e["did"] for e in _walk(directory, limit=4)]
+    assert dids == sorted(dids) and len(dids) == 10
+
+
+def test_pagination_consistent_under_concurrent_registration():
+    """测试翻页期间其他线程持续注册/注销，全程存在的智能体恰好出现一次"""
+    directory = _directory()
+    stable = {e["did"] for e in _walk(directory, limit=AGENT_COUNT)}
+    stop = threading.Event()
+
+    def churn():
+        rng = random.Random(7)
+        n = AGENT_COUNT
+        while not stop.is_set():
+            agent = _agent(n, port=rng.choice((9527, 9528)))
+            directory.add(agent)
+            if rng.random() < 0.5:
+                directory.remove(agent.id)
+            n += 1
+
+    threads = [threading.Thread(target=churn) for _ in range(2)]
+    for t in threads:
+        t.start()
+    try:
+        for _ in range(20):
+            dids = [e["did"] for e in _walk(directory, limit=17)]
+            assert len(dids) == len(set(dids))
+            assert dids == sorted(dids)
+            assert stable <= set(dids)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+
+def _app(directory: AgentDirectory) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router_publisher.router)
+    app.state.sdk = SimpleNamespace(router=SimpleNamespace(directory=directory))
+    return app
+
+
+def test_publisher_agents_endpoint():
+    """测试 /publisher/agents 分页、过滤和参数校验，不带 cursor/limit 时返回全部"""
+    directory = _directory()
+
+    async def main():
+        transport = httpx.ASGITransport(app=_app(directory))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            dids, params = [], {"limit": 60}
+            while True:
+                data = (await client.get("/publisher/agents", params=params)).json()
+                assert data["total"] == len(directory)
+                assert data["count"] == len(data["agents"])
+                assert all(set(agent) == {"did", "name"} for agent in data["agents"])
+                dids.extend(agent["did"] for agent in data["agents"])
+                # 翻页期间注册新智能体，排在游标之前的不会出现，之后的会出现
+                directory.add(_agent(10_000 + len(dids)))
+                if not data["next_cursor"]:
+                    break
+                params = {"limit": 60, "cursor": data["next_cursor"]}
+            assert len(dids) == len(set(dids))
+            assert dids == sorted(dids)
+
+            data = (await client.get("/publisher/agents")).json()
+            assert data["count"] == data["total"] == len(directory) > 100
+            assert data["next_cursor"] is None
+            data = (await client.get("/publisher/agents", params={"cursor": directory.page(limit=1)[1]})).json()
+            assert data["count"] == 100 and data["next_cursor"]
+
+            data = (await client.get("/publisher/agents", params={
+                "hosted": "true", "server": "localhost:9528", "fields": "did,hosted,server"
+            })).json()
+            assert data["agents"] and all(a["hosted"] and a["server"] == "localhost:9528" for a in data["agents"])
+
+            assert (await client.get("/publisher/agents", params={"cursor": "%%%"})).status_code == 400
+            assert (await client.get("/publisher/agents", params={"fields": "secret"})).status_code == 400
+            assert (await client.get("/publisher/agents", params={"limit": 0})).status_code == 422
+
+    asyncio.run(main())
+
+
+def test_paginate_helper():
+    """测试通用分页：排序键并列时按完整键区分，翻页间插入的记录不导致重复"""
+    items = [{"host": "h", "dir": f"user_{i:03d}"} for i in range(25)]
+    key = lambda x: (x["host"], x["dir"])
+    page1, cursor = paginate(items, key, limit=10)
+    items.append({"host": "a", "dir": "user_new"})
+    page2, cursor = paginate(items, key, cursor=cursor, limit=10)
+    page3, cursor = paginate(items, key, cursor=cursor, limit=10)
+    assert cursor is None
+    dirs = [x["dir"] for x in page1 + page2 + page3]
+    assert dirs == [f"user_{i:03d}" for i in range(25)]
+    assert paginate(items, key)[1] is None
+    with pytest.raises(ValueError):
+        paginate(items, key, cursor="bad*cursor")
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+准入控制与限流测试
+
+测试调用方提取、令牌桶补充、调用方之间的公平性、握手的单 DID 与全局限制、
+伪造 DID 不影响真实调用方、认证后按 DID 限流、全局并发上限，以及 10 万个不同 DID 时令牌桶表的内存上限。
+"""
+
+import sys
+import json
+import base64
+import asyncio
+import logging
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from fastapi import FastAPI
+
+from anp_open_sdk.auth.rate_limiter import BucketTable, RateLimiter, extract_caller
+
+logger = logging.getLogger(__name__)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _request(headers=None, host="10.0.0.1"):
+    return SimpleNamespace(headers={k.lower(): v for k, v in (headers or {}).items()},
+                           client=SimpleNamespace(host=host))
+
+
+def _didwba(did: str) -> str:
+    return (f'DIDWba resp_did="did:wba:server", did="{did}", nonce="n", timestamp="t", '
+            f'verification_method="key-1", signature="sig"')
+
+
+def _jwt(claims: dict) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+    return f"eyJhbGciOiJSUzI1NiJ9.{payload}.signature"
+
+
+def test_extract_caller():
+    """测试认证前的调用方标识是客户端地址加上 DIDWba、Bearer 请求声称的 DID"""
+    assert extract_caller(_request({"Authorization": _didwba("did:wba:a")})) == ("ip:10.0.0.1|did:wba:a", True)
+    assert extract_caller(_request({"Authorization": "Bearer x", "req_did": "did:wba:b"})) == \
+        ("ip:10.0.0.1|did:wba:b", False)
+    assert extract_caller(_request({"Authorization": "Bearer " + _jwt({"req_did": "did:wba:c"})})) == \
+        ("ip:10.0.0.1|did:wba:c", False)
+    assert extract_caller(_request({"Authorization": "Bearer garbage"})) == ("ip:10.0.0.1", False)
+    assert extract_caller(_request({"Authorization": 'DIDWba nonce="n"'})) == ("ip:10.0.0.1", True)
+    assert extract_caller(_request()) == ("ip:10.0.0.1", False)
+
+
+def test_token_bucket_refill():
+    """测试突发上限、按速率补充和 Retry-After 估算"""
+    clock = FakeClock()
+    limiter = RateLimiter(caller_rate=2, caller_burst=4, clock=clock)
+    assert [limiter.check("a") for _ in range(4)] == [0, 0, 0, 0]
+    wait = limiter.check("a")
+    assert 0 < wait <= 0.5
+    clock.now += 0.5
+    assert limiter.check("a") == 0
+    assert limiter.check("a") > 0
+    clock.now += 100
+    assert [limiter.check("a") for _ in range(5)].count(0) == 4
+
+
+def test_fairness_between_callers():
+    """测试一个调用方持续超量时，其他调用方的正常请求全部放行"""
+    clock = FakeClock()
+    limiter = RateLimiter(caller_rate=10, caller_burst=20, clock=clock)
+    noisy_allowed = quiet_allowed = 0
+    for tick in range(1000):
+        clock.now += 0.01
+        for _ in range(10):
+            noisy_allowed += limiter.check("did:wba:noisy") == 0
+        if tick % 20 == 0:
+            quiet_allowed += limiter.check("did:wba:quiet") == 0
+    # 10 秒内 noisy 只拿到突发上限加补充的令牌，quiet 每次都成功
+    assert noisy_allowed <= 20 + 10 * 10 + 1
+    assert quiet_allowed == 50
+
+
+def test_spoofed_did_does_not_starve_victim():
+    """测试伪造他人 DID 的请求只耗尽伪造者地址下的桶，验证后的 DID 桶单独计"""
+    clock = FakeClock()
+    limiter = RateLimiter(caller_rate=1, caller_burst=5, clock=clock)
+    headers = {"Authorization": _didwba("did:wba:victim")}
+    spoofer, victim = _request(headers, host="10.6.6.6"), _request(headers, host="10.0.0.2")
+    assert sum(limiter.check(*extract_caller(spoofer)) == 0 for _ in range(50)) == 5
+    assert limiter.check(*extract_caller(victim)) == 0
+    assert limiter.admit_verified(victim) is None
+
+    # 验签通过的 DID 从多个地址发起的请求合计受限
+    for i in range(4):
+        assert limiter.admit_verified(_request(headers, host=f"10.1.0.{i}")) is None
+    rejected = limiter.admit_verified(_request(headers, host="10.1.0.9"))
+    assert rejected.status_code == 429 and int(rejected.headers["retry-after"]) >= 1
+    assert limiter.admit_verified(_request()) is None
+
+
+def test_handshake_limits():
+    """测试单 DID 握手桶比普通请求更严格，轮换 DID 受全局握手桶限制"""
+    clock = FakeClock()
+    limiter = RateLimiter(caller_rate=100, caller_burst=100, handshake_rate=1, handshake_burst=3,
+                          handshake_global_rate=10, handshake_global_burst=20, clock=clock)
+    assert [limiter.check("did:wba:x", handshake=True) for _ in range(3)] == [0, 0, 0]
+    assert limiter.check("did:wba:x", handshake=True) > 0
+    assert limiter.check("did:wba:x") == 0
+
+    allowed = sum(limiter.check(f"did:wba:rot{i}", handshake=True) == 0 for i in range(1000))
+    assert allowed == 20 - 3
+
+
+def test_memory_bound_with_100k_dids():
+    """测试 10 万个不同 DID 时令牌桶表不超过上限，内存有界，活跃调用方不被淘汰"""
+    clock = FakeClock()
+    limiter = RateLimiter(caller_rate=1, caller_burst=2, max_callers=5000, clock=clock)
+    tracemalloc.start()
+    try:
+        for i in range(100_000):
+            limiter.check(f"did:wba:localhost%3A9527:wba:user:{i:016x}")
+            if i % 100 == 0:
+                limiter.check("did:wba:active")
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(limiter.callers) == 5000
+    assert "did:wba:active" in limiter.callers._buckets
+    logger.info(f"10 万个 DID 后令牌桶表 {len(limiter.callers)} 项，内存峰值 {peak / 1e6:.2f}MB")
+    assert peak < 10e6
+
+    table = BucketTable(rate=1, burst=1, max_entries=3)
+    for key in "abcd":
+        table.take(key, 0)
+    assert list(table._buckets) == ["b", "c", "d"]
+
+
+def test_middleware_429_and_concurrency_cap():
+    """测试中间件返回 429 和 Retry-After，全局并发上限拒绝多余的请求"""
+    limiter = RateLimiter(caller_rate=1, caller_burst=2, max_concurrency=2)
+    app = FastAPI()
+    release = asyncio.Event()
+
+    @app.get("/slow")
+    async def slow():
+        await release.wait()
+        return {"ok": True}
+
+    @app.get("/fast")
+    async def fast():
+        return {"ok": True}
+
+    @app.middleware("http")
+    async def rate_limit_middleware(request, call_next):
+        return await limiter.dispatch(request, call_next)
+
+    async def main():
+        transport = httpx.ASGITransport(app=app, client=("10.0.0.9", 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"Authorization": "Bearer t", "req_did": "did:wba:caller"}
+            statuses = [(await client.get("/fast", headers=headers)).status_code for _ in range(3)]
+            assert statuses == [200, 200, 429]
+            response = await client.get("/fast", headers=headers)
+            assert response.status_code == 429 and int(response.headers["retry-after"]) >= 1
+
+            # 两个慢请求占满并发，第三个调用方被拒绝
+            slow = [asyncio.create_task(client.get("/slow", headers={"req_did": f"did:wba:s{i}",
+                                                                      "Authorization": "Bearer t"}))
+                    for i in range(2)]
+            while limiter.in_flight < 2:
+                await asyncio.sleep(0.01)
+            busy = await client.get("/fast", headers={"Authorization": "Bearer t", "req_did": "did:wba:other"})
+            assert busy.status_code == 429 and busy.json()["detail"] == "Server busy"
+            release.set()
+            assert [r.status_code for r in await asyncio.gather(*slow)] == [200, 200]
+            assert limiter.in_flight == 0
+
+    asyncio.run(main())
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+请求载荷读取一次测试
+
+测试认证中间件缓存的原始请求体和 JSON 被 /agent/api、/agent/message 路由和 LocalAgent 处理器复用，
+大请求体只读取和解析一次，并给出单次请求内存分配的基准。
+"""
+
+import sys
+import json
+import asyncio
+import logging
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from fastapi import FastAPI, Request
+
+from anp_open_sdk.anp_sdk_agent import LocalAgent
+from anp_open_sdk.auth import auth_server
+from anp_open_sdk.config.unified_config import UnifiedConfig, get_global_config, set_global_config
+from anp_open_sdk.utils import request_payload
+from anp_open_sdk.utils.request_payload import get_json_payload, get_raw_body, load_payload, payload_size
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = Path(__file__).parent.parent
+AGENT_DID = "did:wba:localhost%3A9527:wba:user:payload"
+LARGE_ITEMS = 200_000
+
+
+def _get_sdk():
+    from anp_open_sdk.anp_sdk import ANPSDK
+    try:
+        get_global_config()
+    except RuntimeError:
+        set_global_config(UnifiedConfig(
+            config_file=str(APP_ROOT / 'anp_open_sdk_framework_demo_agent_unified_config.yaml'),
+            app_root=str(APP_ROOT)
+        ))
+    return ANPSDK()
+
+
+def _agent(tmp_path) -> LocalAgent:
+    user_dir = tmp_path / "user_payload"
+    user_data = SimpleNamespace(
+        user_dir=str(user_dir), did=AGENT_DID, name="payload",
+        did_doc_path=str(user_dir / "did_document.json"),
+        did_private_key_file_path=str(user_dir / "key-1_private.pem"),
+        jwt_private_key_file_path=str(user_dir / "private_key.pem"),
+        jwt_public_key_file_path=str(user_dir / "public_key.pem"),
+        list_contacts=lambda: [],
+    )
+    return LocalAgent(user_data, name="payload")
+
+
+class _CountingLoads:
+    """统计 request_payload 中 JSON 解析的调用次数"""
+
+    def __init__(self, monkeypatch):
+        self.calls = 0
+        original = request_payload.serialization.loads
+
+        def loads(*args, **kwargs):
+            self.calls += 1
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(request_payload, "serialization", SimpleNamespace(loads=loads))
+
+
+def _large_body() -> dict:
+    return {"items": [{"id": i, "text": "x" * 16} for i in range(LARGE_ITEMS)]}
+
+
+def test_sdk_routes_reuse_cached_payload(tmp_path, monkeypatch):
+    """测试大请求体经过中间件、路由器和处理器时只解析一次，处理器拿到的是缓存的浅拷贝"""
+    sdk = _get_sdk()
+    agent = _agent(tmp_path)
+    seen = {}
+
+    async def echo(request_data, request):
+        seen["api"] = request_data
+        seen["state_payload"] = request.state.payload
+        return {"count": len(request_data["items"]), "bytes": payload_size(request)}
+
+    async def on_text(request_data):
+        seen["message"] = request_data
+        return {"len": len(request_data["content"])}
+
+    agent.expose_api("/echo", echo)
+    agent.register_message_handler("text", on_text)
+    sdk.register_agent(agent)
+
+    async def no_auth(request, auth):
+        return None
+
+    monkeypatch.setattr(auth_server, "authenticate_request", no_auth)
+    loads = _CountingLoads(monkeypatch)
+    body = json.dumps(_large_body()).encode("utf-8")
+    quoted = AGENT_DID.replace("%", "%25")
+
+    async def main():
+        transport = httpx.ASGITransport(app=sdk.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost:9527") as client:
+            response = await client.post(f"/agent/api/{quoted}/echo", content=body,
+                                         headers={"content-type": "application/json"})
+            assert response.status_code == 200
+            assert response.json() == {"count": LARGE_ITEMS, "bytes": len(body)}
+            # 路由改写的是副本，缓存的载荷保持原样，嵌套数据不复制
+            assert seen["api"]["items"] is seen["state_payload"]["items"]
+            assert "type" not in seen["state_payload"]
+            assert loads.calls == 1
+
+            content = "y" * 1_000_000
+            response = await client.post(f"/agent/message/{quoted}/post",
+                                         json={"message_type": "text", "content": content})
+            assert response.json() == {"anp_result": {"len": len(content)}}
+            assert seen["message"]["type"] == "message"
+            assert loads.calls == 2
+
+            # 空请求体和非 JSON 请求体按空载荷处理
+            response = await client.post(f"/agent/api/{quoted}/missing", content=b"not json")
+            assert response.status_code == 404
+            assert loads.calls == 2
+
+    try:
+        asyncio.run(main())
+    finally:
+        sdk.unregister_agent(AGENT_DID)
+
+
+def test_helpers_without_middleware():
+    """测试没有经过中间件时按需读取一次并缓存"""
+    app = FastAPI()
+    results = {}
+
+    @app.post("/raw")
+    async def raw(request: Request):
+        results["first"] = await get_json_payload(request, {})
+        results["second"] = await get_json_payload(request, {})
+        results["raw"] = await get_raw_body(request)
+        return {"ok": True}
+
+    @app.middleware("http")
+    async def middleware(request, call_next):
+        if request.url.path == "/cached":
+            await load_payload(request)
+            results["middleware_raw"] = request.state.raw_body
+        return await call_next(request)
+
+    @app.post("/cached")
+    async def cached(request: Request):
+        results["route_raw"] = await get_raw_body(request)
+        return {"payload": await get_json_payload(request)}
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/raw", content=b' [1, 2, 3]')
+            assert results["first"] == [1, 2, 3]
+            # 每次返回副本，一个调用方改写不影响其他调用方
+            assert results["first"] is not results["second"]
+            results["first"].append(4)
+            assert results["second"] == [1, 2, 3]
+            assert results["raw"] == b' [1, 2, 3]'
+
+            await client.post("/raw", content=b"")
+            assert results["first"] == {} and results["raw"] == b""
+
+            # 格式错误的 JSON 返回 400，不当作空载荷交给路由
+            results.clear()
+            response = await client.post("/raw", content=b'{"a": ')
+            assert response.status_code == 400
+            assert "first" not in results
+
+            response = await client.post("/cached", json={"a": 1})
+            assert response.json() == {"payload": {"a": 1}}
+            assert results["route_raw"] is results["middleware_raw"]
+
+    asyncio.run(main())
+
+    # 没有 state 的对象（如 WebSocket 代理伪造的请求）返回默认值
+    assert asyncio.run(get_json_payload(object(), {"d": 1})) == {"d": 1}
+    assert payload_size(object()) == 0
+
+
+def test_allocation_benchmark():
+    """基准：单次大请求在旧方式（中间件、路由、日志各读取/解析）与缓存方式下的内存峰值"""
+    body = json.dumps(_large_body()).encode("utf-8")
+
+    def build(cached: bool) -> FastAPI:
+        app = FastAPI()
+
+        @app.middleware("http")
+        async def middleware(request, call_next):
+            if cached:
+                await load_payload(request)
+            else:
+                await request.body()
+            return await call_next(request)
+
+        @app.post("/agent/api/bench")
+        async def route(request: Request):
+            if cached:
+                data = await get_json_payload(request, {})
+                log_line = f"body: {payload_size(request)} 字节"
+            else:
+                data = json.loads(await request.body())
+                log_line = f"请求数据为{data}\nbody: {await request.body()}"
+            return {"count": len(data["items"]), "log": len(log_line)}
+
+        return app
+
+    async def measure(app) -> int:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            tracemalloc.start()
+            try:
+                response = await client.post("/agent/api/bench", content=body)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        assert response.json()["count"] == LARGE_ITEMS
+        return peak
+
+    legacy = asyncio.run(measure(build(cached=False)))
+    cached = asyncio.run(measure(build(cached=True)))
+    logger.info(f"{len(body) / 1e6:.1f}MB 请求体单次请求内存峰值: 旧方式 {legacy / 1e6:.1f}MB, 缓存 {cached / 1e6:.1f}MB")
+    assert cached < legacy
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    test_allocation_benchmark()
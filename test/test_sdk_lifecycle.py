@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+服务生命周期测试
+
+通过 ANPSDK.start_server/stop_server 启动和停止真实服务：停机时进行中的慢请求在排空期限内完成、
+新连接被拒绝、SSE 和 WebSocket 客户端收到带重连间隔的关闭通知、nonce 状态写入文件；
+超过排空期限的请求被取消；启动任务并发执行，/ready 反映启动、就绪和停机状态。
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import aiohttp
+import httpx
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.anp_sdk_lifecycle import StartupTasks, restore_runtime_state, save_runtime_state
+from anp_open_sdk.auth import auth_server
+from anp_open_sdk.config.unified_config import UnifiedConfig, get_global_config, set_global_config
+from anp_open_sdk.service.interaction.anp_sdk_group_runner import Agent, GroupRunner, Message
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = Path(__file__).parent.parent
+GROUP_ID = "lifecycle"
+
+
+def _get_sdk():
+    from anp_open_sdk.anp_sdk import ANPSDK
+    try:
+        get_global_config()
+    except RuntimeError:
+        set_global_config(UnifiedConfig(
+            config_file=str(APP_ROOT / 'anp_open_sdk_framework_demo_agent_unified_config.yaml'),
+            app_root=str(APP_ROOT)
+        ))
+    return ANPSDK()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class EchoRunner(GroupRunner):
+    async def on_agent_join(self, agent: Agent) -> bool:
+        return True
+
+    async def on_agent_leave(self, agent: Agent):
+        pass
+
+    async def on_message(self, message: Message):
+        await self.broadcast(message)
+        return None
+
+
+@pytest.fixture
+def served_sdk(tmp_path, monkeypatch):
+    """配置好端口、状态文件和 /slow 慢处理器的 SDK，返回按给定排空期限启动服务的函数，测试结束时恢复"""
+    sdk = _get_sdk()
+    port = _free_port()
+    monkeypatch.setattr(get_global_config().anp_sdk, "port", port)
+    monkeypatch.setattr(get_global_config().anp_sdk, "host", "127.0.0.1")
+    monkeypatch.setattr(sdk, "state_file", str(tmp_path / "runtime_state.json"))
+    monkeypatch.setattr(sdk, "reconnect_after", 0.2)
+
+    async def no_auth(request, auth):
+        return None
+
+    monkeypatch.setattr(auth_server, "authenticate_request", no_auth)
+
+    async def slow(seconds: float):
+        await asyncio.sleep(seconds)
+        return {"slept": seconds}
+
+    sdk.app.add_api_route("/slow", slow, methods=["GET"])
+    route = sdk.app.router.routes[-1]
+    runner = EchoRunner(GROUP_ID)
+    runner.agents["alice"] = Agent("alice", "alice", 0)
+    sdk.group_manager.runners[GROUP_ID] = runner
+
+    def start(drain_timeout: float):
+        monkeypatch.setattr(sdk, "drain_timeout", drain_timeout)
+        sdk.start_server()
+        return sdk, port, runner
+
+    try:
+        yield start
+    finally:
+        if sdk.server_running:
+            sdk.stop_server(timeout=5)
+        sdk.app.router.routes.remove(route)
+        sdk.group_manager.runners.pop(GROUP_ID, None)
+        sdk.draining = False
+
+
+async def _wait_ready(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"http://127.0.0.1:{port}/ready") as response:
+                    if response.status == 200:
+                        return await response.json()
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.02)
+    raise AssertionError("服务未就绪")
+
+
+def test_stop_drains_in_flight_requests(served_sdk, tmp_path):
+    """测试停机时慢请求完成、新连接被拒绝、长连接收到关闭通知、nonce 写入状态文件"""
+    sdk, port, runner = served_sdk(drain_timeout=5)
+    nonce = "lifecycle-nonce"
+    auth_server.VALID_SERVER_NONCES[nonce] = datetime.now(timezone.utc)
+    base = f"http://127.0.0.1:{port}"
+
+    async def main():
+        ready = await _wait_ready(port)
+        assert ready["status"] == "ready"
+        assert set(ready["tasks"]) == {"openapi_yaml", "jwt_keys"}
+
+        async with aiohttp.ClientSession() as session:
+            sse = await session.get(f"{base}/agent/group/alice/{GROUP_ID}/connect", params={"req_did": "alice"})
+            ws = await session.ws_connect(f"ws://127.0.0.1:{port}/ws/message")
+            while not runner.listeners.get("alice") or not sdk.ws_connections:
+                await asyncio.sleep(0.01)
+
+            slow = asyncio.create_task(session.get(f"{base}/slow", params={"seconds": 1.0}))
+            await asyncio.sleep(0.2)
+            start = time.monotonic()
+            # 异步退出不阻塞事件循环，停机期间仍能读取 SSE、WebSocket 和慢请求的响应
+            stop = asyncio.create_task(sdk.__aexit__(None, None, None))
+
+            sse_lines = []
+            async for line in sse.content:
+                sse_lines.append(line.decode().rstrip("\r\n"))
+            ws_notice = await ws.receive_json(timeout=5)
+            ws_closed = await ws.receive(timeout=5)
+
+            # 监听端口已关闭，新请求无法建立连接
+            while not sdk.draining:
+                await asyncio.sleep(0.01)
+            with pytest.raises(aiohttp.ClientConnectionError):
+                async with aiohttp.ClientSession() as fresh:
+                    await fresh.get(f"{base}/ready")
+
+            response = await slow
+            body = await response.json()
+            await stop
+            elapsed = time.monotonic() - start
+            return sse_lines, ws_notice, ws_closed, response.status, body, elapsed
+
+    try:
+        sse_lines, ws_notice, ws_closed, status, body, elapsed = asyncio.run(asyncio.wait_for(main(), timeout=30))
+    finally:
+        auth_server.VALID_SERVER_NONCES.pop(nonce, None)
+
+    logger.info(f"停机用时 {elapsed:.2f}s（进行中的请求剩余约 0.8s）")
+    assert status == 200 and body == {"slept": 1.0}
+    assert 0.6 < elapsed < sdk.drain_timeout
+    assert "retry: 200" in sse_lines and "event: close" in sse_lines
+    assert ws_notice == {"type": "server_shutdown", "reconnect_after": 0.2}
+    assert ws_closed.type == aiohttp.WSMsgType.CLOSE and ws_closed.data == 1012
+    assert not sdk.server_running and not runner.listeners
+
+    state = json.loads((tmp_path / "runtime_state.json").read_text(encoding="utf-8"))
+    assert nonce in state["nonces"]
+
+
+def test_stop_cancels_requests_past_deadline(served_sdk):
+    """测试超过排空期限的请求被取消，stop_server 按期限返回"""
+    sdk, port, _ = served_sdk(drain_timeout=0.5)
+
+    async def main():
+        await _wait_ready(port)
+        async with aiohttp.ClientSession() as session:
+            slow = asyncio.create_task(session.get(f"http://127.0.0.1:{port}/slow", params={"seconds": 30}))
+            await asyncio.sleep(0.2)
+            start = time.monotonic()
+            await sdk.astop_server()
+            elapsed = time.monotonic() - start
+            try:
+                response = await slow
+                status = response.status
+            except aiohttp.ClientError:
+                status = None
+            return elapsed, status
+
+    elapsed, status = asyncio.run(asyncio.wait_for(main(), timeout=30))
+    logger.info(f"超过期限的停机用时 {elapsed:.2f}s")
+    assert elapsed < 3
+    assert status != 200
+    assert not sdk.server_running
+
+
+def test_startup_tasks_run_concurrently_and_ready_endpoint():
+    """测试启动任务并发执行、失败的任务不阻止就绪，/ready 在启动、就绪和停机时的响应"""
+    tasks = StartupTasks()
+    for i in range(3):
+        tasks.add(f"sleep_{i}", lambda: time.sleep(0.3))
+
+    async def fails():
+        raise RuntimeError("boom")
+
+    tasks.add("fails", fails)
+    asyncio.run(tasks.run())
+    assert tasks.ready
+    assert tasks.elapsed < 0.6
+    assert tasks.status["sleep_0"] == "ok" and tasks.status["fails"] == "error: boom"
+
+    sdk = _get_sdk()
+    original = sdk.startup
+
+    async def main():
+        transport = httpx.ASGITransport(app=sdk.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost:9527") as client:
+            sdk.startup = StartupTasks()
+            response = await client.get("/ready")
+            assert response.status_code == 503 and response.json() == {"status": "starting"}
+            assert "retry-after" in response.headers
+
+            sdk.startup = tasks
+            response = await client.get("/ready")
+            assert response.status_code == 200 and response.json()["status"] == "ready"
+
+            sdk.draining = True
+            response = await client.get("/ready")
+            assert response.status_code == 503 and response.json() == {"status": "draining"}
+
+    try:
+        asyncio.run(main())
+    finally:
+        sdk.startup = original
+        sdk.draining = False
+
+
+def test_runtime_state_roundtrip(tmp_path):
+    """测试 nonce 保存后恢复，过期条目被跳过；状态文件只有所有者可读写，不包含 token"""
+    now = datetime.now(timezone.utc)
+    fresh, stale = "roundtrip-fresh", "roundtrip-stale"
+    auth_server.VALID_SERVER_NONCES[fresh] = now
+    auth_server.VALID_SERVER_NONCES[stale] = now - timedelta(days=1)
+    path = str(tmp_path / "state" / "runtime_state.json")
+
+    try:
+        assert save_runtime_state(path) == {"nonces": 1}
+        saved = json.loads(Path(path).read_text(encoding="utf-8"))
+        assert fresh in saved["nonces"] and stale not in saved["nonces"]
+        assert "tokens" not in saved
+        assert os.stat(path).st_mode & 0o777 == 0o600
+        auth_server.VALID_SERVER_NONCES.pop(fresh)
+        auth_server.VALID_SERVER_NONCES.pop(stale)
+
+        assert restore_runtime_state(path) == {"nonces": 1}
+        assert fresh in auth_server.VALID_SERVER_NONCES
+        assert stale not in auth_server.VALID_SERVER_NONCES
+        assert restore_runtime_state(str(tmp_path / "missing.json")) == {"nonces": 0}
+    finally:
+        auth_server.VALID_SERVER_NONCES.pop(fresh, None)
+        auth_server.VALID_SERVER_NONCES.pop(stale, None)
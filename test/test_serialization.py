@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+JSON 编解码与压缩测试
+
+测试 orjson 与标准库两种编解码器的输出语义一致（常见载荷逐字节一致）、回退路径、
+FastJSONResponse 与 gzip 响应压缩、压缩请求体的解压和大小上限，并给出编解码吞吐量基准。
+"""
+
+import sys
+import gzip
+import json
+import time
+import zlib
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+
+from anp_open_sdk.utils import serialization
+from anp_open_sdk.utils.request_payload import get_json_payload, load_payload
+from anp_open_sdk.utils.serialization import (
+    EventStreamGZipMiddleware, FastJSONResponse, PayloadTooLarge, decode_content, get_codec
+)
+
+logger = logging.getLogger(__name__)
+
+CODECS = ["json"] + (["orjson"] if serialization.orjson is not None else [])
+
+
+def _agent_description(n: int = 200) -> dict:
+    """模拟智能体描述文档 ad.json"""
+    return {
+        "@context": {"@vocab": "https://schema.org/", "ad": "https://agent-network-protocol.com/ad#"},
+        "@type": "ad:AgentDescription",
+        "name": "智能体描述 🤖",
+        "did": "did:wba:localhost%3A9527:wba:user:5fea49e183c6c211",
+        "interfaces": [
+            {
+                "@type": "ad:NaturalLanguageInterface",
+                "path": f"/api/method_{i}",
+                "description": f"第 {i} 个接口，支持 \"引号\"、反斜杠 \\ 和换行\n以及制表符\t",
+                "params": {"a": {"type": "number", "default": i * 0.5}, "flag": i % 2 == 0, "none": None},
+                "tags": ["demo", "测试", str(i)],
+                "nested": [[i, -i, 2 ** 40], {"deep": {"deeper": [True, False, None]}}],
+            }
+            for i in range(n)
+        ],
+    }
+
+
+SAMPLES = [
+    {},
+    [],
+    "",
+    "纯中文字符串",
+    "emoji 🚀 and \u0000 control \u001f chars  ",
+    {"int": 1, "neg": -7, "zero": 0, "big": 2 ** 62, "float": 0.1, "pi": 3.141592653589793},
+    {"bool": [True, False], "none": None, "nested": {"a": [{"b": [{"c": []}]}]}},
+    _agent_description(5),
+]
+
+
+@pytest.mark.parametrize("sample", SAMPLES)
+def test_codecs_byte_for_byte(sample):
+    """测试常见载荷两种编解码器输出逐字节一致，并可互相解码"""
+    outputs = {name: get_codec(name).dumps(sample) for name in CODECS}
+    assert len(set(outputs.values())) == 1
+    for encoded in outputs.values():
+        for name in CODECS:
+            assert get_codec(name).loads(encoded) == sample
+            assert get_codec(name).loads(encoded.decode("utf-8")) == sample
+        assert json.loads(encoded) == sample
+    assert get_codec("json").dumps_str(sample) == outputs["json"].decode("utf-8")
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_semantic_equivalence_edge_cases(name):
+    """测试格式可能不同但语义一致的输入，以及 orjson 不支持时的回退"""
+    codec = get_codec(name)
+    when = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    data = {1: "int key", "huge": 2 ** 70, "exp": 1e16, "tiny": 5e-324, "when": when, "set": {3}}
+    decoded = json.loads(codec.dumps(data))
+    assert decoded == {"1": "int key", "huge": 2 ** 70, "exp": 1e16, "tiny": 5e-324,
+                       "when": when.isoformat(), "set": [3]}
+    assert codec.loads(b'{"nan": NaN, "big": 123456789012345678901234567890}')["big"] == 123456789012345678901234567890
+    # NaN/Infinity 不是合法 JSON，两种编解码器都输出 null（包括回退到标准库的路径）
+    assert codec.dumps({"x": float("nan"), "y": [float("inf"), -float("inf")], "z": 1.5}) == \
+        b'{"x":null,"y":[null,null],"z":1.5}'
+    assert codec.dumps({"x": float("nan"), "huge": 2 ** 70}) == b'{"x":null,"huge":1180591620717411303424}'
+    # 浮点数字面量和字符串中的长数字不触发回退，结果与标准库一致
+    assert codec.loads(b'{"f": 1e19, "n": -9.3e18, "s": "1234567890123456789012"}') == \
+        {"f": 1e19, "n": -9.3e18, "s": "1234567890123456789012"}
+    assert codec.loads('[18446744073709551616]') == [2 ** 64]
+    assert codec.loads(b'{"big": 1180591620717411303424, "neg": -9223372036854775809, "u64": 18446744073709551615}') == \
+        {"big": 2 ** 70, "neg": -2 ** 63 - 1, "u64": 2 ** 64 - 1}
+    assert codec.loads(memoryview(b'[1e19999999999999999999, "12345678901234567890123"]')) == [float("inf"), "12345678901234567890123"]
+    with pytest.raises(ValueError):
+        codec.loads(b"{not json")
+    with pytest.raises(TypeError):
+        codec.dumps({"obj": object()})
+
+
+def test_fast_response_and_gzip():
+    """测试 FastJSONResponse 作为默认响应类，大响应 gzip 压缩、小响应和未声明 gzip 的客户端不压缩"""
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+    document = _agent_description()
+
+    @app.get("/ad.json")
+    async def ad():
+        return document
+
+    @app.get("/small")
+    async def small():
+        return {"ok": "好"}
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/ad.json", headers={"accept-encoding": "gzip"})
+            assert response.headers["content-encoding"] == "gzip"
+            assert response.json() == document
+            compressed = int(response.headers["content-length"])
+            plain = await client.get("/ad.json", headers={"accept-encoding": "identity"})
+            assert "content-encoding" not in plain.headers
+            assert plain.content == serialization.dumps(document)
+            logger.info(f"ad.json {len(plain.content)} 字节, gzip 后 {compressed} 字节")
+            assert compressed < len(plain.content) / 5
+
+            response = await client.get("/small", headers={"accept-encoding": "gzip"})
+            assert "content-encoding" not in response.headers
+            assert response.content == '{"ok":"好"}'.encode("utf-8")
+
+    asyncio.run(main())
+
+
+def test_event_stream_skips_gzip():
+    """测试 SSE 路由和 Accept: text/event-stream 的请求不经过 gzip，事件逐条送达；其他大响应照常压缩"""
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(EventStreamGZipMiddleware, minimum_size=16, compresslevel=6)
+    release = asyncio.Event()
+    payload = {"text": "x" * 4096}
+
+    async def events():
+        yield "id: 1\ndata: first\n\n"
+        await release.wait()
+        yield "id: 2\ndata: second\n\n"
+
+    @app.get("/agent/group/{did}/{group_id}/connect")
+    async def connect(did: str, group_id: str):
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/big")
+    async def big():
+        return payload
+
+    async def main():
+        sent, first_event = [], asyncio.Event()
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+            if message["type"] == "http.response.body" and b"first" in message.get("body", b""):
+                first_event.set()
+
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                 "scheme": "http", "path": "/agent/group/d/g/connect", "raw_path": b"/agent/group/d/g/connect",
+                 "root_path": "", "query_string": b"", "headers": [(b"accept-encoding", b"gzip")],
+                 "client": ("127.0.0.1", 1), "server": ("test", 80)}
+        task = asyncio.create_task(app(scope, receive, send))
+        # 第二条事件还没产生时第一条已经未压缩地送达
+        await asyncio.wait_for(first_event.wait(), timeout=5)
+        start = next(m for m in sent if m["type"] == "http.response.start")
+        assert b"content-encoding" not in dict(start["headers"])
+        release.set()
+        await asyncio.wait_for(task, timeout=5)
+        assert b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body") == \
+            b"id: 1\ndata: first\n\nid: 2\ndata: second\n\n"
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/big", headers={"accept-encoding": "gzip"})
+            assert response.headers["content-encoding"] == "gzip" and response.json() == payload
+            response = await client.get("/big", headers={"accept-encoding": "gzip", "accept": "text/event-stream"})
+            assert "content-encoding" not in response.headers
+
+    asyncio.run(main())
+
+
+def test_compressed_request_bodies():
+    """测试 gzip/deflate 请求体在读取时解压，损坏的数据返回 400，超限返回 413"""
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def middleware(request, call_next):
+        try:
+            await load_payload(request)
+        except Exception as e:
+            return FastJSONResponse(status_code=e.status_code, content={"detail": e.detail})
+        return await call_next(request)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"payload": await get_json_payload(request)}
+
+    payload = _agent_description(20)
+    body = json.dumps(payload).encode("utf-8")
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for encoding, data in (("gzip", gzip.compress(body)), ("deflate", zlib.compress(body)), ("identity", body)):
+                response = await client.post("/echo", content=data, headers={"content-encoding": encoding})
+                assert response.status_code == 200
+                assert response.json()["payload"] == payload
+
+            response = await client.post("/echo", content=b"\x1f\x8bcorrupt", headers={"content-encoding": "gzip"})
+            assert response.status_code == 400
+
+    asyncio.run(main())
+
+    bomb = gzip.compress(b"0" * (8 * 1024 * 1024))
+    with pytest.raises(PayloadTooLarge):
+        decode_content(bomb, "gzip", max_size=1024 * 1024)
+    assert decode_content(bomb, "gzip", max_size=8 * 1024 * 1024) == b"0" * (8 * 1024 * 1024)
+    assert decode_content(b"raw", "br") == b"raw"
+
+
+def test_codec_throughput_benchmark():
+    """基准：智能体描述文档和小型 API 请求体的编码/解码吞吐量，orjson 编解码都应快于标准库"""
+    document = _agent_description(500)
+    encoded = get_codec("json").dumps(document)
+    body = get_codec("json").dumps({"type": "api_call", "path": "/calc", "params": {"a": 1, "b": 2.5},
+                                    "req_did": "did:wba:localhost%3A9527:wba:user:5fea49e183c6c211",
+                                    "content": "你好" * 200})
+
+    def best_of(func, rounds, repeat=5):
+        # 取多轮中的最好成绩，减少 GC 和其他测试线程造成的抖动
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                func()
+            best = min(best, time.perf_counter() - start)
+        return best / rounds
+
+    results = {}
+    for name in CODECS:
+        codec = get_codec(name)
+        dump_time = best_of(lambda: codec.dumps(document), 10)
+        load_time = best_of(lambda: codec.loads(encoded), 10)
+        body_time = best_of(lambda: codec.loads(body), 2000)
+        results[name] = (dump_time, load_time, body_time)
+        mb = len(encoded) / 1e6
+        logger.info(f"{name}: 编码 {mb / dump_time:.1f}MB/s, 解码 {mb / load_time:.1f}MB/s（文档 {len(encoded) / 1e3:.0f}KB）, "
+                    f"{len(body)} 字节请求体解码 {body_time * 1e6:.1f}us")
+    if "orjson" in results:
+        assert results["orjson"][0] < results["json"][0]
+        assert results["orjson"][1] < results["json"][1]
+        assert results["orjson"][2] < results["json"][2]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    test_codec_throughput_benchmark()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+用户批量创建测试
+
+测试 did_create_user 的异步版本、批量创建接口、用户名唯一性和原子写入，
+托管 DID 目录的批量创建和执行器关闭，并提供批量创建 1000 个智能体的性能基准。
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+from pathlib import Path
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.config import UnifiedConfig, set_global_config, get_global_config
+from anp_open_sdk import anp_sdk_user_data
+from anp_open_sdk.anp_sdk_user_data import (
+    did_create_user, did_create_user_async, did_create_users_batch, did_create_hosted_users_batch,
+    shutdown_user_executors
+)
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = Path(__file__).parent.parent
+
+
+def _ensure_config():
+    try:
+        return get_global_config()
+    except RuntimeError:
+        config = UnifiedConfig(
+            config_file=str(APP_ROOT / 'anp_open_sdk_framework_demo_agent_unified_config.yaml'),
+            app_root=str(APP_ROOT)
+        )
+        set_global_config(config)
+        return config
+
+
+@pytest.fixture
+def user_root(tmp_path):
+    """将用户目录指向临时目录"""
+    config = _ensure_config()
+    original = config.anp_sdk.user_did_path
+    root = tmp_path / "anp_users"
+    config.anp_sdk.user_did_path = str(root)
+    yield root
+    config.anp_sdk.user_did_path = original
+
+
+def _params(name, port=9527):
+    return {'name': name, 'host': 'localhost', 'port': port, 'dir': 'wba', 'type': 'user'}
+
+
+def test_create_user_files(user_root):
+    """测试同步创建用户生成完整的用户目录"""
+    did_doc = did_create_user(_params("provision_user"))
+    assert did_doc is not None
+    user_dir = user_root / f"user_{did_doc['id'].split(':')[-1]}"
+    for file_name in ("did_document.json", "agent_cfg.yaml", "key-1_private.pem",
+                      "key-1_public.pem", "private_key.pem", "public_key.pem"):
+        assert (user_dir / file_name).exists(), file_name
+    assert not [p for p in user_root.iterdir() if p.name.startswith('.')]
+
+
+def test_default_port_did(user_root):
+    """测试 80/443 端口的 DID 不包含端口号"""
+    did_doc = did_create_user(_params("port80_user", port=80))
+    assert did_doc is not None
+    assert did_doc['id'].startswith("did:wba:localhost:wba:user:")
+
+    did_doc = did_create_user(_params("port443_user", port=443))
+    assert did_doc['id'].startswith("did:wba:localhost:wba:user:")
+
+
+def test_batch_names_unique(user_root):
+    """测试批量创建时重名用户获得不同的名称"""
+    did_create_user(_params("same_name"))
+    results = asyncio.run(did_create_users_batch([_params("same_name") for _ in range(5)]))
+    assert all(results)
+
+    import yaml
+    names = []
+    for cfg_path in user_root.glob("user_*/agent_cfg.yaml"):
+        with open(cfg_path, 'r', encoding='utf-8') as f:
+            names.append(yaml.safe_load(f)['name'])
+    assert len(names) == 6
+    assert len(set(names)) == 6
+    assert "same_name" in names
+
+
+def test_async_create_does_not_block_loop(user_root):
+    """测试异步创建期间事件循环仍能调度其他任务"""
+    async def run():
+        ticks = 0
+        stop = False
+
+        async def ticker():
+            nonlocal ticks
+            while not stop:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        ticker_task = asyncio.create_task(ticker())
+        did_doc = await did_create_user_async(_params("async_user"))
+        stop = True
+        await ticker_task
+        return did_doc, ticks
+
+    did_doc, ticks = asyncio.run(run())
+    assert did_doc is not None
+    assert ticks > 1
+
+
+def test_hosted_users_batch(user_root):
+    """测试托管 DID 目录批量创建：复制父用户密钥，写入托管配置，失败的条目返回 None"""
+    import json
+    import yaml
+    parent_doc = did_create_user(_params("hosted_parent"))
+    parent_dir = next(p for p in user_root.glob("user_*")
+                      if json.loads((p / "did_document.json").read_text(encoding="utf-8"))["id"] == parent_doc["id"])
+    hosted = [("hoster.example", "9528", {"id": f"did:wba:hoster.example%3A9528:wba:hostuser:{i:016x}"})
+              for i in range(5)]
+    hosted.append(("hoster.example", "not-a-port", {"id": "did:wba:hoster.example:bad"}))
+
+    names = asyncio.run(did_create_hosted_users_batch(str(parent_dir), parent_doc["id"], hosted))
+    assert names[:5] == [f"user_hosted_hoster.example_9528_{i:016x}" for i in range(5)]
+    assert names[5] is None
+    hosted_dir = user_root / names[0]
+    assert (hosted_dir / "key-1_private.pem").read_bytes() == (parent_dir / "key-1_private.pem").read_bytes()
+    cfg = yaml.safe_load((hosted_dir / "agent_cfg.yaml").read_text(encoding="utf-8"))
+    assert cfg["hosted_config"]["parent_did"] == parent_doc["id"] and cfg["hosted_config"]["port"] == 9528
+    assert not list(user_root.glob(".*.tmp-*"))
+
+
+def test_shutdown_user_executors(user_root):
+    """测试关闭执行器后再次创建用户会重新建立执行器"""
+    assert asyncio.run(did_create_user_async(_params("before_shutdown"))) is not None
+    keygen = anp_sdk_user_data._keygen_executor
+    assert keygen is not None
+    shutdown_user_executors()
+    assert anp_sdk_user_data._keygen_executor is None and anp_sdk_user_data._io_executor is None
+    assert asyncio.run(did_create_user_async(_params("after_shutdown"))) is not None
+    assert anp_sdk_user_data._keygen_executor is not keygen
+
+
+def run_batch_create_benchmark(count: int):
+    """批量创建 count 个智能体并统计耗时"""
+    start_time = time.time()
+    results = asyncio.run(did_create_users_batch([_params(f"bench_{i}") for i in range(count)]))
+    elapsed = time.time() - start_time
+    assert sum(1 for r in results if r) == count
+    logger.info(f"批量创建 {count} 个智能体耗时: {elapsed:.2f}秒 ({count / elapsed:.1f} 个/秒)")
+    return elapsed
+
+
+def test_batch_create_benchmark(user_root):
+    """批量创建性能基准测试，ANP_BENCH_AGENTS 可调整数量"""
+    run_batch_create_benchmark(int(os.environ.get("ANP_BENCH_AGENTS", "20")))
+
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO)
+    config = _ensure_config()
+    with tempfile.TemporaryDirectory() as tmp:
+        config.anp_sdk.user_did_path = tmp
+        run_batch_create_benchmark(1000)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+验证方法缓存测试
+
+测试 verify_auth_header_signature_two_way / verify_auth_json_signature 复用已构建的
+验证器、密钥轮换后使用新公钥，并提供验签性能基准。
+"""
+
+import sys
+import time
+import logging
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+
+from anp_open_sdk.agent_connect_hotpatch.authentication import did_wba
+from anp_open_sdk.agent_connect_hotpatch.authentication.did_wba import (
+    generate_auth_header_two_way, verify_auth_header_signature_two_way,
+    generate_auth_json, verify_auth_json_signature, clear_verification_caches, _public_key_to_jwk
+)
+
+logger = logging.getLogger(__name__)
+
+DID = "did:wba:localhost%3A9527:wba:user:0123456789abcdef"
+SERVICE = "localhost"
+
+
+def _did_document(private_key: ec.EllipticCurvePrivateKey) -> dict:
+    return {
+        "id": DID,
+        "verificationMethod": [{
+            "id": f"{DID}#key-1",
+            "type": "EcdsaSecp256k1VerificationKey2019",
+            "controller": DID,
+            "publicKeyJwk": _public_key_to_jwk(private_key.public_key())
+        }],
+        "authentication": [f"{DID}#key-1"]
+    }
+
+
+def _sign(private_key):
+    def sign(content, fragment):
+        # encode_signature 按最短字节长度拼接 R|S，避开 r/s 不足 32 字节的签名以免验签偶发失败
+        while True:
+            signature = private_key.sign(content, ec.ECDSA(hashes.SHA256()))
+            r, s = decode_dss_signature(signature)
+            if r.bit_length() > 248 and s.bit_length() > 248:
+                return signature
+    return sign
+
+
+def _header(private_key) -> str:
+    return generate_auth_header_two_way(_did_document(private_key), "did:wba:resp", SERVICE, _sign(private_key))
+
+
+def _count_constructions(monkeypatch):
+    calls = {"count": 0}
+    original = did_wba.create_verification_method
+
+    def counting(method_dict):
+        calls["count"] += 1
+        return original(method_dict)
+
+    monkeypatch.setattr(did_wba, "create_verification_method", counting)
+    return calls
+
+
+def test_verifier_reused_across_documents(monkeypatch):
+    """测试同一公钥在重新解析的文档上复用验证器"""
+    clear_verification_caches()
+    key = ec.generate_private_key(ec.SECP256K1())
+    calls = _count_constructions(monkeypatch)
+
+    for _ in range(5):
+        # 每次请求都会重新解析出新的文档对象
+        ok, message = verify_auth_header_signature_two_way(_header(key), _did_document(key), SERVICE)
+        assert ok, message
+    auth_json = generate_auth_json(_did_document(key), SERVICE, _sign(key))
+    ok, message = verify_auth_json_signature(auth_json, _did_document(key), SERVICE)
+    assert ok, message
+    assert calls["count"] == 1
+
+
+def test_key_rotation(monkeypatch):
+    """测试同一 DID 与方法 id 轮换公钥后，旧签名失效、新签名通过"""
+    clear_verification_caches()
+    old_key = ec.generate_private_key(ec.SECP256K1())
+    new_key = ec.generate_private_key(ec.SECP256K1())
+
+    old_header = _header(old_key)
+    assert verify_auth_header_signature_two_way(old_header, _did_document(old_key), SERVICE)[0]
+
+    rotated = _did_document(new_key)
+    ok, _ = verify_auth_header_signature_two_way(old_header, rotated, SERVICE)
+    assert not ok
+    ok, message = verify_auth_header_signature_two_way(_header(new_key), rotated, SERVICE)
+    assert ok, message
+    # 回滚到旧公钥后也不会误用新公钥的验证器
+    assert verify_auth_header_signature_two_way(old_header, _did_document(old_key), SERVICE)[0]
+    assert not verify_auth_header_signature_two_way(_header(new_key), _did_document(old_key), SERVICE)[0]
+
+
+def test_method_lookup():
+    """测试按 id 查找验证方法，包括内嵌的 authentication 方法"""
+    key = ec.generate_private_key(ec.SECP256K1())
+    document = _did_document(key)
+    embedded = dict(document["verificationMethod"][0], id=f"{DID}#key-2")
+    document["authentication"].append(embedded)
+    assert did_wba._find_verification_method(document, f"{DID}#key-1") is document["verificationMethod"][0]
+    assert did_wba._find_verification_method(document, f"{DID}#key-2") is embedded
+    assert did_wba._find_verification_method(document, f"{DID}#missing") is None
+
+
+def run_verification_benchmark(count: int = 2000):
+    """比较每次重建验证器与使用缓存时的验签耗时"""
+    key = ec.generate_private_key(ec.SECP256K1())
+    headers = [_header(key) for _ in range(count)]
+    documents = [_did_document(key) for _ in range(count)]
+
+    start_time = time.perf_counter()
+    for header, document in zip(headers, documents):
+        clear_verification_caches()
+        assert verify_auth_header_signature_two_way(header, document, SERVICE)[0]
+    cold = (time.perf_counter() - start_time) / count
+
+    start_time = time.perf_counter()
+    for header, document in zip(headers, documents):
+        assert verify_auth_header_signature_two_way(header, document, SERVICE)[0]
+    warm = (time.perf_counter() - start_time) / count
+
+    logger.info(f"验签耗时: 无缓存 {cold * 1e6:.1f}微秒, 缓存 {warm * 1e6:.1f}微秒")
+    return cold, warm
+
+
+def test_verification_benchmark():
+    """验签基准测试"""
+    cold, warm = run_verification_benchmark(300)
+    assert warm < cold * 1.5
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_verification_benchmark()
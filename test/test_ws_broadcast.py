@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+WebSocket 广播测试
+
+测试 ANPSDK.broadcast_message 的每连接发送队列：2k 个客户端中有一个停止读取时，
+广播不被阻塞、负载只编码一次、慢速连接在超时后被关闭；并通过 /ws/message
+对真实 WebSocket 客户端做扇出延迟基准测试。
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import threading
+from pathlib import Path
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from anp_open_sdk.config import UnifiedConfig, set_global_config, get_global_config
+from anp_open_sdk.service.interaction.anp_sdk_ws_sender import WebSocketSender
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = Path(__file__).parent.parent
+CLIENT_COUNT = 2000
+
+
+class FakeWebSocket:
+    """记录收到的文本，stalled 时 send_text 永远不返回"""
+
+    def __init__(self, stalled: bool = False):
+        self.stalled = stalled
+        self.received = []
+        self.close_code = None
+
+    async def send_text(self, text: str):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.received.append(text)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+def _get_sdk():
+    from anp_open_sdk.anp_sdk import ANPSDK
+    try:
+        get_global_config()
+    except RuntimeError:
+        set_global_config(UnifiedConfig(
+            config_file=str(APP_ROOT / 'anp_open_sdk_framework_demo_agent_unified_config.yaml'),
+            app_root=str(APP_ROOT)
+        ))
+    return ANPSDK()
+
+
+def test_broadcast_with_stalled_client():
+    """测试 2k 个连接中有一个停止读取时其他连接按时收到全部消息"""
+    sdk = _get_sdk()
+
+    async def run():
+        sockets = [FakeWebSocket() for _ in range(CLIENT_COUNT - 1)] + [FakeWebSocket(stalled=True)]
+        for ws in sockets:
+            sdk.ws_connections[id(ws)] = WebSocketSender(
+                ws, max_queue=64, high_water=8, slow_timeout=0.2,
+                on_close=lambda sender: sdk.ws_connections.pop(id(sender.websocket), None)
+            ).start()
+
+        start_time = time.time()
+        for i in range(20):
+            assert await sdk.broadcast_message({"type": "notice", "seq": i}) >= CLIENT_COUNT - 1
+        enqueue_time = time.time() - start_time
+
+        while any(len(ws.received) < 20 for ws in sockets[:-1]):
+            await asyncio.sleep(0.01)
+        fan_out_time = time.time() - start_time
+
+        await asyncio.sleep(0.4)
+        return sockets, enqueue_time, fan_out_time
+
+    try:
+        sockets, enqueue_time, fan_out_time = asyncio.run(run())
+    finally:
+        sdk.ws_connections.clear()
+
+    stalled = sockets[-1]
+    assert stalled.close_code == 1008
+    assert stalled.received == []
+    assert [json.loads(t)["seq"] for t in sockets[0].received] == list(range(20))
+    # 同一条广播在所有连接上是同一个字符串对象（只编码一次）
+    assert all(ws.received[5] is sockets[0].received[5] for ws in sockets[:-1])
+    assert enqueue_time < 1.0
+    logger.info(f"{CLIENT_COUNT} 个连接: 入队 {enqueue_time * 1000:.1f}毫秒, 扇出完成 {fan_out_time * 1000:.1f}毫秒")
+
+
+def test_slow_client_recovers_below_high_water():
+    """测试短暂超过高水位后追上的连接不会被关闭"""
+    async def run():
+        ws = FakeWebSocket()
+        gate = asyncio.Event()
+        original_send = ws.send_text
+
+        async def slow_send(text):
+            await gate.wait()
+            await original_send(text)
+
+        ws.send_text = slow_send
+        sender = WebSocketSender(ws, max_queue=64, high_water=4, slow_timeout=0.2).start()
+        for i in range(10):
+            sender.enqueue(str(i))
+        await asyncio.sleep(0.05)
+        gate.set()
+        await asyncio.sleep(0.3)
+        return ws, sender
+
+    ws, sender = asyncio.run(run())
+    assert not sender.closed
+    assert ws.received == [str(i) for i in range(10)]
+
+
+def test_full_queue_close_is_tracked():
+    """测试队列满时发起的关闭任务被保留并只创建一次，发送失败时写任务直接完成关闭"""
+    async def run():
+        stalled = FakeWebSocket(stalled=True)
+        sender = WebSocketSender(stalled, max_queue=2, high_water=1, slow_timeout=10).start()
+        await asyncio.sleep(0)
+        results = [sender.enqueue(str(i)) for i in range(5)]
+        close_task = sender._close_task
+        assert close_task is not None
+        await close_task
+        assert sender._close_task is close_task
+
+        failing = FakeWebSocket()
+
+        async def broken_send(text):
+            raise ConnectionError("reset")
+
+        failing.send_text = broken_send
+        broken = WebSocketSender(failing).start()
+        broken.enqueue("x")
+        await broken._writer_task
+        return stalled, sender, results, failing, broken
+
+    stalled, sender, results, failing, broken = asyncio.run(run())
+    assert results == [True, True, False, False, False]
+    assert sender.closed and stalled.close_code == 1008
+    assert broken.closed and broken._close_task is None and failing.close_code == 1000
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_ws_fan_out_benchmark(count: int, rounds: int = 5):
+    """启动 ANPSDK 服务，连接 count 个真实 WebSocket 客户端并测量广播扇出延迟"""
+    import uvicorn
+    import websockets
+
+    sdk = _get_sdk()
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(sdk.app, host="127.0.0.1", port=port, log_level="error", backlog=count))
+    server_loop = {}
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        server_loop["loop"] = loop
+        loop.run_until_complete(server.serve())
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    async def run():
+        url = f"ws://127.0.0.1:{port}/ws/message"
+        clients = []
+        for start in range(0, count, 200):
+            clients += await asyncio.gather(*(websockets.connect(url, max_queue=None)
+                                              for _ in range(start, min(count, start + 200))))
+        while len(sdk.ws_connections) < count:
+            await asyncio.sleep(0.01)
+
+        latencies = []
+        for i in range(rounds):
+            start_time = time.time()
+            asyncio.run_coroutine_threadsafe(sdk.broadcast_message({"type": "notice", "seq": i}),
+                                             server_loop["loop"]).result()
+            messages = await asyncio.gather(*(client.recv() for client in clients))
+            latencies.append(time.time() - start_time)
+            assert all(json.loads(m)["seq"] == i for m in messages)
+
+        await asyncio.gather(*(client.close() for client in clients))
+        return latencies
+
+    try:
+        latencies = asyncio.run(run())
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        sdk.ws_connections.clear()
+    logger.info(f"{count} 个 WebSocket 客户端扇出延迟: 平均 {sum(latencies) / len(latencies) * 1000:.1f}毫秒, "
+                f"最大 {max(latencies) * 1000:.1f}毫秒")
+    return latencies
+
+
+def test_ws_fan_out_benchmark():
+    """真实 WebSocket 客户端扇出基准测试，ANP_BENCH_WS_CLIENTS 可调整客户端数量"""
+    latencies = run_ws_fan_out_benchmark(int(os.environ.get("ANP_BENCH_WS_CLIENTS", "200")))
+    assert max(latencies) < 5.0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_ws_fan_out_benchmark(CLIENT_COUNT)